@@ -9,11 +9,11 @@ from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 from starlette.responses import RedirectResponse, FileResponse
 
 from Settings import SETTINGS, VERSION
-from logic import Constants
+from logic import Constants, WriteBehindQueue
 from logic.DatabaseCleanupService import DatabaseCleanupService
-from logic.Dependencies import get_database
+from logic.DatabaseExecutor import DATABASE_EXECUTOR
 from logic.DiscoveryService import DiscoveryService
-from logic.database import Models
+from logic.database import Crud, DatabaseMigration, DatabaseVacuum, Models
 from logic.database.Database import engine
 from logic.routers import DeviceRouter, GeneralRouter, DatabaseRouter
 from logic.routers import SensorRouter, MeasurementRouter
@@ -22,8 +22,23 @@ LOGGER = DefaultLogger().create_logger_if_not_exists(Constants.APP_NAME)
 
 DATABASE_SETTINGS = SETTINGS['database']
 
+if DatabaseMigration.is_measurement_storage_migration_required(engine):
+    DatabaseMigration.migrate_measurement_storage(engine)
+
+isRollupBackfillRequired = DatabaseMigration.is_rollup_backfill_required(engine)
+
+if DatabaseMigration.is_sensor_autoincrement_migration_required(engine):
+    DatabaseMigration.migrate_sensor_autoincrement(engine)
+
+# must be set up before the tables of a new database are created
+DatabaseVacuum.prepare_auto_vacuum(engine, DATABASE_SETTINGS['cleanup'].get('vacuum', {}))
+
 # create database tables
 Models.Base.metadata.create_all(bind=engine)
+DatabaseMigration.migrate_indexes(engine)
+
+if isRollupBackfillRequired:
+    DatabaseMigration.backfill_rollups(engine)
 
 app = FastAPI(title=Constants.APP_NAME,
               version=VERSION['name'],
@@ -65,9 +80,11 @@ def overridden_redoc():
 
 @app.on_event("startup")
 async def startup_event():
+    WriteBehindQueue.WRITE_BEHIND_QUEUE.start()
+
     cleanupSettings = SETTINGS['database']['cleanup']
     if cleanupSettings['automatic']['enable']:
-        cleanupService = DatabaseCleanupService(cleanupSettings)
+        cleanupService = DatabaseCleanupService(cleanupSettings, SETTINGS['database'].get('partitioning', {}))
 
         try:
             cronTrigger = CronTrigger.from_crontab(cleanupSettings['automatic']['cronSchedule'])
@@ -75,7 +92,17 @@ async def startup_event():
             raise ValueError(f'Invalid syntax for settings option "cronSchedule": {str(e)}') from e
 
         from logic import JobScheduler
-        JobScheduler.SCHEDULER.schedule_automatic_job(cleanupService.cleanup, [next(get_database())], cronTrigger)
+        JobScheduler.SCHEDULER.schedule_automatic_job(cleanupService.run, [], cronTrigger)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from logic import JobScheduler
+    JobScheduler.SCHEDULER.shutdown()
+
+    await WriteBehindQueue.WRITE_BEHIND_QUEUE.stop()
+    DATABASE_EXECUTOR.shutdown()
+    Crud.BACKUP_SERVICE.shutdown()
 
 
 app.include_router(GeneralRouter.router)
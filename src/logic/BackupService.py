@@ -1,8 +1,14 @@
+import json
 import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
 
-from TheCodeLabs_BaseUtils.OwncloudUploader import OwncloudUploader
-
-from logic import Constants
+from logic import BackupSnapshot, Constants
+from logic.BackupTarget import LocalBackupTarget, OwncloudBackupTarget, TARGET_LOCAL, TARGET_OWNCLOUD
+from logic.database import Schemas
 
 LOGGER = logging.getLogger(Constants.APP_NAME)
 
@@ -12,17 +18,64 @@ class BackupService:
                  fileToBackup: str,
                  enable: bool,
                  maxModifications: int,
-                 owncloudHost: str,
-                 owncloudUser: str,
-                 owncloudPassword: str,
-                 owncloudDestinationPath: str):
+                 owncloudHost: str = '',
+                 owncloudUser: str = '',
+                 owncloudPassword: str = '',
+                 owncloudDestinationPath: str = '',
+                 maxIncrementalBackups: int = 10,
+                 snapshotDirectory: Optional[str] = None,
+                 minIntervalInSeconds: float = 0,
+                 maxDatabaseGrowthInMB: float = 0,
+                 target: str = TARGET_OWNCLOUD,
+                 localDestinationPath: str = ''):
         self._fileToBackup = fileToBackup
         self._enable = enable
         self._maxModifications = maxModifications
-        self._owncloudHost = owncloudHost
-        self._owncloudUser = owncloudUser
-        self._owncloudPassword = owncloudPassword
-        self._owncloudDestinationPath = owncloudDestinationPath
+        self._maxIncrementalBackups = maxIncrementalBackups
+        self._minIntervalInSeconds = minIntervalInSeconds
+        self._maxDatabaseGrowthInBytes = maxDatabaseGrowthInMB * 1024 * 1024
+
+        if target == TARGET_OWNCLOUD:
+            self._target = OwncloudBackupTarget(owncloudHost, owncloudUser, owncloudPassword, owncloudDestinationPath)
+        elif target == TARGET_LOCAL:
+            self._target = LocalBackupTarget(localDestinationPath)
+        else:
+            raise ValueError(f'Invalid value for settings option "target": "{target}" '
+                             f'(allowed: {TARGET_OWNCLOUD}, {TARGET_LOCAL})')
+
+        # the snapshot of the last uploaded backup is kept to compute the next incremental backup
+        if not snapshotDirectory:
+            snapshotDirectory = os.path.dirname(os.path.abspath(fileToBackup))
+        fileName = os.path.basename(fileToBackup)
+        self._snapshotPath = os.path.join(snapshotDirectory, f'{fileName}.snapshot')
+        self._newSnapshotPath = os.path.join(snapshotDirectory, f'{fileName}.snapshot.new')
+        self._statePath = os.path.join(snapshotDirectory, f'{fileName}.snapshot.json')
+        self._uploadDirectory = snapshotDirectory
+        self._uploadFileName = fileName
+
+        # modifications are counted by the threads of all requests
+        self._lock = threading.Lock()
+        # at most one backup runs at a time
+        self._backupLock = threading.Lock()
+
+        # backups are performed by a background thread, requests only signal it
+        self._backupRequested = threading.Event()
+        self._stopRequested = threading.Event()
+        self._isBackupPending = False
+        self._isBackupForced = False
+        self._workerThread = None
+
+        self._lastBackupStart = None
+        self._databaseSizeAtLastBackup = self.__get_database_size()
+
+        self._numberOfBackups = 0
+        self._numberOfIncrementalBackups = 0
+        self._numberOfFailedBackups = 0
+        self._lastBackupTime = None
+        self._lastDurationInSeconds = 0.0
+        self._totalDurationInSeconds = 0.0
+        self._lastUploadedBytes = 0
+        self._totalUploadedBytes = 0
 
         self.__reset()
 
@@ -33,19 +86,165 @@ class BackupService:
         if not self._enable:
             return False
 
-        return self._numberOfModifications >= self._maxModifications
+        if self._numberOfModifications >= self._maxModifications:
+            return True
+
+        return bool(self._maxDatabaseGrowthInBytes) \
+            and self.__get_database_size() - self._databaseSizeAtLastBackup >= self._maxDatabaseGrowthInBytes
 
     def backup(self):
-        try:
-            LOGGER.info('Running backup...')
-            uploader = OwncloudUploader(self._owncloudHost, self._owncloudUser, self._owncloudPassword)
-            uploader.upload(self._owncloudDestinationPath, self._fileToBackup, chunked=False)
-            self.__reset()
-        except Exception:
-            LOGGER.exception('Error performing backup')
+        # forces a backup regardless of the backup policy, non-blocking
+        with self._lock:
+            self._isBackupForced = True
+            self.__request_backup()
 
     def perform_modification(self):
-        self._numberOfModifications += 1
-        LOGGER.debug(f'New Modification ({self._numberOfModifications}/{self._maxModifications})')
-        if self.is_backup_needed():
-            self.backup()
+        with self._lock:
+            self._numberOfModifications += 1
+            LOGGER.debug(f'New Modification ({self._numberOfModifications}/{self._maxModifications})')
+            if not self._isBackupPending and self.is_backup_needed():
+                self.__request_backup()
+
+    def __request_backup(self):
+        # triggers that arrive while a backup is pending or running are coalesced into a single subsequent backup
+        if self._stopRequested.is_set():
+            return
+
+        self._isBackupPending = True
+        if self._workerThread is None:
+            self._workerThread = threading.Thread(target=self.__run_worker, name='BackupService', daemon=True)
+            self._workerThread.start()
+        self._backupRequested.set()
+
+    def __run_worker(self):
+        while True:
+            self._backupRequested.wait()
+            self._backupRequested.clear()
+            if self._stopRequested.is_set():
+                return
+
+            with self._lock:
+                isForced = self._isBackupForced
+
+            if not isForced and self._lastBackupStart is not None:
+                remainingInterval = self._lastBackupStart + self._minIntervalInSeconds - time.monotonic()
+                if remainingInterval > 0:
+                    LOGGER.debug(f'Delaying backup by {remainingInterval:.0f}s (minimum interval)')
+                    if self._stopRequested.wait(remainingInterval):
+                        return
+
+            self.perform_backup()
+
+    def shutdown(self, timeoutInSeconds: float = 60):
+        # a running backup is completed, pending backups are discarded
+        LOGGER.debug('Shutting down backup service...')
+        with self._lock:
+            self._stopRequested.set()
+            self._backupRequested.set()
+            workerThread = self._workerThread
+
+        if workerThread is not None:
+            workerThread.join(timeoutInSeconds)
+            if workerThread.is_alive():
+                LOGGER.warning(f'Backup still running after {timeoutInSeconds}s, shutting down anyway')
+
+    def perform_backup(self):
+        with self._backupLock:
+            with self._lock:
+                # modifications made from now on are part of the next backup
+                self.__reset()
+                self._isBackupPending = False
+                self._isBackupForced = False
+                self._lastBackupStart = time.monotonic()
+                self._databaseSizeAtLastBackup = self.__get_database_size()
+
+            try:
+                LOGGER.info('Running backup...')
+                uploadedBytes, isIncremental = self.__backup()
+                self.__record_backup(time.monotonic() - self._lastBackupStart, uploadedBytes, isIncremental)
+                LOGGER.info(f'Backup done ({uploadedBytes} bytes uploaded)')
+            except Exception:
+                with self._lock:
+                    self._numberOfFailedBackups += 1
+                LOGGER.exception('Error performing backup')
+
+    def __backup(self):
+        BackupSnapshot.create_snapshot(self._fileToBackup, self._newSnapshotPath)
+
+        numberOfIncrementalBackups = self.__load_number_of_incremental_backups()
+        isIncremental = self.__is_incremental_backup_possible(numberOfIncrementalBackups)
+        if isIncremental:
+            numberOfIncrementalBackups += 1
+            uploadPath = os.path.join(self._uploadDirectory,
+                                      f'{self._uploadFileName}.delta{numberOfIncrementalBackups}.gz')
+            numberOfChangedPages = BackupSnapshot.write_delta(self._snapshotPath, self._newSnapshotPath, uploadPath)
+            LOGGER.debug(f'Incremental backup {numberOfIncrementalBackups}: {numberOfChangedPages} changed pages')
+        else:
+            numberOfIncrementalBackups = 0
+            uploadPath = os.path.join(self._uploadDirectory, f'{self._uploadFileName}.gz')
+            BackupSnapshot.compress(self._newSnapshotPath, uploadPath)
+
+        try:
+            uploadedBytes = os.path.getsize(uploadPath)
+            self._target.upload(uploadPath)
+        finally:
+            os.remove(uploadPath)
+
+        # the next incremental backup is based on the uploaded snapshot only
+        os.replace(self._newSnapshotPath, self._snapshotPath)
+        self.__save_number_of_incremental_backups(numberOfIncrementalBackups)
+        return uploadedBytes, isIncremental
+
+    def __record_backup(self, durationInSeconds: float, uploadedBytes: int, isIncremental: bool):
+        with self._lock:
+            self._numberOfBackups += 1
+            if isIncremental:
+                self._numberOfIncrementalBackups += 1
+            self._lastBackupTime = datetime.now()
+            self._lastDurationInSeconds = durationInSeconds
+            self._totalDurationInSeconds += durationInSeconds
+            self._lastUploadedBytes = uploadedBytes
+            self._totalUploadedBytes += uploadedBytes
+
+    def get_statistics(self) -> Schemas.BackupStatistics:
+        with self._lock:
+            return Schemas.BackupStatistics(enabled=self._enable,
+                                            is_backup_pending=self._isBackupPending,
+                                            is_backup_running=self._backupLock.locked(),
+                                            number_of_modifications=self._numberOfModifications,
+                                            number_of_backups=self._numberOfBackups,
+                                            number_of_incremental_backups=self._numberOfIncrementalBackups,
+                                            number_of_failed_backups=self._numberOfFailedBackups,
+                                            last_backup_time=self._lastBackupTime,
+                                            last_duration_in_seconds=self._lastDurationInSeconds,
+                                            total_duration_in_seconds=self._totalDurationInSeconds,
+                                            last_uploaded_bytes=self._lastUploadedBytes,
+                                            total_uploaded_bytes=self._totalUploadedBytes)
+
+    def __get_database_size(self) -> int:
+        # the write-ahead log contains the changes that are not yet checkpointed into the database file
+        size = 0
+        for path in [self._fileToBackup, f'{self._fileToBackup}-wal']:
+            if os.path.exists(path):
+                size += os.path.getsize(path)
+        return size
+
+    def __is_incremental_backup_possible(self, numberOfIncrementalBackups: Optional[int]) -> bool:
+        if numberOfIncrementalBackups is None or not os.path.exists(self._snapshotPath):
+            return False
+
+        if BackupSnapshot.get_page_size(self._snapshotPath) != BackupSnapshot.get_page_size(self._newSnapshotPath):
+            return False
+
+        return numberOfIncrementalBackups < self._maxIncrementalBackups
+
+    def __load_number_of_incremental_backups(self) -> Optional[int]:
+        try:
+            with open(self._statePath, 'r', encoding='utf-8') as stateFile:
+                return json.load(stateFile)['numberOfIncrementalBackups']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __save_number_of_incremental_backups(self, numberOfIncrementalBackups: int):
+        with open(self._statePath, 'w', encoding='utf-8') as stateFile:
+            json.dump({'numberOfIncrementalBackups': numberOfIncrementalBackups}, stateFile)
@@ -0,0 +1,114 @@
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import struct
+from typing import BinaryIO, Tuple
+
+# Backups consist of a compressed full snapshot of the database and compressed deltas.
+# A delta contains the pages that changed since the previous snapshot and the SHA-256 digests of the database before
+# and after applying it, therefore a restore detects deltas that do not belong to the restored chain.
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+DELTA_MAGIC = b'SLDELTA1'
+# magic, page size, number of pages, digest before, digest after
+DELTA_HEADER = struct.Struct('>8sIQ32s32s')
+# page number (starting at 0) followed by the page content
+DELTA_PAGE_HEADER = struct.Struct('>Q')
+
+
+def create_snapshot(databasePath: str, snapshotPath: str):
+    # the online backup api copies all pages in a single read transaction: the snapshot is consistent and
+    # writers are not blocked in WAL mode
+    source = sqlite3.connect(f'file:{databasePath}?mode=ro', uri=True)
+    try:
+        target = sqlite3.connect(snapshotPath)
+        try:
+            source.backup(target)
+            # a snapshot of a WAL database is a WAL database as well, the restored file has to be self-contained
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+def get_page_size(snapshotPath: str) -> int:
+    # stored in the database header, 1 means 65536
+    with open(snapshotPath, 'rb') as snapshotFile:
+        snapshotFile.seek(16)
+        pageSize = struct.unpack('>H', snapshotFile.read(2))[0]
+    return 65536 if pageSize == 1 else pageSize
+
+
+def get_digest(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as inputFile:
+        for chunk in iter(lambda: inputFile.read(COPY_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def compress(path: str, compressedPath: str):
+    with open(path, 'rb') as inputFile, gzip.open(compressedPath, 'wb') as outputFile:
+        shutil.copyfileobj(inputFile, outputFile, COPY_BUFFER_SIZE)
+
+
+def decompress(compressedPath: str, path: str):
+    with gzip.open(compressedPath, 'rb') as inputFile, open(path, 'wb') as outputFile:
+        shutil.copyfileobj(inputFile, outputFile, COPY_BUFFER_SIZE)
+
+
+def write_delta(previousSnapshotPath: str, snapshotPath: str, deltaPath: str) -> int:
+    # returns the number of changed pages
+    # the snapshots keep the page numbers of the database, unchanged pages are identical in both files
+    pageSize = get_page_size(snapshotPath)
+    if pageSize != get_page_size(previousSnapshotPath):
+        raise ValueError('The page size of the database changed, a full backup is required')
+
+    numberOfPages = os.path.getsize(snapshotPath) // pageSize
+    header = DELTA_HEADER.pack(DELTA_MAGIC, pageSize, numberOfPages,
+                               get_digest(previousSnapshotPath), get_digest(snapshotPath))
+
+    numberOfChangedPages = 0
+    with open(previousSnapshotPath, 'rb') as previousFile, open(snapshotPath, 'rb') as snapshotFile, \
+            gzip.open(deltaPath, 'wb') as deltaFile:
+        deltaFile.write(header)
+        for pageNumber in range(numberOfPages):
+            page = snapshotFile.read(pageSize)
+            if page != previousFile.read(pageSize):
+                deltaFile.write(DELTA_PAGE_HEADER.pack(pageNumber))
+                deltaFile.write(page)
+                numberOfChangedPages += 1
+
+    return numberOfChangedPages
+
+
+def apply_delta(deltaPath: str, databasePath: str):
+    with gzip.open(deltaPath, 'rb') as deltaFile:
+        magic, pageSize, numberOfPages, digestBefore, digestAfter = __read_header(deltaFile)
+        if magic != DELTA_MAGIC:
+            raise ValueError(f'"{deltaPath}" is not a backup delta')
+        if get_digest(databasePath) != digestBefore:
+            raise ValueError(f'"{deltaPath}" does not belong to the restored backup')
+
+        with open(databasePath, 'r+b') as databaseFile:
+            while True:
+                pageHeader = deltaFile.read(DELTA_PAGE_HEADER.size)
+                if not pageHeader:
+                    break
+
+                pageNumber = DELTA_PAGE_HEADER.unpack(pageHeader)[0]
+                databaseFile.seek(pageNumber * pageSize)
+                databaseFile.write(deltaFile.read(pageSize))
+
+            databaseFile.truncate(numberOfPages * pageSize)
+
+    if get_digest(databasePath) != digestAfter:
+        raise ValueError(f'Restoring "{deltaPath}" failed: the digest of the database does not match')
+
+
+def __read_header(deltaFile: BinaryIO) -> Tuple[bytes, int, int, bytes, bytes]:
+    return DELTA_HEADER.unpack(deltaFile.read(DELTA_HEADER.size))
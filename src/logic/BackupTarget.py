@@ -0,0 +1,36 @@
+import os
+import shutil
+
+from TheCodeLabs_BaseUtils.OwncloudUploader import OwncloudUploader
+
+TARGET_OWNCLOUD = 'owncloud'
+TARGET_LOCAL = 'local'
+
+
+class OwncloudBackupTarget:
+    def __init__(self, host: str, user: str, password: str, destinationPath: str):
+        self._host = host
+        self._user = user
+        self._password = password
+        self._destinationPath = destinationPath
+
+    def upload(self, path: str):
+        uploader = OwncloudUploader(self._host, self._user, self._password)
+        uploader.upload(self._destinationPath, path, chunked=True)
+
+
+class LocalBackupTarget:
+    # copies the backups to a directory, e.g. a mounted network share
+    def __init__(self, destinationPath: str):
+        if not destinationPath:
+            raise ValueError('Settings option "localDestinationPath" is required for the local backup target')
+        self._destinationPath = destinationPath
+
+    def upload(self, path: str):
+        os.makedirs(self._destinationPath, exist_ok=True)
+
+        # copied under a temporary name first, the destination never contains an incomplete backup
+        destinationPath = os.path.join(self._destinationPath, os.path.basename(path))
+        temporaryPath = f'{destinationPath}.part'
+        shutil.copyfile(path, temporaryPath)
+        os.replace(temporaryPath, destinationPath)
@@ -0,0 +1,43 @@
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Hashable, Optional
+
+from fastapi import Request, Response
+
+from logic.database import Crud
+
+# Conditional GET based on the change versions of the database (ETag / Last-Modified).
+# Must be evaluated before the query, so a response is never older than its entity tag.
+
+
+def check_not_modified(request: Request, response: Response, *keys: Hashable) -> Optional[Response]:
+    # returns the response with status 304 if the client is up to date, otherwise sets the validators on the response
+    entityTag, lastModified = Crud.CHANGE_TRACKER.get_state(*keys)
+    headers = {'ETag': entityTag,
+               'Last-Modified': formatdate(lastModified, usegmt=True),
+               'Cache-Control': 'no-cache'}
+
+    if __is_not_modified(request, entityTag, lastModified):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+
+def __is_not_modified(request: Request, entityTag: str, lastModified: float) -> bool:
+    ifNoneMatch = request.headers.get('if-none-match')
+    if ifNoneMatch is not None:
+        # If-Modified-Since is ignored if If-None-Match is present (RFC 9110)
+        entityTags = [tag.strip() for tag in ifNoneMatch.split(',')]
+        return '*' in entityTags or any(tag.removeprefix('W/') == entityTag for tag in entityTags)
+
+    ifModifiedSince = request.headers.get('if-modified-since')
+    if ifModifiedSince is None:
+        return False
+
+    try:
+        since = parsedate_to_datetime(ifModifiedSince).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+    # Last-Modified has a resolution of seconds
+    return int(lastModified) <= since
@@ -1,18 +1,40 @@
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
 from sqlalchemy.orm import Session
 
-from logic.database import Schemas, DatabaseInfoProvider
-from logic.database.DatabaseCleaner import DatabaseCleaner
+from logic.database import Schemas, DatabaseInfoProvider, Partitions
+from logic.database.CleanupProgressTracker import CleanupProgressTracker
+from logic.database.Database import ReadSessionLocal, SessionLocal
+from logic.database.DatabaseCleaner import DatabaseCleaner, get_parallel_settings
+from logic.database.DatabaseVacuum import DatabaseVacuum
+from logic.database.PartitionManager import PartitionManager
 from logic.database.RetentionPolicy import RetentionPolicy
 
 
 class DatabaseCleanupService:
-    def __init__(self, cleanupSettings: Dict):
+    def __init__(self, cleanupSettings: Dict, partitioningSettings: Optional[Dict] = None):
         self._cleanupSettings = cleanupSettings
+        self._partitioningSettings = Partitions.get_settings(partitioningSettings or {})
+        self._databaseVacuum = DatabaseVacuum(cleanupSettings.get('vacuum', {}))
+        self._parallelSettings = get_parallel_settings(cleanupSettings.get('parallel', {}))
+        self._maxRuntimeInSeconds = cleanupSettings.get('maxRuntimeInMinutes', 0) * 60
+        if self._maxRuntimeInSeconds < 0:
+            raise ValueError('"maxRuntimeInMinutes" must not be negative')
+
+    def run(self, progressTracker: Optional[CleanupProgressTracker] = None) -> Schemas.DatabaseCleanupInfo:
+        # every run uses a session of its own, a scheduled job outlives the request or startup that created it
+        db = SessionLocal()
+        try:
+            return self.cleanup(db, progressTracker)
+        finally:
+            db.close()
+
+    def cleanup(self, db: Session,
+                progressTracker: Optional[CleanupProgressTracker] = None) -> Schemas.DatabaseCleanupInfo:
+        progressTracker = progressTracker or CleanupProgressTracker()
+        progressTracker.set_max_runtime(self._maxRuntimeInSeconds)
 
-    def cleanup(self, db: Session) -> Schemas.DatabaseCleanupInfo:
         infoBefore = DatabaseInfoProvider.get_database_info(db)#
         startTime = datetime.now()
 
@@ -22,7 +44,13 @@ class DatabaseCleanupService:
             policies.append(RetentionPolicy(numberOfMeasurementsPerDay=item['numberOfMeasurementsPerDay'],
                                             ageInDays=item['ageInDays']))
 
-        DatabaseCleaner(policies, self._cleanupSettings['forceBackupAfterCleanup']).clean(db, datetime.now().date())
+        if self._partitioningSettings['enable']:
+            PartitionManager(self._partitioningSettings, policies).maintain(db, datetime.now().date())
+
+        vacuumInfo = DatabaseCleaner(policies, self._cleanupSettings['forceBackupAfterCleanup'], self._databaseVacuum,
+                                     self._parallelSettings, ReadSessionLocal,
+                                     progressTracker).clean(db, datetime.now().date())
+        progressTracker.finish()
 
         infoAfter = DatabaseInfoProvider.get_database_info(db)
         endTime = datetime.now()
@@ -31,6 +59,7 @@ class DatabaseCleanupService:
         sizeFreed = infoBefore.size_on_disk_in_mb - infoAfter.size_on_disk_in_mb
         infoDifference = Schemas.DatabaseInfo(number_of_measurements=deletedMeasurements, size_on_disk_in_mb=sizeFreed)
 
-        return Schemas.DatabaseCleanupInfo(status=Schemas.DatabaseCleanupStatus.FINISHED, before=infoBefore,
-                                           after=infoAfter, difference=infoDifference,
+        return Schemas.DatabaseCleanupInfo(status=progressTracker.get_status(), before=infoBefore,
+                                           after=infoAfter, difference=infoDifference, vacuum=vacuumInfo,
+                                           progress=progressTracker.get_progress(),
                                            startTime=startTime, endTime=endTime)
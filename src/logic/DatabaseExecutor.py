@@ -0,0 +1,62 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from Settings import SETTINGS
+from logic import Constants
+from logic.database import Schemas
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+T = TypeVar('T')
+
+
+class DatabaseExecutor:
+    def __init__(self, maxWorkers: int = 4):
+        self._maxWorkers = maxWorkers
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix='DatabaseExecutor')
+
+        self._lock = threading.Lock()
+        self._numberOfPendingTasks = 0
+        self._numberOfRunningTasks = 0
+        self._numberOfCompletedTasks = 0
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        with self._lock:
+            self._numberOfPendingTasks += 1
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self.__execute,
+                                                                    functools.partial(func, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._numberOfPendingTasks -= 1
+                self._numberOfCompletedTasks += 1
+
+    def __execute(self, func: Callable[[], T]) -> T:
+        with self._lock:
+            self._numberOfRunningTasks += 1
+
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._numberOfRunningTasks -= 1
+
+    def get_statistics(self) -> Schemas.DatabaseExecutorStatistics:
+        with self._lock:
+            queuedTasks = self._numberOfPendingTasks - self._numberOfRunningTasks
+            return Schemas.DatabaseExecutorStatistics(max_workers=self._maxWorkers,
+                                                      running_tasks=self._numberOfRunningTasks,
+                                                      queued_tasks=queuedTasks,
+                                                      completed_tasks=self._numberOfCompletedTasks)
+
+    def shutdown(self):
+        LOGGER.debug('Shutting down database executor...')
+        self._executor.shutdown(wait=True)
+
+
+DATABASE_EXECUTOR: DatabaseExecutor = DatabaseExecutor(**SETTINGS['database'].get('executor', {}))
@@ -1,11 +1,14 @@
 import secrets
+from typing import Annotated, Optional, Tuple
 
 from fastapi import Security, HTTPException, Query
 from fastapi.security import APIKeyHeader
+from pydantic import AfterValidator
 from starlette.status import HTTP_403_FORBIDDEN
 
 from Settings import SETTINGS
-from logic.database.Database import SessionLocal
+from logic.database import Cursor, MeasurementFormat
+from logic.database.Database import SessionLocal, ReadSessionLocal
 
 
 def get_database():
@@ -16,6 +19,14 @@ def get_database():
         db.close()
 
 
+def get_read_database():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 API_KEY_HEADER = APIKeyHeader(name='apiKey')
 
 
@@ -25,7 +36,38 @@ async def check_api_key(apiKey: str = Security(API_KEY_HEADER)):
         raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail='apiKey invalid')
 
 
-START_DATE_TIME: str = Query(default='2021-01-16 18:15:22',
-                             description='The start date and time of the date range that should be taken into account.')
-END_DATE_TIME: str = Query(default='2021-01-16 19:15:22',
-                           description='The end date and time of the date range that should be taken into account.')
+# an empty value disables the date range, the time may be omitted
+DATE_TIME_PATTERN = r'^(\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2})?)?$'
+
+
+def validate_date_time(dateTime: str) -> str:
+    # the pattern only checks the format, impossible dates (e.g. 2021-02-30) are rejected with status 422 here
+    if dateTime:
+        MeasurementFormat.range_bound_to_epoch_seconds(dateTime)
+    return dateTime
+
+
+def date_time_query(description: str):
+    # the default value has to be specified by the parameter, it is not allowed inside of Annotated
+    return Annotated[str, Query(pattern=DATE_TIME_PATTERN, description=description),
+                     AfterValidator(validate_date_time)]
+
+
+StartDateTime = date_time_query('The start date and time of the date range that should be taken into account.')
+EndDateTime = date_time_query('The end date and time of the date range that should be taken into account.')
+START_DATE_TIME = '2021-01-16 18:15:22'
+END_DATE_TIME = '2021-01-16 19:15:22'
+
+CURSOR: str | None = Query(default=None,
+                           description='Continues after the last item of a previous response '
+                                       '(taken from the response header "X-Next-Cursor").')
+
+
+def decode_cursor(cursor: str | None, keyLength: int) -> Optional[Tuple[int, ...]]:
+    if not cursor:
+        return None
+
+    try:
+        return Cursor.decode_cursor(cursor, keyLength)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
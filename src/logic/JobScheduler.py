@@ -1,14 +1,17 @@
 import logging
+import threading
 from datetime import datetime, timedelta
-from typing import Callable, List
+from typing import Callable, List, Optional
 
 from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, JobExecutionEvent
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from tzlocal import get_localzone
 
 from logic import Constants
 from logic.database import Schemas
+from logic.database.CleanupProgressTracker import CleanupProgressTracker
 from logic.database.Schemas import DatabaseCleanupInfo
 
 LOGGER = logging.getLogger(Constants.APP_NAME)
@@ -23,7 +26,9 @@ class JobScheduler:
     STATE_RUNNING = 1
 
     def __init__(self, ):
-        self._scheduler = AsyncIOScheduler(logger=LOGGER)
+        # jobs run on a dedicated thread instead of the event loop or its default executor,
+        # the api keeps serving requests while a cleanup is running
+        self._scheduler = AsyncIOScheduler(logger=LOGGER, executors={'default': ThreadPoolExecutor(max_workers=1)})
         self._jobAutomatic = self._scheduler.add_job(func=dummyFunc, args=[], trigger='interval',
                                                      minutes=60, id=self.ID_AUTO, timezone=TIMEZONE)
 
@@ -36,6 +41,10 @@ class JobScheduler:
 
         self._jobResults = []
 
+        self._lock = threading.Lock()
+        # tracker of the running cleanup, automatic and manual cleanups never run at the same time
+        self._progressTracker: Optional[CleanupProgressTracker] = None
+
         self._scheduler.start(paused=True)
 
         self._jobAutomatic.pause()
@@ -44,10 +53,12 @@ class JobScheduler:
         self._scheduler.resume()
 
     def job_event_listener(self, event: JobExecutionEvent):
-        self._jobStatus[event.job_id] = self.STATE_IDLE
+        # called by the thread of the job
+        with self._lock:
+            self._jobStatus[event.job_id] = self.STATE_IDLE
 
-        if isinstance(event.retval, DatabaseCleanupInfo):
-            self._jobResults.append(event.retval)
+            if isinstance(event.retval, DatabaseCleanupInfo):
+                self._jobResults.append(event.retval)
 
         if event.exception:
             LOGGER.error(f'Error executing job "{event.job_id}"')
@@ -55,18 +66,39 @@ class JobScheduler:
             LOGGER.debug(f'Successfully finished job "{event.job_id}" (retval: {event.retval})')
 
     def schedule_automatic_job(self, func: Callable, args: List, cronTrigger: CronTrigger):
-        self._jobAutomatic = self._jobAutomatic.modify(func=func, args=args)
+        self._jobAutomatic = self._jobAutomatic.modify(func=self._run_cleanup, args=[func, args])
         self._jobAutomatic = self._jobAutomatic.reschedule(trigger=cronTrigger, timezone=TIMEZONE)
         self._jobStatus[self.ID_AUTO] = self.STATE_RUNNING
 
     def run_manual_job(self, func: Callable, args: List):
-        if self._jobStatus[self.ID_MANUAL] == self.STATE_RUNNING:
-            raise JobAlreadyRunningError(f'Job "{self.ID_MANUAL}" is already running!')
-
-        self._jobManual = self._scheduler.add_job(func=func, args=args, trigger='date',
-                                                  run_date=datetime.now() + timedelta(seconds=5),
-                                                  id=self.ID_MANUAL, timezone=TIMEZONE)
-        self._jobStatus[self.ID_MANUAL] = self.STATE_RUNNING
+        with self._lock:
+            if self._jobStatus[self.ID_MANUAL] == self.STATE_RUNNING:
+                raise JobAlreadyRunningError(f'Job "{self.ID_MANUAL}" is already running!')
+
+            self._jobManual = self._scheduler.add_job(func=self._run_cleanup, args=[func, args], trigger='date',
+                                                      run_date=datetime.now() + timedelta(seconds=5),
+                                                      id=self.ID_MANUAL, timezone=TIMEZONE)
+            self._jobStatus[self.ID_MANUAL] = self.STATE_RUNNING
+
+    def _run_cleanup(self, func: Callable, args: List) -> DatabaseCleanupInfo:
+        # func receives the progress tracker of this run as keyword argument "progressTracker"
+        progressTracker = CleanupProgressTracker()
+        with self._lock:
+            if self._progressTracker is not None:
+                raise JobAlreadyRunningError('Another database cleanup is already running!')
+            self._progressTracker = progressTracker
+
+        try:
+            return func(*args, progressTracker=progressTracker)
+        finally:
+            with self._lock:
+                self._progressTracker = None
+
+    def cancel_running_job(self):
+        with self._lock:
+            if self._progressTracker is None:
+                raise JobNotRunningError('No database cleanup is running')
+            self._progressTracker.cancel()
 
     def get_scheduled_jobs(self) -> Schemas.ScheduledJobStatus:
         jobs = []
@@ -77,14 +109,27 @@ class JobScheduler:
             jobs.append(scheduledJob)
 
         isManualJobInList = any(job for job in jobs if job.job_id == self.ID_MANUAL)
-        isManualJobRunning = self._jobStatus[self.ID_MANUAL] == self.STATE_RUNNING
 
-        if isManualJobRunning and not isManualJobInList:
-            jobs.append(Schemas.ScheduledJob(job_id=self.ID_MANUAL,
-                                             run_frequency=str(self._jobManual.trigger),
-                                             next_run=str(self._jobManual.next_run_time)))
+        with self._lock:
+            isManualJobRunning = self._jobStatus[self.ID_MANUAL] == self.STATE_RUNNING
+            if isManualJobRunning and not isManualJobInList:
+                jobs.append(Schemas.ScheduledJob(job_id=self.ID_MANUAL,
+                                                 run_frequency=str(self._jobManual.trigger),
+                                                 next_run=str(self._jobManual.next_run_time)))
+
+            progress = None if self._progressTracker is None else self._progressTracker.get_progress()
+            jobResults = list(self._jobResults)
+
+        return Schemas.ScheduledJobStatus(jobs=jobs, job_results=jobResults, progress=progress)
 
-        return Schemas.ScheduledJobStatus(jobs=jobs, job_results=self._jobResults)
+    def shutdown(self):
+        # a running cleanup stops after the current sensor, the next start continues where it stopped
+        LOGGER.debug('Shutting down job scheduler...')
+        with self._lock:
+            if self._progressTracker is not None:
+                self._progressTracker.cancel()
+
+        self._scheduler.shutdown(wait=True)
 
 
 def dummyFunc():
@@ -95,4 +140,8 @@ class JobAlreadyRunningError(Exception):
     pass
 
 
+class JobNotRunningError(Exception):
+    pass
+
+
 SCHEDULER: JobScheduler = JobScheduler()
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import threading
+from typing import Iterable, List, Optional, Set
+
+from Settings import SETTINGS
+from logic import Constants
+from logic.database import Schemas
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+class TooManySubscribersError(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, sensorIds: Optional[Set[int]], bufferSize: int):
+        self._loop = loop
+        self._sensorIds = sensorIds
+        self._queue = asyncio.Queue(maxsize=bufferSize)
+        self._isDropped = False
+
+    @property
+    def is_dropped(self) -> bool:
+        return self._isDropped
+
+    def matches(self, sensorId: int) -> bool:
+        return self._sensorIds is None or sensorId in self._sensorIds
+
+    async def get(self) -> Optional[Schemas.Measurement]:
+        # None if the subscription was dropped, because the client did not keep up
+        return await self._queue.get()
+
+    def deliver(self, measurements: List[Schemas.Measurement]):
+        # must be called from the event loop of the subscription
+        if self._isDropped:
+            return
+
+        for measurement in measurements:
+            if self._queue.full():
+                self.__drop()
+                return
+            self._queue.put_nowait(measurement)
+
+    def deliver_threadsafe(self, measurements: List[Schemas.Measurement]):
+        try:
+            self._loop.call_soon_threadsafe(self.deliver, measurements)
+        except RuntimeError:
+            # event loop already closed
+            pass
+
+    def __drop(self):
+        # buffered measurements are discarded, the client has to fetch the current state again after reconnecting
+        self._isDropped = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+
+class MeasurementBroker:
+    # in-process publish/subscribe for new measurements
+    # measurements are published by the database executor threads and delivered to the event loop of each subscriber
+
+    def __init__(self, maxSubscribers: int = 100, bufferSize: int = 1000, heartbeatIntervalInSeconds: float = 15):
+        self._maxSubscribers = maxSubscribers
+        self._bufferSize = bufferSize
+        self._heartbeatIntervalInSeconds = heartbeatIntervalInSeconds
+
+        self._lock = threading.Lock()
+        self._subscriptions: Set[Subscription] = set()
+
+        self._numberOfPublishedMeasurements = 0
+        self._numberOfDroppedSubscribers = 0
+
+    @property
+    def heartbeat_interval_in_seconds(self) -> float:
+        return self._heartbeatIntervalInSeconds
+
+    def subscribe(self, sensorIds: Optional[Iterable[int]]) -> Subscription:
+        # None subscribes to all sensors, must be called from the event loop
+        subscription = Subscription(asyncio.get_running_loop(),
+                                    None if sensorIds is None else set(sensorIds),
+                                    self._bufferSize)
+        with self._lock:
+            if len(self._subscriptions) >= self._maxSubscribers:
+                raise TooManySubscribersError(f'Maximum number of subscribers ({self._maxSubscribers}) reached')
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            if subscription.is_dropped:
+                self._numberOfDroppedSubscribers += 1
+                LOGGER.debug('Dropped slow subscriber of live measurements')
+
+    def has_subscribers(self, sensorIds: Iterable[int]) -> bool:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        return any(subscription.matches(sensorId) for subscription in subscriptions for sensorId in sensorIds)
+
+    def publish(self, measurements: List[Schemas.Measurement]):
+        # thread safe, never blocks the publisher
+        if not measurements:
+            return
+
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            self._numberOfPublishedMeasurements += len(measurements)
+
+        for subscription in subscriptions:
+            matchingMeasurements = [m for m in measurements if subscription.matches(m.sensor_id)]
+            if matchingMeasurements:
+                subscription.deliver_threadsafe(matchingMeasurements)
+
+    def get_statistics(self) -> Schemas.LiveStreamStatistics:
+        with self._lock:
+            return Schemas.LiveStreamStatistics(number_of_subscribers=len(self._subscriptions),
+                                                max_subscribers=self._maxSubscribers,
+                                                number_of_published_measurements=self._numberOfPublishedMeasurements,
+                                                number_of_dropped_subscribers=self._numberOfDroppedSubscribers)
+
+
+MEASUREMENT_BROKER: MeasurementBroker = MeasurementBroker(**SETTINGS['api'].get('liveStream', {}))
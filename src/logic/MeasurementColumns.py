@@ -0,0 +1,84 @@
+import math
+import struct
+import sys
+from array import array
+from typing import List, Optional, Sequence
+
+from fastapi import Response
+
+from logic.database import Cursor
+
+# Compact columnar binary format for bulk measurement reads, requested via "Accept: application/x-storageleaf-columns"
+#
+# All numbers are little-endian:
+# - header (16 bytes): magic "SLMC", format version (uint16), reserved (uint16), number of rows n (uint64)
+# - column id (n x int64)
+# - column sensor_id (n x int64)
+# - column timestamp (n x int64, seconds since epoch, UTC)
+# - column value (n x float64, NaN for non-numeric values of databases created before the numeric storage)
+
+MEDIA_TYPE = 'application/x-storageleaf-columns'
+
+MAGIC = b'SLMC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')
+
+
+def is_accepted(acceptHeader: str | None) -> bool:
+    if not acceptHeader:
+        return False
+    return any(mediaRange.split(';')[0].strip() == MEDIA_TYPE for mediaRange in acceptHeader.split(','))
+
+
+def create_response(response: Response, measurements: List, nextCursor: Optional[str], isColumnar: bool):
+    # measurements are ORM objects for json or plain rows for the columnar format
+    headers = {'Vary': 'Accept'}
+    if nextCursor is not None:
+        headers[Cursor.NEXT_CURSOR_HEADER] = nextCursor
+
+    if isColumnar:
+        return Response(content=encode(measurements), media_type=MEDIA_TYPE, headers=headers)
+
+    response.headers.update(headers)
+    return measurements
+
+
+def encode(rows: Sequence[Sequence]) -> bytes:
+    # rows: (id, sensor_id, timestamp, value)
+    # the columns are built with a single transposition, no per-row objects are created
+    if rows:
+        ids, sensorIds, timestamps, values = zip(*rows)
+    else:
+        ids, sensorIds, timestamps, values = (), (), (), ()
+
+    columns = [array('q', ids), array('q', sensorIds), array('q', timestamps), __to_float_column(values)]
+    if sys.byteorder == 'big':
+        for column in columns:
+            column.byteswap()
+
+    return b''.join([HEADER.pack(MAGIC, VERSION, 0, len(rows))] + [column.tobytes() for column in columns])
+
+
+def decode(data: bytes) -> List[tuple]:
+    magic, version, __, numberOfRows = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Unsupported format')
+
+    columns = []
+    offset = HEADER.size
+    for typeCode in ['q', 'q', 'q', 'd']:
+        column = array(typeCode)
+        column.frombytes(data[offset:offset + numberOfRows * column.itemsize])
+        if sys.byteorder == 'big':
+            column.byteswap()
+        columns.append(column)
+        offset += numberOfRows * column.itemsize
+
+    return list(zip(*columns))
+
+
+def __to_float_column(values: Sequence) -> array:
+    try:
+        return array('d', values)
+    except TypeError:
+        return array('d', (value if isinstance(value, float) else math.nan for value in values))
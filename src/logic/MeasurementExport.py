@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from itertools import islice
+from typing import AsyncIterator, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+from logic.DatabaseExecutor import DATABASE_EXECUTOR
+from logic.database import MeasurementFormat, Models, Schemas
+
+CHUNK_SIZE = 1000
+
+MEDIA_TYPES = {
+    Schemas.ExportFormat.NDJSON: 'application/x-ndjson',
+    Schemas.ExportFormat.CSV: 'text/csv'
+}
+
+CSV_HEADER = ['id', 'sensor_id', 'timestamp', 'value']
+
+
+def get_next_key(query: Query, limit: int) -> Optional[Tuple[int, int, int]]:
+    # key of the last row of a page with the given size, if there are further rows
+    # the keys are read from the covering index in chunks, every chunk seeks to the last key of the previous one
+    keyColumns = __get_key_columns()
+    keyQuery = query.with_entities(*keyColumns)
+
+    lastKey = None
+    numberOfRemainingRows = limit
+    while numberOfRemainingRows > 0:
+        chunkSize = min(numberOfRemainingRows, CHUNK_SIZE)
+        keys = __seek_after(keyQuery, keyColumns, lastKey).limit(chunkSize).all()
+        if len(keys) < chunkSize:
+            return None
+
+        lastKey = tuple(keys[-1])
+        numberOfRemainingRows -= chunkSize
+
+    if __seek_after(keyQuery, keyColumns, lastKey).first() is None:
+        return None
+    return lastKey
+
+
+def end_page_at_key(query: Query, lastKey: Tuple[int, int, int]) -> Query:
+    # the page is bounded by its last key instead of its size:
+    # the key and the page are read by separate statements, measurements inserted in between must not shift the page
+    return query.filter(tuple_(*__get_key_columns()) <= tuple_(*lastKey))
+
+
+def __get_key_columns() -> Tuple:
+    return Models.Measurement.sensor_id, Models.Measurement.timestamp, Models.Measurement.id
+
+
+def __seek_after(keyQuery: Query, keyColumns: Tuple, lastKey: Optional[Tuple[int, int, int]]) -> Query:
+    if lastKey is None:
+        return keyQuery
+    return keyQuery.filter(tuple_(*keyColumns) > tuple_(*lastKey))
+
+
+async def stream_measurements(query: Query, exportFormat: Schemas.ExportFormat) -> AsyncIterator[str]:
+    # rows are fetched in chunks by the database executor, the memory usage does not depend on the result size
+    rows = await DATABASE_EXECUTOR.run(iter, query.yield_per(CHUNK_SIZE))
+
+    if exportFormat == Schemas.ExportFormat.CSV:
+        yield __format_csv([CSV_HEADER])
+
+    while True:
+        chunk = await DATABASE_EXECUTOR.run(list, islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+
+        if exportFormat == Schemas.ExportFormat.CSV:
+            yield __format_csv([__to_csv_row(row) for row in chunk])
+        else:
+            yield ''.join(f'{json.dumps(__to_dict(row))}\n' for row in chunk)
+
+
+def __to_dict(row) -> dict:
+    return {'id': row.id,
+            'sensor_id': row.sensor_id,
+            'timestamp': MeasurementFormat.to_date_time_string(row.timestamp),
+            'value': MeasurementFormat.format_value(row.value)}
+
+
+def __to_csv_row(row) -> List:
+    return [row.id, row.sensor_id, MeasurementFormat.to_date_time_string(row.timestamp),
+            MeasurementFormat.format_value(row.value)]
+
+
+def __format_csv(rows: List[List]) -> str:
+    output = io.StringIO()
+    csv.writer(output, lineterminator='\n').writerows(rows)
+    return output.getvalue()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from Settings import SETTINGS
+from logic import Constants
+from logic.DatabaseExecutor import DATABASE_EXECUTOR
+from logic.database import Crud, Schemas
+from logic.database.Database import SessionLocal
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+class PendingWrite:
+    def __init__(self, rows: List[Dict], future: Optional[asyncio.Future]):
+        self.rows = rows
+        self.future = future
+
+
+class WriteBehindQueue:
+    DURABILITY_QUEUED = 'queued'
+    DURABILITY_COMMITTED = 'committed'
+
+    def __init__(self,
+                 enable: bool = False,
+                 maxQueueSize: int = 10000,
+                 maxBatchSize: int = 1000,
+                 maxDelayInMilliseconds: int = 200,
+                 durability: str = DURABILITY_COMMITTED,
+                 enqueueTimeoutInSeconds: float = 5):
+        if durability not in [self.DURABILITY_QUEUED, self.DURABILITY_COMMITTED]:
+            raise ValueError(f'Invalid value for settings option "durability": "{durability}" '
+                             f'(allowed: {self.DURABILITY_QUEUED}, {self.DURABILITY_COMMITTED})')
+
+        self._enable = enable
+        self._maxQueueSize = maxQueueSize
+        self._maxBatchSize = maxBatchSize
+        self._maxDelayInSeconds = maxDelayInMilliseconds / 1000
+        self._durability = durability
+        self._enqueueTimeoutInSeconds = enqueueTimeoutInSeconds
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._writerTask: Optional[asyncio.Task] = None
+        self._isStopping = False
+
+        self._numberOfGroupCommits = 0
+        self._numberOfWrittenMeasurements = 0
+        self._numberOfRejectedRequests = 0
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._enable and self._writerTask is not None and not self._isStopping
+
+    def start(self):
+        if not self._enable:
+            return
+
+        LOGGER.debug(f'Start write-behind queue (max queue size: {self._maxQueueSize}, '
+                     f'max batch size: {self._maxBatchSize}, durability: {self._durability})')
+        self._queue = asyncio.Queue(maxsize=self._maxQueueSize)
+        self._writerTask = asyncio.create_task(self.__write_loop())
+
+    async def stop(self):
+        if self._writerTask is None:
+            return
+
+        LOGGER.debug(f'Flushing write-behind queue ({self._queue.qsize()} pending requests)...')
+        self._isStopping = True
+        await self._queue.join()
+
+        self._writerTask.cancel()
+        self._writerTask = None
+        LOGGER.debug('Stopped write-behind queue')
+
+    async def enqueue(self, rows: List[Dict]):
+        if self._isStopping:
+            raise QueueFullError('Write-behind queue is shutting down')
+
+        future = None
+        if self._durability == self.DURABILITY_COMMITTED:
+            future = asyncio.get_running_loop().create_future()
+
+        try:
+            await asyncio.wait_for(self._queue.put(PendingWrite(rows, future)), self._enqueueTimeoutInSeconds)
+        except asyncio.TimeoutError as e:
+            self._numberOfRejectedRequests += 1
+            raise QueueFullError(f'Write-behind queue is full ({self._maxQueueSize} pending requests)') from e
+
+        if future is not None:
+            await future
+
+    def get_statistics(self) -> Schemas.WriteBehindStatistics:
+        return Schemas.WriteBehindStatistics(enabled=self.is_enabled,
+                                             queue_size=self._queue.qsize() if self._queue else 0,
+                                             max_queue_size=self._maxQueueSize,
+                                             number_of_group_commits=self._numberOfGroupCommits,
+                                             number_of_written_measurements=self._numberOfWrittenMeasurements,
+                                             number_of_rejected_requests=self._numberOfRejectedRequests)
+
+    async def __write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pendingWrites = [await self._queue.get()]
+            numberOfRows = len(pendingWrites[0].rows)
+
+            deadline = loop.time() + self._maxDelayInSeconds
+            while numberOfRows < self._maxBatchSize:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+
+                try:
+                    pendingWrite = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+                pendingWrites.append(pendingWrite)
+                numberOfRows += len(pendingWrite.rows)
+
+            await self.__write(pendingWrites)
+
+            for __ in pendingWrites:
+                self._queue.task_done()
+
+    async def __write(self, pendingWrites: List[PendingWrite]):
+        rows = [row for pendingWrite in pendingWrites for row in pendingWrite.rows]
+        try:
+            await DATABASE_EXECUTOR.run(self.__write_rows, rows)
+            self._numberOfGroupCommits += 1
+            self._numberOfWrittenMeasurements += len(rows)
+            LOGGER.debug(f'Group commit of {len(rows)} measurements from {len(pendingWrites)} requests')
+            exception = None
+        except Exception as e:
+            LOGGER.exception(f'Error writing {len(rows)} measurements')
+            exception = e
+
+        for pendingWrite in pendingWrites:
+            if pendingWrite.future is None or pendingWrite.future.done():
+                continue
+
+            if exception is None:
+                pendingWrite.future.set_result(None)
+            else:
+                pendingWrite.future.set_exception(exception)
+
+    @staticmethod
+    def __write_rows(rows: List[Dict]):
+        db = SessionLocal()
+        try:
+            Crud.create_measurements_from_rows(db, rows)
+        finally:
+            db.close()
+
+
+class QueueFullError(Exception):
+    pass
+
+
+WRITE_BEHIND_QUEUE: WriteBehindQueue = WriteBehindQueue(**SETTINGS['database'].get('writeBehind', {}))
@@ -0,0 +1,41 @@
+import secrets
+import threading
+import time
+from typing import Dict, Hashable, Iterable, Tuple
+
+
+class ChangeTracker:
+    DEVICES = 'devices'
+    SENSORS = 'sensors'
+    MEASUREMENTS = 'measurements'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # versions restart on every server start, the instance id keeps the entity tags of different runs distinct
+        self._instanceId = secrets.token_hex(4)
+        self._startTime = time.time()
+        self._versions: Dict[Hashable, Tuple[int, float]] = {}
+
+    @staticmethod
+    def measurements_of_sensor(sensorId: int) -> Tuple[str, int]:
+        return ChangeTracker.MEASUREMENTS, sensorId
+
+    # must be called after the change is committed, otherwise a reader could cache old data with the new version
+    def mark_changed(self, *keys: Hashable):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                version, __ = self._versions.get(key, (0, self._startTime))
+                self._versions[key] = (version + 1, now)
+
+    def mark_measurements_changed(self, sensorIds: Iterable[int]):
+        self.mark_changed(ChangeTracker.MEASUREMENTS,
+                          *[ChangeTracker.measurements_of_sensor(sensorId) for sensorId in set(sensorIds)])
+
+    def get_state(self, *keys: Hashable) -> Tuple[str, float]:
+        # strong entity tag and time of the last modification for the combination of the given keys
+        with self._lock:
+            states = [self._versions.get(key, (0, self._startTime)) for key in keys]
+
+        entityTag = '"{}"'.format('-'.join([self._instanceId] + [str(version) for version, __ in states]))
+        return entityTag, max(lastModified for __, lastModified in states)
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from logic.database import Schemas
+
+
+class CleanupProgressTracker:
+    # progress of a single cleanup run, updated by the cleaner and read by the status requests
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._maxRuntimeInSeconds = 0
+        self._startTime = time.monotonic()
+        self._endTime = None
+        self._isCancelRequested = False
+        self._status = Schemas.DatabaseCleanupStatus.RUNNING
+
+        self._numberOfSensors = 0
+        self._numberOfProcessedSensors = 0
+        self._numberOfProcessedDays = 0
+        self._numberOfDeletedMeasurements = 0
+
+    def set_max_runtime(self, maxRuntimeInSeconds: float):
+        # counted from the start of the run, 0 means no limit
+        with self._lock:
+            self._maxRuntimeInSeconds = maxRuntimeInSeconds
+
+    def start(self, numberOfSensors: int):
+        with self._lock:
+            self._numberOfSensors = numberOfSensors
+
+    def add_processed_days(self, numberOfProcessedDays: int, numberOfDeletedMeasurements: int):
+        # called for every committed chunk of days, a sensor may be stopped before all of its days are processed
+        with self._lock:
+            self._numberOfProcessedDays += numberOfProcessedDays
+            self._numberOfDeletedMeasurements += numberOfDeletedMeasurements
+
+    def finish_sensor(self):
+        with self._lock:
+            self._numberOfProcessedSensors += 1
+
+    def cancel(self):
+        # cooperative, the cleaner stops after the current chunk of days or delete batch
+        with self._lock:
+            self._isCancelRequested = True
+
+    def is_stop_requested(self) -> bool:
+        with self._lock:
+            if self._status != Schemas.DatabaseCleanupStatus.RUNNING:
+                return True
+
+            if self._isCancelRequested:
+                self._status = Schemas.DatabaseCleanupStatus.CANCELLED
+            elif self._maxRuntimeInSeconds and time.monotonic() - self._startTime >= self._maxRuntimeInSeconds:
+                self._status = Schemas.DatabaseCleanupStatus.TIME_LIMIT_REACHED
+            return self._status != Schemas.DatabaseCleanupStatus.RUNNING
+
+    def finish(self):
+        with self._lock:
+            self._endTime = time.monotonic()
+            if self._status == Schemas.DatabaseCleanupStatus.RUNNING:
+                self._status = Schemas.DatabaseCleanupStatus.FINISHED
+
+    def get_status(self) -> Schemas.DatabaseCleanupStatus:
+        with self._lock:
+            return self._status
+
+    def get_progress(self) -> Schemas.CleanupProgress:
+        with self._lock:
+            elapsedTime = (self._endTime or time.monotonic()) - self._startTime
+            throughput = self._numberOfDeletedMeasurements / elapsedTime if elapsedTime else 0.0
+
+            remainingTime = None
+            if self._status == Schemas.DatabaseCleanupStatus.RUNNING and self._numberOfProcessedSensors:
+                remainingSensors = self._numberOfSensors - self._numberOfProcessedSensors
+                remainingTime = elapsedTime / self._numberOfProcessedSensors * remainingSensors
+
+            return Schemas.CleanupProgress(status=self._status,
+                                           number_of_sensors=self._numberOfSensors,
+                                           number_of_processed_sensors=self._numberOfProcessedSensors,
+                                           number_of_processed_days=self._numberOfProcessedDays,
+                                           number_of_deleted_measurements=self._numberOfDeletedMeasurements,
+                                           elapsed_time_in_seconds=elapsedTime,
+                                           deleted_measurements_per_second=throughput,
+                                           estimated_remaining_time_in_seconds=remainingTime)
@@ -1,17 +1,28 @@
-from datetime import datetime
-from typing import List, Set
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from sqlalchemy import and_, text
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, and_, case, func, insert, literal, or_, select, text, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Query, Session, aliased, selectinload
 
 from Settings import SETTINGS
 from logic.BackupService import BackupService
-from logic.database import Models, Schemas
+from logic.MeasurementBroker import MEASUREMENT_BROKER
+from logic.database import MeasurementFormat, Models, Partitions, Rollups, Schemas
+from logic.database.ChangeTracker import ChangeTracker
+from logic.database.IdentityCache import IdentityCache
+from logic.database.LatestMeasurementCache import LatestMeasurementCache
 
-DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = MeasurementFormat.DATE_FORMAT
 
 BACKUP_SERVICE = BackupService(SETTINGS['database']['databasePath'], **SETTINGS['database']['backup'])
 
+IDENTITY_CACHE = IdentityCache()
+
+LATEST_MEASUREMENT_CACHE = LatestMeasurementCache()
+
+CHANGE_TRACKER = ChangeTracker()
+
 
 def notify_backup_service(backupService: BackupService):
     def inner(func):
@@ -25,15 +36,60 @@ def notify_backup_service(backupService: BackupService):
     return inner
 
 
+def invalidate_identity_cache(identityCache: IdentityCache):
+    def inner(func):
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                identityCache.invalidate()
+
+        return wrapper
+
+    return inner
+
+
+def invalidate_latest_measurement_cache(latestMeasurementCache: LatestMeasurementCache):
+    def inner(func):
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                latestMeasurementCache.invalidate()
+
+        return wrapper
+
+    return inner
+
+
+def mark_changed(changeTracker: ChangeTracker, *keys: str):
+    def inner(func):
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                changeTracker.mark_changed(*keys)
+
+        return wrapper
+
+    return inner
+
+
 # ===== devices =====
 
 
-def get_devices(db: Session, skip: int = 0, limit: int = 100) -> List[Models.Device]:
-    return db.query(Models.Device).offset(skip).limit(limit).all()
+def get_devices(db: Session, skip: int = 0, limit: int = 100, afterId: Optional[int] = None) -> List[Models.Device]:
+    query = db.query(Models.Device).options(selectinload(Models.Device.sensors))
+    if afterId is not None:
+        query = query.filter(Models.Device.id > afterId)
+    return query.order_by(Models.Device.id.asc()).offset(skip).limit(limit).all()
 
 
 def get_device(db: Session, deviceId: int) -> Models.Device:
-    return db.query(Models.Device).filter(Models.Device.id == deviceId).first()
+    return db.query(Models.Device) \
+        .options(selectinload(Models.Device.sensors)) \
+        .filter(Models.Device.id == deviceId) \
+        .first()
 
 
 def get_device_by_name(db: Session, name: str) -> Models.Device:
@@ -41,6 +97,8 @@ def get_device_by_name(db: Session, name: str) -> Models.Device:
 
 
 @notify_backup_service(BACKUP_SERVICE)
+@invalidate_identity_cache(IDENTITY_CACHE)
+@mark_changed(CHANGE_TRACKER, ChangeTracker.DEVICES)
 def create_device(db: Session, device: Schemas.DeviceCreate) -> Models.Device:
     dbDevice = Models.Device(name=device.name)
     db.add(dbDevice)
@@ -50,6 +108,8 @@ def create_device(db: Session, device: Schemas.DeviceCreate) -> Models.Device:
 
 
 @notify_backup_service(BACKUP_SERVICE)
+@invalidate_identity_cache(IDENTITY_CACHE)
+@mark_changed(CHANGE_TRACKER, ChangeTracker.DEVICES)
 def update_device(db: Session, deviceId: int, device: Schemas.DeviceCreate) -> Models.Device:
     existingDevice = get_device(db, deviceId)
     existingDevice.name = device.name
@@ -59,27 +119,56 @@ def update_device(db: Session, deviceId: int, device: Schemas.DeviceCreate) -> M
 
 
 @notify_backup_service(BACKUP_SERVICE)
+@invalidate_identity_cache(IDENTITY_CACHE)
+@invalidate_latest_measurement_cache(LATEST_MEASUREMENT_CACHE)
+@mark_changed(CHANGE_TRACKER, ChangeTracker.DEVICES, ChangeTracker.SENSORS, ChangeTracker.MEASUREMENTS)
 def delete_device(db: Session, device: Schemas.Device):
+    # the archived measurements are not covered by the cascade of the sensors
+    Partitions.delete_measurements_of_sensors(db, [sensor.id for sensor in device.sensors])
     db.delete(device)
     db.commit()
 
 
 # ===== sensors =====
 
-def get_sensors(db: Session, skip: int = 0, limit: int = 100) -> List[Models.Sensor]:
-    return db.query(Models.Sensor).offset(skip).limit(limit).all()
+def get_sensors(db: Session, skip: int = 0, limit: int = 100, afterId: Optional[int] = None) -> List[Models.Sensor]:
+    query = db.query(Models.Sensor)
+    if afterId is not None:
+        query = query.filter(Models.Sensor.id > afterId)
+    return query.order_by(Models.Sensor.id.asc()).offset(skip).limit(limit).all()
 
 
 def get_sensor(db: Session, sensorId: int) -> Models.Sensor:
     return db.query(Models.Sensor).filter(Models.Sensor.id == sensorId).first()
 
 
+def get_sensor_ids(db: Session, sensorIds: Optional[List[int]], deviceIds: Optional[List[int]]) -> List[int]:
+    # ids of the existing sensors matching all given filters, ordered ascending
+    query = db.query(Models.Sensor.id)
+    if sensorIds:
+        query = query.filter(Models.Sensor.id.in_(sensorIds))
+    if deviceIds:
+        query = query.filter(Models.Sensor.device_id.in_(deviceIds))
+    return [row.id for row in query.order_by(Models.Sensor.id.asc()).all()]
+
+
+def sensor_exists(db: Session, sensorId: int) -> bool:
+    exists = IDENTITY_CACHE.get_sensor_existence(sensorId)
+    if exists is None:
+        generation = IDENTITY_CACHE.generation
+        exists = get_sensor(db, sensorId) is not None
+        IDENTITY_CACHE.put_sensor_existence(sensorId, exists, generation)
+    return exists
+
+
 def get_sensor_by_name_and_device_id(db: Session, sensorName: str, deviceId: int) -> Models.Sensor:
     return db.query(Models.Sensor).filter(and_(Models.Sensor.name == sensorName,
                                                Models.Sensor.device_id == deviceId)).first()
 
 
 @notify_backup_service(BACKUP_SERVICE)
+@invalidate_identity_cache(IDENTITY_CACHE)
+@mark_changed(CHANGE_TRACKER, ChangeTracker.SENSORS)
 def create_sensor(db: Session, sensor: Schemas.SensorCreate) -> Models.Sensor:
     dbSensor = Models.Sensor(**sensor.dict())
     db.add(dbSensor)
@@ -89,6 +178,8 @@ def create_sensor(db: Session, sensor: Schemas.SensorCreate) -> Models.Sensor:
 
 
 @notify_backup_service(BACKUP_SERVICE)
+@invalidate_identity_cache(IDENTITY_CACHE)
+@mark_changed(CHANGE_TRACKER, ChangeTracker.SENSORS)
 def update_sensor(db: Session, sensorId: int, sensor: Schemas.SensorUpdate) -> Models.Sensor:
     existingSensor = get_sensor(db, sensorId)
     existingSensor.name = sensor.name
@@ -99,49 +190,355 @@ def update_sensor(db: Session, sensorId: int, sensor: Schemas.SensorUpdate) -> M
 
 
 @notify_backup_service(BACKUP_SERVICE)
+@invalidate_identity_cache(IDENTITY_CACHE)
+@invalidate_latest_measurement_cache(LATEST_MEASUREMENT_CACHE)
+@mark_changed(CHANGE_TRACKER, ChangeTracker.SENSORS, ChangeTracker.MEASUREMENTS)
 def delete_sensor(db: Session, sensor: Schemas.Sensor):
+    # the archived measurements are not covered by the cascade of the sensor
+    Partitions.delete_measurements_of_sensors(db, [sensor.id])
     db.delete(sensor)
     db.commit()
 
 
 # ===== measurements =====
 
-def get_measurements(db: Session, startDateTime: str, endDateTime: str) -> List[Models.Measurement]:
+def get_measurements(db: Session, startDateTime: str, endDateTime: str, limit: Optional[int] = None,
+                     afterKey: Optional[Tuple[int, int]] = None) -> List[Models.Measurement]:
+    return __query_measurements(db.query(Models.Measurement), startDateTime, endDateTime, limit, afterKey).all()
+
+
+def get_measurement_rows(db: Session, startDateTime: str, endDateTime: str, limit: Optional[int] = None,
+                         afterKey: Optional[Tuple[int, int]] = None) -> List[Row]:
+    # same as get_measurements, but returns plain (id, sensor_id, timestamp, value) rows instead of ORM objects
+    return __query_measurements(__query_measurement_columns(db), startDateTime, endDateTime, limit, afterKey).all()
+
+
+def __query_measurements(query: Query, startDateTime: str, endDateTime: str,
+                         limit: Optional[int], afterKey: Optional[Tuple[int, int]]) -> Query:
     if startDateTime and endDateTime:
-        return db.query(Models.Measurement).filter(and_(startDateTime <= Models.Measurement.timestamp,
-                                                        endDateTime >= Models.Measurement.timestamp)).all()
+        startTimestamp, endTimestamp = __to_timestamp_range(startDateTime, endDateTime)
+        query = query.filter(and_(startTimestamp <= Models.Measurement.timestamp,
+                                  endTimestamp >= Models.Measurement.timestamp))
+
+    if limit is None and afterKey is None:
+        return query
+
+    # pages are ordered ascending by (timestamp, id), the timestamp index contains the id as rowid
+    if afterKey is not None:
+        query = __filter_after_key(query, afterKey, isDescending=False)
+    return query.order_by(Models.Measurement.timestamp.asc(), Models.Measurement.id.asc()).limit(limit)
 
-    return db.query(Models.Measurement).all()
 
+def get_measurements_for_sensor(db: Session, startDateTime: str, endDateTime: str, sensorId: int,
+                                limit: Optional[int] = None,
+                                beforeKey: Optional[Tuple[int, int]] = None) -> List[Models.Measurement]:
+    return __query_measurements_for_sensor(db.query(Models.Measurement), startDateTime, endDateTime,
+                                           sensorId, limit, beforeKey).all()
 
-def get_measurements_for_sensor(db: Session, startDateTime: str,
-                                endDateTime: str, sensorId: int) -> List[Models.Measurement]:
+
+def get_measurement_rows_for_sensor(db: Session, startDateTime: str, endDateTime: str, sensorId: int,
+                                    limit: Optional[int] = None,
+                                    beforeKey: Optional[Tuple[int, int]] = None) -> List[Row]:
+    # same as get_measurements_for_sensor, but returns plain (id, sensor_id, timestamp, value) rows
+    return __query_measurements_for_sensor(__query_measurement_columns(db), startDateTime, endDateTime,
+                                           sensorId, limit, beforeKey).all()
+
+
+def __query_measurements_for_sensor(query: Query, startDateTime: str, endDateTime: str, sensorId: int,
+                                    limit: Optional[int], beforeKey: Optional[Tuple[int, int]]) -> Query:
+    # ordered descending by (timestamp, id)
+    query = query.filter(Models.Measurement.sensor_id == sensorId)
     if startDateTime and endDateTime:
-        return db.query(Models.Measurement) \
-            .filter(Models.Measurement.sensor_id == sensorId) \
-            .filter(and_(startDateTime <= Models.Measurement.timestamp,
-                         endDateTime >= Models.Measurement.timestamp)) \
-            .order_by(Models.Measurement.timestamp.desc()) \
-            .all()
-
-    return db.query(Models.Measurement) \
-        .filter(Models.Measurement.sensor_id == sensorId) \
-        .order_by(Models.Measurement.timestamp.desc()) \
-        .all()
+        startTimestamp, endTimestamp = __to_timestamp_range(startDateTime, endDateTime)
+        query = query.filter(and_(startTimestamp <= Models.Measurement.timestamp,
+                                  endTimestamp >= Models.Measurement.timestamp))
+
+    if beforeKey is not None:
+        query = __filter_after_key(query, beforeKey, isDescending=True)
+
+    return query.order_by(Models.Measurement.timestamp.desc(), Models.Measurement.id.desc()).limit(limit)
+
+
+def __query_measurement_columns(db: Session) -> Query:
+    return db.query(Models.Measurement.id, Models.Measurement.sensor_id,
+                    Models.Measurement.timestamp, Models.Measurement.value)
+
+
+def __filter_after_key(query: Query, key: Tuple[int, int], isDescending: bool) -> Query:
+    # keyset condition for the order (timestamp, id)
+    # the timestamp bound is used for the index seek, therefore the costs do not depend on the number of skipped rows
+    timestamp, measurementId = key
+    if isDescending:
+        return query.filter(Models.Measurement.timestamp <= timestamp) \
+            .filter(or_(Models.Measurement.timestamp < timestamp, Models.Measurement.id < measurementId))
+
+    return query.filter(Models.Measurement.timestamp >= timestamp) \
+        .filter(or_(Models.Measurement.timestamp > timestamp, Models.Measurement.id > measurementId))
+
 
+def get_latest_measurement_for_sensor(db: Session, sensorId: int) -> Optional[Schemas.Measurement]:
+    isHit, measurement = LATEST_MEASUREMENT_CACHE.get(sensorId)
+    if isHit:
+        return measurement
 
-def get_latest_measurement_for_sensor(db: Session, sensorId: int) -> Models.Measurement:
-    return db.query(Models.Measurement) \
+    version = LATEST_MEASUREMENT_CACHE.get_version(sensorId)
+    dbMeasurement = db.query(Models.Measurement) \
         .filter(Models.Measurement.sensor_id == sensorId) \
-        .order_by(Models.Measurement.timestamp.desc()) \
+        .order_by(Models.Measurement.timestamp.desc(), Models.Measurement.id.desc()) \
         .first()
 
+    measurement = None if dbMeasurement is None else Schemas.Measurement.model_validate(dbMeasurement)
+    LATEST_MEASUREMENT_CACHE.put(sensorId, measurement, version)
+    return measurement
+
+
+def get_latest_measurements(db: Session, sensorIds: Optional[List[int]],
+                            deviceIds: Optional[List[int]]) -> List[Schemas.Measurement]:
+    # latest measurement of every matching sensor, ordered by sensor id, sensors without measurements are omitted
+    matchingSensorIds = get_sensor_ids(db, sensorIds, deviceIds)
+
+    measurementsBySensorId = {}
+    versionsOfMissingSensors = {}
+    for sensorId in matchingSensorIds:
+        isHit, measurement = LATEST_MEASUREMENT_CACHE.get(sensorId)
+        if isHit:
+            measurementsBySensorId[sensorId] = measurement
+        else:
+            versionsOfMissingSensors[sensorId] = LATEST_MEASUREMENT_CACHE.get_version(sensorId)
+
+    if versionsOfMissingSensors:
+        # one index seek per missing sensor
+        measurement = aliased(Models.Measurement)
+        latestIdQuery = db.query(measurement.id) \
+            .filter(measurement.sensor_id == Models.Sensor.id) \
+            .order_by(measurement.timestamp.desc(), measurement.id.desc()) \
+            .limit(1) \
+            .correlate(Models.Sensor) \
+            .scalar_subquery()
+        latestIds = db.query(latestIdQuery).filter(Models.Sensor.id.in_(versionsOfMissingSensors.keys()))
+        dbMeasurements = db.query(Models.Measurement).filter(Models.Measurement.id.in_(latestIds)).all()
+
+        loadedMeasurements = {m.sensor_id: Schemas.Measurement.model_validate(m) for m in dbMeasurements}
+        for sensorId, version in versionsOfMissingSensors.items():
+            measurementsBySensorId[sensorId] = loadedMeasurements.get(sensorId)
+            LATEST_MEASUREMENT_CACHE.put(sensorId, loadedMeasurements.get(sensorId), version)
+
+    return [measurementsBySensorId[sensorId] for sensorId in matchingSensorIds
+            if measurementsBySensorId[sensorId] is not None]
+
+
+def get_first_timestamp_for_sensor(db: Session, sensorId: int) -> Optional[int]:
+    return db.query(func.min(Models.Measurement.timestamp)) \
+        .filter(Models.Measurement.sensor_id == sensorId) \
+        .scalar()
+
+
+def begin_read_transaction(db: Session):
+    # pysqlite does not begin a transaction for reads, every statement sees all commits made before it runs
+    # after BEGIN all reads of the session see the same snapshot of the database until the session is closed
+    db.execute(text('BEGIN'))
+
+
+def get_max_measurement_id(db: Session) -> Optional[int]:
+    return db.query(func.max(Models.Measurement.id)).scalar()
+
+
+def has_measurements_inserted_after(db: Session, measurementId: int, sensorId: int, endDateTime: str) -> bool:
+    # measurements of the sensor up to endDateTime that were inserted after the given id
+    # "+ 0" keeps sqlite from using the sensor index, only the few rows after the id are searched by rowid
+    return db.query(Models.Measurement.id) \
+        .filter(Models.Measurement.id > measurementId) \
+        .filter(Models.Measurement.sensor_id + 0 == sensorId) \
+        .filter(Models.Measurement.timestamp <= MeasurementFormat.range_bound_to_epoch_seconds(endDateTime)) \
+        .first() is not None
+
+
+def get_measurement_buckets_for_sensor(db: Session, startDateTime: str, endDateTime: str,
+                                       sensorId: int, bucketWidthInSeconds: int) -> List[Rollups.Aggregate]:
+    # one entry per bucket with numeric values: bucket (index relative to startDateTime), min, max, avg, count,
+    # first, last
+    # rollups can only answer buckets whose boundaries are aligned to the rollup resolution
+    startTimestamp, endTimestamp = __to_timestamp_range(startDateTime, endDateTime)
+    resolutions = [resolution for resolution in Rollups.RESOLUTIONS
+                   if bucketWidthInSeconds % resolution == 0 and startTimestamp % resolution == 0]
+
+    aggregates = __aggregate(db, [sensorId], (startTimestamp, endTimestamp + 1), resolutions,
+                             startTimestamp, bucketWidthInSeconds)
+    return [aggregate for aggregate in aggregates if aggregate.count]
+
+
+def get_statistics_for_sensors(db: Session, startDateTime: str, endDateTime: str,
+                               sensorIds: List[int]) -> List[Rollups.Aggregate]:
+    # one entry per sensor with measurements: sensor_id, min, max, avg, count, number_of_non_numeric_values
+    # min, max, avg and count only consider numeric values
+    timestampRange = None
+    if startDateTime and endDateTime:
+        startTimestamp, endTimestamp = __to_timestamp_range(startDateTime, endDateTime)
+        timestampRange = (startTimestamp, endTimestamp + 1)
+
+    return __aggregate(db, sensorIds, timestampRange, Rollups.RESOLUTIONS, 0, None)
+
+
+def __aggregate(db: Session, sensorIds: List[int], timestampRange: Optional[Tuple[int, int]],
+                resolutions: List[int], originTimestamp: int,
+                bucketWidthInSeconds: Optional[int]) -> List[Rollups.Aggregate]:
+    # aggregates per sensor and bucket (index relative to originTimestamp, always 0 without bucket width)
+    # the aligned parts of the range are answered by the rollups, only the remaining edges read raw measurements
+    # timestampRange: start inclusive, end exclusive, None for all measurements
+    if timestampRange is None:
+        pieces = [(resolutions[0], None, None)]
+    else:
+        pieces = Rollups.split_range(*timestampRange, resolutions)
+
+    aggregates: Dict[Tuple[int, int], Rollups.Aggregate] = {}
+    for resolution, startTimestamp, endTimestamp in pieces:
+        if resolution is None:
+            rows = __query_measurement_aggregates(db, sensorIds, startTimestamp, endTimestamp,
+                                                  originTimestamp, bucketWidthInSeconds)
+        else:
+            rows = __query_rollup_aggregates(db, sensorIds, resolution, startTimestamp, endTimestamp,
+                                             originTimestamp, bucketWidthInSeconds)
+
+        for row in rows:
+            key = (row.sensor_id, row.bucket)
+            if key not in aggregates:
+                aggregates[key] = Rollups.Aggregate(row.sensor_id, row.bucket)
+            aggregates[key].add(row.min, row.max, row.sum, row.count, row.number_of_non_numeric_values,
+                                row.first, row.last)
+
+    return [aggregates[key] for key in sorted(aggregates)]
+
+
+def __query_measurement_aggregates(db: Session, sensorIds: List[int], startTimestamp: int, endTimestamp: int,
+                                   originTimestamp: int, bucketWidthInSeconds: Optional[int]) -> List[Row]:
+    isNumeric = __is_numeric(Models.Measurement.value)
+    numericValue = case((isNumeric, Models.Measurement.value), else_=None)
+    numericTimestamp = case((isNumeric, Models.Measurement.timestamp), else_=None)
+
+    query = db.query(Models.Measurement.sensor_id,
+                     func.min(numericValue).label('min'),
+                     func.max(numericValue).label('max'),
+                     func.total(numericValue).label('sum'),
+                     func.count(numericValue).label('count'),
+                     func.sum(case((isNumeric, 0), else_=1)).label('number_of_non_numeric_values'),
+                     func.min(numericTimestamp).label('first_timestamp'),
+                     func.max(numericTimestamp).label('last_timestamp')) \
+        .filter(Models.Measurement.sensor_id.in_(sensorIds)) \
+        .filter(and_(startTimestamp <= Models.Measurement.timestamp,
+                     endTimestamp > Models.Measurement.timestamp))
+    aggregates = __group_by_bucket(query, Models.Measurement.sensor_id, Models.Measurement.timestamp,
+                                   originTimestamp, bucketWidthInSeconds)
+
+    first = __get_value_at_timestamp(db, aggregates.c.sensor_id, aggregates.c.first_timestamp, isFirst=True)
+    last = __get_value_at_timestamp(db, aggregates.c.sensor_id, aggregates.c.last_timestamp, isFirst=False)
+    return db.query(aggregates, first.label('first'), last.label('last')).all()
+
+
+def __query_rollup_aggregates(db: Session, sensorIds: List[int], resolution: int,
+                              startTimestamp: Optional[int], endTimestamp: Optional[int],
+                              originTimestamp: int, bucketWidthInSeconds: Optional[int]) -> List[Row]:
+    rollup = Models.MeasurementRollup
+    hasNumericValues = rollup.count > 0
+
+    query = db.query(rollup.sensor_id,
+                     func.min(rollup.min).label('min'),
+                     func.max(rollup.max).label('max'),
+                     func.total(rollup.sum).label('sum'),
+                     func.sum(rollup.count).label('count'),
+                     func.sum(rollup.number_of_non_numeric_values).label('number_of_non_numeric_values'),
+                     func.min(case((hasNumericValues, rollup.bucket), else_=None)).label('first_bucket'),
+                     func.max(case((hasNumericValues, rollup.bucket), else_=None)).label('last_bucket')) \
+        .filter(rollup.sensor_id.in_(sensorIds)) \
+        .filter(rollup.resolution == resolution)
+    if startTimestamp is not None:
+        query = query.filter(and_(startTimestamp <= rollup.bucket, endTimestamp > rollup.bucket))
+    aggregates = __group_by_bucket(query, rollup.sensor_id, rollup.bucket, originTimestamp, bucketWidthInSeconds)
+
+    first = __get_rollup_value(db, aggregates.c.sensor_id, resolution, aggregates.c.first_bucket, isFirst=True)
+    last = __get_rollup_value(db, aggregates.c.sensor_id, resolution, aggregates.c.last_bucket, isFirst=False)
+    return db.query(aggregates, first.label('first'), last.label('last')).all()
+
+
+def __group_by_bucket(query: Query, sensorIdColumn, timestampColumn, originTimestamp: int,
+                      bucketWidthInSeconds: Optional[int]):
+    if bucketWidthInSeconds is None:
+        return query.add_columns(literal(0).label('bucket')).group_by(sensorIdColumn).subquery()
+
+    bucket = ((timestampColumn - originTimestamp) // bucketWidthInSeconds).label('bucket')
+    return query.add_columns(bucket).group_by(sensorIdColumn, bucket).subquery()
+
+
+def __get_rollup_value(db: Session, sensorId, resolution: int, bucket, isFirst: bool):
+    rollup = aliased(Models.MeasurementRollup)
+    return db.query(rollup.first_value if isFirst else rollup.last_value) \
+        .filter(rollup.sensor_id == sensorId) \
+        .filter(rollup.resolution == resolution) \
+        .filter(rollup.bucket == bucket) \
+        .scalar_subquery()
+
+
+def get_measurements_for_export(db: Session, startDateTime: str, endDateTime: str,
+                                sensorIds: Optional[List[int]], deviceIds: Optional[List[int]],
+                                afterKey: Optional[Tuple[int, int, int]]) -> Query:
+    # (id, sensor_id, timestamp, value) ordered by the key (sensor_id, timestamp, id)
+    # the order matches the covering index, therefore no sorting is required regardless of the result size
+    sensorIdsQuery = db.query(Models.Sensor.id)
+    if sensorIds:
+        sensorIdsQuery = sensorIdsQuery.filter(Models.Sensor.id.in_(sensorIds))
+    if deviceIds:
+        sensorIdsQuery = sensorIdsQuery.filter(Models.Sensor.device_id.in_(deviceIds))
+    if afterKey is not None:
+        # sensors before the cursor are skipped entirely
+        sensorIdsQuery = sensorIdsQuery.filter(Models.Sensor.id >= afterKey[0])
+
+    query = db.query(Models.Measurement.id, Models.Measurement.sensor_id,
+                     Models.Measurement.timestamp, Models.Measurement.value) \
+        .filter(Models.Measurement.sensor_id.in_(sensorIdsQuery.scalar_subquery()))
 
-def get_first_measurement_for_sensor(db: Session, sensorId: int) -> Models.Measurement:
-    return db.query(Models.Measurement) \
+    if startDateTime and endDateTime:
+        startTimestamp, endTimestamp = __to_timestamp_range(startDateTime, endDateTime)
+        query = query.filter(and_(startTimestamp <= Models.Measurement.timestamp,
+                                  endTimestamp >= Models.Measurement.timestamp))
+
+    if afterKey is not None:
+        query = query.filter(tuple_(Models.Measurement.sensor_id,
+                                    Models.Measurement.timestamp,
+                                    Models.Measurement.id) > tuple_(*afterKey))
+
+    return query.order_by(Models.Measurement.sensor_id.asc(),
+                          Models.Measurement.timestamp.asc(),
+                          Models.Measurement.id.asc())
+
+
+def get_measurement_values_for_sensor(db: Session, startDateTime: str, endDateTime: str,
+                                      sensorId: int, batchSize: int = 1000) -> Iterator[Tuple[int, int, float]]:
+    # (id, timestamp, value) of all numeric measurements, ordered ascending by timestamp
+    startTimestamp, endTimestamp = __to_timestamp_range(startDateTime, endDateTime)
+    return db.query(Models.Measurement.id, Models.Measurement.timestamp, Models.Measurement.value) \
         .filter(Models.Measurement.sensor_id == sensorId) \
+        .filter(and_(startTimestamp <= Models.Measurement.timestamp,
+                     endTimestamp >= Models.Measurement.timestamp)) \
+        .filter(__is_numeric(Models.Measurement.value)) \
         .order_by(Models.Measurement.timestamp.asc()) \
-        .first()
+        .yield_per(batchSize)
+
+
+def __get_value_at_timestamp(db: Session, sensorId, timestamp, isFirst: bool, source=Models.Measurement):
+    # first (lowest id) or last (highest id) numeric value of the sensor at the given timestamp
+    measurement = aliased(source)
+    order = measurement.id.asc() if isFirst else measurement.id.desc()
+    return db.query(measurement.value) \
+        .filter(measurement.sensor_id == sensorId) \
+        .filter(measurement.timestamp == timestamp) \
+        .filter(__is_numeric(measurement.value)) \
+        .order_by(order) \
+        .limit(1) \
+        .scalar_subquery()
+
+
+def __is_numeric(column):
+    # databases created before the numeric storage may still contain non-numeric values
+    return func.typeof(column).in_(['real', 'integer'])
 
 
 def get_measurement(db: Session, measurementId: int) -> Models.Measurement:
@@ -151,42 +548,386 @@ def get_measurement(db: Session, measurementId: int) -> Models.Measurement:
 @notify_backup_service(BACKUP_SERVICE)
 def create_measurement(db: Session, measurement: Schemas.MeasurementCreate) -> Models.Measurement:
     if measurement.timestamp is None:
-        measurement.timestamp = __get_current_datetime()
+        timestamp = __get_current_timestamp()
+    else:
+        timestamp = MeasurementFormat.to_epoch_seconds(measurement.timestamp)
 
-    dbMeasurement = Models.Measurement(**measurement.dict())
+    dbMeasurement = Models.Measurement(sensor_id=measurement.sensor_id,
+                                       value=MeasurementFormat.parse_value(measurement.value),
+                                       timestamp=timestamp)
     db.add(dbMeasurement)
+    rows = [{'sensor_id': dbMeasurement.sensor_id, 'timestamp': dbMeasurement.timestamp, 'value': dbMeasurement.value}]
+    __update_rollups(db, rows)
+    __reset_retention_progress(db, rows)
     db.commit()
     db.refresh(dbMeasurement)
+
+    createdMeasurement = Schemas.Measurement.model_validate(dbMeasurement)
+    LATEST_MEASUREMENT_CACHE.offer(createdMeasurement)
+    CHANGE_TRACKER.mark_measurements_changed([createdMeasurement.sensor_id])
+    MEASUREMENT_BROKER.publish([createdMeasurement])
     return dbMeasurement
 
 
 @notify_backup_service(BACKUP_SERVICE)
 def update_measurement(db: Session, measurementId: int, measurement: Schemas.MeasurementUpdate) -> Models.Measurement:
     existingMeasurement = get_measurement(db, measurementId)
-    existingMeasurement.value = measurement.value
+    oldValue = existingMeasurement.value
+    existingMeasurement.value = MeasurementFormat.parse_value(measurement.value)
+    db.flush()
+    __rebuild_rollups_for_timestamp(db, existingMeasurement.sensor_id, existingMeasurement.timestamp,
+                                    oldValue, existingMeasurement.value)
     db.commit()
     db.refresh(existingMeasurement)
+
+    LATEST_MEASUREMENT_CACHE.offer(Schemas.Measurement.model_validate(existingMeasurement))
+    CHANGE_TRACKER.mark_measurements_changed([existingMeasurement.sensor_id])
     return existingMeasurement
 
 
 @notify_backup_service(BACKUP_SERVICE)
 def delete_measurement(db: Session, measurement: Schemas.Measurement):
+    sensorId, measurementId, timestamp = measurement.sensor_id, measurement.id, measurement.timestamp
+    value = measurement.value
     db.delete(measurement)
+    db.flush()
+    __rebuild_rollups_for_timestamp(db, sensorId, timestamp, value, None)
     db.commit()
 
+    LATEST_MEASUREMENT_CACHE.remove_measurement(sensorId, measurementId)
+    CHANGE_TRACKER.mark_measurements_changed([sensorId])
 
-def delete_multiple_measurements(db: Session, measurementIds: Set[int]):
-    db.query(Models.Measurement).filter(Models.Measurement.id.in_(measurementIds)).delete()
+
+@notify_backup_service(BACKUP_SERVICE)
+def create_measurement_batch(db: Session, batch: Schemas.MeasurementBatch) -> int:
+    generation = IDENTITY_CACHE.generation
+    sensorIds, isNewSensorCreated = __resolve_sensor_ids(db, batch)
+
+    rows = build_measurement_rows(batch, sensorIds)
+    createdMeasurements = __insert_measurements(db, rows)
     db.commit()
 
+    __remember_sensor_ids(sensorIds, isNewSensorCreated, generation)
+    __invalidate_latest_measurements(rows)
+    MEASUREMENT_BROKER.publish(createdMeasurements)
+    return len(rows)
+
+
+@notify_backup_service(BACKUP_SERVICE)
+def create_measurements_from_rows(db: Session, rows: List[Dict]) -> int:
+    createdMeasurements = __insert_measurements(db, rows)
+    db.commit()
+
+    __invalidate_latest_measurements(rows)
+    MEASUREMENT_BROKER.publish(createdMeasurements)
+    return len(rows)
+
+
+def __insert_measurements(db: Session, rows: List[Dict]) -> List[Schemas.Measurement]:
+    # returns the inserted measurements of sensors with live subscribers
+    # the ids are only fetched if required, since inserting with RETURNING is considerably slower
+    if not rows:
+        return []
+
+    __update_rollups(db, rows)
+    __reset_retention_progress(db, rows)
+
+    if not MEASUREMENT_BROKER.has_subscribers({row['sensor_id'] for row in rows}):
+        db.execute(insert(Models.Measurement), rows)
+        return []
+
+    statement = insert(Models.Measurement).returning(Models.Measurement.id, sort_by_parameter_order=True)
+    measurementIds = db.execute(statement, rows).scalars().all()
+    return [Schemas.Measurement(id=measurementId, **row) for measurementId, row in zip(measurementIds, rows)]
+
+
+def __update_rollups(db: Session, rows: List[Dict]):
+    # merges new measurements into the rollups, part of the same transaction as the insert
+    rollups = Rollups.aggregate_measurements(rows)
+    if not rollups:
+        return
+
+    rollup = Models.MeasurementRollup
+    statement = sqlite_insert(rollup)
+    new = statement.excluded
+    isFirst = or_(rollup.first_timestamp.is_(None), new.first_timestamp < rollup.first_timestamp)
+    isLast = or_(rollup.last_timestamp.is_(None), new.last_timestamp >= rollup.last_timestamp)
+
+    # min and max of existing rollups are NULL if the bucket only contained non-numeric values
+    statement = statement.on_conflict_do_update(index_elements=[rollup.sensor_id, rollup.resolution, rollup.bucket],
+                                                set_={'min': func.min(func.coalesce(rollup.min, new.min), new.min),
+                                                      'max': func.max(func.coalesce(rollup.max, new.max), new.max),
+                                                      'sum': rollup.sum + new.sum,
+                                                      'count': rollup.count + new.count,
+                                                      'first_timestamp': case((isFirst, new.first_timestamp),
+                                                                              else_=rollup.first_timestamp),
+                                                      'first_value': case((isFirst, new.first_value),
+                                                                          else_=rollup.first_value),
+                                                      'last_timestamp': case((isLast, new.last_timestamp),
+                                                                             else_=rollup.last_timestamp),
+                                                      'last_value': case((isLast, new.last_value),
+                                                                         else_=rollup.last_value)})
+    db.execute(statement, rollups)
+
+
+def __reset_retention_progress(db: Session, rows: List[Dict]):
+    # measurements inserted into days that were already thinned out (e.g. uploaded later by a device) are
+    # classified again by the next cleanup, part of the same transaction as the insert
+    firstTimestamps = {}
+    for row in rows:
+        sensorId = row['sensor_id']
+        firstTimestamps[sensorId] = min(row['timestamp'], firstTimestamps.get(sensorId, row['timestamp']))
+
+    for sensorId, firstTimestamp in firstTimestamps.items():
+        previousDate = (MeasurementFormat.to_datetime(firstTimestamp).date() - timedelta(days=1)).isoformat()
+        db.query(Models.RetentionProgress) \
+            .filter(Models.RetentionProgress.sensor_id == sensorId) \
+            .filter(Models.RetentionProgress.last_enforced_date > previousDate) \
+            .update({Models.RetentionProgress.last_enforced_date: previousDate}, synchronize_session=False)
+
+
+def __rebuild_rollups_for_timestamp(db: Session, sensorId: int, timestamp: int, oldValue,
+                                    newValue: Optional[float]):
+    # the buckets containing an updated or deleted (newValue None) measurement are recomputed from the remaining
+    # measurements, buckets thinned out by the database cleanup are corrected instead (see Rollups.correct_rollup)
+    # buckets never span multiple months, measurements of the month may already be archived in a partition
+    monthStart = Partitions.get_month_start(MeasurementFormat.to_datetime(timestamp).date())
+    source = Partitions.get_measurement_source(db, *Partitions.get_month_range(monthStart))
+    rollupTable = Models.MeasurementRollup.__table__
+    for resolution in Rollups.RESOLUTIONS:
+        bucket = Rollups.get_bucket(timestamp, resolution)
+        isBucket = and_(rollupTable.c.sensor_id == sensorId,
+                        rollupTable.c.resolution == resolution,
+                        rollupTable.c.bucket == bucket)
+
+        rollup = db.execute(select(rollupTable).where(isBucket)).mappings().first()
+        db.execute(rollupTable.delete().where(isBucket))
+        __insert_rollups_from_measurements(db, sensorId, resolution, (bucket, bucket + resolution), source)
+        if rollup is None:
+            continue
+
+        recomputed = db.execute(select(rollupTable).where(isBucket)).mappings().first()
+        corrected = Rollups.correct_rollup(rollup, recomputed, timestamp, oldValue, newValue)
+        if corrected is recomputed:
+            continue
+
+        db.execute(rollupTable.delete().where(isBucket))
+        if corrected is not None:
+            db.execute(insert(rollupTable), [corrected])
+
+
+def rebuild_rollups(db: Session, sensorId: int):
+    # recomputes all rollups of the sensor from the raw measurements in one transaction
+    # measurements removed by the database cleanup are no longer included afterwards
+    source = Partitions.get_measurement_source(db)
+    db.query(Models.MeasurementRollup) \
+        .filter(Models.MeasurementRollup.sensor_id == sensorId) \
+        .delete(synchronize_session=False)
+    for resolution in Rollups.RESOLUTIONS:
+        __insert_rollups_from_measurements(db, sensorId, resolution, None, source)
+    db.commit()
+
+
+def __insert_rollups_from_measurements(db: Session, sensorId: int, resolution: int,
+                                       timestampRange: Optional[Tuple[int, int]], source=Models.Measurement):
+    # timestampRange: start inclusive, end exclusive, both aligned to the resolution, None for all measurements
+    # source: the measurement table or the union with the partitions, see Partitions.get_measurement_source
+    isNumeric = __is_numeric(source.value)
+    numericValue = case((isNumeric, source.value), else_=None)
+    numericTimestamp = case((isNumeric, source.timestamp), else_=None)
+    bucket = (source.timestamp // resolution * resolution).label('bucket')
+
+    query = db.query(bucket,
+                     func.min(numericValue).label('min'),
+                     func.max(numericValue).label('max'),
+                     func.total(numericValue).label('sum'),
+                     func.count(numericValue).label('count'),
+                     func.sum(case((isNumeric, 0), else_=1)).label('number_of_non_numeric_values'),
+                     func.min(numericTimestamp).label('first_timestamp'),
+                     func.max(numericTimestamp).label('last_timestamp')) \
+        .filter(source.sensor_id == sensorId)
+    if timestampRange is not None:
+        query = query.filter(and_(timestampRange[0] <= source.timestamp, timestampRange[1] > source.timestamp))
+    buckets = query.group_by(bucket).subquery()
+
+    first = __get_value_at_timestamp(db, sensorId, buckets.c.first_timestamp, isFirst=True, source=source)
+    last = __get_value_at_timestamp(db, sensorId, buckets.c.last_timestamp, isFirst=False, source=source)
+    rollups = select(literal(sensorId), literal(resolution), buckets.c.bucket, buckets.c.min, buckets.c.max,
+                     buckets.c.sum, buckets.c.count, buckets.c.number_of_non_numeric_values,
+                     buckets.c.first_timestamp, first, buckets.c.last_timestamp, last)
+
+    db.execute(insert(Models.MeasurementRollup).from_select(['sensor_id', 'resolution', 'bucket', 'min', 'max', 'sum',
+                                                             'count', 'number_of_non_numeric_values',
+                                                             'first_timestamp', 'first_value',
+                                                             'last_timestamp', 'last_value'],
+                                                            rollups))
+
+
+def __invalidate_latest_measurements(rows: List[Dict]):
+    # the ids of bulk inserted measurements are unknown, the next read fetches the latest measurement again
+    sensorIds = {row['sensor_id'] for row in rows}
+    LATEST_MEASUREMENT_CACHE.invalidate_sensors(sensorIds)
+    CHANGE_TRACKER.mark_measurements_changed(sensorIds)
+
+
+def get_or_create_sensor_ids(db: Session, batch: Schemas.MeasurementBatch) -> Dict[Tuple[str, str], int]:
+    generation = IDENTITY_CACHE.generation
+    sensorIds, isNewSensorCreated = __resolve_sensor_ids(db, batch)
+    if isNewSensorCreated:
+        db.commit()
+        BACKUP_SERVICE.perform_modification()
+
+    __remember_sensor_ids(sensorIds, isNewSensorCreated, generation)
+    return sensorIds
+
+
+def build_measurement_rows(batch: Schemas.MeasurementBatch, sensorIds: Dict[Tuple[str, str], int]) -> List[Dict]:
+    currentTimestamp = __get_current_timestamp()
+
+    rows = []
+    for deviceMeasurements in batch.devices:
+        for sensorValues in deviceMeasurements.sensors:
+            sensorId = sensorIds[(deviceMeasurements.deviceName, sensorValues.name)]
+            for item in sensorValues.values:
+                if item.timestamp is None:
+                    timestamp = currentTimestamp
+                else:
+                    timestamp = MeasurementFormat.to_epoch_seconds(item.timestamp)
+
+                rows.append({'sensor_id': sensorId,
+                             'value': MeasurementFormat.parse_value(item.value),
+                             'timestamp': timestamp})
+    return rows
+
+
+def __resolve_sensor_ids(db: Session, batch: Schemas.MeasurementBatch) -> Tuple[Dict[Tuple[str, str], int], bool]:
+    sensorIds = __get_cached_sensor_ids(batch)
+    if sensorIds is not None:
+        return sensorIds, False
+
+    return __get_or_create_sensor_ids(db, batch)
+
+
+def __remember_sensor_ids(sensorIds: Dict[Tuple[str, str], int], isNewSensorCreated: bool, generation: int):
+    if isNewSensorCreated:
+        IDENTITY_CACHE.invalidate()
+        generation = IDENTITY_CACHE.generation
+        CHANGE_TRACKER.mark_changed(ChangeTracker.DEVICES, ChangeTracker.SENSORS)
+    IDENTITY_CACHE.put_sensor_ids(sensorIds, generation)
+
+
+def __get_cached_sensor_ids(batch: Schemas.MeasurementBatch) -> Optional[Dict[Tuple[str, str], int]]:
+    sensorIds = {}
+    for deviceMeasurements in batch.devices:
+        for sensorValues in deviceMeasurements.sensors:
+            sensorId = IDENTITY_CACHE.get_sensor_id(deviceMeasurements.deviceName, sensorValues.name)
+            if sensorId is None:
+                return None
+            sensorIds[(deviceMeasurements.deviceName, sensorValues.name)] = sensorId
+
+    return sensorIds
+
+
+def __get_or_create_sensor_ids(db: Session, batch: Schemas.MeasurementBatch) -> Tuple[Dict[Tuple[str, str], int], bool]:
+    deviceNames = {device.deviceName for device in batch.devices}
+    existingDevices = db.query(Models.Device).filter(Models.Device.name.in_(deviceNames)).all()
+    devicesByName = {device.name: device for device in existingDevices}
+
+    newDevices = [Models.Device(name=name) for name in deviceNames if name not in devicesByName]
+    if newDevices:
+        db.add_all(newDevices)
+        db.flush()
+        devicesByName.update({device.name: device for device in newDevices})
+
+    deviceIds = [device.id for device in devicesByName.values()]
+    existingSensors = db.query(Models.Sensor).filter(Models.Sensor.device_id.in_(deviceIds)).all()
+    sensorsByKey = {(sensor.device_id, sensor.name): sensor for sensor in existingSensors}
+
+    newSensors = {}
+    for deviceMeasurements in batch.devices:
+        deviceId = devicesByName[deviceMeasurements.deviceName].id
+        for sensorValues in deviceMeasurements.sensors:
+            key = (deviceId, sensorValues.name)
+            if key not in sensorsByKey and key not in newSensors:
+                newSensors[key] = Models.Sensor(name=sensorValues.name, type=sensorValues.type, device_id=deviceId)
+
+    if newSensors:
+        db.add_all(newSensors.values())
+        db.flush()
+        sensorsByKey.update(newSensors)
+
+    # plain ids, the orm objects are expired after commit
+    sensorIds = {}
+    for deviceMeasurements in batch.devices:
+        deviceId = devicesByName[deviceMeasurements.deviceName].id
+        for sensorValues in deviceMeasurements.sensors:
+            sensor = sensorsByKey[(deviceId, sensorValues.name)]
+            sensorIds[(deviceMeasurements.deviceName, sensorValues.name)] = sensor.id
+
+    return sensorIds, bool(newDevices or newSensors)
+
+
+def get_measurement_timestamps_for_sensor(db: Session, startDateTime: str, endDateTime: str,
+                                          sensorId: int, batchSize: int = 1000) -> Iterator[Tuple[int, int]]:
+    startTimestamp, endTimestamp = __to_timestamp_range(startDateTime, endDateTime)
+    return db.query(Models.Measurement.id, Models.Measurement.timestamp) \
+        .filter(Models.Measurement.sensor_id == sensorId) \
+        .filter(and_(startTimestamp <= Models.Measurement.timestamp,
+                     endTimestamp >= Models.Measurement.timestamp)) \
+        .order_by(Models.Measurement.timestamp.asc(), Models.Measurement.id.asc()) \
+        .yield_per(batchSize)
+
+
+def get_archived_timestamp_ranges(db: Session, startDateTime: str, endDateTime: str) -> List[Tuple[int, int]]:
+    # ranges (start inclusive, end exclusive) of the partitions overlapping the given range
+    startTimestamp, endTimestamp = __to_timestamp_range(startDateTime, endDateTime)
+    return [(partition.start_timestamp, partition.end_timestamp)
+            for partition in Partitions.get_partitions(db, startTimestamp, endTimestamp + 1)]
+
+
+def delete_measurements_in_batches(db: Session, measurementIds: List[int], batchSize: int = 500):
+    # no commit here, the caller decides about the transaction boundaries
+    for index in range(0, len(measurementIds), batchSize):
+        batch = measurementIds[index:index + batchSize]
+        db.query(Models.Measurement) \
+            .filter(Models.Measurement.id.in_(batch)) \
+            .delete(synchronize_session=False)
+
+
+# ===== retention progress =====
+
+def get_retention_progress(db: Session, sensorId: int, measurementsPerDay: int,
+                           ageInDays: int) -> Models.RetentionProgress:
+    return db.query(Models.RetentionProgress) \
+        .filter(Models.RetentionProgress.sensor_id == sensorId) \
+        .filter(Models.RetentionProgress.measurements_per_day == measurementsPerDay) \
+        .filter(Models.RetentionProgress.age_in_days == ageInDays) \
+        .first()
+
+
+def update_retention_progress(db: Session, sensorId: int, measurementsPerDay: int,
+                              ageInDays: int, lastEnforcedDate: str):
+    # no commit here, the progress is committed together with the corresponding deletions
+    progress = get_retention_progress(db, sensorId, measurementsPerDay, ageInDays)
+    if progress is None:
+        progress = Models.RetentionProgress(sensor_id=sensorId, measurements_per_day=measurementsPerDay,
+                                            age_in_days=ageInDays)
+        db.add(progress)
+
+    progress.last_enforced_date = lastEnforcedDate
+    db.flush()
+
+
+# ===== database =====
 
-def get_total_number_of_measurements(db: Session) -> List[int]:
-    return db.query(Models.Measurement).count()
+def get_total_number_of_measurements(db: Session) -> int:
+    return Partitions.count_measurements(db)
 
 
-def perform_vacuum(db: Session):
-    db.execute(text('VACUUM'))
+def __get_current_timestamp() -> int:
+    return MeasurementFormat.datetime_to_epoch_seconds(datetime.now())
 
 
-def __get_current_datetime():
-    return datetime.strftime(datetime.now(), DATE_FORMAT)
+def __to_timestamp_range(startDateTime: str, endDateTime: str) -> Tuple[int, int]:
+    return (MeasurementFormat.range_bound_to_epoch_seconds(startDateTime),
+            MeasurementFormat.range_bound_to_epoch_seconds(endDateTime))
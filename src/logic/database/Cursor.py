@@ -0,0 +1,37 @@
+import base64
+import binascii
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+# Opaque cursor tokens for keyset pagination: the key of the last returned row, encoded url safe
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+T = TypeVar('T')
+
+
+def encode_cursor(*key: int) -> str:
+    text = ','.join(str(value) for value in key)
+    return base64.urlsafe_b64encode(text.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, keyLength: int) -> Tuple[int, ...]:
+    try:
+        padding = '=' * (-len(token) % 4)
+        text = base64.urlsafe_b64decode(token + padding).decode('ascii')
+        key = tuple(int(value) for value in text.split(','))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor "{token}"') from e
+
+    if len(key) != keyLength:
+        raise ValueError(f'Invalid cursor "{token}"')
+    return key
+
+
+def split_page(rows: List[T], limit: Optional[int],
+               get_key: Callable[[T], Tuple[int, ...]]) -> Tuple[List[T], Optional[str]]:
+    # rows must be queried with limit + 1, the additional row only indicates that a further page exists
+    if limit is None or len(rows) <= limit:
+        return rows, None
+
+    page = rows[:limit]
+    return page, encode_cursor(*get_key(page[-1]))
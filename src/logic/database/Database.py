@@ -1,18 +1,126 @@
-from sqlalchemy import create_engine
+from typing import Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from Settings import SETTINGS
 
+JOURNAL_MODES = ['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF']
+SYNCHRONOUS_LEVELS = ['OFF', 'NORMAL', 'FULL', 'EXTRA']
+TEMP_STORES = ['DEFAULT', 'FILE', 'MEMORY']
+
+DEFAULT_ENGINE_SETTINGS = {
+    'journalMode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cacheSizeInKiB': 65536,
+    'mmapSizeInMB': 256,
+    'tempStore': 'MEMORY',
+    'busyTimeoutInMilliseconds': 5000,
+    'readerPoolSize': 10,
+    'writerPoolSize': 10
+}
+
+
+def get_engine_settings(engineSettings: Dict) -> Dict:
+    settings = {**DEFAULT_ENGINE_SETTINGS, **engineSettings}
+
+    __validate_option(settings, 'journalMode', JOURNAL_MODES)
+    __validate_option(settings, 'synchronous', SYNCHRONOUS_LEVELS)
+    __validate_option(settings, 'tempStore', TEMP_STORES)
+    return settings
+
+
+def __validate_option(settings: Dict, name: str, allowedValues: list):
+    settings[name] = str(settings[name]).upper()
+    if settings[name] not in allowedValues:
+        raise ValueError(f'Invalid value for settings option "{name}": "{settings[name]}" '
+                         f'(allowed: {", ".join(allowedValues)})')
+
+
+def create_database_engine(databaseUrl: str, engineSettings: Dict, isReadOnly: bool) -> Engine:
+    settings = get_engine_settings(engineSettings)
+    poolSize = settings['readerPoolSize'] if isReadOnly else settings['writerPoolSize']
+
+    databaseEngine = create_engine(
+        databaseUrl, connect_args={'check_same_thread': False},
+        pool_size=poolSize,
+        max_overflow=poolSize,
+    )
+
+    @event.listens_for(databaseEngine, 'connect')
+    def set_pragmas(dbapiConnection, connectionRecord):
+        cursor = dbapiConnection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout={int(settings["busyTimeoutInMilliseconds"])}')
+        cursor.execute(f'PRAGMA journal_mode={settings["journalMode"]}')
+        cursor.execute(f'PRAGMA synchronous={settings["synchronous"]}')
+        # negative values are interpreted as KiB by sqlite
+        cursor.execute(f'PRAGMA cache_size=-{int(settings["cacheSizeInKiB"])}')
+        cursor.execute(f'PRAGMA mmap_size={int(settings["mmapSizeInMB"]) * 1024 * 1024}')
+        cursor.execute(f'PRAGMA temp_store={settings["tempStore"]}')
+        if isReadOnly:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+    if isReadOnly:
+        @event.listens_for(databaseEngine, 'checkout')
+        def refresh_measurement_view(dbapiConnection, connectionRecord, connectionProxy):
+            # creating, dropping or replacing a partition changes the schema version of the database file,
+            # this includes changes made by other processes
+            cursor = dbapiConnection.cursor()
+            schemaVersion = cursor.execute('PRAGMA main.schema_version').fetchone()[0]
+            cursor.close()
+            if connectionRecord.info.get('schemaVersion') != schemaVersion:
+                install_measurement_view(dbapiConnection)
+                connectionRecord.info['schemaVersion'] = schemaVersion
+
+    return databaseEngine
+
+
+# Archived months of measurements are stored in separate tables (see Partitions).
+# Read connections see them through a temporary view that shadows the measurement table, therefore all read queries
+# cover the archived months without changes. Write connections only see the measurement table.
+PARTITION_REGISTRY_TABLE = 'measurement_partition'
+MEASUREMENT_COLUMNS = 'id, timestamp, value, sensor_id'
+
+
+def install_measurement_view(dbapiConnection):
+    cursor = dbapiConnection.cursor()
+    try:
+        isQueryOnly = cursor.execute('PRAGMA query_only').fetchone()[0]
+        cursor.execute('PRAGMA query_only=OFF')
+        try:
+            cursor.execute('DROP VIEW IF EXISTS temp.measurement')
+
+            hasRegistry = cursor.execute('SELECT 1 FROM main.sqlite_master WHERE type = \'table\' AND name = ?',
+                                         (PARTITION_REGISTRY_TABLE,)).fetchone()
+            partitions = []
+            if hasRegistry:
+                partitions = cursor.execute(f'SELECT name, start_timestamp, end_timestamp '
+                                            f'FROM main.{PARTITION_REGISTRY_TABLE} '
+                                            f'ORDER BY start_timestamp').fetchall()
+            if partitions:
+                # the bounds of every partition allow sqlite to skip partitions outside of a queried range
+                # with a single index seek
+                selects = [f'SELECT {MEASUREMENT_COLUMNS} FROM main.measurement']
+                selects.extend(f'SELECT {MEASUREMENT_COLUMNS} FROM main."{name}" '
+                               f'WHERE timestamp >= {int(startTimestamp)} AND timestamp < {int(endTimestamp)}'
+                               for name, startTimestamp, endTimestamp in partitions)
+                cursor.execute(f'CREATE TEMP VIEW measurement AS {" UNION ALL ".join(selects)}')
+        finally:
+            cursor.execute(f'PRAGMA query_only={"ON" if isQueryOnly else "OFF"}')
+    finally:
+        cursor.close()
+
+
 databasePath = SETTINGS['database']['databasePath']
 databaseUrl = f'sqlite:///{databasePath}'
 
-engine = create_engine(
-    databaseUrl, connect_args={'check_same_thread': False},
-    pool_size=10,
-    max_overflow=10,
-)
+engine = create_database_engine(databaseUrl, SETTINGS['database'].get('engine', {}), isReadOnly=False)
+readEngine = create_database_engine(databaseUrl, SETTINGS['database'].get('engine', {}), isReadOnly=True)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=readEngine)
 
 Base = declarative_base()
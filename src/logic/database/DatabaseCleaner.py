@@ -1,120 +1,447 @@
 import logging
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple, Set
+from itertools import groupby
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Set
 
 from sqlalchemy.orm import Session
 
 from logic import Constants
-from logic.database import Crud, Schemas
+from logic.database import Crud, MeasurementFormat, Schemas
+from logic.database.CleanupProgressTracker import CleanupProgressTracker
+from logic.database.DatabaseVacuum import DatabaseVacuum
 from logic.database.RetentionPolicy import RetentionPolicy
 
 LOGGER = logging.getLogger(Constants.APP_NAME)
 
+EXECUTOR_THREAD = 'thread'
+EXECUTOR_PROCESS = 'process'
+
+DEFAULT_PARALLEL_SETTINGS = {
+    # number of sensors that are classified at the same time, 1 processes all sensors sequentially
+    'maxWorkers': 1,
+    # thread: classification in threads (little overhead), process: classification in processes (scales with cores)
+    'executor': EXECUTOR_THREAD,
+    # target duration of a single delete transaction, requests wait at most this long for the write lock
+    'latencyBudgetInMilliseconds': 50
+}
+
+
+def get_parallel_settings(parallelSettings: Dict) -> Dict:
+    settings = {**DEFAULT_PARALLEL_SETTINGS, **parallelSettings}
+    if settings['maxWorkers'] < 1:
+        raise ValueError('"maxWorkers" must be positive')
+    if settings['executor'] not in [EXECUTOR_THREAD, EXECUTOR_PROCESS]:
+        raise ValueError(f'Invalid value for settings option "executor": "{settings["executor"]}" '
+                         f'(allowed: {EXECUTOR_THREAD}, {EXECUTOR_PROCESS})')
+    if settings['latencyBudgetInMilliseconds'] <= 0:
+        raise ValueError('"latencyBudgetInMilliseconds" must be positive')
+    return settings
+
+
+# policy, first and last day of the chunk, ids of the measurements to delete
+CleanupChunk = Tuple[RetentionPolicy, datetime.date, datetime.date, List[int]]
+
+
+class CleanupPlan:
+    # result of the classification of one sensor: the measurements to delete per chunk of days,
+    # in the order of the policies, the retention progress of a policy is advanced after each chunk
+    # lastMeasurementId: the measurements inserted afterwards were not part of the classification
+    def __init__(self, sensor: Schemas.Sensor, chunks: List[CleanupChunk], lastMeasurementId: int = 0):
+        self.sensor = sensor
+        self.chunks = chunks
+        self.lastMeasurementId = lastMeasurementId
+
+    @property
+    def numberOfMeasurementsToDelete(self) -> int:
+        return sum(len(idsToDelete) for __, __, __, idsToDelete in self.chunks)
+
 
 class DatabaseCleaner:
     MIN_DATE = datetime(year=1970, month=1, day=1).date()
 
     DATE_FORMAT = "%Y-%m-%d"
 
-    def __init__(self, retentionPolicies: List[RetentionPolicy], forceBackupAfterCleanup: bool):
+    DELETE_BATCH_SIZE = 500
+    # cancellation and the maximum runtime are checked after every chunk, the progress is stored per chunk
+    DAYS_PER_CHUNK = 7
+    MIN_DELETE_BATCH_SIZE = 50
+    MAX_DELETE_BATCH_SIZE = 10000
+
+    def __init__(self, retentionPolicies: List[RetentionPolicy], forceBackupAfterCleanup: bool,
+                 databaseVacuum: Optional[DatabaseVacuum] = None, parallelSettings: Optional[Dict] = None,
+                 readSessionFactory: Optional[Callable[[], Session]] = None,
+                 progressTracker: Optional[CleanupProgressTracker] = None):
         self._policies = retentionPolicies
         self._forceBackupAfterCleanup = forceBackupAfterCleanup
+        self._databaseVacuum = databaseVacuum
+        self._progressTracker = progressTracker or CleanupProgressTracker()
 
-    def clean(self, db: Session, currentDate: datetime.date):
+        settings = get_parallel_settings(parallelSettings or {})
+        self._maxWorkers = settings['maxWorkers']
+        self._executorType = settings['executor']
+        self._latencyBudgetInSeconds = settings['latencyBudgetInMilliseconds'] / 1000
+        self._readSessionFactory = readSessionFactory
+        self._deleteBatchSize = self.DELETE_BATCH_SIZE
+
+    def clean(self, db: Session, currentDate: datetime.date) -> Optional[Schemas.VacuumInfo]:
         LOGGER.info('Performing database cleanup...')
 
-        for policy in self._policies:
-            LOGGER.debug(f'Enforcing retention policy: {policy}')
+        if self._policies:
+            allSensors = Crud.get_sensors(db, skip=0, limit=1000000)
+            self._progressTracker.start(len(allSensors))
+            if self._maxWorkers > 1 and self._readSessionFactory is not None:
+                self._cleanup_measurements_in_parallel(allSensors, db, currentDate)
+            else:
+                for sensor in allSensors:
+                    # the next cleanup continues with the remaining days
+                    if self._progressTracker.is_stop_requested():
+                        break
+                    self._cleanup_measurements_for_sensor(sensor, db, currentDate)
+
+        vacuumInfo = None
+        if self._progressTracker.is_stop_requested():
+            LOGGER.info(f'Database cleanup stopped ({self._progressTracker.get_status().value})')
+        else:
+            if self._databaseVacuum is not None:
+                vacuumInfo = self._databaseVacuum.reclaim(db)
+            LOGGER.info('Database cleanup done')
+
+        if self._forceBackupAfterCleanup:
+            Crud.BACKUP_SERVICE.backup()
+
+        return vacuumInfo
 
+    def _cleanup_measurements_for_sensor(self, sensor: Schemas.Sensor, db: Session, currentDate: datetime.date):
+        firstTimestamp = Crud.get_first_timestamp_for_sensor(db=db, sensorId=sensor.id)
+        if firstTimestamp is None:
+            self._progressTracker.finish_sensor()
+            return
+
+        # the day of the first measurement is never thinned out
+        minDate = MeasurementFormat.to_datetime(firstTimestamp).date()
+
+        # every chunk of days is committed on its own, the deletions are throttled like in the parallel cleanup
+        isStopped = False
+        numberOfDeletedMeasurements = 0
+        for policy in self._policies:
             policyStart = currentDate - timedelta(days=policy.ageInDays)
+            firstDate = DatabaseCleaner._determine_first_date_to_process(db, sensor.id, policy, minDate)
+            if policyStart < firstDate:
+                continue
 
-            allSensors = Crud.get_sensors(db, skip=0, limit=1000000)
-            for sensor in allSensors:
-                self._cleanup_measurements_for_sensor(sensor, db, policy, policyStart)
+            LOGGER.debug(f'Enforcing retention policy {policy} for sensor "{sensor.name}" '
+                         f'from {policyStart.strftime(DatabaseCleaner.DATE_FORMAT)} '
+                         f'to {firstDate.strftime(DatabaseCleaner.DATE_FORMAT)} '
+                         f'(id: {sensor.id}, device_id: {sensor.device_id})')
 
-        LOGGER.debug('Performing database vacuum...')
-        Crud.perform_vacuum(db)
+            for chunkStart, chunkEnd in DatabaseCleaner._split_into_chunks(firstDate, policyStart):
+                isStopped = self._progressTracker.is_stop_requested()
+                if isStopped:
+                    break
 
-        LOGGER.info('Database cleanup done')
+                # read before the classification, the ids of measurements inserted afterwards are always greater
+                lastMeasurementId = Crud.get_max_measurement_id(db) or 0
+                idsToDelete = DatabaseCleaner._collect_measurements_to_delete(db, sensor.id, policy,
+                                                                              chunkStart, chunkEnd)
+                if idsToDelete:
+                    LOGGER.debug(f'Scheduled {len(idsToDelete)} measurements for deletion')
 
-        if self._forceBackupAfterCleanup:
-            Crud.BACKUP_SERVICE.backup()
+                numberOfDeletedMeasurementsOfChunk = self._apply_cleanup_chunk(
+                    db, sensor.id, lastMeasurementId, (policy, chunkStart, chunkEnd, idsToDelete))
+                numberOfDeletedMeasurements += numberOfDeletedMeasurementsOfChunk
+                isStopped = numberOfDeletedMeasurementsOfChunk < len(idsToDelete)
+                if isStopped:
+                    break
+
+            if isStopped:
+                break
+
+        if numberOfDeletedMeasurements:
+            Crud.LATEST_MEASUREMENT_CACHE.invalidate_sensors([sensor.id])
+            Crud.CHANGE_TRACKER.mark_measurements_changed([sensor.id])
+
+        if not isStopped:
+            self._progressTracker.finish_sensor()
+
+    def _cleanup_measurements_in_parallel(self, sensors: List[Schemas.Sensor], db: Session,
+                                          currentDate: datetime.date):
+        # the sensors are classified by a pool of workers, each reading from its own snapshot of the database (WAL),
+        # the deletions are applied by the calling thread as the single writer
+        LOGGER.debug(f'Classifying measurements of {len(sensors)} sensors with {self._maxWorkers} workers '
+                     f'({self._executorType})')
+
+        # the workers must not touch the database objects of the writing session, they are expired by every commit
+        sensors = [Schemas.Sensor.model_validate(sensor) for sensor in sensors]
+
+        classificationExecutor = None
+        if self._executorType == EXECUTOR_PROCESS:
+            classificationExecutor = ProcessPoolExecutor(max_workers=self._maxWorkers)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self._maxWorkers, thread_name_prefix='DatabaseCleaner') as executor:
+                # only a few plans are kept in memory at the same time
+                pendingPlans = deque()
+                for sensor in sensors:
+                    if self._progressTracker.is_stop_requested():
+                        break
+
+                    # read before the worker takes its snapshot, the ids of new measurements are always greater
+                    lastMeasurementId = Crud.get_max_measurement_id(db) or 0
+                    pendingPlans.append(executor.submit(self._plan_cleanup_for_sensor, sensor, currentDate,
+                                                        classificationExecutor, lastMeasurementId))
+                    if len(pendingPlans) >= 2 * self._maxWorkers:
+                        self._apply_cleanup_plan(db, pendingPlans.popleft().result())
+
+                while pendingPlans and not self._progressTracker.is_stop_requested():
+                    self._apply_cleanup_plan(db, pendingPlans.popleft().result())
+
+                # plans that are not applied yet are discarded, nothing was written for them
+                for plan in pendingPlans:
+                    plan.cancel()
+        finally:
+            if classificationExecutor is not None:
+                classificationExecutor.shutdown()
+
+    def _plan_cleanup_for_sensor(self, sensor: Schemas.Sensor, currentDate: datetime.date,
+                                 classificationExecutor: Optional[Executor], lastMeasurementId: int) -> CleanupPlan:
+        readDb = self._readSessionFactory()
+        try:
+            # the measurements and the archived ranges must not be read from different states of the database
+            Crud.begin_read_transaction(readDb)
+            firstTimestamp = Crud.get_first_timestamp_for_sensor(db=readDb, sensorId=sensor.id)
+            if firstTimestamp is None:
+                return CleanupPlan(sensor, [])
+
+            minDate = MeasurementFormat.to_datetime(firstTimestamp).date()
+
+            policyRanges = []
+            for policy in self._policies:
+                policyStart = currentDate - timedelta(days=policy.ageInDays)
+                firstDate = DatabaseCleaner._determine_first_date_to_process(readDb, sensor.id, policy, minDate)
+                if policyStart >= firstDate:
+                    policyRanges.append((policy, firstDate, policyStart))
+
+            if not policyRanges:
+                return CleanupPlan(sensor, [])
+
+            # the measurements of all policies are read at once, the policies are applied in memory
+            startDate = min(firstDate for __, firstDate, __ in policyRanges)
+            endDate = max(lastDate for __, __, lastDate in policyRanges)
+            startTime = datetime.combine(startDate, datetime.min.time()).strftime(Crud.DATE_FORMAT)
+            endTime = datetime.combine(endDate, datetime.max.time()).strftime(Crud.DATE_FORMAT)
+            rows = Crud.get_measurement_timestamps_for_sensor(readDb, startTime, endTime, sensor.id)
+
+            # read sessions see the archived measurements as well, they are thinned out by the PartitionManager
+            archivedRanges = Crud.get_archived_timestamp_ranges(readDb, startTime, endTime)
+            rows = [(row[0], row[1]) for row in rows
+                    if not any(start <= row[1] < end for start, end in archivedRanges)]
+        finally:
+            readDb.close()
+
+        if classificationExecutor is None:
+            chunks = DatabaseCleaner._collect_ids_to_delete_for_policies(rows, policyRanges)
+        else:
+            chunks = classificationExecutor.submit(DatabaseCleaner._collect_ids_to_delete_for_policies,
+                                                   rows, policyRanges).result()
+
+        return CleanupPlan(sensor, chunks, lastMeasurementId)
 
     @staticmethod
-    def _cleanup_measurements_for_sensor(sensor: Schemas.Sensor, db: Session,
-                                         policy: RetentionPolicy, policyStart: datetime.date):
-        firstMeasurement = Crud.get_first_measurement_for_sensor(db=db, sensorId=sensor.id)
-        if firstMeasurement is None:
-            return
+    def _collect_ids_to_delete_for_policies(rows: List[Tuple[int, int]],
+                                            policyRanges: List[Tuple[RetentionPolicy, datetime.date, datetime.date]]
+                                            ) -> List[CleanupChunk]:
+        # same result as enforcing the policies one after another:
+        # every policy only sees the measurements that were kept by the previous policies
+        # rows: (id, timestamp) sorted ascending by timestamp and id
+        timestamps = [row[1] for row in rows]
+        chunks = []
+        deletedIds = set()
+        for policy, firstDate, lastDate in policyRanges:
+            for chunkStart, chunkEnd in DatabaseCleaner._split_into_chunks(firstDate, lastDate):
+                startTimestamp = MeasurementFormat.datetime_to_epoch_seconds(
+                    datetime.combine(chunkStart, datetime.min.time()))
+                endTimestamp = MeasurementFormat.datetime_to_epoch_seconds(
+                    datetime.combine(chunkEnd + timedelta(days=1), datetime.min.time()))
+                chunkRows = [row for row in rows[bisect_left(timestamps, startTimestamp):
+                                                 bisect_left(timestamps, endTimestamp)]
+                             if row[0] not in deletedIds]
 
-        minDate = datetime.strptime(firstMeasurement.timestamp, Crud.DATE_FORMAT).date()
-        LOGGER.debug(f'Cleaning measurements for sensor "{sensor.name}" '
-                     f'from now to {minDate.strftime(DatabaseCleaner.DATE_FORMAT)} '
-                     f'(id: {sensor.id}, device_id: {sensor.device_id})')
+                idsToDelete = DatabaseCleaner._collect_ids_to_delete(chunkRows, policy)
+                deletedIds.update(idsToDelete)
+                chunks.append((policy, chunkStart, chunkEnd, idsToDelete))
 
-        processedDate = policyStart
-        while processedDate > minDate:
-            LOGGER.debug(f'Cleaning {processedDate.strftime(DatabaseCleaner.DATE_FORMAT)}...')
-            DatabaseCleaner._cleanup_measurements_for_day(db, processedDate, policy, sensor.id)
-            processedDate = processedDate - timedelta(days=1)
+        return chunks
 
     @staticmethod
-    def _cleanup_measurements_for_day(db: Session, date: datetime.date,
-                                      policy: RetentionPolicy, sensor_id: int):
-        measurementIds, idsToDelete = DatabaseCleaner._categorize_measurements_for_day(db,
-                                                                                       date=date,
-                                                                                       policy=policy,
-                                                                                       sensorId=sensor_id)
-
-        if not idsToDelete:
-            return
+    def _split_into_chunks(firstDate: datetime.date,
+                           lastDate: datetime.date) -> List[Tuple[datetime.date, datetime.date]]:
+        # consecutive ranges of at most DAYS_PER_CHUNK days, first and last day inclusive
+        chunks = []
+        chunkStart = firstDate
+        while chunkStart <= lastDate:
+            chunkEnd = min(chunkStart + timedelta(days=DatabaseCleaner.DAYS_PER_CHUNK - 1), lastDate)
+            chunks.append((chunkStart, chunkEnd))
+            chunkStart = chunkEnd + timedelta(days=1)
+        return chunks
 
-        LOGGER.debug(f'Scheduled {len(idsToDelete)} measurements for deletion '
-                     f'(keeping: {len(measurementIds)}, max allowed: {policy.numberOfMeasurementsPerDay})')
-        Crud.delete_multiple_measurements(db, idsToDelete)
+    def _apply_cleanup_plan(self, db: Session, plan: CleanupPlan):
+        if plan.numberOfMeasurementsToDelete:
+            LOGGER.debug(f'Deleting {plan.numberOfMeasurementsToDelete} measurements of sensor "{plan.sensor.name}" '
+                         f'(id: {plan.sensor.id})')
+
+        isStopped = False
+        numberOfDeletedMeasurements = 0
+        for chunk in plan.chunks:
+            isStopped = self._progressTracker.is_stop_requested()
+            if isStopped:
+                break
+
+            numberOfDeletedMeasurementsOfChunk = self._apply_cleanup_chunk(db, plan.sensor.id,
+                                                                           plan.lastMeasurementId, chunk)
+            numberOfDeletedMeasurements += numberOfDeletedMeasurementsOfChunk
+            isStopped = numberOfDeletedMeasurementsOfChunk < len(chunk[3])
+            if isStopped:
+                break
+
+        if numberOfDeletedMeasurements:
+            Crud.LATEST_MEASUREMENT_CACHE.invalidate_sensors([plan.sensor.id])
+            Crud.CHANGE_TRACKER.mark_measurements_changed([plan.sensor.id])
+
+        if not isStopped:
+            self._progressTracker.finish_sensor()
+
+    def _apply_cleanup_chunk(self, db: Session, sensorId: int, lastMeasurementId: int, chunk: CleanupChunk) -> int:
+        # returns the number of deleted measurements, less than scheduled if the cleanup was stopped
+        # the progress is stored after all deletions of the chunk are committed,
+        # an interrupted chunk is classified again by the next cleanup with the same result
+        policy, chunkStart, chunkEnd, idsToDelete = chunk
+        numberOfDeletedMeasurements = self._delete_measurements_throttled(db, idsToDelete)
+        if numberOfDeletedMeasurements < len(idsToDelete):
+            self._progressTracker.add_processed_days(0, numberOfDeletedMeasurements)
+            return numberOfDeletedMeasurements
+
+        if not DatabaseCleaner._has_new_measurements(db, sensorId, lastMeasurementId, chunkEnd):
+            Crud.update_retention_progress(db, sensorId, policy.numberOfMeasurementsPerDay, policy.ageInDays,
+                                           chunkEnd.strftime(DatabaseCleaner.DATE_FORMAT))
+        db.commit()
+        self._progressTracker.add_processed_days((chunkEnd - chunkStart).days + 1, numberOfDeletedMeasurements)
+        return numberOfDeletedMeasurements
 
     @staticmethod
-    def _categorize_measurements_for_day(db: Session, date: datetime.date,
-                                         policy: RetentionPolicy, sensorId: int) -> Tuple[List[int], Set[int]]:
-        points = policy.determine_measurement_points(date)
+    def _has_new_measurements(db: Session, sensorId: int, lastMeasurementId: int, lastDate: datetime.date) -> bool:
+        # measurements back-dated into the classified days during the classification are not part of it,
+        # the progress is kept so that the next cleanup classifies these days again
+        endDateTime = datetime.combine(lastDate, datetime.max.time()).strftime(Crud.DATE_FORMAT)
+        return Crud.has_measurements_inserted_after(db, lastMeasurementId, sensorId, endDateTime)
 
-        measurementIdsToKeep = []
-        allMeasurementIds = set()
-        for index, point in enumerate(points):
-            previousItem = DatabaseCleaner.__get_previous_item(index, point, points)
-            nextItem = DatabaseCleaner.__get_next_item(index, point, points)
+    def _delete_measurements_throttled(self, db: Session, measurementIds: List[int]) -> int:
+        # every batch is a transaction of its own, the batch size is adapted to stay within the latency budget
+        # returns the number of deleted measurements, less than requested if the cleanup was stopped
+        index = 0
+        while index < len(measurementIds):
+            if self._progressTracker.is_stop_requested():
+                return index
 
-            possibleMeasurements = Crud.get_measurements_for_sensor(db, previousItem.strftime(Crud.DATE_FORMAT),
-                                                                    nextItem.strftime(Crud.DATE_FORMAT), sensorId)
+            batch = measurementIds[index:index + self._deleteBatchSize]
+            startTime = time.monotonic()
+            Crud.delete_measurements_in_batches(db, batch, len(batch))
+            db.commit()
+            duration = time.monotonic() - startTime
+            index += len(batch)
 
-            allMeasurementIds.update([m.id for m in possibleMeasurements])
+            if duration > self._latencyBudgetInSeconds:
+                self._deleteBatchSize = max(self._deleteBatchSize // 2, self.MIN_DELETE_BATCH_SIZE)
+            elif duration < self._latencyBudgetInSeconds / 2:
+                self._deleteBatchSize = min(self._deleteBatchSize * 2, self.MAX_DELETE_BATCH_SIZE)
 
-            closestMeasurement = DatabaseCleaner._get_closest_measurement_for_point(possibleMeasurements, point)
-            if closestMeasurement is not None:
-                measurementIdsToKeep.append(closestMeasurement.id)
+            # gives waiting requests the chance to acquire the write lock
+            if index < len(measurementIds):
+                time.sleep(min(duration, self._latencyBudgetInSeconds))
 
-        return measurementIdsToKeep, {m for m in allMeasurementIds if m not in measurementIdsToKeep}
+        return index
 
     @staticmethod
-    def __get_previous_item(index: int, point: datetime, points: List[datetime]) -> datetime:
-        if index == 0:
-            previousItem = point
-        else:
-            previousItem = points[index - 1]
-        return previousItem
+    def _determine_first_date_to_process(db: Session, sensorId: int, policy: RetentionPolicy,
+                                         minDate: datetime.date) -> datetime.date:
+        firstDate = minDate + timedelta(days=1)
+
+        # days up to the last enforced date have already been thinned out by previous runs
+        progress = Crud.get_retention_progress(db, sensorId, policy.numberOfMeasurementsPerDay, policy.ageInDays)
+        if progress is not None:
+            lastEnforcedDate = datetime.strptime(progress.last_enforced_date, DatabaseCleaner.DATE_FORMAT).date()
+            firstDate = max(firstDate, lastEnforcedDate + timedelta(days=1))
+
+        return firstDate
 
     @staticmethod
-    def __get_next_item(index: int, point: datetime, points: List[datetime]) -> datetime:
-        if index == (len(points) - 1):
-            nextItem = datetime(year=point.year, month=point.month, day=point.day, hour=23, minute=59, second=59)
-        else:
-            nextItem = points[index + 1]
-        return nextItem
+    def _collect_measurements_to_delete(db: Session, sensorId: int, policy: RetentionPolicy,
+                                        firstDate: datetime.date, lastDate: datetime.date) -> List[int]:
+        startDateTime = datetime(year=firstDate.year, month=firstDate.month, day=firstDate.day,
+                                 hour=0, minute=0, second=0)
+        endDateTime = datetime(year=lastDate.year, month=lastDate.month, day=lastDate.day,
+                               hour=23, minute=59, second=59)
+
+        rows = Crud.get_measurement_timestamps_for_sensor(db, startDateTime.strftime(Crud.DATE_FORMAT),
+                                                          endDateTime.strftime(Crud.DATE_FORMAT), sensorId)
+        return DatabaseCleaner._collect_ids_to_delete(rows, policy)
+
+    @staticmethod
+    def _collect_ids_to_delete(rows: Iterable[Tuple[int, int]], policy: RetentionPolicy) -> List[int]:
+        # rows: (id, timestamp) sorted ascending by timestamp and id, returns the ids to delete
+        idsToDelete = []
+        for day, rowsForDay in groupby(rows, key=lambda row: row[1] // MeasurementFormat.SECONDS_PER_DAY):
+            measurements = [(row[0], MeasurementFormat.to_datetime(row[1])) for row in rowsForDay]
+            date = MeasurementFormat.to_datetime(day * MeasurementFormat.SECONDS_PER_DAY).date()
+            __, idsToDeleteForDay = DatabaseCleaner._categorize_measurements(measurements, date, policy)
+            idsToDelete.extend(idsToDeleteForDay)
+
+        return idsToDelete
+
+    @staticmethod
+    def _categorize_measurements(measurements: List[Tuple[int, datetime]], date: datetime.date,
+                                 policy: RetentionPolicy) -> Tuple[Set[int], Set[int]]:
+        # measurements: all (id, timestamp) tuples of the day, sorted ascending by timestamp and id
+        # ties are resolved like the descending order of get_measurements_for_sensor: the later measurement wins
+        points = policy.determine_measurement_points(date)
+        timestamps = [m[1] for m in measurements]
+
+        measurementIdsToKeep = set()
+        endOfDay = datetime(year=date.year, month=date.month, day=date.day, hour=23, minute=59, second=59)
+        for index, point in enumerate(points):
+            # a measurement belongs to a point if it lies between the neighbouring points
+            previousItem = points[index - 1] if index > 0 else point
+            nextItem = points[index + 1] if index < len(points) - 1 else endOfDay
+
+            closestIndex = DatabaseCleaner.__get_index_of_closest_timestamp(timestamps, point, previousItem, nextItem)
+            if closestIndex is not None:
+                measurementIdsToKeep.add(measurements[closestIndex][0])
+
+        return measurementIdsToKeep, {m[0] for m in measurements if m[0] not in measurementIdsToKeep}
 
     @staticmethod
-    def _get_closest_measurement_for_point(measurements: List[Schemas.Measurement],
-                                           point: datetime) -> Optional[Schemas.Measurement]:
-        if not measurements:
-            return None
+    def __get_index_of_closest_timestamp(timestamps: List[datetime], point: datetime,
+                                         lowerBound: datetime, upperBound: datetime) -> Optional[int]:
+        rightIndex = bisect_left(timestamps, point)
+
+        rightCandidate = None
+        if rightIndex < len(timestamps) and timestamps[rightIndex] <= upperBound:
+            # last one of equal timestamps
+            rightCandidate = bisect_right(timestamps, timestamps[rightIndex]) - 1
+
+        leftCandidate = None
+        if rightIndex > 0 and timestamps[rightIndex - 1] >= lowerBound:
+            leftCandidate = rightIndex - 1
+
+        if leftCandidate is None:
+            return rightCandidate
+
+        if rightCandidate is None:
+            return leftCandidate
 
-        return min(measurements, key=lambda m: abs(datetime.strptime(m.timestamp, Crud.DATE_FORMAT) - point))
+        if timestamps[rightCandidate] - point <= point - timestamps[leftCandidate]:
+            return rightCandidate
+        return leftCandidate
@@ -0,0 +1,156 @@
+import logging
+
+from sqlalchemy import Integer, MetaData, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from logic import Constants
+from logic.database import Crud, Models
+from logic.database.Database import Base
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+LEGACY_MEASUREMENT_TABLE = 'measurement_legacy'
+INDEX_PREFIX = 'ix_'
+
+
+def is_measurement_storage_migration_required(databaseEngine: Engine) -> bool:
+    inspector = inspect(databaseEngine)
+    if not inspector.has_table(Models.Measurement.__tablename__):
+        return False
+
+    columnTypes = {column['name']: column['type'] for column in inspector.get_columns(Models.Measurement.__tablename__)}
+    return not isinstance(columnTypes['timestamp'], Integer)
+
+
+def migrate_measurement_storage(databaseEngine: Engine):
+    # converts the string columns of databases created before the numeric storage:
+    # timestamps are converted to epoch seconds, numeric values are converted to REAL by the column affinity
+    table = Models.Measurement.__table__
+    tableName = table.name
+
+    existingIndexNames = [index['name'] for index in inspect(databaseEngine).get_indexes(tableName)]
+
+    statements = [f'DROP INDEX {name}' for name in existingIndexNames]
+    statements.append(f'ALTER TABLE {tableName} RENAME TO {LEGACY_MEASUREMENT_TABLE}')
+    statements.append(str(CreateTable(table).compile(dialect=databaseEngine.dialect)).strip())
+    statements.append(f'INSERT INTO {tableName} (id, timestamp, value, sensor_id) '
+                      f'SELECT id, CAST(strftime(\'%s\', timestamp) AS INTEGER), value, sensor_id '
+                      f'FROM {LEGACY_MEASUREMENT_TABLE} '
+                      f'WHERE strftime(\'%s\', timestamp) IS NOT NULL '
+                      f'ORDER BY id')
+    statements.extend(str(CreateIndex(index).compile(dialect=databaseEngine.dialect)).strip()
+                      for index in sorted(table.indexes, key=lambda index: index.name))
+    statements.append(f'DROP TABLE {LEGACY_MEASUREMENT_TABLE}')
+
+    connection = databaseEngine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        numberOfMeasurements = cursor.execute(f'SELECT COUNT(*) FROM {tableName}').fetchone()[0]
+        numberOfInvalidTimestamps = cursor.execute(f'SELECT COUNT(*) FROM {tableName} '
+                                                   f'WHERE strftime(\'%s\', timestamp) IS NULL').fetchone()[0]
+        cursor.close()
+
+        LOGGER.info(f'Migrating {numberOfMeasurements} measurements to numeric storage...')
+        if numberOfInvalidTimestamps:
+            LOGGER.warning(f'Skipping {numberOfInvalidTimestamps} measurements with invalid timestamp')
+
+        # all statements run inside one transaction, an aborted migration leaves the database untouched
+        script = ';\n'.join(['BEGIN'] + statements + ['COMMIT']) + ';'
+        try:
+            connection.driver_connection.executescript(script)
+        except Exception:
+            connection.driver_connection.rollback()
+            raise
+
+        LOGGER.info('Performing database vacuum...')
+        connection.driver_connection.execute('VACUUM')
+    finally:
+        connection.close()
+
+    LOGGER.info('Migration to numeric storage done')
+
+
+def migrate_indexes(databaseEngine: Engine):
+    # creates indexes that were added to the models and drops the ones that were removed from the models
+    # create_all only creates indexes for new tables
+    inspector = inspect(databaseEngine)
+    with databaseEngine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existingIndexNames = {index['name'] for index in inspector.get_indexes(table.name)}
+            declaredIndexes = {index.name: index for index in table.indexes}
+
+            for name in sorted(existingIndexNames - declaredIndexes.keys()):
+                # only indexes created by sqlalchemy, manually created indexes are kept
+                if name.startswith(INDEX_PREFIX):
+                    LOGGER.info(f'Dropping obsolete index {name}...')
+                    connection.execute(text(f'DROP INDEX {name}'))
+
+            for name in sorted(declaredIndexes.keys() - existingIndexNames):
+                LOGGER.info(f'Creating index {name} (may take a while for large tables)...')
+                declaredIndexes[name].create(bind=connection)
+
+
+def is_sensor_autoincrement_migration_required(databaseEngine: Engine) -> bool:
+    with databaseEngine.connect() as connection:
+        tableSql = connection.execute(text('SELECT sql FROM sqlite_master WHERE type = \'table\' AND name = :name'),
+                                      {'name': Models.Sensor.__tablename__}).scalar()
+    return tableSql is not None and 'AUTOINCREMENT' not in tableSql.upper()
+
+
+def migrate_sensor_autoincrement(databaseEngine: Engine):
+    # sqlite can only add AUTOINCREMENT by rebuilding the table, the ids of the existing sensors are kept
+    table = Models.Sensor.__table__
+    tableName = table.name
+    temporaryTableName = f'{tableName}_autoincrement'
+
+    # the referenced device table has to be part of the metadata to compile the foreign key
+    metadata = MetaData()
+    Models.Device.__table__.to_metadata(metadata)
+    temporaryTable = table.to_metadata(metadata, name=temporaryTableName)
+    statements = [str(CreateTable(temporaryTable).compile(dialect=databaseEngine.dialect)).strip()]
+    statements.append(f'INSERT INTO {temporaryTableName} (id, name, type, device_id) '
+                      f'SELECT id, name, type, device_id FROM {tableName} ORDER BY id')
+    statements.append(f'DROP TABLE {tableName}')
+    statements.append(f'ALTER TABLE {temporaryTableName} RENAME TO {tableName}')
+    statements.extend(str(CreateIndex(index).compile(dialect=databaseEngine.dialect)).strip()
+                      for index in sorted(table.indexes, key=lambda index: index.name))
+
+    LOGGER.info('Migrating sensor table to never reuse sensor ids...')
+    connection = databaseEngine.raw_connection()
+    try:
+        # all statements run inside one transaction, an aborted migration leaves the database untouched
+        script = ';\n'.join(['BEGIN'] + statements + ['COMMIT']) + ';'
+        try:
+            connection.driver_connection.executescript(script)
+        except Exception:
+            connection.driver_connection.rollback()
+            raise
+    finally:
+        connection.close()
+
+
+def is_rollup_backfill_required(databaseEngine: Engine) -> bool:
+    # must be checked before the tables are created: databases created before the rollups contain measurements
+    # that are not part of any rollup yet
+    inspector = inspect(databaseEngine)
+    return inspector.has_table(Models.Measurement.__tablename__) \
+        and not inspector.has_table(Models.MeasurementRollup.__tablename__)
+
+
+def backfill_rollups(databaseEngine: Engine) -> int:
+    # one transaction per sensor, measurements can still be inserted while the backfill is running
+    with Session(databaseEngine) as db:
+        sensorIds = [sensorId for sensorId, in db.query(Models.Sensor.id).order_by(Models.Sensor.id.asc())]
+
+        LOGGER.info(f'Computing rollups for {len(sensorIds)} sensors (may take a while for large databases)...')
+        for index, sensorId in enumerate(sensorIds):
+            Crud.rebuild_rollups(db, sensorId)
+            LOGGER.debug(f'Computed rollups for sensor {sensorId} ({index + 1}/{len(sensorIds)})')
+
+    LOGGER.info('Computing rollups done')
+    return len(sensorIds)
@@ -0,0 +1,140 @@
+import logging
+import time
+from typing import Dict, Tuple
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from logic import Constants
+from logic.database import Crud, Schemas
+from logic.database.ChangeTracker import ChangeTracker
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+DEFAULT_SETTINGS = {
+    # none: free pages are only reused by new data, full: VACUUM (rewrites the whole database and blocks all writes),
+    # incremental: auto_vacuum=INCREMENTAL and short incremental_vacuum steps
+    'mode': Schemas.VacuumMode.INCREMENTAL.value,
+    # no vacuum is performed as long as the free pages are less than this percentage of the database size
+    'freePageThresholdInPercent': 10,
+    'pagesPerStep': 1000,
+    'pauseBetweenStepsInMilliseconds': 100,
+    # 0 reclaims all free pages, remaining pages are reclaimed by the next cleanup
+    'maxPagesPerCleanup': 0
+}
+
+
+def get_settings(vacuumSettings: Dict) -> Dict:
+    settings = {**DEFAULT_SETTINGS, **vacuumSettings}
+
+    modes = [mode.value for mode in Schemas.VacuumMode]
+    settings['mode'] = str(settings['mode']).lower()
+    if settings['mode'] not in modes:
+        raise ValueError(f'Invalid value for settings option "mode": "{settings["mode"]}" '
+                         f'(allowed: {", ".join(modes)})')
+
+    if not 0 <= settings['freePageThresholdInPercent'] <= 100:
+        raise ValueError('"freePageThresholdInPercent" must be between 0 and 100')
+    if settings['pagesPerStep'] < 1:
+        raise ValueError('"pagesPerStep" must be positive')
+    if settings['pauseBetweenStepsInMilliseconds'] < 0:
+        raise ValueError('"pauseBetweenStepsInMilliseconds" must not be negative')
+    if settings['maxPagesPerCleanup'] < 0:
+        raise ValueError('"maxPagesPerCleanup" must not be negative')
+    return settings
+
+
+def prepare_auto_vacuum(databaseEngine: Engine, vacuumSettings: Dict):
+    # auto_vacuum can only be changed by a VACUUM once the database contains tables:
+    # new databases are set up right away, existing databases are converted by the next cleanup
+    if get_settings(vacuumSettings)['mode'] != Schemas.VacuumMode.INCREMENTAL:
+        return
+
+    connection = databaseEngine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        autoVacuum = cursor.execute('PRAGMA auto_vacuum').fetchone()[0]
+        numberOfTables = cursor.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0]
+        cursor.close()
+
+        if autoVacuum == AUTO_VACUUM_INCREMENTAL:
+            return
+
+        if numberOfTables:
+            LOGGER.info('The database will be converted to incremental vacuum by the next cleanup '
+                        '(one-time full vacuum)')
+        else:
+            connection.driver_connection.executescript('PRAGMA auto_vacuum=INCREMENTAL; VACUUM;')
+    finally:
+        connection.close()
+
+
+class DatabaseVacuum:
+    def __init__(self, vacuumSettings: Dict):
+        settings = get_settings(vacuumSettings)
+        self._mode = Schemas.VacuumMode(settings['mode'])
+        self._freePageThresholdInPercent = settings['freePageThresholdInPercent']
+        self._pagesPerStep = settings['pagesPerStep']
+        self._pauseBetweenStepsInSeconds = settings['pauseBetweenStepsInMilliseconds'] / 1000
+        self._maxPagesPerCleanup = settings['maxPagesPerCleanup']
+
+    def reclaim(self, db: Session) -> Schemas.VacuumInfo:
+        db.commit()
+        pageSize = self.__get_pragma(db, 'page_size')
+        pageCountBefore, freePagesBefore = self.__get_page_counts(db)
+
+        mode = self._mode
+        freePagesInPercent = freePagesBefore * 100 / pageCountBefore if pageCountBefore else 0
+        if mode == Schemas.VacuumMode.NONE or freePagesInPercent < self._freePageThresholdInPercent:
+            LOGGER.debug(f'Skipping database vacuum ({freePagesBefore} of {pageCountBefore} pages free)')
+            mode = Schemas.VacuumMode.NONE
+        elif mode == Schemas.VacuumMode.FULL:
+            LOGGER.debug('Performing database vacuum...')
+            self.__execute_script(db, 'VACUUM;')
+        elif self.__get_pragma(db, 'auto_vacuum') != AUTO_VACUUM_INCREMENTAL:
+            LOGGER.info('Converting database to incremental vacuum...')
+            self.__execute_script(db, 'PRAGMA auto_vacuum=INCREMENTAL; VACUUM;')
+            mode = Schemas.VacuumMode.FULL
+        else:
+            self.__vacuum_incremental(db, freePagesBefore)
+
+        pageCountAfter, freePagesAfter = self.__get_page_counts(db)
+        if pageCountAfter != pageCountBefore:
+            # changes the size of the database
+            Crud.CHANGE_TRACKER.mark_changed(ChangeTracker.MEASUREMENTS)
+
+        return Schemas.VacuumInfo(mode=mode, page_size=pageSize,
+                                  free_pages_before=freePagesBefore, free_pages_after=freePagesAfter,
+                                  reclaimed_pages=max(pageCountBefore - pageCountAfter, 0))
+
+    def __vacuum_incremental(self, db: Session, numberOfFreePages: int):
+        numberOfPages = numberOfFreePages
+        if self._maxPagesPerCleanup:
+            numberOfPages = min(numberOfPages, self._maxPagesPerCleanup)
+
+        LOGGER.debug(f'Performing incremental vacuum of {numberOfPages} pages...')
+
+        # every step is a short write transaction, requests are served in between
+        while numberOfPages > 0:
+            pagesForStep = min(numberOfPages, self._pagesPerStep)
+            self.__execute_script(db, f'PRAGMA incremental_vacuum({int(pagesForStep)});')
+            numberOfPages -= pagesForStep
+
+            if numberOfPages > 0 and self._pauseBetweenStepsInSeconds:
+                time.sleep(self._pauseBetweenStepsInSeconds)
+
+    @staticmethod
+    def __execute_script(db: Session, script: str):
+        # the sqlite3 module executes incremental_vacuum only for a single page, executescript runs it to completion
+        db.connection().connection.driver_connection.executescript(script)
+        db.commit()
+
+    @staticmethod
+    def __get_page_counts(db: Session) -> Tuple[int, int]:
+        return DatabaseVacuum.__get_pragma(db, 'page_count'), DatabaseVacuum.__get_pragma(db, 'freelist_count')
+
+    @staticmethod
+    def __get_pragma(db: Session, name: str) -> int:
+        return db.connection().exec_driver_sql(f'PRAGMA main.{name}').scalar()
@@ -0,0 +1,46 @@
+from typing import List, Sequence
+
+
+def largest_triangle_three_buckets(timestamps: Sequence[int], values: Sequence[float],
+                                   numberOfPoints: int) -> List[int]:
+    # Largest-Triangle-Three-Buckets (Sveinn Steinarsson, 2013): selects the indices of the points that preserve
+    # the visual shape of the series. The first and the last point are always kept.
+    # timestamps must be sorted ascending.
+    numberOfValues = len(timestamps)
+    if numberOfPoints >= numberOfValues or numberOfPoints < 3:
+        return list(range(numberOfValues))
+
+    # the inner points are divided into numberOfPoints - 2 buckets
+    bucketSize = (numberOfValues - 2) / (numberOfPoints - 2)
+
+    selectedIndices = [0]
+    previousIndex = 0
+    for bucketIndex in range(numberOfPoints - 2):
+        bucketStart = int(bucketIndex * bucketSize) + 1
+        bucketEnd = int((bucketIndex + 1) * bucketSize) + 1
+
+        # the third point of the triangle is the average of the next bucket
+        nextBucketStart = bucketEnd
+        nextBucketEnd = min(int((bucketIndex + 2) * bucketSize) + 1, numberOfValues)
+        numberOfNextValues = nextBucketEnd - nextBucketStart
+        averageTimestamp = sum(timestamps[nextBucketStart:nextBucketEnd]) / numberOfNextValues
+        averageValue = sum(values[nextBucketStart:nextBucketEnd]) / numberOfNextValues
+
+        previousTimestamp = timestamps[previousIndex]
+        previousValue = values[previousIndex]
+
+        maxArea = -1
+        maxAreaIndex = bucketStart
+        for index in range(bucketStart, bucketEnd):
+            # twice the triangle area, the factor does not change the maximum
+            area = abs((previousTimestamp - averageTimestamp) * (values[index] - previousValue)
+                       - (previousTimestamp - timestamps[index]) * (averageValue - previousValue))
+            if area > maxArea:
+                maxArea = area
+                maxAreaIndex = index
+
+        selectedIndices.append(maxAreaIndex)
+        previousIndex = maxAreaIndex
+
+    selectedIndices.append(numberOfValues - 1)
+    return selectedIndices
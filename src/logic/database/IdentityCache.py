@@ -0,0 +1,65 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+from logic.database import Schemas
+
+
+class IdentityCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sensorIdsByName: Dict[Tuple[str, str], int] = {}
+        self._sensorExistence: Dict[int, bool] = {}
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    # values read from the database are only stored if no invalidation happened since the read started
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get_sensor_id(self, deviceName: str, sensorName: str) -> Optional[int]:
+        with self._lock:
+            sensorId = self._sensorIdsByName.get((deviceName, sensorName))
+            self.__count(sensorId is not None)
+            return sensorId
+
+    def put_sensor_ids(self, sensorIds: Dict[Tuple[str, str], int], generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            self._sensorIdsByName.update(sensorIds)
+            for sensorId in sensorIds.values():
+                self._sensorExistence[sensorId] = True
+
+    def get_sensor_existence(self, sensorId: int) -> Optional[bool]:
+        with self._lock:
+            exists = self._sensorExistence.get(sensorId)
+            self.__count(exists is not None)
+            return exists
+
+    def put_sensor_existence(self, sensorId: int, exists: bool, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            self._sensorExistence[sensorId] = exists
+
+    def invalidate(self):
+        with self._lock:
+            self._sensorIdsByName.clear()
+            self._sensorExistence.clear()
+            self._generation += 1
+
+    def get_statistics(self) -> Schemas.CacheStatistics:
+        with self._lock:
+            return Schemas.CacheStatistics(hits=self._hits,
+                                           misses=self._misses,
+                                           size=len(self._sensorIdsByName) + len(self._sensorExistence))
+
+    def __count(self, isHit: bool):
+        if isHit:
+            self._hits += 1
+        else:
+            self._misses += 1
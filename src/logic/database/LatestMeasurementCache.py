@@ -0,0 +1,90 @@
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from logic.database import MeasurementFormat, Schemas
+
+# key of a cached sensor: (timestamp, id) of the latest measurement or None if the sensor has no measurements
+Entry = Tuple[Optional[Tuple[int, int]], Optional[Schemas.Measurement]]
+
+
+class LatestMeasurementCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Entry] = {}
+        self._versions: Dict[int, int] = {}
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    # values read from the database are only stored if no write for the sensor happened since the read started
+    def get_version(self, sensorId: int) -> Tuple[int, int]:
+        with self._lock:
+            return self._generation, self._versions.get(sensorId, 0)
+
+    def get(self, sensorId: int) -> Tuple[bool, Optional[Schemas.Measurement]]:
+        with self._lock:
+            entry = self._entries.get(sensorId)
+            self.__count(entry is not None)
+            if entry is None:
+                return False, None
+            return True, entry[1]
+
+    def put(self, sensorId: int, measurement: Optional[Schemas.Measurement], version: Tuple[int, int]):
+        with self._lock:
+            if version != (self._generation, self._versions.get(sensorId, 0)):
+                return
+
+            self._entries[sensorId] = (self.__get_key(measurement), measurement)
+
+    def offer(self, measurement: Schemas.Measurement):
+        # a created or updated measurement, replaces the cached one if it is at least as recent
+        with self._lock:
+            self.__increment_version(measurement.sensor_id)
+
+            entry = self._entries.get(measurement.sensor_id)
+            if entry is None:
+                # unknown if the measurement is the latest one, the next read fetches it from the database
+                return
+
+            key = self.__get_key(measurement)
+            if entry[0] is None or key >= entry[0]:
+                self._entries[measurement.sensor_id] = (key, measurement)
+
+    def remove_measurement(self, sensorId: int, measurementId: int):
+        with self._lock:
+            self.__increment_version(sensorId)
+
+            entry = self._entries.get(sensorId)
+            if entry is not None and entry[1] is not None and entry[1].id == measurementId:
+                del self._entries[sensorId]
+
+    def invalidate_sensors(self, sensorIds: Iterable[int]):
+        with self._lock:
+            for sensorId in sensorIds:
+                self.__increment_version(sensorId)
+                self._entries.pop(sensorId, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._generation += 1
+
+    def get_statistics(self) -> Schemas.CacheStatistics:
+        with self._lock:
+            return Schemas.CacheStatistics(hits=self._hits, misses=self._misses, size=len(self._entries))
+
+    def __increment_version(self, sensorId: int):
+        self._versions[sensorId] = self._versions.get(sensorId, 0) + 1
+
+    @staticmethod
+    def __get_key(measurement: Optional[Schemas.Measurement]) -> Optional[Tuple[int, int]]:
+        if measurement is None:
+            return None
+        return MeasurementFormat.to_epoch_seconds(measurement.timestamp), measurement.id
+
+    def __count(self, isHit: bool):
+        if isHit:
+            self._hits += 1
+        else:
+            self._misses += 1
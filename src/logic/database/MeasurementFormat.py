@@ -0,0 +1,53 @@
+import math
+from datetime import datetime, timedelta
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+EPOCH = datetime(year=1970, month=1, day=1)
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+# Timestamps are stored as seconds since epoch.
+# The date time strings of the api carry no time zone, therefore they are treated as UTC to allow a lossless round trip.
+
+def datetime_to_epoch_seconds(dateTime: datetime) -> int:
+    return (dateTime - EPOCH) // timedelta(seconds=1)
+
+
+def to_epoch_seconds(dateTime: str) -> int:
+    return datetime_to_epoch_seconds(datetime.strptime(dateTime, DATE_FORMAT))
+
+
+def range_bound_to_epoch_seconds(dateTime: str) -> int:
+    # range bounds may also be specified without time ('2021-01-16')
+    return datetime_to_epoch_seconds(datetime.fromisoformat(dateTime))
+
+
+def to_datetime(epochSeconds: int) -> datetime:
+    return EPOCH + timedelta(seconds=epochSeconds)
+
+
+def to_date_time_string(epochSeconds: int) -> str:
+    return to_datetime(epochSeconds).strftime(DATE_FORMAT)
+
+
+def parse_value(value: str) -> float:
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f'Value "{value}" is not a finite number')
+    return number
+
+
+# integral values below this limit are formatted without decimal point and exponent
+MAX_INTEGER_VALUE = 10 ** 16
+
+
+def format_value(value) -> str:
+    # the shortest string that is parsed to the same number, e.g. '20.5', '18' (stored from '18.0') or '1e+20'
+    # the string sent by the client is not stored, equal numbers are always returned as the same string
+    # values of databases created before the numeric storage may still contain non-numeric strings
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < MAX_INTEGER_VALUE:
+            return str(int(value))
+        return repr(value)
+    return str(value)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, String, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from logic.database.Database import Base
@@ -15,22 +15,80 @@ class Device(Base):
 
 class Sensor(Base):
     __tablename__ = 'sensor'
+    # ids of deleted sensors are never reused, measurements of a deleted sensor can never show up for a new one
+    __table_args__ = {'sqlite_autoincrement': True}
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, index=True, nullable=False)
     type = Column(String, index=True, nullable=False)
-    device_id = Column(Integer, ForeignKey('device.id'))
+    device_id = Column(Integer, ForeignKey('device.id'), index=True)
 
     device = relationship('Device', back_populates='sensors')
     measurements = relationship('Measurement', back_populates='sensor', cascade='all,delete')
+    retention_progress = relationship('RetentionProgress', back_populates='sensor', cascade='all,delete')
+    rollups = relationship('MeasurementRollup', back_populates='sensor', cascade='all,delete')
 
 
 class Measurement(Base):
     __tablename__ = 'measurement'
+    # covering index: range queries for a sensor are answered without touching the table
+    # id is part of the index to order equal timestamps without sorting (keyset pagination, cleanup)
+    __table_args__ = (Index('ix_measurement_sensor_id_timestamp_id_value', 'sensor_id', 'timestamp', 'id', 'value'),)
 
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    timestamp = Column(String, index=True, nullable=False)
-    value = Column(String, index=True, nullable=False)
+    # no separate index, the primary key is the rowid of sqlite
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # seconds since epoch, see MeasurementFormat
+    timestamp = Column(Integer, index=True, nullable=False)
+    value = Column(Float, nullable=False)
     sensor_id = Column(Integer, ForeignKey('sensor.id'))
 
     sensor = relationship('Sensor', back_populates='measurements')
+
+
+class MeasurementRollup(Base):
+    __tablename__ = 'measurement_rollup'
+    # without rowid: rows are stored in primary key order, the rollups of a sensor are read without a separate index
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    sensor_id = Column(Integer, ForeignKey('sensor.id'), primary_key=True)
+    # bucket width in seconds, see Rollups.RESOLUTIONS
+    resolution = Column(Integer, primary_key=True)
+    # start of the bucket in seconds since epoch
+    bucket = Column(Integer, primary_key=True)
+    # min, max, sum, count, first and last only consider numeric values
+    min = Column(Float)
+    max = Column(Float)
+    sum = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False)
+    number_of_non_numeric_values = Column(Integer, nullable=False)
+    first_timestamp = Column(Integer)
+    first_value = Column(Float)
+    last_timestamp = Column(Integer)
+    last_value = Column(Float)
+
+    sensor = relationship('Sensor', back_populates='rollups')
+
+
+class MeasurementPartition(Base):
+    # archived months of measurements, each stored in its own table, see Partitions
+    __tablename__ = 'measurement_partition'
+
+    name = Column(String, primary_key=True)
+    # range of the month in seconds since epoch (start inclusive, end exclusive)
+    start_timestamp = Column(Integer, unique=True, nullable=False)
+    end_timestamp = Column(Integer, nullable=False)
+    # None as long as the partition was not thinned out by a retention policy
+    measurements_per_day = Column(Integer)
+
+
+class RetentionProgress(Base):
+    __tablename__ = 'retention_progress'
+    __table_args__ = (UniqueConstraint('sensor_id', 'measurements_per_day', 'age_in_days'),)
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    sensor_id = Column(Integer, ForeignKey('sensor.id'), nullable=False)
+    measurements_per_day = Column(Integer, nullable=False)
+    age_in_days = Column(Integer, nullable=False)
+    last_enforced_date = Column(String, nullable=False)
+
+    sensor = relationship('Sensor', back_populates='retention_progress')
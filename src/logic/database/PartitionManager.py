@@ -0,0 +1,188 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from logic import Constants
+from logic.database import Crud, MeasurementFormat, Models, Partitions
+from logic.database.ChangeTracker import ChangeTracker
+from logic.database.DatabaseCleaner import DatabaseCleaner
+from logic.database.RetentionPolicy import RetentionPolicy
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+class PartitionManager:
+    # moves the measurements of completed months into partitions and enforces the retention on whole partitions
+    # every step commits on its own, an aborted run is continued by the next one
+
+    COPY_BATCH_SIZE = 500
+
+    def __init__(self, partitioningSettings: Dict, retentionPolicies: List[RetentionPolicy]):
+        settings = Partitions.get_settings(partitioningSettings)
+        self._archiveAfterMonths = settings['archiveAfterMonths']
+        self._retentionInMonths = settings['retentionInMonths']
+        self._policies = retentionPolicies
+
+    def maintain(self, db: Session, currentDate: date):
+        LOGGER.info('Performing partition maintenance...')
+
+        self.archive(db, currentDate)
+
+        isChanged = self.drop_expired_partitions(db, currentDate)
+        isChanged = self.downsample_partitions(db, currentDate) or isChanged
+        if isChanged:
+            Crud.LATEST_MEASUREMENT_CACHE.invalidate()
+            Crud.CHANGE_TRACKER.mark_changed(ChangeTracker.MEASUREMENTS)
+
+        LOGGER.info('Partition maintenance done')
+
+    def archive(self, db: Session, currentDate: date):
+        archiveEnd = Partitions.add_months(Partitions.get_month_start(currentDate), -self._archiveAfterMonths)
+        archiveEndTimestamp = Partitions.get_month_range(archiveEnd)[0]
+
+        months = self.__get_months_to_archive(db, archiveEndTimestamp)
+
+        # all partitions are created before any measurement is moved, so read connections checked out afterwards
+        # already include them. The partition of the next month to archive is created in advance for the same reason.
+        partitionsByName = {partition.name: partition for partition in Partitions.get_partitions(db)}
+        for monthStart in months + [archiveEnd]:
+            if Partitions.get_partition_name(monthStart) not in partitionsByName:
+                partition = Partitions.create_partition(db, monthStart)
+                partitionsByName[partition.name] = partition
+
+        if not months:
+            return
+
+        # the measurement with the highest id is never moved: sqlite assigns the next id based on the highest id of
+        # the table, moving it could lead to an id that is already used by an archived measurement
+        maxId = db.query(func.max(Models.Measurement.id)).scalar()
+        sensorIds = [sensorId for sensorId, in db.query(Models.Sensor.id).order_by(Models.Sensor.id.asc())]
+
+        for monthStart in months:
+            partition = partitionsByName[Partitions.get_partition_name(monthStart)]
+            LOGGER.debug(f'Archiving measurements of {monthStart.strftime("%Y-%m")} to {partition.name}...')
+            for sensorId in sensorIds:
+                self.__move_measurements(db, partition, sensorId, maxId)
+
+    @staticmethod
+    def __get_months_to_archive(db: Session, archiveEndTimestamp: int) -> List[date]:
+        firstTimestamp = db.query(func.min(Models.Measurement.timestamp)).scalar()
+        if firstTimestamp is None or firstTimestamp >= archiveEndTimestamp:
+            return []
+
+        months = []
+        monthStart = Partitions.get_month_start(MeasurementFormat.to_datetime(firstTimestamp).date())
+        while Partitions.get_month_range(monthStart)[0] < archiveEndTimestamp:
+            startTimestamp, endTimestamp = Partitions.get_month_range(monthStart)
+            hasMeasurements = db.query(Models.Measurement.id) \
+                .filter(Models.Measurement.timestamp >= startTimestamp) \
+                .filter(Models.Measurement.timestamp < endTimestamp) \
+                .first() is not None
+            if hasMeasurements:
+                months.append(monthStart)
+            monthStart = Partitions.add_months(monthStart, 1)
+        return months
+
+    @staticmethod
+    def __move_measurements(db: Session, partition: Models.MeasurementPartition, sensorId: int, maxId: int):
+        # one transaction per sensor and month keeps the write lock short
+        measurement = Models.Measurement.__table__
+        condition = (measurement.c.sensor_id == sensorId) \
+            & (measurement.c.timestamp >= partition.start_timestamp) \
+            & (measurement.c.timestamp < partition.end_timestamp) \
+            & (measurement.c.id < maxId)
+
+        columns = [measurement.c.id, measurement.c.timestamp, measurement.c.value, measurement.c.sensor_id]
+        partitionTable = Partitions.get_partition_table(partition.name)
+        db.execute(insert(partitionTable).from_select([column.name for column in columns],
+                                                      select(*columns).where(condition)))
+        numberOfMovedMeasurements = db.execute(delete(measurement).where(condition)).rowcount
+        if numberOfMovedMeasurements and partition.measurements_per_day is not None:
+            # late measurements of an already thinned out partition, the retention has to be enforced again
+            partition.measurements_per_day = None
+        db.commit()
+
+    def drop_expired_partitions(self, db: Session, currentDate: date) -> bool:
+        if not self._retentionInMonths:
+            return False
+
+        retentionStart = Partitions.add_months(Partitions.get_month_start(currentDate), -self._retentionInMonths)
+        expiredPartitions = Partitions.get_partitions(db, endTimestamp=Partitions.get_month_range(retentionStart)[0])
+        for partition in expiredPartitions:
+            LOGGER.debug(f'Dropping expired partition {partition.name}')
+            Partitions.drop_partition(db, partition)
+
+        return bool(expiredPartitions)
+
+    def downsample_partitions(self, db: Session, currentDate: date) -> bool:
+        isChanged = False
+        for partition in Partitions.get_partitions(db):
+            policy = self.__get_policy(partition, currentDate)
+            if policy is None:
+                continue
+
+            if partition.measurements_per_day is None \
+                    or policy.numberOfMeasurementsPerDay < partition.measurements_per_day:
+                self.__downsample_partition(db, partition, policy)
+                isChanged = True
+
+        return isChanged
+
+    def __get_policy(self, partition: Models.MeasurementPartition, currentDate: date) -> Optional[RetentionPolicy]:
+        # the policy keeping the fewest measurements among the ones covering the whole month
+        lastDate = MeasurementFormat.to_datetime(partition.end_timestamp).date() - timedelta(days=1)
+        policies = [policy for policy in self._policies
+                    if lastDate <= currentDate - timedelta(days=policy.ageInDays)]
+        return min(policies, key=lambda policy: policy.numberOfMeasurementsPerDay, default=None)
+
+    def __downsample_partition(self, db: Session, partition: Models.MeasurementPartition, policy: RetentionPolicy):
+        # the kept measurements are copied into a new table that replaces the partition
+        # this frees the pages of the old table at once, a vacuum of the whole database is not required
+        LOGGER.debug(f'Enforcing retention policy {policy} for partition {partition.name}')
+
+        partitionTable = Partitions.get_partition_table(partition.name)
+        newTable = Partitions.get_partition_table(f'{partition.name}_new', isIndexed=False)
+        db.execute(text(f'DROP TABLE IF EXISTS "{newTable.name}"'))
+        newTable.create(bind=db.connection())
+        db.commit()
+
+        sensorIds = [sensorId for sensorId, in db.query(partitionTable.c.sensor_id).distinct()]
+        for sensorId in sensorIds:
+            rows = db.execute(select(partitionTable.c.id, partitionTable.c.timestamp)
+                              .where(partitionTable.c.sensor_id == sensorId)
+                              .order_by(partitionTable.c.timestamp.asc(), partitionTable.c.id.asc())).all()
+            idsToDelete = set(DatabaseCleaner._collect_ids_to_delete(rows, policy))
+            idsToKeep = [row[0] for row in rows if row[0] not in idsToDelete]
+
+            for index in range(0, len(idsToKeep), self.COPY_BATCH_SIZE):
+                batch = idsToKeep[index:index + self.COPY_BATCH_SIZE]
+                db.execute(insert(newTable).from_select([column.name for column in partitionTable.columns],
+                                                        select(*partitionTable.columns)
+                                                        .where(partitionTable.c.id.in_(batch))))
+            db.commit()
+
+        # the driver commits every DDL statement on its own, an explicit transaction is required
+        # read connections must see either the old or the new table with all of its indexes
+        dialect = db.get_bind().dialect
+        statements = [f'DROP TABLE "{partition.name}"',
+                      f'ALTER TABLE "{newTable.name}" RENAME TO "{partition.name}"']
+        statements.extend(str(CreateIndex(index).compile(dialect=dialect)).strip()
+                          for index in sorted(partitionTable.indexes, key=lambda index: index.name))
+        statements.append(f'UPDATE {Models.MeasurementPartition.__tablename__} '
+                          f'SET measurements_per_day = {int(policy.numberOfMeasurementsPerDay)} '
+                          f'WHERE name = \'{partition.name}\'')
+        script = ';\n'.join(['BEGIN IMMEDIATE'] + statements + ['COMMIT']) + ';'
+
+        driverConnection = db.connection().connection.driver_connection
+        try:
+            driverConnection.executescript(script)
+        except Exception:
+            driverConnection.rollback()
+            raise
+        finally:
+            db.commit()
+            db.expire(partition)
@@ -0,0 +1,125 @@
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Float, Index, Integer, MetaData, Table, func, select, text, union_all
+from sqlalchemy.orm import Session, aliased
+
+from logic.database import MeasurementFormat, Models
+
+# Optional partitioned storage: measurements of completed months are moved from the measurement table into one table
+# per month (e.g. measurement_p202101). Retention drops or rewrites whole partitions instead of deleting rows.
+# Archived measurements are read-only: they can still be read, but not updated or deleted individually.
+
+DEFAULT_SETTINGS = {
+    'enable': False,
+    # months are archived once this number of further months has been completed
+    'archiveAfterMonths': 1,
+    # partitions older than this number of months are dropped, 0 keeps all partitions
+    'retentionInMonths': 0
+}
+
+PARTITION_PREFIX = 'measurement_p'
+
+
+def get_settings(partitioningSettings: Dict) -> Dict:
+    settings = {**DEFAULT_SETTINGS, **partitioningSettings}
+    if settings['archiveAfterMonths'] < 0:
+        raise ValueError('"archiveAfterMonths" must not be negative')
+    if settings['retentionInMonths'] < 0:
+        raise ValueError('"retentionInMonths" must not be negative')
+    if settings['retentionInMonths'] and settings['retentionInMonths'] <= settings['archiveAfterMonths']:
+        raise ValueError('"retentionInMonths" must be larger than "archiveAfterMonths"')
+    return settings
+
+
+def get_month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(monthStart: date, numberOfMonths: int) -> date:
+    monthIndex = monthStart.year * 12 + monthStart.month - 1 + numberOfMonths
+    return date(monthIndex // 12, monthIndex % 12 + 1, 1)
+
+
+def get_month_range(monthStart: date) -> Tuple[int, int]:
+    monthEnd = add_months(monthStart, 1)
+    return (MeasurementFormat.datetime_to_epoch_seconds(datetime(monthStart.year, monthStart.month, 1)),
+            MeasurementFormat.datetime_to_epoch_seconds(datetime(monthEnd.year, monthEnd.month, 1)))
+
+
+def get_partition_name(monthStart: date) -> str:
+    return f'{PARTITION_PREFIX}{monthStart.year:04d}{monthStart.month:02d}'
+
+
+def get_partition_table(name: str, isIndexed: bool = True) -> Table:
+    # same columns and indexes as the measurement table, ids are kept when moving measurements
+    table = Table(name, MetaData(),
+                  Column('id', Integer, primary_key=True),
+                  Column('timestamp', Integer, nullable=False),
+                  Column('value', Float, nullable=False),
+                  Column('sensor_id', Integer))
+    if isIndexed:
+        Index(f'ix_{name}_sensor_id_timestamp_id_value', table.c.sensor_id, table.c.timestamp, table.c.id,
+              table.c.value)
+        Index(f'ix_{name}_timestamp', table.c.timestamp)
+    return table
+
+
+def get_partitions(db: Session, startTimestamp: Optional[int] = None,
+                   endTimestamp: Optional[int] = None) -> List[Models.MeasurementPartition]:
+    # partitions overlapping [startTimestamp, endTimestamp), ordered by time
+    query = db.query(Models.MeasurementPartition)
+    if startTimestamp is not None:
+        query = query.filter(Models.MeasurementPartition.end_timestamp > startTimestamp)
+    if endTimestamp is not None:
+        query = query.filter(Models.MeasurementPartition.start_timestamp < endTimestamp)
+    return query.order_by(Models.MeasurementPartition.start_timestamp.asc()).all()
+
+
+def create_partition(db: Session, monthStart: date) -> Models.MeasurementPartition:
+    name = get_partition_name(monthStart)
+    startTimestamp, endTimestamp = get_month_range(monthStart)
+
+    get_partition_table(name).create(bind=db.connection(), checkfirst=True)
+    partition = Models.MeasurementPartition(name=name, start_timestamp=startTimestamp, end_timestamp=endTimestamp)
+    db.add(partition)
+    db.commit()
+    return partition
+
+
+def drop_partition(db: Session, partition: Models.MeasurementPartition):
+    db.execute(text(f'DROP TABLE IF EXISTS "{partition.name}"'))
+    db.delete(partition)
+    db.commit()
+
+
+def get_measurement_source(db: Session, startTimestamp: Optional[int] = None, endTimestamp: Optional[int] = None):
+    # entity for queries of write sessions that need the archived measurements as well, e.g. recomputing rollups
+    # (read sessions see them through the view of Database.install_measurement_view)
+    partitions = get_partitions(db, startTimestamp, endTimestamp)
+    if not partitions:
+        return Models.Measurement
+
+    mainTable = Models.Measurement.__table__
+    selects = [select(mainTable.c.id, mainTable.c.timestamp, mainTable.c.value, mainTable.c.sensor_id)]
+    for partition in partitions:
+        partitionTable = get_partition_table(partition.name)
+        selects.append(select(partitionTable.c.id, partitionTable.c.timestamp,
+                              partitionTable.c.value, partitionTable.c.sensor_id))
+    return aliased(Models.Measurement, union_all(*selects).subquery('measurements_with_partitions'))
+
+
+def delete_measurements_of_sensors(db: Session, sensorIds: List[int]):
+    # no commit here, the measurements of deleted sensors are removed together with the sensors
+    for partition in get_partitions(db):
+        partitionTable = get_partition_table(partition.name)
+        db.execute(partitionTable.delete().where(partitionTable.c.sensor_id.in_(sensorIds)))
+
+
+def count_measurements(db: Session) -> int:
+    # schema qualified: on read connections "measurement" is the view including the partitions
+    numberOfMeasurements = db.execute(text('SELECT COUNT(*) FROM main.measurement')).scalar()
+    for partition in get_partitions(db):
+        partitionTable = get_partition_table(partition.name)
+        numberOfMeasurements += db.execute(select(func.count()).select_from(partitionTable)).scalar()
+    return numberOfMeasurements
@@ -0,0 +1,163 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Rollups store min, max, sum, count, first and last value of the numeric measurements per sensor and bucket.
+# They are maintained on every insert and allow aggregations over long date ranges without reading the raw measurements.
+
+SECONDS_PER_HOUR = 60 * 60
+SECONDS_PER_DAY = 24 * SECONDS_PER_HOUR
+
+# bucket widths in seconds, coarsest first, buckets are aligned to epoch (UTC)
+RESOLUTIONS = (SECONDS_PER_DAY, SECONDS_PER_HOUR)
+
+# part of a date range (start inclusive, end exclusive) and the resolution of the rollups answering it
+# None: the part is not aligned to any resolution and has to be answered by the raw measurements
+Piece = Tuple[Optional[int], int, int]
+
+
+class Aggregate:
+    # aggregate of a sensor and bucket combined from rollups and raw measurements
+    # parts have to be added in chronological order
+    def __init__(self, sensorId: int, bucket: int):
+        self.sensor_id = sensorId
+        self.bucket = bucket
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+        self.count = 0
+        self.number_of_non_numeric_values = 0
+        self.first = None
+        self.last = None
+
+    @property
+    def avg(self) -> Optional[float]:
+        if not self.count:
+            return None
+        return self.sum / self.count
+
+    def add(self, minimum: Optional[float], maximum: Optional[float], total: float, count: int,
+            numberOfNonNumericValues: int, first: Optional[float], last: Optional[float]):
+        self.number_of_non_numeric_values += numberOfNonNumericValues
+        if not count:
+            return
+
+        if not self.count:
+            self.min = minimum
+            self.max = maximum
+            self.first = first
+        else:
+            self.min = min(self.min, minimum)
+            self.max = max(self.max, maximum)
+
+        self.sum += total
+        self.count += count
+        self.last = last
+
+
+def get_bucket(timestamp: int, resolution: int) -> int:
+    return timestamp // resolution * resolution
+
+
+def split_range(startTimestamp: int, endTimestamp: int, resolutions: Sequence[int]) -> List[Piece]:
+    # splits [startTimestamp, endTimestamp) into chronologically ordered pieces:
+    # the aligned interior is answered by the coarsest resolution, the edges by finer resolutions or raw measurements
+    if startTimestamp >= endTimestamp:
+        return []
+
+    if not resolutions:
+        return [(None, startTimestamp, endTimestamp)]
+
+    resolution = resolutions[0]
+    alignedStart = -get_bucket(-startTimestamp, resolution)
+    alignedEnd = get_bucket(endTimestamp, resolution)
+    if alignedStart >= alignedEnd:
+        return split_range(startTimestamp, endTimestamp, resolutions[1:])
+
+    return split_range(startTimestamp, alignedStart, resolutions[1:]) \
+        + [(resolution, alignedStart, alignedEnd)] \
+        + split_range(alignedEnd, endTimestamp, resolutions[1:])
+
+
+def aggregate_measurements(rows: Iterable[Dict]) -> List[Dict]:
+    # rollup rows of new measurements, merged into the existing rollups with an upsert
+    # rows must be in insertion order: on equal timestamps the first value is the earliest inserted one
+    # and the last value the latest inserted one, same as for the raw measurements
+    rollups: Dict[Tuple[int, int, int], Dict] = {}
+    for row in rows:
+        sensorId, timestamp, value = row['sensor_id'], row['timestamp'], row['value']
+        for resolution in RESOLUTIONS:
+            bucket = get_bucket(timestamp, resolution)
+            rollup = rollups.get((sensorId, resolution, bucket))
+            if rollup is None:
+                rollups[(sensorId, resolution, bucket)] = {'sensor_id': sensorId,
+                                                           'resolution': resolution,
+                                                           'bucket': bucket,
+                                                           'min': value,
+                                                           'max': value,
+                                                           'sum': value,
+                                                           'count': 1,
+                                                           'number_of_non_numeric_values': 0,
+                                                           'first_timestamp': timestamp,
+                                                           'first_value': value,
+                                                           'last_timestamp': timestamp,
+                                                           'last_value': value}
+                continue
+
+            rollup['min'] = min(rollup['min'], value)
+            rollup['max'] = max(rollup['max'], value)
+            rollup['sum'] += value
+            rollup['count'] += 1
+            if timestamp < rollup['first_timestamp']:
+                rollup['first_timestamp'] = timestamp
+                rollup['first_value'] = value
+            if timestamp >= rollup['last_timestamp']:
+                rollup['last_timestamp'] = timestamp
+                rollup['last_value'] = value
+
+    return list(rollups.values())
+
+
+def correct_rollup(rollup: Dict, recomputed: Optional[Dict], timestamp: int, oldValue,
+                   newValue: Optional[float]) -> Optional[Dict]:
+    # rollup of a bucket after one of its measurements was updated (newValue) or deleted (newValue None)
+    # rollup: the rollup before the change, recomputed: the rollup of the raw measurements left after the change
+    # the recomputed rollup is exact as long as the raw measurements of the bucket are complete, buckets thinned out
+    # by the database cleanup keep their aggregates and are only corrected by the change:
+    # sum and count exactly, min, max, first and last are replaced by the remaining measurements if the changed one
+    # defined them (the best value still known)
+    isOldNumeric = isinstance(oldValue, (int, float))
+    isNewNumeric = newValue is not None
+
+    corrected = dict(rollup)
+    corrected['sum'] += (newValue if isNewNumeric else 0.0) - (oldValue if isOldNumeric else 0.0)
+    corrected['count'] += int(isNewNumeric) - int(isOldNumeric)
+    corrected['number_of_non_numeric_values'] -= int(not isOldNumeric)
+
+    if recomputed is None:
+        isComplete = not corrected['count'] and not corrected['number_of_non_numeric_values']
+    else:
+        isComplete = (recomputed['count'], recomputed['number_of_non_numeric_values']) \
+                     == (corrected['count'], corrected['number_of_non_numeric_values'])
+    if isComplete:
+        return recomputed
+
+    if not corrected['count']:
+        corrected.update({'min': None, 'max': None, 'sum': 0.0, 'first_timestamp': None, 'first_value': None,
+                          'last_timestamp': None, 'last_value': None})
+        return corrected
+
+    recomputed = recomputed or {}
+    for key, extreme in (('min', min), ('max', max)):
+        if rollup[key] is None or (isOldNumeric and oldValue == rollup[key]):
+            if recomputed.get(key) is not None:
+                corrected[key] = recomputed[key]
+        elif isNewNumeric:
+            corrected[key] = extreme(rollup[key], newValue)
+
+    for prefix in ('first', 'last'):
+        timestampKey, valueKey = f'{prefix}_timestamp', f'{prefix}_value'
+        isDefinedByChange = rollup[timestampKey] is None or rollup[timestampKey] == timestamp
+        if isDefinedByChange and recomputed.get(timestampKey) is not None:
+            corrected[timestampKey] = recomputed[timestampKey]
+            corrected[valueKey] = recomputed[valueKey]
+
+    return corrected
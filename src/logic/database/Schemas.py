@@ -1,8 +1,25 @@
 from datetime import datetime
 from enum import Enum
-from typing import List
+from typing import Annotated, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import AfterValidator, BaseModel, Field, field_validator
+
+from logic.database import MeasurementFormat
+
+
+def validate_numeric_value(value: str) -> str:
+    MeasurementFormat.parse_value(value)
+    return value
+
+
+def validate_date_time(dateTime: str | None) -> str | None:
+    if dateTime is not None:
+        MeasurementFormat.to_epoch_seconds(dateTime)
+    return dateTime
+
+
+NumericValue = Annotated[str, Field(..., min_length=1), AfterValidator(validate_numeric_value)]
+DateTime = Annotated[str | None, AfterValidator(validate_date_time)]
 
 
 # ===== special =====
@@ -43,6 +60,53 @@ class DatabaseCleanupStatus(str, Enum):
     UNDEFINED = 'UNDEFINED'
     RUNNING = 'RUNNING'
     FINISHED = 'FINISHED'
+    # stopped early, the next cleanup continues where this one stopped
+    CANCELLED = 'CANCELLED'
+    TIME_LIMIT_REACHED = 'TIME_LIMIT_REACHED'
+
+
+class VacuumMode(str, Enum):
+    NONE = 'none'
+    FULL = 'full'
+    INCREMENTAL = 'incremental'
+
+
+class VacuumInfo(BaseModel):
+    mode: VacuumMode
+    page_size: int
+    free_pages_before: int
+    free_pages_after: int
+    reclaimed_pages: int
+
+
+class ExportFormat(str, Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
+class CleanupProgress(BaseModel):
+    status: DatabaseCleanupStatus
+    number_of_sensors: int
+    number_of_processed_sensors: int
+    number_of_processed_days: int
+    number_of_deleted_measurements: int
+    elapsed_time_in_seconds: float
+    deleted_measurements_per_second: float
+    estimated_remaining_time_in_seconds: Optional[float] = None
+
+    class Config:
+        json_schema_extra = {
+            'example': {
+                'status': 'RUNNING',
+                'number_of_sensors': 40,
+                'number_of_processed_sensors': 10,
+                'number_of_processed_days': 300,
+                'number_of_deleted_measurements': 120000,
+                'elapsed_time_in_seconds': 30.0,
+                'deleted_measurements_per_second': 4000.0,
+                'estimated_remaining_time_in_seconds': 90.0
+            }
+        }
 
 
 class DatabaseCleanupInfo(BaseModel):
@@ -50,15 +114,175 @@ class DatabaseCleanupInfo(BaseModel):
     before: DatabaseInfo = None
     after: DatabaseInfo = None
     difference: DatabaseInfo = None
+    vacuum: VacuumInfo = None
+    progress: CleanupProgress = None
     startTime: datetime
     endTime: datetime
 
 
+class CacheStatistics(BaseModel):
+    hits: int
+    misses: int
+    size: int
+
+
+class WriteBehindStatistics(BaseModel):
+    enabled: bool
+    queue_size: int
+    max_queue_size: int
+    number_of_group_commits: int
+    number_of_written_measurements: int
+    number_of_rejected_requests: int
+
+
+class LiveStreamStatistics(BaseModel):
+    number_of_subscribers: int
+    max_subscribers: int
+    number_of_published_measurements: int
+    number_of_dropped_subscribers: int
+
+
+class DatabaseExecutorStatistics(BaseModel):
+    max_workers: int
+    running_tasks: int
+    queued_tasks: int
+    completed_tasks: int
+
+
+class BackupStatistics(BaseModel):
+    enabled: bool
+    is_backup_pending: bool
+    is_backup_running: bool
+    number_of_modifications: int
+    number_of_backups: int
+    number_of_incremental_backups: int
+    number_of_failed_backups: int
+    last_backup_time: Optional[datetime] = None
+    last_duration_in_seconds: float
+    total_duration_in_seconds: float
+    last_uploaded_bytes: int
+    total_uploaded_bytes: int
+
+
+class Metrics(BaseModel):
+    identity_cache: CacheStatistics
+    latest_measurement_cache: CacheStatistics
+    write_behind: WriteBehindStatistics
+    database_executor: DatabaseExecutorStatistics
+    live_stream: LiveStreamStatistics
+    backup: BackupStatistics
+
+    class Config:
+        json_schema_extra = {
+            'example': {
+                'identity_cache': {
+                    'hits': 1500,
+                    'misses': 12,
+                    'size': 20
+                },
+                'latest_measurement_cache': {
+                    'hits': 86400,
+                    'misses': 150,
+                    'size': 15
+                },
+                'write_behind': {
+                    'enabled': True,
+                    'queue_size': 3,
+                    'max_queue_size': 10000,
+                    'number_of_group_commits': 120,
+                    'number_of_written_measurements': 4800,
+                    'number_of_rejected_requests': 0
+                },
+                'database_executor': {
+                    'max_workers': 4,
+                    'running_tasks': 2,
+                    'queued_tasks': 0,
+                    'completed_tasks': 51234
+                },
+                'live_stream': {
+                    'number_of_subscribers': 12,
+                    'max_subscribers': 100,
+                    'number_of_published_measurements': 4800,
+                    'number_of_dropped_subscribers': 1
+                },
+                'backup': {
+                    'enabled': True,
+                    'is_backup_pending': False,
+                    'is_backup_running': False,
+                    'number_of_modifications': 12,
+                    'number_of_backups': 25,
+                    'number_of_incremental_backups': 22,
+                    'number_of_failed_backups': 0,
+                    'last_backup_time': '2021-01-16 18:22:02',
+                    'last_duration_in_seconds': 0.8,
+                    'total_duration_in_seconds': 31.5,
+                    'last_uploaded_bytes': 65536,
+                    'total_uploaded_bytes': 10485760
+                }
+            }
+        }
+
+
 class MinMax(BaseModel):
     min: float = None
     max: float = None
 
 
+class SensorStatistics(BaseModel):
+    sensor_id: int
+    min: float = None
+    max: float = None
+    avg: float = None
+    count: int = 0
+    number_of_non_numeric_values: int = 0
+
+    class Config:
+        from_attributes = True
+        json_schema_extra = {
+            'example': {
+                'sensor_id': 1,
+                'min': 18.2,
+                'max': 24.9,
+                'avg': 21.37,
+                'count': 8640,
+                'number_of_non_numeric_values': 0
+            }
+        }
+
+
+class MeasurementBucket(BaseModel):
+    timestamp: str
+    min: float
+    max: float
+    avg: float
+    count: int
+    first: float
+    last: float
+
+
+class MeasurementAggregation(BaseModel):
+    bucket_width_in_seconds: int
+    buckets: List[MeasurementBucket]
+
+    class Config:
+        json_schema_extra = {
+            'example': {
+                'bucket_width_in_seconds': 3600,
+                'buckets': [
+                    {
+                        'timestamp': '2021-01-16 18:00:00',
+                        'min': 20.1,
+                        'max': 20.9,
+                        'avg': 20.52,
+                        'count': 12,
+                        'first': 20.1,
+                        'last': 20.7
+                    }
+                ]
+            }
+        }
+
+
 # ===== measurement =====
 class Measurement(BaseModel):
     id: int
@@ -66,18 +290,31 @@ class Measurement(BaseModel):
     timestamp: str
     sensor_id: int
 
+    # the database stores numeric values and epoch seconds, the api keeps the string representation
+    @field_validator('value', mode='before')
+    @classmethod
+    def format_value(cls, value) -> str:
+        return MeasurementFormat.format_value(value)
+
+    @field_validator('timestamp', mode='before')
+    @classmethod
+    def format_timestamp(cls, timestamp) -> str:
+        if isinstance(timestamp, int):
+            return MeasurementFormat.to_date_time_string(timestamp)
+        return timestamp
+
     class Config:
         from_attributes = True
 
 
 class MeasurementCreate(BaseModel):
-    value: str = Field(..., min_length=1)
-    timestamp: str | None = None
+    value: NumericValue
+    timestamp: DateTime = None
     sensor_id: int
 
 
 class MeasurementUpdate(BaseModel):
-    value: str = Field(..., min_length=1)
+    value: NumericValue
 
 
 # ===== sensor =====
@@ -130,7 +367,7 @@ class DeviceCreate(BaseModel):
 class SensorValue(BaseModel):
     name: str
     type: str
-    value: str
+    value: NumericValue
 
 
 class MultipleMeasurements(BaseModel):
@@ -138,6 +375,49 @@ class MultipleMeasurements(BaseModel):
     sensors: List[SensorValue]
 
 
+# ===== send measurement batches =====
+
+class TimestampedValue(BaseModel):
+    value: NumericValue
+    timestamp: DateTime = None
+
+
+class SensorValues(BaseModel):
+    name: str = Field(..., min_length=1)
+    type: str = Field(..., min_length=1)
+    values: List[TimestampedValue]
+
+
+class DeviceMeasurements(BaseModel):
+    deviceName: str = Field(..., min_length=1)
+    sensors: List[SensorValues]
+
+
+class MeasurementBatch(BaseModel):
+    devices: List[DeviceMeasurements]
+
+    class Config:
+        json_schema_extra = {
+            'example': {
+                'devices': [
+                    {
+                        'deviceName': 'myDevice',
+                        'sensors': [
+                            {
+                                'name': 'myTempSensor',
+                                'type': 'temperature',
+                                'values': [
+                                    {'value': '20.5', 'timestamp': '2021-01-16 18:15:22'},
+                                    {'value': '20.7', 'timestamp': '2021-01-16 18:20:22'}
+                                ]
+                            }
+                        ]
+                    }
+                ]
+            }
+        }
+
+
 # ===== scheduled jobs =====
 class ScheduledJob(BaseModel):
     job_id: str
@@ -157,3 +437,5 @@ class ScheduledJob(BaseModel):
 class ScheduledJobStatus(BaseModel):
     jobs: List[ScheduledJob]
     job_results: List[DatabaseCleanupInfo]
+    # progress of the running cleanup
+    progress: Optional[CleanupProgress] = None
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 
 from Settings import SETTINGS
+from logic import ConditionalRequests
 from logic.DatabaseCleanupService import DatabaseCleanupService
-from logic.Dependencies import get_database, check_api_key
+from logic.DatabaseExecutor import DATABASE_EXECUTOR
+from logic.Dependencies import get_read_database, check_api_key
 from logic.database import Schemas, DatabaseInfoProvider
+from logic.database.ChangeTracker import ChangeTracker
 
 router = APIRouter(
     prefix='/database',
@@ -14,28 +17,51 @@ router = APIRouter(
 
 @router.get('/databaseInfo',
             summary='Gets information about the database',
-            response_model=Schemas.DatabaseInfo)
-async def databaseInfo(db: Session = Depends(get_database)):
-    return DatabaseInfoProvider.get_database_info(db)
+            response_model=Schemas.DatabaseInfo,
+            responses={304: {'description': 'Not modified'}})
+async def databaseInfo(request: Request, response: Response, db: Session = Depends(get_read_database)):
+    notModified = ConditionalRequests.check_not_modified(request, response, ChangeTracker.DEVICES,
+                                                         ChangeTracker.SENSORS, ChangeTracker.MEASUREMENTS)
+    if notModified is not None:
+        return notModified
+
+    return await DATABASE_EXECUTOR.run(DatabaseInfoProvider.get_database_info, db)
 
 
 @router.post('/databaseCleanup',
              summary='Initiates a database cleanup by enforcing the configured retention policies for each sensor',
              response_model=Schemas.Status,
              dependencies=[Depends(check_api_key)])
-async def databaseCleanup(db: Session = Depends(get_database)):
+async def databaseCleanup():
     from logic import JobScheduler
-    cleanupService = DatabaseCleanupService(SETTINGS['database']['cleanup'])
+    cleanupService = DatabaseCleanupService(SETTINGS['database']['cleanup'],
+                                            SETTINGS['database'].get('partitioning', {}))
     try:
-        JobScheduler.SCHEDULER.run_manual_job(cleanupService.cleanup, args=[db])
+        JobScheduler.SCHEDULER.run_manual_job(cleanupService.run, args=[])
     except JobScheduler.JobAlreadyRunningError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
     return Schemas.Status(message='Successfully triggered database cleanup')
 
 
+@router.post('/databaseCleanup/cancel',
+             summary='Stops the running database cleanup after the current sensor, '
+                     'the next cleanup continues where it stopped',
+             response_model=Schemas.Status,
+             dependencies=[Depends(check_api_key)])
+async def cancelDatabaseCleanup():
+    from logic import JobScheduler
+    try:
+        JobScheduler.SCHEDULER.cancel_running_job()
+    except JobScheduler.JobNotRunningError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return Schemas.Status(message='Successfully requested the cancellation of the database cleanup')
+
+
 @router.get('/databaseCleanup',
-            summary='Provides the status of the all scheduled database cleanup jobs',
+            summary='Provides the status of the all scheduled database cleanup jobs '
+                    'and the progress of a running cleanup',
             response_model=Schemas.ScheduledJobStatus)
 async def getStatus():
     from logic import JobScheduler
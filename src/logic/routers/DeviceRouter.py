@@ -1,10 +1,13 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from sqlalchemy.orm import Session
 
-from logic.Dependencies import get_database, check_api_key
-from logic.database import Schemas, Crud
+from logic import ConditionalRequests
+from logic.DatabaseExecutor import DATABASE_EXECUTOR
+from logic.Dependencies import get_database, get_read_database, check_api_key, CURSOR, decode_cursor
+from logic.database import Schemas, Crud, Cursor
+from logic.database.ChangeTracker import ChangeTracker
 from logic.database.Schemas import Status
 
 router = APIRouter(
@@ -14,16 +17,40 @@ router = APIRouter(
 
 
 @router.get('/', response_model=List[Schemas.Device],
-            summary='Gets all devices')
-async def read_devices(skip: int = 0, limit: int = 100, db: Session = Depends(get_database)):
-    return Crud.get_devices(db, skip=skip, limit=limit)
+            summary='Gets all devices',
+            description='Devices are ordered by id. '
+                        'If further devices exist, the response header "X-Next-Cursor" contains the cursor '
+                        'for the next page. "skip" is deprecated, use "cursor" instead.',
+            responses={304: {'description': 'Not modified'},
+                       400: {'description': 'Invalid cursor'}})
+async def read_devices(request: Request,
+                       response: Response,
+                       skip: int = Query(default=0, ge=0, deprecated=True),
+                       limit: int = Query(default=100, ge=1),
+                       cursor: str | None = CURSOR,
+                       db: Session = Depends(get_read_database)):
+    afterKey = decode_cursor(cursor, 1)
+
+    # the devices contain their sensors
+    notModified = ConditionalRequests.check_not_modified(request, response,
+                                                         ChangeTracker.DEVICES, ChangeTracker.SENSORS)
+    if notModified is not None:
+        return notModified
+
+    devices = await DATABASE_EXECUTOR.run(Crud.get_devices, db, skip=skip, limit=limit + 1,
+                                          afterId=afterKey[0] if afterKey else None)
+
+    devices, nextCursor = Cursor.split_page(devices, limit, lambda device: (device.id,))
+    if nextCursor is not None:
+        response.headers[Cursor.NEXT_CURSOR_HEADER] = nextCursor
+    return devices
 
 
 @router.get('/{deviceId}', response_model=Schemas.Device,
             summary='Gets a specific device',
             responses={404: {'description': 'Device not found'}})
-async def read_device(deviceId: int, db: Session = Depends(get_database)):
-    device = Crud.get_device(db, deviceId=deviceId)
+async def read_device(deviceId: int, db: Session = Depends(get_read_database)):
+    device = await DATABASE_EXECUTOR.run(Crud.get_device, db, deviceId=deviceId)
     if device is None:
         raise HTTPException(status_code=404, detail='Device not found')
     return device
@@ -34,10 +61,10 @@ async def read_device(deviceId: int, db: Session = Depends(get_database)):
              responses={400: {'description': 'Device with this name already exists'}},
              dependencies=[Depends(check_api_key)])
 async def create_device(device: Schemas.DeviceCreate, db: Session = Depends(get_database)):
-    existingDevice = Crud.get_device_by_name(db, device.name)
+    existingDevice = await DATABASE_EXECUTOR.run(Crud.get_device_by_name, db, device.name)
     if existingDevice:
         raise HTTPException(status_code=400, detail='Device with this name already exists')
-    return Crud.create_device(db=db, device=device)
+    return await DATABASE_EXECUTOR.run(Crud.create_device, db=db, device=device)
 
 
 @router.put('/{deviceId}', response_model=Schemas.Device,
@@ -46,15 +73,15 @@ async def create_device(device: Schemas.DeviceCreate, db: Session = Depends(get_
                        404: {'description': 'Device not found'}},
             dependencies=[Depends(check_api_key)])
 async def update_device(deviceId: int, device: Schemas.DeviceCreate, db: Session = Depends(get_database)):
-    existingDevice = Crud.get_device(db, deviceId)
+    existingDevice = await DATABASE_EXECUTOR.run(Crud.get_device, db, deviceId)
     if not existingDevice:
         raise HTTPException(status_code=404, detail='Device not found')
 
-    existingDevice = Crud.get_device_by_name(db, device.name)
+    existingDevice = await DATABASE_EXECUTOR.run(Crud.get_device_by_name, db, device.name)
     if existingDevice:
         raise HTTPException(status_code=400, detail='Device with this name already exists')
 
-    return Crud.update_device(db=db, deviceId=deviceId, device=device)
+    return await DATABASE_EXECUTOR.run(Crud.update_device, db=db, deviceId=deviceId, device=device)
 
 
 @router.delete('/{deviceId}', response_model=Status,
@@ -63,9 +90,9 @@ async def update_device(deviceId: int, device: Schemas.DeviceCreate, db: Session
                responses={404: {'description': 'Device not found'}},
                dependencies=[Depends(check_api_key)])
 async def delete_device(deviceId: int, db: Session = Depends(get_database)):
-    device = Crud.get_device(db, deviceId=deviceId)
+    device = await DATABASE_EXECUTOR.run(Crud.get_device, db, deviceId=deviceId)
     if device is None:
         raise HTTPException(status_code=404, detail='Device not found')
 
-    Crud.delete_device(db, device)
+    await DATABASE_EXECUTOR.run(Crud.delete_device, db, device)
     return Status(message=f"Deleted device {device.id}")
@@ -1,7 +1,10 @@
 from fastapi import APIRouter
 
 from Settings import VERSION
-from logic.database import Schemas
+from logic import WriteBehindQueue
+from logic.MeasurementBroker import MEASUREMENT_BROKER
+from logic.DatabaseExecutor import DATABASE_EXECUTOR
+from logic.database import Schemas, Crud
 
 router = APIRouter(
     prefix='/general',
@@ -14,3 +17,15 @@ router = APIRouter(
             response_model=Schemas.Version)
 async def version():
     return Schemas.Version(**VERSION)
+
+
+@router.get('/metrics',
+            summary='Gets internal metrics of the server',
+            response_model=Schemas.Metrics)
+async def metrics():
+    return Schemas.Metrics(identity_cache=Crud.IDENTITY_CACHE.get_statistics(),
+                           latest_measurement_cache=Crud.LATEST_MEASUREMENT_CACHE.get_statistics(),
+                           write_behind=WriteBehindQueue.WRITE_BEHIND_QUEUE.get_statistics(),
+                           database_executor=DATABASE_EXECUTOR.get_statistics(),
+                           live_stream=MEASUREMENT_BROKER.get_statistics(),
+                           backup=Crud.BACKUP_SERVICE.get_statistics())
@@ -1,29 +1,62 @@
-from typing import List
+import asyncio
+from typing import AsyncIterator, List
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from sqlalchemy.orm import Session
+from starlette.responses import StreamingResponse
 
-from logic.Dependencies import get_database, check_api_key, START_DATE_TIME, END_DATE_TIME
-from logic.database import Schemas, Crud
+from logic import ConditionalRequests, MeasurementColumns, MeasurementExport, WriteBehindQueue
+from logic.DatabaseExecutor import DATABASE_EXECUTOR
+from logic.MeasurementBroker import MEASUREMENT_BROKER, Subscription, TooManySubscribersError
+from logic.Dependencies import get_database, get_read_database, check_api_key, START_DATE_TIME, END_DATE_TIME, \
+    StartDateTime, EndDateTime, CURSOR, decode_cursor, date_time_query
+from logic.database import Schemas, Crud, Cursor
+from logic.database.ChangeTracker import ChangeTracker
+from logic.database.Database import ReadSessionLocal
 from logic.database.Schemas import Status, MinMax
 
 router = APIRouter(tags=['measurement'])
 
+ExportStartDateTime = date_time_query('The start date and time of the date range. Empty for no date range.')
+ExportEndDateTime = date_time_query('The end date and time of the date range. Empty for no date range.')
+
 
 @router.get('/measurement', response_model=List[Schemas.Measurement],
             summary='Gets all measurements',
-            description='Number of results can be limited by specifying a date range')
-async def read_measurements(startDateTime: str = START_DATE_TIME,
-                            endDateTime: str = END_DATE_TIME,
-                            db: Session = Depends(get_database)):
-    return Crud.get_measurements(db, startDateTime=startDateTime, endDateTime=endDateTime)
+            description='Number of results can be limited by specifying a date range. '
+                        'If "limit" or "cursor" is specified, the measurements are ordered ascending by timestamp '
+                        'and id. If further measurements exist, the response header "X-Next-Cursor" contains the '
+                        'cursor for the next page. '
+                        'Use "/measurements/export" to retrieve large numbers of measurements. '
+                        f'Send "Accept: {MeasurementColumns.MEDIA_TYPE}" to receive the compact columnar binary '
+                        'format (see README).',
+            responses={200: {'content': {MeasurementColumns.MEDIA_TYPE: {}}},
+                       400: {'description': 'Invalid cursor'}})
+async def read_measurements(request: Request,
+                            response: Response,
+                            startDateTime: StartDateTime = START_DATE_TIME,
+                            endDateTime: EndDateTime = END_DATE_TIME,
+                            limit: int | None = Query(default=None, ge=1),
+                            cursor: str | None = CURSOR,
+                            db: Session = Depends(get_read_database)):
+    afterKey = decode_cursor(cursor, 2)
+    isColumnar = MeasurementColumns.is_accepted(request.headers.get('accept'))
+
+    getMeasurements = Crud.get_measurement_rows if isColumnar else Crud.get_measurements
+    measurements = await DATABASE_EXECUTOR.run(getMeasurements, db, startDateTime=startDateTime,
+                                               endDateTime=endDateTime, limit=limit + 1 if limit else None,
+                                               afterKey=afterKey)
+
+    measurements, nextCursor = Cursor.split_page(measurements, limit,
+                                                 lambda measurement: (measurement.timestamp, measurement.id))
+    return MeasurementColumns.create_response(response, measurements, nextCursor, isColumnar)
 
 
 @router.get('/measurement/{measurementId}', response_model=Schemas.Measurement,
             summary='Gets a specific measurement',
             responses={404: {'description': 'Measurement not found'}})
-async def read_measurement(measurementId: int, db: Session = Depends(get_database)):
-    measurement = Crud.get_measurement(db, measurementId=measurementId)
+async def read_measurement(measurementId: int, db: Session = Depends(get_read_database)):
+    measurement = await DATABASE_EXECUTOR.run(Crud.get_measurement, db, measurementId=measurementId)
     if measurement is None:
         raise HTTPException(status_code=404, detail='Measurement not found')
     return measurement
@@ -34,11 +67,10 @@ async def read_measurement(measurementId: int, db: Session = Depends(get_databas
              responses={404: {'description': 'No sensor with id "{measurement.sensor_id}" existing'}},
              dependencies=[Depends(check_api_key)])
 async def create_measurement(measurement: Schemas.MeasurementCreate, db: Session = Depends(get_database)):
-    existingSensor = Crud.get_sensor(db, measurement.sensor_id)
-    if not existingSensor:
+    if not await DATABASE_EXECUTOR.run(Crud.sensor_exists, db, measurement.sensor_id):
         raise HTTPException(status_code=404, detail=f'No sensor with id "{measurement.sensor_id}" existing')
 
-    return Crud.create_measurement(db=db, measurement=measurement)
+    return await DATABASE_EXECUTOR.run(Crud.create_measurement, db=db, measurement=measurement)
 
 
 @router.put('/measurement/{measurementId}', response_model=Schemas.Measurement,
@@ -46,11 +78,12 @@ async def create_measurement(measurement: Schemas.MeasurementCreate, db: Session
             responses={404: {'description': 'Measurement not found'}},
             dependencies=[Depends(check_api_key)])
 async def update_measurement(measurementId: int, measurement: Schemas.MeasurementUpdate, db: Session = Depends(get_database)):
-    existingMeasurement = Crud.get_measurement(db, measurementId)
+    existingMeasurement = await DATABASE_EXECUTOR.run(Crud.get_measurement, db, measurementId)
     if existingMeasurement is None:
         raise HTTPException(status_code=404, detail='Measurement not found')
 
-    return Crud.update_measurement(db, measurementId=measurementId, measurement=measurement)
+    return await DATABASE_EXECUTOR.run(Crud.update_measurement, db,
+                                       measurementId=measurementId, measurement=measurement)
 
 
 @router.delete('/measurement/{measurementId}', response_model=Status,
@@ -58,49 +91,199 @@ async def update_measurement(measurementId: int, measurement: Schemas.Measuremen
                responses={404: {'description': 'Measurement not found'}},
                dependencies=[Depends(check_api_key)])
 async def delete_measurement(measurementId: int, db: Session = Depends(get_database)):
-    measurement = Crud.get_measurement(db, measurementId=measurementId)
+    measurement = await DATABASE_EXECUTOR.run(Crud.get_measurement, db, measurementId=measurementId)
     if measurement is None:
         raise HTTPException(status_code=404, detail='Measurement not found')
 
-    Crud.delete_measurement(db, measurement)
+    await DATABASE_EXECUTOR.run(Crud.delete_measurement, db, measurement)
     return Status(message=f'Deleted measurement {measurement.id}')
 
 
 @router.get('/measurements/minMax', response_model=Schemas.MinMax,
             summary='Gets the minimum and maximum values for the given sensor ids',
-            description='Number of checked values can be limited by specifying a date range')
+            description='Number of checked values can be limited by specifying a date range. '
+                        'Non-numeric values are ignored.')
 async def get_min_and_max_for_sensor_ids(sensorIds: List[int] = Query(None),
-                                         startDateTime: str = START_DATE_TIME,
-                                         endDateTime: str = END_DATE_TIME,
-                                         db: Session = Depends(get_database)):
-    values = []
-    for sensorId in sensorIds:
-        measurementsForSensor = Crud.get_measurements_for_sensor(db, startDateTime, endDateTime, sensorId)
-        for measurement in measurementsForSensor:
-            values.append(float(measurement.value))
-
-    if values:
-        return MinMax(min=min(values), max=max(values))
+                                         startDateTime: StartDateTime = START_DATE_TIME,
+                                         endDateTime: EndDateTime = END_DATE_TIME,
+                                         db: Session = Depends(get_read_database)):
+    if not sensorIds:
+        return MinMax()
+
+    rows = await DATABASE_EXECUTOR.run(Crud.get_statistics_for_sensors, db, startDateTime, endDateTime, sensorIds)
+    rows = [row for row in rows if row.count]
+    if rows:
+        return MinMax(min=min(row.min for row in rows), max=max(row.max for row in rows))
 
     return MinMax()
 
 
+@router.get('/measurements/statistics', response_model=List[Schemas.SensorStatistics],
+            summary='Gets min, max, average and number of values for each of the given sensor ids',
+            description='Number of checked values can be limited by specifying a date range. '
+                        'Non-numeric values are not included in min, max, avg and count, '
+                        'but are counted separately.')
+async def get_statistics_for_sensor_ids(sensorIds: List[int] = Query(None),
+                                        startDateTime: StartDateTime = START_DATE_TIME,
+                                        endDateTime: EndDateTime = END_DATE_TIME,
+                                        db: Session = Depends(get_read_database)):
+    if not sensorIds:
+        return []
+
+    rows = await DATABASE_EXECUTOR.run(Crud.get_statistics_for_sensors, db, startDateTime, endDateTime, sensorIds)
+    statisticsBySensorId = {row.sensor_id: Schemas.SensorStatistics.model_validate(row) for row in rows}
+
+    # sensors without measurements are included as well
+    return [statisticsBySensorId.get(sensorId, Schemas.SensorStatistics(sensor_id=sensorId))
+            for sensorId in dict.fromkeys(sensorIds)]
+
+
+@router.get('/sensors/latest', response_model=List[Schemas.Measurement],
+            summary='Gets the latest measurement for multiple sensors',
+            description='Returns the latest measurement of all sensors, ordered by sensor id. '
+                        'The sensors can be filtered by sensor ids and device ids. '
+                        'Sensors without measurements are omitted.',
+            responses={304: {'description': 'Not modified'}})
+async def get_latest_measurements(request: Request,
+                                  response: Response,
+                                  sensorIds: List[int] = Query(None),
+                                  deviceIds: List[int] = Query(None),
+                                  db: Session = Depends(get_read_database)):
+    notModified = ConditionalRequests.check_not_modified(request, response, ChangeTracker.SENSORS,
+                                                         ChangeTracker.MEASUREMENTS)
+    if notModified is not None:
+        return notModified
+
+    return await DATABASE_EXECUTOR.run(Crud.get_latest_measurements, db, sensorIds, deviceIds)
+
+
+@router.get('/measurements/live',
+            summary='Streams new measurements as server-sent events',
+            description='Every new measurement is sent as event "measurement" as soon as it is stored. '
+                        'The measurements can be filtered by sensor ids and device ids (sensors that are created '
+                        'after the subscription are not included). '
+                        'If the client does not keep up, the event "dropped" is sent and the stream is closed.',
+            response_class=StreamingResponse,
+            responses={200: {'content': {'text/event-stream': {}}},
+                       503: {'description': 'Maximum number of subscribers reached'}})
+async def stream_live_measurements(sensorIds: List[int] = Query(None),
+                                   deviceIds: List[int] = Query(None)):
+    subscribedSensorIds = None
+    if sensorIds or deviceIds:
+        # no request scoped session, a pooled connection must not be occupied for the lifetime of the stream
+        db = ReadSessionLocal()
+        try:
+            subscribedSensorIds = await DATABASE_EXECUTOR.run(Crud.get_sensor_ids, db, sensorIds, deviceIds)
+        finally:
+            db.close()
+
+    try:
+        subscription = MEASUREMENT_BROKER.subscribe(subscribedSensorIds)
+    except TooManySubscribersError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return StreamingResponse(__stream_events(subscription),
+                             media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def __stream_events(subscription: Subscription) -> AsyncIterator[str]:
+    try:
+        yield ': subscribed\n\n'
+
+        while True:
+            try:
+                measurement = await asyncio.wait_for(subscription.get(),
+                                                     MEASUREMENT_BROKER.heartbeat_interval_in_seconds)
+            except asyncio.TimeoutError:
+                # comments keep idle connections open and detect disconnected clients
+                yield ': heartbeat\n\n'
+                continue
+
+            if measurement is None:
+                yield 'event: dropped\ndata: {}\n\n'
+                return
+
+            yield f'event: measurement\nid: {measurement.id}\ndata: {measurement.model_dump_json()}\n\n'
+    finally:
+        MEASUREMENT_BROKER.unsubscribe(subscription)
+
+
+@router.get('/measurements/export',
+            summary='Exports measurements as stream',
+            description='The measurements are streamed as newline delimited JSON or CSV, ordered by sensor, '
+                        'timestamp and id. Measurements can be filtered by sensor ids, device ids and date range '
+                        '(all filters are combined). '
+                        'If "limit" is specified and further measurements exist, the response header "X-Next-Cursor" '
+                        'contains the cursor for the next export.',
+            response_class=StreamingResponse,
+            responses={200: {'content': {'application/x-ndjson': {}, 'text/csv': {}}},
+                       400: {'description': 'Invalid cursor'}})
+async def export_measurements(exportFormat: Schemas.ExportFormat = Query(default=Schemas.ExportFormat.NDJSON,
+                                                                          alias='format'),
+                              sensorIds: List[int] = Query(None),
+                              deviceIds: List[int] = Query(None),
+                              startDateTime: ExportStartDateTime = '',
+                              endDateTime: ExportEndDateTime = '',
+                              limit: int | None = Query(default=None, ge=1),
+                              cursor: str | None = CURSOR,
+                              db: Session = Depends(get_read_database)):
+    afterKey = decode_cursor(cursor, 3)
+
+    # the session is closed after the response is sent, even if the stream is never started or aborted
+    query = Crud.get_measurements_for_export(db, startDateTime, endDateTime, sensorIds, deviceIds, afterKey)
+
+    headers = {}
+    if limit is not None:
+        nextKey = await DATABASE_EXECUTOR.run(MeasurementExport.get_next_key, query, limit)
+        if nextKey is not None:
+            headers[Cursor.NEXT_CURSOR_HEADER] = Cursor.encode_cursor(*nextKey)
+            query = MeasurementExport.end_page_at_key(query, nextKey)
+
+    return StreamingResponse(MeasurementExport.stream_measurements(query, exportFormat),
+                             media_type=MeasurementExport.MEDIA_TYPES[exportFormat],
+                             headers=headers)
+
+
 @router.post('/measurements/', response_model=Schemas.Status,
              summary='Adds multiple measurements',
              description='Non-existent device and sensors will be created automatically',
+             responses={503: {'description': 'Write-behind queue is full'}},
              dependencies=[Depends(check_api_key)])
 async def create_multiple_measurements(measurementsToAdd: Schemas.MultipleMeasurements,
                                        db: Session = Depends(get_database)):
-    existingDevice = Crud.get_device_by_name(db, measurementsToAdd.deviceName)
-    if not existingDevice:
-        existingDevice = Crud.create_device(db, Schemas.DeviceCreate(name=measurementsToAdd.deviceName))
-
-    for sensor in measurementsToAdd.sensors:
-        existingSensor = Crud.get_sensor_by_name_and_device_id(db, sensor.name, existingDevice.id)
-        if not existingSensor:
-            existingSensor = Crud.create_sensor(db, Schemas.SensorCreate(name=sensor.name,
-                                                                         type=sensor.type,
-                                                                         device_id=existingDevice.id))
-        Crud.create_measurement(db, Schemas.MeasurementCreate(value=sensor.value, sensor_id=existingSensor.id))
+    sensors = [Schemas.SensorValues(name=sensor.name, type=sensor.type,
+                                    values=[Schemas.TimestampedValue(value=sensor.value)])
+               for sensor in measurementsToAdd.sensors]
+    batch = Schemas.MeasurementBatch(devices=[Schemas.DeviceMeasurements(deviceName=measurementsToAdd.deviceName,
+                                                                         sensors=sensors)])
+    await __store_measurement_batch(db, batch)
 
     return Status(message=f'Success')
+
+
+@router.post('/measurements/batch', response_model=Schemas.Status,
+             summary='Adds measurements for multiple devices and sensors at once',
+             description='Non-existent devices and sensors will be created automatically. '
+                         'All measurements are stored in a single transaction. '
+                         'Values without timestamp are stored with the current date and time.',
+             responses={503: {'description': 'Write-behind queue is full'}},
+             dependencies=[Depends(check_api_key)])
+async def create_measurement_batch(batch: Schemas.MeasurementBatch, db: Session = Depends(get_database)):
+    numberOfMeasurements = await __store_measurement_batch(db, batch)
+    return Status(message=f'Added {numberOfMeasurements} measurements')
+
+
+async def __store_measurement_batch(db: Session, batch: Schemas.MeasurementBatch) -> int:
+    writeBehindQueue = WriteBehindQueue.WRITE_BEHIND_QUEUE
+    if not writeBehindQueue.is_enabled:
+        return await DATABASE_EXECUTOR.run(Crud.create_measurement_batch, db, batch)
+
+    sensorIds = await DATABASE_EXECUTOR.run(Crud.get_or_create_sensor_ids, db, batch)
+    rows = Crud.build_measurement_rows(batch, sensorIds)
+    try:
+        await writeBehindQueue.enqueue(rows)
+    except WriteBehindQueue.QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return len(rows)
@@ -1,10 +1,16 @@
+import math
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from sqlalchemy.orm import Session
 
-from logic.Dependencies import get_database, check_api_key, START_DATE_TIME, END_DATE_TIME
-from logic.database import Schemas, Crud
+from logic import ConditionalRequests, MeasurementColumns
+from logic.DatabaseExecutor import DATABASE_EXECUTOR
+from logic.Dependencies import get_database, get_read_database, check_api_key, START_DATE_TIME, END_DATE_TIME, \
+    StartDateTime, EndDateTime, CURSOR, decode_cursor
+from logic.database import Schemas, Crud, Cursor, MeasurementFormat
+from logic.database.ChangeTracker import ChangeTracker
+from logic.database.Downsampling import largest_triangle_three_buckets
 from logic.database.Schemas import Status
 
 router = APIRouter(
@@ -12,18 +18,43 @@ router = APIRouter(
     tags=['sensor']
 )
 
+MAX_NUMBER_OF_BUCKETS = 10000
+MAX_NUMBER_OF_POINTS = 10000
+
 
 @router.get('/', response_model=List[Schemas.Sensor],
-            summary='Gets all sensors')
-async def read_sensors(skip: int = 0, limit: int = 100, db: Session = Depends(get_database)):
-    return Crud.get_sensors(db, skip=skip, limit=limit)
+            summary='Gets all sensors',
+            description='Sensors are ordered by id. '
+                        'If further sensors exist, the response header "X-Next-Cursor" contains the cursor '
+                        'for the next page. "skip" is deprecated, use "cursor" instead.',
+            responses={304: {'description': 'Not modified'},
+                       400: {'description': 'Invalid cursor'}})
+async def read_sensors(request: Request,
+                       response: Response,
+                       skip: int = Query(default=0, ge=0, deprecated=True),
+                       limit: int = Query(default=100, ge=1),
+                       cursor: str | None = CURSOR,
+                       db: Session = Depends(get_read_database)):
+    afterKey = decode_cursor(cursor, 1)
+
+    notModified = ConditionalRequests.check_not_modified(request, response, ChangeTracker.SENSORS)
+    if notModified is not None:
+        return notModified
+
+    sensors = await DATABASE_EXECUTOR.run(Crud.get_sensors, db, skip=skip, limit=limit + 1,
+                                          afterId=afterKey[0] if afterKey else None)
+
+    sensors, nextCursor = Cursor.split_page(sensors, limit, lambda sensor: (sensor.id,))
+    if nextCursor is not None:
+        response.headers[Cursor.NEXT_CURSOR_HEADER] = nextCursor
+    return sensors
 
 
 @router.get('/{sensorId}', response_model=Schemas.Sensor,
             summary='Gets a specific sensor',
             responses={404: {'description': 'Sensor not found'}})
-async def read_sensor(sensorId: int, db: Session = Depends(get_database)):
-    sensor = Crud.get_sensor(db, sensorId=sensorId)
+async def read_sensor(sensorId: int, db: Session = Depends(get_read_database)):
+    sensor = await DATABASE_EXECUTOR.run(Crud.get_sensor, db, sensorId=sensorId)
     if sensor is None:
         raise HTTPException(status_code=404, detail='Sensor not found')
     return sensor
@@ -36,17 +67,18 @@ async def read_sensor(sensorId: int, db: Session = Depends(get_database)):
                         404: {'description': 'No device with id "{sensor.device_id}" existing'}},
              dependencies=[Depends(check_api_key)])
 async def create_sensor(sensor: Schemas.SensorCreate, db: Session = Depends(get_database)):
-    existingDevice = Crud.get_device(db, sensor.device_id)
+    existingDevice = await DATABASE_EXECUTOR.run(Crud.get_device, db, sensor.device_id)
     if not existingDevice:
         raise HTTPException(status_code=404, detail=f'No device with id "{sensor.device_id}" existing')
 
-    existingSensor = Crud.get_sensor_by_name_and_device_id(db, sensor.name, sensor.device_id)
+    existingSensor = await DATABASE_EXECUTOR.run(Crud.get_sensor_by_name_and_device_id, db,
+                                                 sensor.name, sensor.device_id)
     if existingSensor:
         raise HTTPException(status_code=400,
                             detail=f'A sensor called "{sensor.name}" already exists '
                                    f'(ID: {existingSensor.id}) for device {sensor.device_id}')
 
-    return Crud.create_sensor(db=db, sensor=sensor)
+    return await DATABASE_EXECUTOR.run(Crud.create_sensor, db=db, sensor=sensor)
 
 
 @router.put('/{sensorId}', response_model=Schemas.Sensor,
@@ -54,18 +86,19 @@ async def create_sensor(sensor: Schemas.SensorCreate, db: Session = Depends(get_
             responses={404: {'description': 'Sensor not found'}},
             dependencies=[Depends(check_api_key)])
 async def update_sensor(sensorId: int, sensor: Schemas.SensorUpdate, db: Session = Depends(get_database)):
-    sensorToUpdate = Crud.get_sensor(db, sensorId)
+    sensorToUpdate = await DATABASE_EXECUTOR.run(Crud.get_sensor, db, sensorId)
     if not sensorToUpdate:
         raise HTTPException(status_code=404, detail='Sensor not found')
 
     if sensorToUpdate.name != sensor.name:
-        existingSensor = Crud.get_sensor_by_name_and_device_id(db, sensor.name, sensorToUpdate.device_id)
+        existingSensor = await DATABASE_EXECUTOR.run(Crud.get_sensor_by_name_and_device_id, db,
+                                                     sensor.name, sensorToUpdate.device_id)
         if existingSensor:
             raise HTTPException(status_code=400,
                                 detail=f'A sensor called "{sensor.name}" already exists '
                                        f'(ID: {existingSensor.id}) for device {sensorToUpdate.device_id}')
 
-    return Crud.update_sensor(db=db, sensorId=sensorId, sensor=sensor)
+    return await DATABASE_EXECUTOR.run(Crud.update_sensor, db=db, sensorId=sensorId, sensor=sensor)
 
 
 @router.delete('/{sensorId}', response_model=Status,
@@ -74,33 +107,153 @@ async def update_sensor(sensorId: int, sensor: Schemas.SensorUpdate, db: Session
                responses={404: {'description': 'Sensor not found'}},
                dependencies=[Depends(check_api_key)])
 async def delete_sensor(sensorId: int, db: Session = Depends(get_database)):
-    sensor = Crud.get_sensor(db, sensorId=sensorId)
+    sensor = await DATABASE_EXECUTOR.run(Crud.get_sensor, db, sensorId=sensorId)
     if sensor is None:
         raise HTTPException(status_code=404, detail='Sensor not found')
 
-    Crud.delete_sensor(db, sensor)
+    await DATABASE_EXECUTOR.run(Crud.delete_sensor, db, sensor)
     return Status(message=f'Deleted sensor {sensor.id}')
 
 
 @router.get('/{sensorId}/measurements', response_model=List[Schemas.Measurement],
             summary='Gets all measurements for a specific sensor',
-            description='Number of results can be limited by specifying a date range',
-            responses={404: {'description': 'Sensor not found'}})
-async def get_sensor_measurements(sensorId: int,
-                                  startDateTime: str = START_DATE_TIME,
-                                  endDateTime: str = END_DATE_TIME,
-                                  db: Session = Depends(get_database)):
-    sensor = Crud.get_sensor(db, sensorId=sensorId)
+            description='Number of results can be limited by specifying a date range. '
+                        'Measurements are ordered descending by timestamp and id. '
+                        'If "limit" is specified and further measurements exist, '
+                        'the response header "X-Next-Cursor" contains the cursor for the next page. '
+                        f'Send "Accept: {MeasurementColumns.MEDIA_TYPE}" to receive the compact columnar binary '
+                        'format (see README).',
+            responses={200: {'content': {MeasurementColumns.MEDIA_TYPE: {}}},
+                       400: {'description': 'Invalid cursor'},
+                       404: {'description': 'Sensor not found'}})
+async def get_sensor_measurements(request: Request,
+                                  response: Response,
+                                  sensorId: int,
+                                  startDateTime: StartDateTime = START_DATE_TIME,
+                                  endDateTime: EndDateTime = END_DATE_TIME,
+                                  limit: int | None = Query(default=None, ge=1),
+                                  cursor: str | None = CURSOR,
+                                  db: Session = Depends(get_read_database)):
+    beforeKey = decode_cursor(cursor, 2)
+
+    sensor = await DATABASE_EXECUTOR.run(Crud.get_sensor, db, sensorId=sensorId)
     if sensor is None:
         raise HTTPException(status_code=404, detail='Sensor not found')
-    return Crud.get_measurements_for_sensor(db, startDateTime, endDateTime, sensorId)
+
+    isColumnar = MeasurementColumns.is_accepted(request.headers.get('accept'))
+    getMeasurements = Crud.get_measurement_rows_for_sensor if isColumnar else Crud.get_measurements_for_sensor
+    measurements = await DATABASE_EXECUTOR.run(getMeasurements, db, startDateTime, endDateTime,
+                                               sensorId, limit=limit + 1 if limit else None, beforeKey=beforeKey)
+
+    measurements, nextCursor = Cursor.split_page(measurements, limit,
+                                                 lambda measurement: (measurement.timestamp, measurement.id))
+    return MeasurementColumns.create_response(response, measurements, nextCursor, isColumnar)
 
 
 @router.get('/{sensorId}/measurements/latest', response_model=Schemas.Measurement,
             summary='Gets the latest measurement for a specific sensor',
-            responses={404: {'description': 'Sensor not found'}})
-async def get_latest_measurements_for_sensor(sensorId: int, db: Session = Depends(get_database)):
-    sensor = Crud.get_sensor(db, sensorId=sensorId)
+            responses={304: {'description': 'Not modified'},
+                       404: {'description': 'Sensor not found'}})
+async def get_latest_measurements_for_sensor(request: Request,
+                                             response: Response,
+                                             sensorId: int,
+                                             db: Session = Depends(get_read_database)):
+    notModified = ConditionalRequests.check_not_modified(request, response, ChangeTracker.SENSORS,
+                                                         ChangeTracker.measurements_of_sensor(sensorId))
+    if notModified is not None:
+        return notModified
+
+    if not await DATABASE_EXECUTOR.run(Crud.sensor_exists, db, sensorId):
+        raise HTTPException(status_code=404, detail='Sensor not found')
+    return await DATABASE_EXECUTOR.run(Crud.get_latest_measurement_for_sensor, db, sensorId)
+
+
+@router.get('/{sensorId}/measurements/aggregated', response_model=Schemas.MeasurementAggregation,
+            summary='Gets aggregated measurements for a specific sensor',
+            description='The date range is divided into buckets of equal width. '
+                        'For every bucket containing measurements min, max, avg, count, first and last value '
+                        'are returned. Either "bucketWidthInSeconds" or "numberOfBuckets" must be specified. '
+                        'Non-numeric values are ignored.',
+            responses={400: {'description': 'Invalid bucket specification'},
+                       404: {'description': 'Sensor not found'}})
+async def get_aggregated_sensor_measurements(sensorId: int,
+                                             startDateTime: StartDateTime = START_DATE_TIME,
+                                             endDateTime: EndDateTime = END_DATE_TIME,
+                                             bucketWidthInSeconds: int | None = Query(default=None, ge=1),
+                                             numberOfBuckets: int | None = Query(default=None, ge=1,
+                                                                                 le=MAX_NUMBER_OF_BUCKETS),
+                                             db: Session = Depends(get_read_database)):
+    if not startDateTime or not endDateTime:
+        raise HTTPException(status_code=400, detail='startDateTime and endDateTime are required')
+
+    if (bucketWidthInSeconds is None) == (numberOfBuckets is None):
+        raise HTTPException(status_code=400,
+                            detail='Either "bucketWidthInSeconds" or "numberOfBuckets" must be specified')
+
+    startTimestamp = MeasurementFormat.range_bound_to_epoch_seconds(startDateTime)
+    durationInSeconds = MeasurementFormat.range_bound_to_epoch_seconds(endDateTime) - startTimestamp + 1
+    if durationInSeconds <= 0:
+        raise HTTPException(status_code=400, detail='endDateTime must not be before startDateTime')
+
+    if bucketWidthInSeconds is None:
+        bucketWidthInSeconds = math.ceil(durationInSeconds / numberOfBuckets)
+    elif math.ceil(durationInSeconds / bucketWidthInSeconds) > MAX_NUMBER_OF_BUCKETS:
+        raise HTTPException(status_code=400,
+                            detail=f'"bucketWidthInSeconds" is too small, at most {MAX_NUMBER_OF_BUCKETS} '
+                                   f'buckets are allowed')
+
+    sensor = await DATABASE_EXECUTOR.run(Crud.get_sensor, db, sensorId=sensorId)
     if sensor is None:
         raise HTTPException(status_code=404, detail='Sensor not found')
-    return Crud.get_latest_measurement_for_sensor(db, sensorId)
+
+    rows = await DATABASE_EXECUTOR.run(Crud.get_measurement_buckets_for_sensor, db,
+                                       startDateTime, endDateTime, sensorId, bucketWidthInSeconds)
+
+    buckets = []
+    for row in rows:
+        timestamp = MeasurementFormat.to_date_time_string(startTimestamp + row.bucket * bucketWidthInSeconds)
+        buckets.append(Schemas.MeasurementBucket(timestamp=timestamp, min=row.min, max=row.max, avg=row.avg,
+                                                 count=row.count, first=row.first, last=row.last))
+
+    return Schemas.MeasurementAggregation(bucket_width_in_seconds=bucketWidthInSeconds, buckets=buckets)
+
+
+@router.get('/{sensorId}/measurements/downsampled', response_model=List[Schemas.Measurement],
+            summary='Gets a shape preserving subset of the measurements for a specific sensor',
+            description='Selects at most "numberOfPoints" measurements with the Largest-Triangle-Three-Buckets '
+                        'algorithm. Peaks and valleys are retained, therefore the result is well suited for charts. '
+                        'Non-numeric values are ignored.',
+            responses={400: {'description': 'Missing date range'},
+                       404: {'description': 'Sensor not found'}})
+async def get_downsampled_sensor_measurements(sensorId: int,
+                                              startDateTime: StartDateTime = START_DATE_TIME,
+                                              endDateTime: EndDateTime = END_DATE_TIME,
+                                              numberOfPoints: int = Query(default=500, ge=3,
+                                                                          le=MAX_NUMBER_OF_POINTS),
+                                              db: Session = Depends(get_read_database)):
+    if not startDateTime or not endDateTime:
+        raise HTTPException(status_code=400, detail='startDateTime and endDateTime are required')
+
+    sensor = await DATABASE_EXECUTOR.run(Crud.get_sensor, db, sensorId=sensorId)
+    if sensor is None:
+        raise HTTPException(status_code=404, detail='Sensor not found')
+
+    return await DATABASE_EXECUTOR.run(__downsample_measurements, db, startDateTime, endDateTime,
+                                       sensorId, numberOfPoints)
+
+
+def __downsample_measurements(db: Session, startDateTime: str, endDateTime: str,
+                              sensorId: int, numberOfPoints: int) -> List[Schemas.Measurement]:
+    ids = []
+    timestamps = []
+    values = []
+    for measurementId, timestamp, value in Crud.get_measurement_values_for_sensor(db, startDateTime,
+                                                                                  endDateTime, sensorId):
+        ids.append(measurementId)
+        timestamps.append(timestamp)
+        values.append(value)
+
+    # same order as the raw measurements of a sensor: latest first
+    selectedIndices = reversed(largest_triangle_three_buckets(timestamps, values, numberOfPoints))
+    return [Schemas.Measurement(id=ids[index], value=values[index], timestamp=timestamps[index], sensor_id=sensorId)
+            for index in selectedIndices]
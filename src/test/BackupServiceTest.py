@@ -0,0 +1,279 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from logic import BackupSnapshot
+
+
+class DatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._databasePath = os.path.join(self._directory, 'storageLeaf.db')
+
+        self._connection = sqlite3.connect(self._databasePath)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE measurement (id INTEGER PRIMARY KEY, value REAL)')
+        self.insert_values(0, 5000)
+
+    def tearDown(self):
+        self._connection.close()
+        shutil.rmtree(self._directory)
+
+    def insert_values(self, start: int, end: int):
+        self._connection.executemany('INSERT INTO measurement (id, value) VALUES (?, ?)',
+                                     [(index, index * 1.5) for index in range(start, end)])
+        self._connection.commit()
+
+    def get_path(self, name: str) -> str:
+        return os.path.join(self._directory, name)
+
+    @staticmethod
+    def read_values(path: str):
+        connection = sqlite3.connect(path)
+        try:
+            return connection.execute('SELECT id, value FROM measurement ORDER BY id').fetchall()
+        finally:
+            connection.close()
+
+
+class TestBackupSnapshot(DatabaseTestCase):
+    def test_snapshot_containsUncheckpointedChanges(self):
+        BackupSnapshot.create_snapshot(self._databasePath, self.get_path('snapshot'))
+
+        self.assertEqual(self.read_values(self._databasePath), self.read_values(self.get_path('snapshot')))
+        self.assertFalse(os.path.exists(self.get_path('snapshot-wal')))
+
+    def test_compress_roundTrip(self):
+        BackupSnapshot.create_snapshot(self._databasePath, self.get_path('snapshot'))
+        BackupSnapshot.compress(self.get_path('snapshot'), self.get_path('snapshot.gz'))
+        BackupSnapshot.decompress(self.get_path('snapshot.gz'), self.get_path('restored'))
+
+        self.assertEqual(BackupSnapshot.get_digest(self.get_path('snapshot')),
+                         BackupSnapshot.get_digest(self.get_path('restored')))
+
+    def test_delta(self):
+        BackupSnapshot.create_snapshot(self._databasePath, self.get_path('first'))
+        self.insert_values(5000, 5100)
+        self._connection.execute('DELETE FROM measurement WHERE id < 100')
+        self._connection.commit()
+        BackupSnapshot.create_snapshot(self._databasePath, self.get_path('second'))
+
+        numberOfChangedPages = BackupSnapshot.write_delta(self.get_path('first'), self.get_path('second'),
+                                                          self.get_path('delta.gz'))
+        pageSize = BackupSnapshot.get_page_size(self.get_path('second'))
+        numberOfPages = os.path.getsize(self.get_path('second')) // pageSize
+        self.assertLess(numberOfChangedPages, numberOfPages // 2)
+
+        shutil.copy(self.get_path('first'), self.get_path('restored'))
+        BackupSnapshot.apply_delta(self.get_path('delta.gz'), self.get_path('restored'))
+        self.assertEqual(self.read_values(self._databasePath), self.read_values(self.get_path('restored')))
+
+    def test_applyDelta_otherBase_raise(self):
+        BackupSnapshot.create_snapshot(self._databasePath, self.get_path('first'))
+        self.insert_values(5000, 5100)
+        BackupSnapshot.create_snapshot(self._databasePath, self.get_path('second'))
+        self.insert_values(5100, 5200)
+        BackupSnapshot.create_snapshot(self._databasePath, self.get_path('third'))
+        BackupSnapshot.write_delta(self.get_path('second'), self.get_path('third'), self.get_path('delta.gz'))
+
+        with self.assertRaises(ValueError):
+            BackupSnapshot.apply_delta(self.get_path('delta.gz'), self.get_path('first'))
+
+
+class TestBackupService(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self._uploads = os.path.join(self._directory, 'uploads')
+
+    def __create_service(self, **kwargs):
+        from logic.BackupService import BackupService
+        settings = {'enable': True, 'maxModifications': 30, 'target': 'local', 'localDestinationPath': self._uploads}
+        return BackupService(self._databasePath, **{**settings, **kwargs})
+
+    def __restore(self):
+        restoredPath = self.get_path('restored')
+        BackupSnapshot.decompress(os.path.join(self._uploads, 'storageLeaf.db.gz'), restoredPath)
+        numberOfDeltas = 1
+        while os.path.exists(os.path.join(self._uploads, f'storageLeaf.db.delta{numberOfDeltas}.gz')):
+            BackupSnapshot.apply_delta(os.path.join(self._uploads, f'storageLeaf.db.delta{numberOfDeltas}.gz'),
+                                       restoredPath)
+            numberOfDeltas += 1
+        return self.read_values(restoredPath)
+
+    @staticmethod
+    def __wait_for_backups(service, numberOfBackups: int):
+        for __ in range(500):
+            statistics = service.get_statistics()
+            if statistics.number_of_backups >= numberOfBackups and not statistics.is_backup_pending \
+                    and not statistics.is_backup_running:
+                return statistics
+            time.sleep(0.01)
+        raise AssertionError(f'Expected {numberOfBackups} backups')
+
+    def test_invalidTarget_raise(self):
+        with self.assertRaises(ValueError):
+            self.__create_service(target='ftp')
+
+    def test_incrementalBackups(self):
+        service = self.__create_service()
+        service.perform_backup()
+        self.insert_values(5000, 5100)
+        service.perform_backup()
+        self.insert_values(5100, 5200)
+        service.perform_backup()
+
+        self.assertEqual(['storageLeaf.db.delta1.gz', 'storageLeaf.db.delta2.gz', 'storageLeaf.db.gz'],
+                         sorted(os.listdir(self._uploads)))
+        self.assertLess(os.path.getsize(os.path.join(self._uploads, 'storageLeaf.db.delta2.gz')),
+                        os.path.getsize(os.path.join(self._uploads, 'storageLeaf.db.gz')))
+        # only the snapshot of the last backup is kept locally
+        self.assertEqual(['storageLeaf.db', 'storageLeaf.db-shm', 'storageLeaf.db-wal', 'storageLeaf.db.snapshot',
+                          'storageLeaf.db.snapshot.json', 'uploads'], sorted(os.listdir(self._directory)))
+
+        self.assertEqual(self.read_values(self._databasePath), self.__restore())
+
+    def test_fullBackupAfterMaxIncrementalBackups(self):
+        service = self.__create_service(maxIncrementalBackups=1)
+        service.perform_backup()
+        self.insert_values(5000, 5100)
+        service.perform_backup()
+        shutil.rmtree(self._uploads)
+
+        self.insert_values(5100, 5200)
+        service.perform_backup()
+
+        self.assertEqual(['storageLeaf.db.gz'], os.listdir(self._uploads))
+        self.assertEqual(self.read_values(self._databasePath), self.__restore())
+
+    def test_failedUpload_nextBackupUsesLastUploadedSnapshot(self):
+        service = self.__create_service()
+        service.perform_backup()
+
+        with patch('logic.BackupTarget.shutil.copyfile', side_effect=OSError('disk full')):
+            self.insert_values(5000, 5100)
+            service.perform_backup()
+
+        self.insert_values(5100, 5200)
+        service.perform_backup()
+
+        self.assertEqual(['storageLeaf.db.delta1.gz', 'storageLeaf.db.gz'], sorted(os.listdir(self._uploads)))
+        self.assertEqual(self.read_values(self._databasePath), self.__restore())
+        statistics = service.get_statistics()
+        self.assertEqual((2, 1, 1), (statistics.number_of_backups, statistics.number_of_incremental_backups,
+                                     statistics.number_of_failed_backups))
+
+    def test_statistics(self):
+        service = self.__create_service()
+        service.perform_backup()
+
+        statistics = service.get_statistics()
+        uploadedBytes = os.path.getsize(os.path.join(self._uploads, 'storageLeaf.db.gz'))
+        self.assertEqual((uploadedBytes, uploadedBytes), (statistics.last_uploaded_bytes,
+                                                          statistics.total_uploaded_bytes))
+        self.assertGreater(statistics.last_duration_in_seconds, 0)
+        self.assertIsNotNone(statistics.last_backup_time)
+
+    def test_concurrentModifications_coalesced(self):
+        service = self.__create_service(maxModifications=10)
+        backupStarted = threading.Event()
+        releaseBackup = threading.Event()
+        originalBackup = service._BackupService__backup
+
+        def slow_backup():
+            backupStarted.set()
+            releaseBackup.wait()
+            return originalBackup()
+
+        with patch.object(service, '_BackupService__backup', side_effect=slow_backup):
+            for __ in range(10):
+                service.perform_modification()
+            self.assertTrue(backupStarted.wait(5))
+
+            # many threads cross the threshold while the first backup is running
+            threads = [threading.Thread(target=lambda: [service.perform_modification() for __ in range(25)])
+                       for __ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            releaseBackup.set()
+
+            statistics = self.__wait_for_backups(service, 2)
+
+        self.assertEqual(2, statistics.number_of_backups)
+        self.assertEqual(0, statistics.number_of_modifications)
+
+    def test_disabled_noBackup(self):
+        service = self.__create_service(enable=False, maxModifications=1)
+        service.perform_modification()
+        service.perform_modification()
+
+        self.assertFalse(service.get_statistics().is_backup_pending)
+
+    def test_minInterval_delaysBackup(self):
+        service = self.__create_service(maxModifications=1, minIntervalInSeconds=0.5)
+        service.perform_backup()
+        start = time.monotonic()
+
+        service.perform_modification()
+        self.__wait_for_backups(service, 2)
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.4)
+
+    def test_databaseGrowth_triggersBackup(self):
+        service = self.__create_service(maxModifications=1000, maxDatabaseGrowthInMB=0.1)
+        service.perform_modification()
+        self.assertFalse(service.get_statistics().is_backup_pending)
+
+        self.insert_values(5000, 20000)
+        service.perform_modification()
+        self.__wait_for_backups(service, 1)
+
+    def test_shutdown_waitsForRunningBackup(self):
+        service = self.__create_service()
+        backupStarted = threading.Event()
+        releaseBackup = threading.Event()
+        originalBackup = service._BackupService__backup
+
+        def slow_backup():
+            backupStarted.set()
+            releaseBackup.wait()
+            return originalBackup()
+
+        with patch.object(service, '_BackupService__backup', side_effect=slow_backup):
+            service.backup()
+            self.assertTrue(backupStarted.wait(5))
+
+            shutdownThread = threading.Thread(target=service.shutdown)
+            shutdownThread.start()
+            shutdownThread.join(0.1)
+            self.assertTrue(shutdownThread.is_alive())
+
+            releaseBackup.set()
+            shutdownThread.join(5)
+
+        self.assertFalse(shutdownThread.is_alive())
+        self.assertEqual(1, service.get_statistics().number_of_backups)
+
+    def test_shutdown_discardsPendingBackup(self):
+        service = self.__create_service(maxModifications=1, minIntervalInSeconds=30)
+        service.perform_backup()
+        service.perform_modification()
+        self.assertTrue(service.get_statistics().is_backup_pending)
+
+        start = time.monotonic()
+        service.shutdown()
+        self.assertLess(time.monotonic() - start, 5)
+
+        service.backup()
+        time.sleep(0.1)
+        self.assertEqual(1, service.get_statistics().number_of_backups)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from logic.database.ChangeTracker import ChangeTracker
+
+
+class TestChangeTracker(unittest.TestCase):
+    def test_getState_unchanged_sameEntityTag(self):
+        tracker = ChangeTracker()
+
+        self.assertEqual(tracker.get_state(ChangeTracker.DEVICES), tracker.get_state(ChangeTracker.DEVICES))
+
+    def test_markChanged_newEntityTag(self):
+        tracker = ChangeTracker()
+        entityTag, lastModified = tracker.get_state(ChangeTracker.DEVICES, ChangeTracker.SENSORS)
+
+        tracker.mark_changed(ChangeTracker.SENSORS)
+
+        newEntityTag, newLastModified = tracker.get_state(ChangeTracker.DEVICES, ChangeTracker.SENSORS)
+        self.assertNotEqual(entityTag, newEntityTag)
+        self.assertGreaterEqual(newLastModified, lastModified)
+
+    def test_markChanged_otherKey_sameEntityTag(self):
+        tracker = ChangeTracker()
+        state = tracker.get_state(ChangeTracker.DEVICES)
+
+        tracker.mark_changed(ChangeTracker.SENSORS)
+
+        self.assertEqual(state, tracker.get_state(ChangeTracker.DEVICES))
+
+    def test_markMeasurementsChanged_onlyChangedSensors(self):
+        tracker = ChangeTracker()
+        firstSensorState = tracker.get_state(ChangeTracker.measurements_of_sensor(1))
+        secondSensorState = tracker.get_state(ChangeTracker.measurements_of_sensor(2))
+        allMeasurementsState = tracker.get_state(ChangeTracker.MEASUREMENTS)
+
+        tracker.mark_measurements_changed([1, 1])
+
+        self.assertNotEqual(firstSensorState, tracker.get_state(ChangeTracker.measurements_of_sensor(1)))
+        self.assertEqual(secondSensorState, tracker.get_state(ChangeTracker.measurements_of_sensor(2)))
+        self.assertNotEqual(allMeasurementsState, tracker.get_state(ChangeTracker.MEASUREMENTS))
+
+    def test_getState_strongEntityTag(self):
+        entityTag, __ = ChangeTracker().get_state(ChangeTracker.DEVICES)
+
+        self.assertTrue(entityTag.startswith('"'))
+        self.assertTrue(entityTag.endswith('"'))
+
+    def test_getState_differentInstances_differentEntityTags(self):
+        self.assertNotEqual(ChangeTracker().get_state(ChangeTracker.DEVICES)[0],
+                            ChangeTracker().get_state(ChangeTracker.DEVICES)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
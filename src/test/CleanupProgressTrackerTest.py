@@ -0,0 +1,63 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from logic.database import Schemas
+from logic.database.CleanupProgressTracker import CleanupProgressTracker
+
+
+class TestCleanupProgressTracker(unittest.TestCase):
+    def test_progress(self):
+        tracker = CleanupProgressTracker()
+        tracker.start(4)
+        tracker.add_processed_days(4, 100)
+        tracker.add_processed_days(6, 200)
+        tracker.finish_sensor()
+
+        with patch('logic.database.CleanupProgressTracker.time.monotonic', return_value=tracker._startTime + 2):
+            progress = tracker.get_progress()
+
+        self.assertEqual(Schemas.DatabaseCleanupStatus.RUNNING, progress.status)
+        self.assertEqual((4, 1, 10, 300), (progress.number_of_sensors, progress.number_of_processed_sensors,
+                                           progress.number_of_processed_days, progress.number_of_deleted_measurements))
+        self.assertEqual(150, progress.deleted_measurements_per_second)
+        self.assertEqual(6, progress.estimated_remaining_time_in_seconds)
+
+    def test_noSensorProcessed_noEstimation(self):
+        tracker = CleanupProgressTracker()
+        tracker.start(4)
+
+        self.assertIsNone(tracker.get_progress().estimated_remaining_time_in_seconds)
+
+    def test_finish(self):
+        tracker = CleanupProgressTracker()
+        tracker.start(1)
+        tracker.add_processed_days(1, 1)
+        tracker.finish_sensor()
+        tracker.finish()
+
+        progress = tracker.get_progress()
+        self.assertEqual(Schemas.DatabaseCleanupStatus.FINISHED, progress.status)
+        self.assertIsNone(progress.estimated_remaining_time_in_seconds)
+
+    def test_cancel(self):
+        tracker = CleanupProgressTracker()
+        self.assertFalse(tracker.is_stop_requested())
+
+        tracker.cancel()
+        self.assertTrue(tracker.is_stop_requested())
+        tracker.finish()
+        self.assertEqual(Schemas.DatabaseCleanupStatus.CANCELLED, tracker.get_status())
+
+    def test_maxRuntime(self):
+        tracker = CleanupProgressTracker()
+        tracker.set_max_runtime(0.05)
+        self.assertFalse(tracker.is_stop_requested())
+
+        time.sleep(0.06)
+        self.assertTrue(tracker.is_stop_requested())
+        self.assertEqual(Schemas.DatabaseCleanupStatus.TIME_LIMIT_REACHED, tracker.get_status())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from email.utils import formatdate
+from unittest.mock import Mock, patch
+
+from fastapi import Request, Response
+
+from logic.database.ChangeTracker import ChangeTracker
+
+
+def create_request(**headers) -> Request:
+    return Request({'type': 'http',
+                    'method': 'GET',
+                    'headers': [(name.replace('_', '-').lower().encode(), value.encode())
+                                for name, value in headers.items()]})
+
+
+class TestConditionalRequests(unittest.TestCase):
+    def setUp(self):
+        self.changeTracker = ChangeTracker()
+        self._patcher = patch.dict('sys.modules', **{'logic.database.Crud': Mock(CHANGE_TRACKER=self.changeTracker)})
+        self._patcher.start()
+
+        import logic.ConditionalRequests
+        self.conditionalRequests = logic.ConditionalRequests
+        self.entityTag, self.lastModified = self.changeTracker.get_state(ChangeTracker.SENSORS)
+
+    def tearDown(self):
+        self._patcher.stop()
+
+    def test_noConditions_setsValidators(self):
+        response = Response()
+
+        self.assertIsNone(self.conditionalRequests.check_not_modified(create_request(), response,
+                                                                      ChangeTracker.SENSORS))
+        self.assertEqual(self.entityTag, response.headers['etag'])
+        self.assertEqual(formatdate(self.lastModified, usegmt=True), response.headers['last-modified'])
+
+    def test_ifNoneMatch_matching_notModified(self):
+        request = create_request(If_None_Match=f'"other", W/{self.entityTag}')
+
+        result = self.conditionalRequests.check_not_modified(request, Response(), ChangeTracker.SENSORS)
+
+        self.assertEqual(304, result.status_code)
+        self.assertEqual(self.entityTag, result.headers['etag'])
+
+    def test_ifNoneMatch_star_notModified(self):
+        result = self.conditionalRequests.check_not_modified(create_request(If_None_Match='*'), Response(),
+                                                             ChangeTracker.SENSORS)
+        self.assertEqual(304, result.status_code)
+
+    def test_ifNoneMatch_changed_modified(self):
+        request = create_request(If_None_Match=self.entityTag)
+        self.changeTracker.mark_changed(ChangeTracker.SENSORS)
+
+        self.assertIsNone(self.conditionalRequests.check_not_modified(request, Response(), ChangeTracker.SENSORS))
+
+    def test_ifNoneMatch_precedesIfModifiedSince(self):
+        request = create_request(If_None_Match='"other"',
+                                 If_Modified_Since=formatdate(self.lastModified + 60, usegmt=True))
+
+        self.assertIsNone(self.conditionalRequests.check_not_modified(request, Response(), ChangeTracker.SENSORS))
+
+    def test_ifModifiedSince_notModified(self):
+        request = create_request(If_Modified_Since=formatdate(self.lastModified, usegmt=True))
+
+        result = self.conditionalRequests.check_not_modified(request, Response(), ChangeTracker.SENSORS)
+
+        self.assertEqual(304, result.status_code)
+
+    def test_ifModifiedSince_older_modified(self):
+        request = create_request(If_Modified_Since=formatdate(self.lastModified - 60, usegmt=True))
+
+        self.assertIsNone(self.conditionalRequests.check_not_modified(request, Response(), ChangeTracker.SENSORS))
+
+    def test_ifModifiedSince_invalid_modified(self):
+        request = create_request(If_Modified_Since='yesterday')
+
+        self.assertIsNone(self.conditionalRequests.check_not_modified(request, Response(), ChangeTracker.SENSORS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import base64
+import unittest
+
+from logic.database import Cursor
+
+
+class TestCursor(unittest.TestCase):
+    def test_roundTrip(self):
+        token = Cursor.encode_cursor(3, 1610820922, 42)
+        self.assertEqual((3, 1610820922, 42), Cursor.decode_cursor(token, 3))
+
+    def test_noPadding(self):
+        self.assertNotIn('=', Cursor.encode_cursor(1, 2, 3))
+
+    def test_invalidToken(self):
+        with self.assertRaises(ValueError):
+            Cursor.decode_cursor('no cursor!', 3)
+
+    def test_wrongKeyLength(self):
+        with self.assertRaises(ValueError):
+            Cursor.decode_cursor(Cursor.encode_cursor(1, 2), 3)
+
+    def test_noIntegers(self):
+        with self.assertRaises(ValueError):
+            Cursor.decode_cursor(base64.urlsafe_b64encode(b'1,a,3').decode('ascii'), 3)
+
+    def test_splitPage_lastPage(self):
+        self.assertEqual(([1, 2], None), Cursor.split_page([1, 2], 2, lambda item: (item,)))
+
+    def test_splitPage_furtherPage(self):
+        page, nextCursor = Cursor.split_page([1, 2, 3], 2, lambda item: (item,))
+        self.assertEqual([1, 2], page)
+        self.assertEqual((2,), Cursor.decode_cursor(nextCursor, 1))
+
+    def test_splitPage_noLimit(self):
+        self.assertEqual(([1, 2, 3], None), Cursor.split_page([1, 2, 3], None, lambda item: (item,)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,93 @@
+# imported before any test patches sys.modules, the process pool pickles classes of this module
+import concurrent.futures.process
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
 import unittest
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Optional, Set, Tuple
 from unittest.mock import Mock, patch
 
+from sqlalchemy.orm import sessionmaker
 from TheCodeLabs_BaseUtils.DefaultLogger import DefaultLogger
 
 from logic import Constants
-from logic.database import Schemas
+from logic.database import MeasurementFormat, Schemas
 from logic.database.RetentionPolicy import RetentionPolicy
 
 CURRENT_DATE_TIME = datetime(year=2021, month=8, day=18, hour=22, minute=0, second=0)
 DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 LOGGER = DefaultLogger().create_logger_if_not_exists(Constants.APP_NAME)
 
+SETTINGS = {
+    'database': {
+        'databasePath': 'storageLeaf.db',
+        'backup': {}
+    },
+    'api': {}
+}
+
+
+class FakeMeasurementStore:
+    def __init__(self, measurements: List[Schemas.Measurement]):
+        self._measurements = list(measurements)
+
+    def get_measurements_for_sensor(self, db, startTime, endTime, sensorId):
+        result = [m for m in self._measurements if m.sensor_id == sensorId and startTime <= m.timestamp <= endTime]
+        return sorted(result, key=lambda m: (m.timestamp, m.id), reverse=True)
+
+    def get_measurement_timestamps_for_sensor(self, db, startTime, endTime, sensorId, batchSize=1000):
+        measurements = reversed(self.get_measurements_for_sensor(db, startTime, endTime, sensorId))
+        return iter([(m.id, MeasurementFormat.to_epoch_seconds(m.timestamp)) for m in measurements])
+
+    def get_first_timestamp_for_sensor(self, db, sensorId):
+        measurements = self.get_measurements_for_sensor(db, '', '~', sensorId)
+        return MeasurementFormat.to_epoch_seconds(measurements[-1].timestamp) if measurements else None
+
+    def delete_measurements_in_batches(self, db, measurementIds, batchSize=500):
+        self._measurements = [m for m in self._measurements if m.id not in measurementIds]
+
+
+def categorize_measurements_for_day(getMeasurementsForSensor: Callable, date: date, policy: RetentionPolicy,
+                                    sensorId: int) -> Tuple[List[int], Set[int]]:
+    # reference implementation with one query per measurement point, DatabaseCleaner._categorize_measurements must
+    # produce the same result in a single pass
+    points = policy.determine_measurement_points(date)
+
+    measurementIdsToKeep = []
+    allMeasurementIds = set()
+    for index, point in enumerate(points):
+        if index == 0:
+            previousItem = point
+        else:
+            previousItem = points[index - 1]
+
+        if index == (len(points) - 1):
+            nextItem = datetime(year=point.year, month=point.month, day=point.day, hour=23, minute=59, second=59)
+        else:
+            nextItem = points[index + 1]
+
+        possibleMeasurements = getMeasurementsForSensor(None, previousItem.strftime(DATE_FORMAT),
+                                                        nextItem.strftime(DATE_FORMAT), sensorId)
+        allMeasurementIds.update([m.id for m in possibleMeasurements])
+
+        closestMeasurement = get_closest_measurement_for_point(possibleMeasurements, point)
+        if closestMeasurement is not None:
+            measurementIdsToKeep.append(closestMeasurement.id)
+
+    return measurementIdsToKeep, {m for m in allMeasurementIds if m not in measurementIdsToKeep}
+
+
+def get_closest_measurement_for_point(measurements: List[Schemas.Measurement],
+                                      point: datetime) -> Optional[Schemas.Measurement]:
+    if not measurements:
+        return None
+
+    return min(measurements, key=lambda m: abs(datetime.strptime(m.timestamp, DATE_FORMAT) - point))
+
 
 class TestRetentionPolicy(unittest.TestCase):
     def test_determineMeasurementPoints_oddNumberOfPoints_raise(self):
@@ -58,30 +134,30 @@ class TestRetentionPolicy(unittest.TestCase):
 
 
 class TestDatabaseCleaner(unittest.TestCase):
-    FIRST_MEASUREMENT = Schemas.Measurement(id=0, value=18, sensor_id=1,
+    FIRST_MEASUREMENT = Schemas.Measurement(id=0, value='18', sensor_id=1,
                                             timestamp=datetime(year=2021, month=8, day=1,
                                                                hour=22, minute=45, second=0).strftime(DATE_FORMAT))
 
-    MEASUREMENT1 = Schemas.Measurement(id=1, value=5, sensor_id=1,
+    MEASUREMENT1 = Schemas.Measurement(id=1, value='5', sensor_id=1,
                                        timestamp=datetime(year=2021, month=8, day=18,
                                                           hour=6, minute=55, second=0).strftime(DATE_FORMAT))
-    MEASUREMENT2 = Schemas.Measurement(id=2, value=5, sensor_id=1,
+    MEASUREMENT2 = Schemas.Measurement(id=2, value='5', sensor_id=1,
                                        timestamp=datetime(year=2021, month=8, day=18,
                                                           hour=13, minute=15, second=0).strftime(DATE_FORMAT))
 
-    MEASUREMENT3 = Schemas.Measurement(id=3, value=5, sensor_id=1,
+    MEASUREMENT3 = Schemas.Measurement(id=3, value='5', sensor_id=1,
                                        timestamp=datetime(year=2021, month=8, day=18,
                                                           hour=13, minute=45, second=0).strftime(DATE_FORMAT))
 
-    MEASUREMENT4 = Schemas.Measurement(id=4, value=5, sensor_id=1,
+    MEASUREMENT4 = Schemas.Measurement(id=4, value='5', sensor_id=1,
                                        timestamp=datetime(year=2021, month=8, day=18,
                                                           hour=13, minute=48, second=0).strftime(DATE_FORMAT))
 
-    MEASUREMENT5 = Schemas.Measurement(id=5, value=5, sensor_id=2,
+    MEASUREMENT5 = Schemas.Measurement(id=5, value='5', sensor_id=2,
                                        timestamp=datetime(year=2021, month=8, day=18,
                                                           hour=11, minute=55, second=0).strftime(DATE_FORMAT))
 
-    MEASUREMENT6 = Schemas.Measurement(id=6, value=5, sensor_id=2,
+    MEASUREMENT6 = Schemas.Measurement(id=6, value='5', sensor_id=2,
                                        timestamp=datetime(year=2021, month=8, day=18,
                                                           hour=11, minute=54, second=0).strftime(DATE_FORMAT))
 
@@ -109,129 +185,146 @@ class TestDatabaseCleaner(unittest.TestCase):
                 return []
 
     def test__GetClosestMeasurementForPoint_noMeasurementInRange(self):
-        mockedCrud = Mock()
-        with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
-            from logic.database.DatabaseCleaner import DatabaseCleaner
-
-            result = DatabaseCleaner._get_closest_measurement_for_point([], CURRENT_DATE_TIME)
-            self.assertIsNone(result)
+        result = get_closest_measurement_for_point([], CURRENT_DATE_TIME)
+        self.assertIsNone(result)
 
     def test__GetClosestMeasurementForPoint_getClosest_AllMeasurementsBeforePoint(self):
-        mockedCrud = Mock()
-        with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
-            mockedCrud.DATE_FORMAT = DATE_FORMAT
+        expected = Schemas.Measurement(id=2, value='5', sensor_id=15,
+                                       timestamp=datetime(year=2021, month=8, day=18,
+                                                          hour=21, minute=55, second=0).strftime(DATE_FORMAT))
+        measurements = [
+            Schemas.Measurement(id=1, value='5', sensor_id=15,
+                                timestamp=datetime(year=2021, month=8, day=18,
+                                                   hour=21, minute=50, second=0).strftime(DATE_FORMAT)),
+            expected
+        ]
 
-            from logic.database.DatabaseCleaner import DatabaseCleaner
+        result = get_closest_measurement_for_point(measurements, CURRENT_DATE_TIME)
+        self.assertEqual(expected, result)
 
-            expected = Schemas.Measurement(id=2, value=5, sensor_id=15,
-                                           timestamp=datetime(year=2021, month=8, day=18,
-                                                              hour=21, minute=55, second=0).strftime(DATE_FORMAT))
-            measurements = [
-                Schemas.Measurement(id=1, value=5, sensor_id=15,
-                                    timestamp=datetime(year=2021, month=8, day=18,
-                                                       hour=21, minute=50, second=0).strftime(DATE_FORMAT)),
-                expected
-            ]
+    def test__GetClosestMeasurementForPoint_getClosest_AllMeasurementsAfterPoint(self):
+        expected = Schemas.Measurement(id=1, value='5', sensor_id=15,
+                                       timestamp=datetime(year=2021, month=8, day=18,
+                                                          hour=22, minute=15, second=0).strftime(DATE_FORMAT))
+        measurements = [
+            expected,
+            Schemas.Measurement(id=1, value='5', sensor_id=15,
+                                timestamp=datetime(year=2021, month=8, day=18,
+                                                   hour=22, minute=30, second=0).strftime(DATE_FORMAT))
+        ]
 
-            result = DatabaseCleaner._get_closest_measurement_for_point(measurements, CURRENT_DATE_TIME)
-            self.assertEqual(expected, result)
+        result = get_closest_measurement_for_point(measurements, CURRENT_DATE_TIME)
+        self.assertEqual(expected, result)
 
-    def test__GetClosestMeasurementForPoint_getClosest_AllMeasurementsAfterPoint(self):
-        mockedCrud = Mock()
-        with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
-            mockedCrud.DATE_FORMAT = DATE_FORMAT
+    def test__GetClosestMeasurementForPoint_getClosest_BothSidesOfPoint(self):
+        expected = Schemas.Measurement(id=1, value='5', sensor_id=15,
+                                       timestamp=datetime(year=2021, month=8, day=18,
+                                                          hour=21, minute=55, second=0).strftime(DATE_FORMAT))
+        measurements = [
+            expected,
+            Schemas.Measurement(id=1, value='5', sensor_id=15,
+                                timestamp=datetime(year=2021, month=8, day=18,
+                                                   hour=22, minute=10, second=0).strftime(DATE_FORMAT))
+        ]
 
-            from logic.database.DatabaseCleaner import DatabaseCleaner
+        result = get_closest_measurement_for_point(measurements, CURRENT_DATE_TIME)
+        self.assertEqual(expected, result)
 
-            expected = Schemas.Measurement(id=1, value=5, sensor_id=15,
-                                           timestamp=datetime(year=2021, month=8, day=18,
-                                                              hour=22, minute=15, second=0).strftime(DATE_FORMAT))
-            measurements = [
-                expected,
-                Schemas.Measurement(id=1, value=5, sensor_id=15,
-                                    timestamp=datetime(year=2021, month=8, day=18,
-                                                       hour=22, minute=30, second=0).strftime(DATE_FORMAT))
-            ]
+    def test__GetClosestMeasurementForPoint_getClosest_EqualDistance(self):
+        expected = Schemas.Measurement(id=1, value='5', sensor_id=15,
+                                       timestamp=datetime(year=2021, month=8, day=18,
+                                                          hour=21, minute=55, second=0).strftime(DATE_FORMAT))
+        measurements = [
+            expected,
+            Schemas.Measurement(id=1, value='5', sensor_id=15,
+                                timestamp=datetime(year=2021, month=8, day=18,
+                                                   hour=22, minute=5, second=0).strftime(DATE_FORMAT))
+        ]
 
-            result = DatabaseCleaner._get_closest_measurement_for_point(measurements, CURRENT_DATE_TIME)
-            self.assertEqual(expected, result)
+        result = get_closest_measurement_for_point(measurements, CURRENT_DATE_TIME)
+        self.assertEqual(expected, result)
 
-    def test__GetClosestMeasurementForPoint_getClosest_BothSidesOfPoint(self):
+    def test_GetMeasurementsForDay(self):
+        policy = RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=10)
+        measurementIds, idsToDelete = categorize_measurements_for_day(self.get_measurements_mocked,
+                                                                      CURRENT_DATE_TIME.date(), policy, 1)
+        self.assertEqual([self.MEASUREMENT1.id, self.MEASUREMENT1.id, self.MEASUREMENT2.id, self.MEASUREMENT4.id],
+                         measurementIds)
+        self.assertEqual({self.MEASUREMENT3.id}, idsToDelete)
+
+    def test_CategorizeMeasurements(self):
         mockedCrud = Mock()
         with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
             mockedCrud.DATE_FORMAT = DATE_FORMAT
 
             from logic.database.DatabaseCleaner import DatabaseCleaner
 
-            expected = Schemas.Measurement(id=1, value=5, sensor_id=15,
-                                           timestamp=datetime(year=2021, month=8, day=18,
-                                                              hour=21, minute=55, second=0).strftime(DATE_FORMAT))
-            measurements = [
-                expected,
-                Schemas.Measurement(id=1, value=5, sensor_id=15,
-                                    timestamp=datetime(year=2021, month=8, day=18,
-                                                       hour=22, minute=10, second=0).strftime(DATE_FORMAT))
-            ]
-
-            result = DatabaseCleaner._get_closest_measurement_for_point(measurements, CURRENT_DATE_TIME)
-            self.assertEqual(expected, result)
+            measurements = [(m.id, datetime.strptime(m.timestamp, DATE_FORMAT))
+                            for m in [self.MEASUREMENT1, self.MEASUREMENT2, self.MEASUREMENT3, self.MEASUREMENT4]]
+            policy = RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=10)
+            measurementIds, idsToDelete = DatabaseCleaner._categorize_measurements(measurements,
+                                                                                   CURRENT_DATE_TIME.date(), policy)
+            self.assertEqual({self.MEASUREMENT1.id, self.MEASUREMENT2.id, self.MEASUREMENT4.id}, measurementIds)
+            self.assertEqual({self.MEASUREMENT3.id}, idsToDelete)
 
-    def test__GetClosestMeasurementForPoint_getClosest_EqualDistance(self):
+    def test_CategorizeMeasurements_equalToCategorizeMeasurementsForDay(self):
         mockedCrud = Mock()
         with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
             mockedCrud.DATE_FORMAT = DATE_FORMAT
 
             from logic.database.DatabaseCleaner import DatabaseCleaner
 
-            expected = Schemas.Measurement(id=1, value=5, sensor_id=15,
-                                           timestamp=datetime(year=2021, month=8, day=18,
-                                                              hour=21, minute=55, second=0).strftime(DATE_FORMAT))
-            measurements = [
-                expected,
-                Schemas.Measurement(id=1, value=5, sensor_id=15,
-                                    timestamp=datetime(year=2021, month=8, day=18,
-                                                       hour=22, minute=5, second=0).strftime(DATE_FORMAT))
-            ]
+            randomGenerator = random.Random(42)
+            date = CURRENT_DATE_TIME.date()
+            dayStart = datetime(year=date.year, month=date.month, day=date.day)
 
-            result = DatabaseCleaner._get_closest_measurement_for_point(measurements, CURRENT_DATE_TIME)
-            self.assertEqual(expected, result)
+            for iteration in range(200):
+                numberOfMeasurements = randomGenerator.randint(0, 60)
+                measurements = []
+                for measurementId in range(numberOfMeasurements):
+                    # coarse offsets provoke duplicate timestamps, hits on points and equal distances
+                    offsetInMinutes = randomGenerator.choice([randomGenerator.randint(0, 24 * 60 - 1),
+                                                              randomGenerator.randint(0, 48) * 30])
+                    timestamp = min(dayStart + timedelta(minutes=offsetInMinutes),
+                                    dayStart + timedelta(hours=23, minutes=59, seconds=59))
+                    measurements.append(Schemas.Measurement(id=measurementId, value='5', sensor_id=1,
+                                                            timestamp=timestamp.strftime(DATE_FORMAT)))
 
-    def test_GetMeasurementsForDay(self):
-        mockedCrud = Mock()
-        with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
-            mockedCrud.DATE_FORMAT = DATE_FORMAT
-            mockedCrud.get_measurements_for_sensor.side_effect = self.get_measurements_mocked
+                store = FakeMeasurementStore(measurements)
 
-            from logic.database.DatabaseCleaner import DatabaseCleaner
+                for numberOfMeasurementsPerDay in [2, 4, 24, 30]:
+                    policy = RetentionPolicy(numberOfMeasurementsPerDay=numberOfMeasurementsPerDay, ageInDays=1)
 
-            database = Mock()
-            policy = RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=10)
-            measurementIds, idsToDelete = DatabaseCleaner._categorize_measurements_for_day(database,
-                                                                                           CURRENT_DATE_TIME.date(),
-                                                                                           policy, 1)
-            self.assertEqual([self.MEASUREMENT1.id, self.MEASUREMENT1.id, self.MEASUREMENT2.id, self.MEASUREMENT4.id],
-                             measurementIds)
-            self.assertEqual({self.MEASUREMENT3.id}, idsToDelete)
+                    expectedToKeep, expectedToDelete = categorize_measurements_for_day(
+                        store.get_measurements_for_sensor, date, policy, 1)
+
+                    rows = [(m.id, datetime.strptime(m.timestamp, DATE_FORMAT))
+                            for m in reversed(store.get_measurements_for_sensor(None, '', '~', 1))]
+                    idsToKeep, idsToDelete = DatabaseCleaner._categorize_measurements(rows, date, policy)
+
+                    self.assertEqual(set(expectedToKeep), idsToKeep, f'iteration {iteration}')
+                    self.assertEqual(expectedToDelete, idsToDelete, f'iteration {iteration}')
 
     def test_noRetentionPolicies_doNothing(self):
         mockedCrud = Mock()
         with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
-            mockedCrud.get_measurements_for_sensor.return_value = []
+            mockedCrud.get_measurement_timestamps_for_sensor.return_value = []
 
             database = Mock()
             from logic.database.DatabaseCleaner import DatabaseCleaner
             DatabaseCleaner([], False).clean(database, CURRENT_DATE_TIME)
 
-            mockedCrud.get_measurements_for_sensor.assert_not_called()
+            mockedCrud.get_measurement_timestamps_for_sensor.assert_not_called()
+            mockedCrud.delete_measurements_in_batches.assert_not_called()
 
     def test_onePolicy_deleteMeasurements_oneSensor(self):
         mockedCrud = Mock()
         with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
-            mockedCrud.DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
-            mockedCrud.get_measurements_for_sensor.side_effect = self.get_measurements_mocked
+            store = FakeMeasurementStore([self.FIRST_MEASUREMENT, self.MEASUREMENT1, self.MEASUREMENT2,
+                                          self.MEASUREMENT3, self.MEASUREMENT4])
+            self.__mock_crud(mockedCrud, store)
             mockedCrud.get_sensors.return_value = [Schemas.Sensor(id=1, name="myTempSensor",
                                                                   type="temperature", device_id=1)]
-            mockedCrud.get_first_measurement_for_sensor.return_value = self.FIRST_MEASUREMENT
 
             database = Mock()
             from logic.database.DatabaseCleaner import DatabaseCleaner
@@ -240,21 +333,35 @@ class TestDatabaseCleaner(unittest.TestCase):
             policy = RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=1)
             DatabaseCleaner([policy], False).clean(database, datetime(year=2021, month=8, day=19).date())
 
-            mockedCrud.delete_multiple_measurements.assert_called_once_with(database, {3})
+            calls = mockedCrud.delete_measurements_in_batches.call_args_list
+            self.assertEqual(1, len(calls))
+            self.assertEqual((database, [3]), calls[0].args[:2])
+            # one commit per chunk of days and per delete batch
+            self.assertEqual(3 + 1, database.commit.call_count)
 
-            calls = mockedCrud.get_measurements_for_sensor.call_args_list
-            self.assertNotIn((database, '2020-01-01 00:00:00', '2020-01-01 06:00:00', 1), [call.args for call in calls])
+            # the day of the first measurement is not touched, the days are processed in chunks
+            calls = mockedCrud.get_measurement_timestamps_for_sensor.call_args_list
+            self.assertEqual([(database, '2021-08-02 00:00:00', '2021-08-08 23:59:59', 1),
+                              (database, '2021-08-09 00:00:00', '2021-08-15 23:59:59', 1),
+                              (database, '2021-08-16 00:00:00', '2021-08-18 23:59:59', 1)],
+                             [call.args[:4] for call in calls])
 
     def test_onePolicy_deleteMeasurements_twoSensors(self):
         mockedCrud = Mock()
         with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
-            mockedCrud.DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
-            mockedCrud.get_measurements_for_sensor.side_effect = self.get_measurements_mocked
+            measurement7 = Schemas.Measurement(id=7, value='5', sensor_id=2,
+                                               timestamp=datetime(year=2021, month=8, day=18,
+                                                                  hour=11, minute=50, second=0).strftime(DATE_FORMAT))
+            firstMeasurementSensor2 = Schemas.Measurement(id=8, value='5', sensor_id=2,
+                                                          timestamp=self.FIRST_MEASUREMENT.timestamp)
+            store = FakeMeasurementStore([self.FIRST_MEASUREMENT, self.MEASUREMENT1, self.MEASUREMENT2,
+                                          self.MEASUREMENT3, self.MEASUREMENT4, self.MEASUREMENT5,
+                                          self.MEASUREMENT6, measurement7, firstMeasurementSensor2])
+            self.__mock_crud(mockedCrud, store)
             mockedCrud.get_sensors.return_value = [Schemas.Sensor(id=1, name="myTempSensor",
                                                                   type="temperature", device_id=1),
                                                    Schemas.Sensor(id=2, name="myHumiditySensor",
                                                                   type="humidity", device_id=1)]
-            mockedCrud.get_first_measurement_for_sensor.return_value = self.FIRST_MEASUREMENT
 
             database = Mock()
             from logic.database.DatabaseCleaner import DatabaseCleaner
@@ -263,20 +370,84 @@ class TestDatabaseCleaner(unittest.TestCase):
             policy = RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=1)
             DatabaseCleaner([policy], False).clean(database, datetime(year=2021, month=8, day=19).date())
 
-            calls = mockedCrud.delete_multiple_measurements.call_args_list
+            calls = mockedCrud.delete_measurements_in_batches.call_args_list
             self.assertEqual(2, len(calls))
-            self.assertEqual((database, {3}), calls[0].args)
-            self.assertEqual((database, {5}), calls[1].args)
+            self.assertEqual((database, [3]), calls[0].args[:2])
+            self.assertEqual((database, [6]), calls[1].args[:2])
+            self.assertEqual(2 * (3 + 1), database.commit.call_count)
+
+    def test_cancelled_stopAfterCurrentChunk(self):
+        mockedCrud = Mock()
+        with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
+            store = FakeMeasurementStore([self.FIRST_MEASUREMENT, self.MEASUREMENT1, self.MEASUREMENT2,
+                                          self.MEASUREMENT3, self.MEASUREMENT4, self.MEASUREMENT5,
+                                          self.MEASUREMENT6])
+            self.__mock_crud(mockedCrud, store)
+            mockedCrud.get_sensors.return_value = [Schemas.Sensor(id=1, name="myTempSensor",
+                                                                  type="temperature", device_id=1),
+                                                   Schemas.Sensor(id=2, name="myHumiditySensor",
+                                                                  type="humidity", device_id=1)]
+
+            from logic.database.CleanupProgressTracker import CleanupProgressTracker
+            from logic.database.DatabaseCleaner import DatabaseCleaner
+            from logic.database.DatabaseCleaner import RetentionPolicy
+
+            progressTracker = CleanupProgressTracker()
+            database = Mock()
+            database.commit.side_effect = progressTracker.cancel
+            databaseVacuum = Mock()
+
+            policy = RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=1)
+            DatabaseCleaner([policy], False, databaseVacuum, progressTracker=progressTracker) \
+                .clean(database, datetime(year=2021, month=8, day=19).date())
+
+            self.assertEqual(1, database.commit.call_count)
+            databaseVacuum.reclaim.assert_not_called()
+
+            progress = progressTracker.get_progress()
+            self.assertEqual(Schemas.DatabaseCleanupStatus.CANCELLED, progress.status)
+            self.assertEqual((2, 0, 7, 0), (progress.number_of_sensors, progress.number_of_processed_sensors,
+                                             progress.number_of_processed_days,
+                                             progress.number_of_deleted_measurements))
+
+    def test_cancelled_keepProgressOfProcessedChunks(self):
+        mockedCrud = Mock()
+        with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
+            store = FakeMeasurementStore([self.FIRST_MEASUREMENT, self.MEASUREMENT1, self.MEASUREMENT2,
+                                          self.MEASUREMENT3, self.MEASUREMENT4])
+            self.__mock_crud(mockedCrud, store)
+            mockedCrud.get_sensors.return_value = [Schemas.Sensor(id=1, name="myTempSensor",
+                                                                  type="temperature", device_id=1)]
+
+            from logic.database.CleanupProgressTracker import CleanupProgressTracker
+            from logic.database.DatabaseCleaner import DatabaseCleaner
+            from logic.database.DatabaseCleaner import RetentionPolicy
+
+            progressTracker = CleanupProgressTracker()
+            mockedCrud.update_retention_progress.side_effect = lambda *args: progressTracker.cancel()
+            database = Mock()
+
+            policy = RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=1)
+            DatabaseCleaner([policy], False, progressTracker=progressTracker) \
+                .clean(database, datetime(year=2021, month=8, day=19).date())
+
+            mockedCrud.update_retention_progress.assert_called_once_with(database, 1, 4, 1, '2021-08-08')
+            database.commit.assert_called_once()
+
+            progress = progressTracker.get_progress()
+            self.assertEqual(Schemas.DatabaseCleanupStatus.CANCELLED, progress.status)
+            self.assertEqual((1, 0, 7), (progress.number_of_sensors, progress.number_of_processed_sensors,
+                                         progress.number_of_processed_days))
 
     def test_twoPolicies_deleteMeasurements_oneSensor(self):
         mockedCrud = Mock()
 
         with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
-            mockedCrud.DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
-            mockedCrud.get_measurements_for_sensor.side_effect = self.get_measurements_mocked
+            store = FakeMeasurementStore([self.FIRST_MEASUREMENT, self.MEASUREMENT1, self.MEASUREMENT2,
+                                          self.MEASUREMENT3, self.MEASUREMENT4])
+            self.__mock_crud(mockedCrud, store)
             mockedCrud.get_sensors.return_value = [Schemas.Sensor(id=1, name="myTempSensor",
                                                                   type="temperature", device_id=1)]
-            mockedCrud.get_first_measurement_for_sensor.return_value = self.FIRST_MEASUREMENT
 
             database = Mock()
             from logic.database.DatabaseCleaner import DatabaseCleaner
@@ -286,20 +457,95 @@ class TestDatabaseCleaner(unittest.TestCase):
             policy2 = RetentionPolicy(numberOfMeasurementsPerDay=2, ageInDays=1)
             DatabaseCleaner([policy1, policy2], False).clean(database, datetime(year=2021, month=8, day=19).date())
 
-            calls = mockedCrud.delete_multiple_measurements.call_args_list
+            calls = mockedCrud.delete_measurements_in_batches.call_args_list
             self.assertEqual(2, len(calls))
-            self.assertEqual((database, {3}), calls[0].args)
-            self.assertEqual((database, {3, 4}), calls[1].args)
+            self.assertEqual((database, [3]), calls[0].args[:2])
+            self.assertEqual((database, [4]), calls[1].args[:2])
+            self.assertEqual(2 * 3 + 2, database.commit.call_count)
+
+    def test_onePolicy_updateRetentionProgress(self):
+        mockedCrud = Mock()
+        with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
+            store = FakeMeasurementStore([self.FIRST_MEASUREMENT, self.MEASUREMENT1])
+            self.__mock_crud(mockedCrud, store)
+            mockedCrud.get_sensors.return_value = [Schemas.Sensor(id=1, name="myTempSensor",
+                                                                  type="temperature", device_id=1)]
+
+            database = Mock()
+            from logic.database.DatabaseCleaner import DatabaseCleaner
+            from logic.database.DatabaseCleaner import RetentionPolicy
+
+            policy = RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=1)
+            DatabaseCleaner([policy], False).clean(database, datetime(year=2021, month=8, day=19).date())
+
+            calls = mockedCrud.update_retention_progress.call_args_list
+            self.assertEqual(['2021-08-08', '2021-08-15', '2021-08-18'], [call.args[4] for call in calls])
+            self.assertEqual((database, 1, 4, 1), calls[-1].args[:4])
+
+    def test_onePolicy_existingRetentionProgress_onlyProcessNewDays(self):
+        mockedCrud = Mock()
+        with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
+            store = FakeMeasurementStore([self.FIRST_MEASUREMENT, self.MEASUREMENT1, self.MEASUREMENT2,
+                                          self.MEASUREMENT3, self.MEASUREMENT4])
+            self.__mock_crud(mockedCrud, store)
+            mockedCrud.get_retention_progress.return_value = Mock(last_enforced_date='2021-08-11')
+            mockedCrud.get_sensors.return_value = [Schemas.Sensor(id=1, name="myTempSensor",
+                                                                  type="temperature", device_id=1)]
+
+            database = Mock()
+            from logic.database.DatabaseCleaner import DatabaseCleaner
+            from logic.database.DatabaseCleaner import RetentionPolicy
+
+            policy = RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=1)
+            DatabaseCleaner([policy], False).clean(database, datetime(year=2021, month=8, day=19).date())
+
+            calls = mockedCrud.get_measurement_timestamps_for_sensor.call_args_list
+            self.assertEqual(1, len(calls))
+            self.assertEqual((database, '2021-08-12 00:00:00', '2021-08-18 23:59:59', 1), calls[0].args[:4])
+            mockedCrud.delete_measurements_in_batches.assert_called_once()
+
+    def test_onePolicy_alreadyEnforced_doNothing(self):
+        mockedCrud = Mock()
+        with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
+            store = FakeMeasurementStore([self.FIRST_MEASUREMENT, self.MEASUREMENT1, self.MEASUREMENT2,
+                                          self.MEASUREMENT3, self.MEASUREMENT4])
+            self.__mock_crud(mockedCrud, store)
+            mockedCrud.get_retention_progress.return_value = Mock(last_enforced_date='2021-08-18')
+            mockedCrud.get_sensors.return_value = [Schemas.Sensor(id=1, name="myTempSensor",
+                                                                  type="temperature", device_id=1)]
+
+            database = Mock()
+            from logic.database.DatabaseCleaner import DatabaseCleaner
+            from logic.database.DatabaseCleaner import RetentionPolicy
+
+            policy = RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=1)
+            DatabaseCleaner([policy], False).clean(database, datetime(year=2021, month=8, day=19).date())
+
+            mockedCrud.get_measurement_timestamps_for_sensor.assert_not_called()
+            mockedCrud.delete_measurements_in_batches.assert_not_called()
+            mockedCrud.update_retention_progress.assert_not_called()
+
+    @staticmethod
+    def __mock_crud(mockedCrud: Mock, store: FakeMeasurementStore):
+        mockedCrud.DATE_FORMAT = DATE_FORMAT
+        mockedCrud.get_measurement_timestamps_for_sensor.side_effect = store.get_measurement_timestamps_for_sensor
+        mockedCrud.get_first_timestamp_for_sensor.side_effect = store.get_first_timestamp_for_sensor
+        mockedCrud.delete_measurements_in_batches.side_effect = store.delete_measurements_in_batches
+        mockedCrud.get_retention_progress.return_value = None
+        mockedCrud.get_max_measurement_id.return_value = 0
+        mockedCrud.has_measurements_inserted_after.return_value = False
 
     def test_forceBackupAfterCleanup(self):
         mockedCrud = Mock()
 
         with patch.dict('sys.modules', **{'logic.database.Crud': mockedCrud}):
             mockedCrud.DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
-            mockedCrud.get_measurements_for_sensor.return_value = []
+            mockedCrud.get_measurement_timestamps_for_sensor.return_value = []
+            mockedCrud.get_retention_progress.return_value = None
             mockedCrud.get_sensors.return_value = [Schemas.Sensor(id=1, name="myTempSensor",
                                                                   type="temperature", device_id=1)]
-            mockedCrud.get_first_measurement_for_sensor.return_value = self.FIRST_MEASUREMENT
+            mockedCrud.get_first_timestamp_for_sensor.return_value = \
+                MeasurementFormat.to_epoch_seconds(self.FIRST_MEASUREMENT.timestamp)
 
             database = Mock()
             from logic.database.DatabaseCleaner import DatabaseCleaner
@@ -309,3 +555,316 @@ class TestDatabaseCleaner(unittest.TestCase):
             DatabaseCleaner([policy], True).clean(database, datetime(year=2021, month=8, day=19).date())
 
             mockedCrud.BACKUP_SERVICE.backup.assert_called_once()
+
+
+class TestParallelDatabaseCleaner(unittest.TestCase):
+    CURRENT_DATE = date(2021, 4, 15)
+
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS),
+                                                     'logic.BackupService': Mock()})
+        self._patcher.start()
+
+        from logic.database import Crud, Database, Models
+        from logic.database.DatabaseCleaner import DatabaseCleaner
+        self.crud = Crud
+        self.database = Database
+        self.models = Models
+        self.databaseCleaner = DatabaseCleaner
+
+        self._directory = tempfile.mkdtemp()
+        self._engines = []
+        self._sessions = []
+
+    def tearDown(self):
+        for session in self._sessions:
+            session.close()
+        for engine in self._engines:
+            engine.dispose()
+        shutil.rmtree(self._directory)
+        self._patcher.stop()
+
+    def __create_database(self, name: str):
+        # every database gets new sensor ids
+        self.crud.IDENTITY_CACHE.invalidate()
+        self.crud.LATEST_MEASUREMENT_CACHE.invalidate()
+
+        databaseUrl = f'sqlite:///{os.path.join(self._directory, name)}'
+        engine = self.database.create_database_engine(databaseUrl, {}, isReadOnly=False)
+        readEngine = self.database.create_database_engine(databaseUrl, {}, isReadOnly=True)
+        self._engines.extend([engine, readEngine])
+        self.models.Base.metadata.create_all(bind=engine)
+
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        self._sessions.append(db)
+
+        # irregular measurements of three sensors over six weeks, the same for every database
+        generator = random.Random(42)
+        for sensorName in ['first', 'second', 'third']:
+            values = []
+            for day in range(42):
+                for minute in sorted(generator.sample(range(24 * 60), 60)):
+                    timestamp = datetime(2021, 3, 1) + timedelta(days=day, minutes=minute)
+                    values.append(Schemas.TimestampedValue(value=str(minute),
+                                                           timestamp=timestamp.strftime(DATE_FORMAT)))
+            batch = Schemas.MeasurementBatch(devices=[
+                Schemas.DeviceMeasurements(deviceName='myDevice', sensors=[
+                    Schemas.SensorValues(name=sensorName, type='temperature', values=values)
+                ])
+            ])
+            self.crud.create_measurement_batch(db, batch)
+
+        return db, sessionmaker(autocommit=False, autoflush=False, bind=readEngine)
+
+    def __clean(self, name: str, parallelSettings=None):
+        db, readSessionFactory = self.__create_database(name)
+        policies = [RetentionPolicy(numberOfMeasurementsPerDay=24, ageInDays=7),
+                    RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=21)]
+        self.databaseCleaner(policies, False, None, parallelSettings, readSessionFactory).clean(db, self.CURRENT_DATE)
+
+        measurements = db.query(self.models.Measurement.id, self.models.Measurement.timestamp,
+                                self.models.Measurement.sensor_id).order_by(self.models.Measurement.id).all()
+        progress = db.query(self.models.RetentionProgress.sensor_id, self.models.RetentionProgress.age_in_days,
+                            self.models.RetentionProgress.last_enforced_date) \
+            .order_by(self.models.RetentionProgress.sensor_id, self.models.RetentionProgress.age_in_days).all()
+        return [tuple(row) for row in measurements], [tuple(row) for row in progress]
+
+    def test_threads_sameResultAsSequential(self):
+        expected = self.__clean('sequential.db')
+        actual = self.__clean('parallel.db', {'maxWorkers': 3, 'executor': 'thread'})
+
+        self.assertLess(len(expected[0]), 3 * 42 * 60)
+        self.assertEqual(expected, actual)
+
+    def test_processes_sameResultAsSequential(self):
+        expected = self.__clean('sequential.db')
+        actual = self.__clean('parallel.db', {'maxWorkers': 2, 'executor': 'process'})
+
+        self.assertEqual(expected, actual)
+
+    def test_smallLatencyBudget_sameResultAsSequential(self):
+        expected = self.__clean('sequential.db')
+        actual = self.__clean('parallel.db', {'maxWorkers': 2, 'latencyBudgetInMilliseconds': 0.01})
+
+        self.assertEqual(expected, actual)
+
+    def test_planning_readsOneSnapshot(self):
+        db, readSessionFactory = self.__create_database('parallel.db')
+        otherDb = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())()
+        self._sessions.append(otherDb)
+        sensorId = db.query(self.models.Sensor.id).order_by(self.models.Sensor.id).first()[0]
+        policies = [RetentionPolicy(numberOfMeasurementsPerDay=24, ageInDays=7)]
+
+        getArchivedTimestampRanges = self.crud.get_archived_timestamp_ranges
+        visibleMaxIds = []
+        lock = threading.Lock()
+
+        def commit_before_get_archived_timestamp_ranges(readDb, startTime, endTime):
+            # another writer commits between the planning reads of the first planned sensor
+            with lock:
+                if not visibleMaxIds:
+                    maxIdBefore = self.crud.get_max_measurement_id(readDb)
+                    measurement = Schemas.MeasurementCreate(value='1', sensor_id=sensorId,
+                                                            timestamp='2021-03-02 12:00:00')
+                    self.crud.create_measurement(otherDb, measurement)
+                    visibleMaxIds.append((maxIdBefore, self.crud.get_max_measurement_id(readDb)))
+            return getArchivedTimestampRanges(readDb, startTime, endTime)
+
+        with patch.object(self.crud, 'get_archived_timestamp_ranges',
+                          side_effect=commit_before_get_archived_timestamp_ranges):
+            self.databaseCleaner(policies, False, None, {'maxWorkers': 2}, readSessionFactory).clean(
+                db, self.CURRENT_DATE)
+
+        maxIdBefore, maxIdAfterCommit = visibleMaxIds[0]
+        self.assertEqual(maxIdBefore, maxIdAfterCommit)
+        self.assertEqual(maxIdBefore + 1, self.crud.get_max_measurement_id(otherDb))
+
+    def test_cancelled_nextCleanupContinues(self):
+        from logic.database.CleanupProgressTracker import CleanupProgressTracker
+        expected = self.__clean('sequential.db')
+
+        db, readSessionFactory = self.__create_database('parallel.db')
+        policies = [RetentionPolicy(numberOfMeasurementsPerDay=24, ageInDays=7),
+                    RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=21)]
+        progressTracker = CleanupProgressTracker()
+        finishSensor = progressTracker.finish_sensor
+
+        def cancel_after_first_sensor(*args):
+            finishSensor(*args)
+            progressTracker.cancel()
+
+        with patch.object(progressTracker, 'finish_sensor', side_effect=cancel_after_first_sensor):
+            self.databaseCleaner(policies, False, None, {'maxWorkers': 2}, readSessionFactory,
+                                 progressTracker).clean(db, self.CURRENT_DATE)
+        self.assertEqual(1, progressTracker.get_progress().number_of_processed_sensors)
+        self.assertEqual(1, db.query(self.models.RetentionProgress.sensor_id).distinct().count())
+
+        self.databaseCleaner(policies, False, None, {'maxWorkers': 2}, readSessionFactory).clean(db, self.CURRENT_DATE)
+        measurements = db.query(self.models.Measurement.id, self.models.Measurement.timestamp,
+                                self.models.Measurement.sensor_id).order_by(self.models.Measurement.id).all()
+        self.assertEqual(expected[0], [tuple(row) for row in measurements])
+
+    def __clean_cancelled_after_first_delete_batch(self):
+        from logic.database.CleanupProgressTracker import CleanupProgressTracker
+        db, readSessionFactory = self.__create_database('parallel.db')
+        policies = [RetentionPolicy(numberOfMeasurementsPerDay=24, ageInDays=7),
+                    RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=21)]
+        progressTracker = CleanupProgressTracker()
+        deleteMeasurements = self.crud.delete_measurements_in_batches
+
+        def cancel_after_first_batch(*args):
+            deleteMeasurements(*args)
+            progressTracker.cancel()
+
+        with patch.object(self.crud, 'delete_measurements_in_batches', side_effect=cancel_after_first_batch):
+            self.databaseCleaner(policies, False, None, {'maxWorkers': 2}, readSessionFactory,
+                                 progressTracker).clean(db, self.CURRENT_DATE)
+
+        progress = db.query(self.models.RetentionProgress.sensor_id, self.models.RetentionProgress.age_in_days,
+                            self.models.RetentionProgress.last_enforced_date).all()
+        return db, policies, readSessionFactory, progressTracker.get_progress(), [tuple(row) for row in progress]
+
+    def __assert_next_cleanup_continues(self, db, policies, readSessionFactory):
+        expected = self.__clean('sequential.db')
+
+        self.databaseCleaner(policies, False, None, {'maxWorkers': 2}, readSessionFactory).clean(db, self.CURRENT_DATE)
+        measurements = db.query(self.models.Measurement.id, self.models.Measurement.timestamp,
+                                self.models.Measurement.sensor_id).order_by(self.models.Measurement.id).all()
+        self.assertEqual(expected[0], [tuple(row) for row in measurements])
+
+    def test_cancelledAfterChunk_keepProgressOfChunk(self):
+        db, policies, readSessionFactory, progress, retentionProgress = \
+            self.__clean_cancelled_after_first_delete_batch()
+
+        # the first chunk fits into a single delete batch
+        self.assertEqual(Schemas.DatabaseCleanupStatus.CANCELLED, progress.status)
+        self.assertEqual((0, 7), (progress.number_of_processed_sensors, progress.number_of_processed_days))
+        self.assertEqual(3 * 42 * 60 - db.query(self.models.Measurement).count(),
+                         progress.number_of_deleted_measurements)
+        self.assertEqual([(1, 7, '2021-03-08')], retentionProgress)
+
+        self.__assert_next_cleanup_continues(db, policies, readSessionFactory)
+
+    def test_cancelledDuringChunk_noProgress(self):
+        with patch.object(self.databaseCleaner, 'DAYS_PER_CHUNK', 14):
+            db, policies, readSessionFactory, progress, retentionProgress = \
+                self.__clean_cancelled_after_first_delete_batch()
+
+        self.assertEqual((0, 0, self.databaseCleaner.DELETE_BATCH_SIZE),
+                         (progress.number_of_processed_sensors, progress.number_of_processed_days,
+                          progress.number_of_deleted_measurements))
+        self.assertEqual([], retentionProgress)
+
+        self.__assert_next_cleanup_continues(db, policies, readSessionFactory)
+
+    def test_sequential_otherWritersBetweenDeleteBatches(self):
+        db, readSessionFactory = self.__create_database('sequential.db')
+        databaseUrl = f'sqlite:///{os.path.join(self._directory, "sequential.db")}'
+        otherEngine = self.database.create_database_engine(databaseUrl, {'busyTimeoutInMilliseconds': 100},
+                                                           isReadOnly=False)
+        self._engines.append(otherEngine)
+        otherDb = sessionmaker(autocommit=False, autoflush=False, bind=otherEngine)()
+        self._sessions.append(otherDb)
+
+        # fails with "database is locked" if the cleanup keeps its write transaction open
+        writtenMeasurements = []
+
+        def write_measurement(seconds):
+            measurement = Schemas.MeasurementCreate(value='1', sensor_id=1, timestamp='2021-04-14 12:00:00')
+            writtenMeasurements.append(self.crud.create_measurement(otherDb, measurement).id)
+
+        cleaner = self.databaseCleaner([RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=7)], False, None,
+                                       {'latencyBudgetInMilliseconds': 0.01}, readSessionFactory)
+        with patch.object(time, 'sleep', side_effect=write_measurement):
+            cleaner.clean(db, self.CURRENT_DATE)
+
+        self.assertGreater(len(writtenMeasurements), 0)
+        self.assertEqual(len(writtenMeasurements), db.query(self.models.Measurement)
+                         .filter(self.models.Measurement.id.in_(writtenMeasurements)).count())
+
+    def test_repeatedCleanup_doNothing(self):
+        db, readSessionFactory = self.__create_database('parallel.db')
+        cleaner = self.databaseCleaner([RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=7)], False, None,
+                                       {'maxWorkers': 2}, readSessionFactory)
+        cleaner.clean(db, self.CURRENT_DATE)
+        numberOfMeasurements = db.query(self.models.Measurement).count()
+
+        with patch.object(self.crud, 'delete_measurements_in_batches') as deleteMock:
+            cleaner.clean(db, self.CURRENT_DATE)
+            deleteMock.assert_not_called()
+        self.assertEqual(numberOfMeasurements, db.query(self.models.Measurement).count())
+
+    def __create_backdated_measurements(self, db, day: date):
+        # a device uploads the measurements of a whole day later on
+        values = [Schemas.TimestampedValue(value='1', timestamp=(datetime.combine(day, datetime.min.time())
+                                                                 + timedelta(minutes=10 * index)).strftime(DATE_FORMAT))
+                  for index in range(144)]
+        batch = Schemas.MeasurementBatch(devices=[
+            Schemas.DeviceMeasurements(deviceName='myDevice', sensors=[
+                Schemas.SensorValues(name='first', type='temperature', values=values)
+            ])
+        ])
+        self.crud.create_measurement_batch(db, batch)
+
+    def __get_last_enforced_dates(self, db, sensorId: int) -> List[str]:
+        return [row[0] for row in db.query(self.models.RetentionProgress.last_enforced_date)
+                .filter(self.models.RetentionProgress.sensor_id == sensorId)
+                .order_by(self.models.RetentionProgress.age_in_days)]
+
+    def __count_measurements_of_day(self, db, sensorId: int, day: date) -> int:
+        startTimestamp = MeasurementFormat.datetime_to_epoch_seconds(datetime.combine(day, datetime.min.time()))
+        return db.query(self.models.Measurement) \
+            .filter(self.models.Measurement.sensor_id == sensorId) \
+            .filter(self.models.Measurement.timestamp >= startTimestamp) \
+            .filter(self.models.Measurement.timestamp < startTimestamp + 24 * 60 * 60) \
+            .count()
+
+    def test_backdatedMeasurements_nextCleanupThinsThemOut(self):
+        for name, parallelSettings in [('sequential.db', None), ('parallel.db', {'maxWorkers': 2})]:
+            with self.subTest(name=name):
+                db, readSessionFactory = self.__create_database(name)
+                policies = [RetentionPolicy(numberOfMeasurementsPerDay=24, ageInDays=7),
+                            RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=21)]
+                cleaner = self.databaseCleaner(policies, False, None, parallelSettings, readSessionFactory)
+                cleaner.clean(db, self.CURRENT_DATE)
+                sensorId = db.query(self.models.Sensor.id).filter(self.models.Sensor.name == 'first').scalar()
+                self.assertEqual(['2021-04-08', '2021-03-25'], self.__get_last_enforced_dates(db, sensorId))
+
+                self.__create_backdated_measurements(db, date(2021, 3, 10))
+                self.assertEqual(['2021-03-09', '2021-03-09'], self.__get_last_enforced_dates(db, sensorId))
+
+                cleaner.clean(db, self.CURRENT_DATE)
+                self.assertEqual(4, self.__count_measurements_of_day(db, sensorId, date(2021, 3, 10)))
+                self.assertEqual(['2021-04-08', '2021-03-25'], self.__get_last_enforced_dates(db, sensorId))
+
+    def test_backdatedMeasurementsDuringClassification_progressNotAdvanced(self):
+        db, readSessionFactory = self.__create_database('parallel.db')
+        cleaner = self.databaseCleaner([RetentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=7)], False, None,
+                                       {'maxWorkers': 2}, readSessionFactory)
+        sensor = db.query(self.models.Sensor).filter(self.models.Sensor.name == 'first').one()
+
+        plan = cleaner._plan_cleanup_for_sensor(sensor, self.CURRENT_DATE, None, self.crud.get_max_measurement_id(db))
+        self.__create_backdated_measurements(db, date(2021, 3, 10))
+        cleaner._apply_cleanup_plan(db, plan)
+
+        # the new measurements were not classified, the progress stops at the chunk before their day
+        self.assertEqual(['2021-03-08'], self.__get_last_enforced_dates(db, sensor.id))
+        self.assertEqual(144 + 4, self.__count_measurements_of_day(db, sensor.id, date(2021, 3, 10)))
+
+        cleaner.clean(db, self.CURRENT_DATE)
+        self.assertEqual(4, self.__count_measurements_of_day(db, sensor.id, date(2021, 3, 10)))
+        self.assertEqual(['2021-04-08'], self.__get_last_enforced_dates(db, sensor.id))
+
+    def test_invalidParallelSettings_raise(self):
+        from logic.database.DatabaseCleaner import get_parallel_settings
+
+        with self.assertRaises(ValueError):
+            get_parallel_settings({'maxWorkers': 0})
+        with self.assertRaises(ValueError):
+            get_parallel_settings({'executor': 'gpu'})
+        with self.assertRaises(ValueError):
+            get_parallel_settings({'latencyBudgetInMilliseconds': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+SETTINGS = {
+    'database': {},
+    'api': {}
+}
+
+
+class TestDatabaseExecutor(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS)})
+        self._patcher.start()
+
+        from logic.DatabaseExecutor import DatabaseExecutor
+        self.executor = DatabaseExecutor(maxWorkers=2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self._patcher.stop()
+
+    async def __wait_until(self, condition):
+        for __ in range(500):
+            if condition(self.executor.get_statistics()):
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError('Condition not reached')
+
+    async def test_run_returnsResult(self):
+        result = await self.executor.run(lambda first, second=0: first + second, 1, second=2)
+
+        self.assertEqual(3, result)
+        self.assertEqual(1, self.executor.get_statistics().completed_tasks)
+
+    async def test_run_executedInWorkerThread(self):
+        threadName = await self.executor.run(lambda: threading.current_thread().name)
+
+        self.assertTrue(threadName.startswith('DatabaseExecutor'))
+
+    async def test_run_exception_raised(self):
+        def fail():
+            raise ValueError('invalid')
+
+        with self.assertRaises(ValueError):
+            await self.executor.run(fail)
+
+        statistics = self.executor.get_statistics()
+        self.assertEqual((0, 0, 1), (statistics.running_tasks, statistics.queued_tasks, statistics.completed_tasks))
+
+    async def test_run_eventLoopNotBlocked(self):
+        isReleased = threading.Event()
+        task = asyncio.create_task(self.executor.run(isReleased.wait, 5))
+
+        # the event loop keeps serving other coroutines while the task is running
+        await self.__wait_until(lambda statistics: statistics.running_tasks == 1)
+        isReleased.set()
+
+        self.assertTrue(await task)
+
+    async def test_statistics_runningAndQueuedTasks(self):
+        isReleased = threading.Event()
+        tasks = [asyncio.create_task(self.executor.run(isReleased.wait, 5)) for __ in range(3)]
+
+        # only maxWorkers tasks run at the same time, the others are queued
+        await self.__wait_until(lambda statistics: statistics.running_tasks == 2)
+        statistics = self.executor.get_statistics()
+        self.assertEqual((2, 2, 1, 0), (statistics.max_workers, statistics.running_tasks, statistics.queued_tasks,
+                                        statistics.completed_tasks))
+
+        isReleased.set()
+        await asyncio.gather(*tasks)
+
+        statistics = self.executor.get_statistics()
+        self.assertEqual((0, 0, 3), (statistics.running_tasks, statistics.queued_tasks, statistics.completed_tasks))
+
+    async def test_run_maxWorkers_limitsConcurrency(self):
+        lock = threading.Lock()
+        numberOfRunningTasks = 0
+        maxNumberOfRunningTasks = 0
+
+        def work():
+            nonlocal numberOfRunningTasks, maxNumberOfRunningTasks
+            with lock:
+                numberOfRunningTasks += 1
+                maxNumberOfRunningTasks = max(maxNumberOfRunningTasks, numberOfRunningTasks)
+            time.sleep(0.02)
+            with lock:
+                numberOfRunningTasks -= 1
+
+        await asyncio.gather(*[self.executor.run(work) for __ in range(6)])
+
+        self.assertEqual(2, maxNumberOfRunningTasks)
+        self.assertEqual(6, self.executor.get_statistics().completed_tasks)
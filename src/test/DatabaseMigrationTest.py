@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from sqlalchemy import text
+
+SETTINGS = {
+    'database': {
+        'databasePath': 'storageLeaf.db',
+        'backup': {}
+    },
+    'api': {}
+}
+
+
+class TestDatabaseMigration(unittest.TestCase):
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS),
+                                                     'logic.BackupService': Mock()})
+        self._patcher.start()
+
+        from logic.database import Database, DatabaseMigration, Models
+        self.databaseMigration = DatabaseMigration
+        self.models = Models
+
+        self._directory = tempfile.mkdtemp()
+        databaseUrl = f'sqlite:///{os.path.join(self._directory, "storageLeaf.db")}'
+        self._engine = Database.create_database_engine(databaseUrl, {}, isReadOnly=False)
+
+    def tearDown(self):
+        self._engine.dispose()
+        shutil.rmtree(self._directory)
+        self._patcher.stop()
+
+    def test_sensorAutoincrement_newDatabase_notRequired(self):
+        self.models.Base.metadata.create_all(bind=self._engine)
+
+        self.assertFalse(self.databaseMigration.is_sensor_autoincrement_migration_required(self._engine))
+
+    def test_sensorAutoincrement_migrate(self):
+        # sensor table of databases created before sensor ids were protected from reuse
+        with self._engine.begin() as connection:
+            connection.execute(text('CREATE TABLE sensor (id INTEGER NOT NULL, name VARCHAR NOT NULL, '
+                                    'type VARCHAR NOT NULL, device_id INTEGER, PRIMARY KEY (id))'))
+            connection.execute(text('INSERT INTO sensor (id, name, type, device_id) '
+                                    'VALUES (1, \'first\', \'temperature\', 1), (2, \'second\', \'humidity\', 1)'))
+        self.assertTrue(self.databaseMigration.is_sensor_autoincrement_migration_required(self._engine))
+
+        self.databaseMigration.migrate_sensor_autoincrement(self._engine)
+        self.models.Base.metadata.create_all(bind=self._engine)
+        self.databaseMigration.migrate_indexes(self._engine)
+        self.assertFalse(self.databaseMigration.is_sensor_autoincrement_migration_required(self._engine))
+
+        with self._engine.begin() as connection:
+            self.assertEqual([(1, 'first'), (2, 'second')],
+                             [tuple(row) for row in connection.execute(text('SELECT id, name FROM sensor ORDER BY id'))])
+            connection.execute(text('DELETE FROM sensor WHERE id = 2'))
+            connection.execute(text('INSERT INTO sensor (name, type, device_id) VALUES (\'third\', \'humidity\', 1)'))
+            self.assertEqual([1, 3], [row[0] for row in connection.execute(text('SELECT id FROM sensor ORDER BY id'))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+SETTINGS = {
+    'database': {
+        'databasePath': 'storageLeaf.db',
+        'backup': {}
+    },
+    'api': {}
+}
+
+
+class TestDatabaseVacuum(unittest.TestCase):
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS),
+                                                     'logic.BackupService': Mock()})
+        self._patcher.start()
+
+        from logic.database import Database, DatabaseVacuum, Models, Schemas
+        self.databaseVacuum = DatabaseVacuum
+        self.models = Models
+        self.schemas = Schemas
+
+        self._directory = tempfile.mkdtemp()
+        databaseUrl = f'sqlite:///{os.path.join(self._directory, "storageLeaf.db")}'
+        self._engine = Database.create_database_engine(databaseUrl, {}, isReadOnly=False)
+
+    def tearDown(self):
+        self._engine.dispose()
+        shutil.rmtree(self._directory)
+        self._patcher.stop()
+
+    def __create_database(self, vacuumSettings):
+        self.databaseVacuum.prepare_auto_vacuum(self._engine, vacuumSettings)
+        self.models.Base.metadata.create_all(bind=self._engine)
+        db = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)()
+
+        db.add(self.models.Device(name='myDevice'))
+        db.flush()
+        db.add(self.models.Sensor(name='mySensor', type='temperature', device_id=1))
+        db.flush()
+        db.execute(self.models.Measurement.__table__.insert(),
+                   [{'timestamp': index, 'value': float(index), 'sensor_id': 1} for index in range(50000)])
+        db.commit()
+
+        db.execute(text('DELETE FROM measurement WHERE id > 1000'))
+        db.commit()
+        return db
+
+    def __get_pragma(self, db, name: str) -> int:
+        return db.connection().exec_driver_sql(f'PRAGMA {name}').scalar()
+
+    def test_getSettings_invalidMode_raise(self):
+        with self.assertRaises(ValueError):
+            self.databaseVacuum.get_settings({'mode': 'sometimes'})
+
+    def test_prepareAutoVacuum_newDatabase(self):
+        db = self.__create_database({})
+        self.assertEqual(self.databaseVacuum.AUTO_VACUUM_INCREMENTAL, self.__get_pragma(db, 'auto_vacuum'))
+        db.close()
+
+    def test_incremental(self):
+        db = self.__create_database({})
+        freePages = self.__get_pragma(db, 'freelist_count')
+
+        vacuumInfo = self.databaseVacuum.DatabaseVacuum({'pagesPerStep': 10,
+                                                         'pauseBetweenStepsInMilliseconds': 0}).reclaim(db)
+
+        self.assertEqual(self.schemas.VacuumMode.INCREMENTAL, vacuumInfo.mode)
+        self.assertEqual(freePages, vacuumInfo.free_pages_before)
+        self.assertEqual(0, vacuumInfo.free_pages_after)
+        self.assertEqual(freePages, vacuumInfo.reclaimed_pages)
+        self.assertEqual(1000, db.query(self.models.Measurement).count())
+        db.close()
+
+    def test_incremental_maxPagesPerCleanup(self):
+        db = self.__create_database({})
+        freePages = self.__get_pragma(db, 'freelist_count')
+
+        vacuumInfo = self.databaseVacuum.DatabaseVacuum({'pagesPerStep': 7, 'pauseBetweenStepsInMilliseconds': 0,
+                                                         'maxPagesPerCleanup': 20}).reclaim(db)
+
+        self.assertEqual(20, vacuumInfo.reclaimed_pages)
+        self.assertEqual(freePages - 20, vacuumInfo.free_pages_after)
+        db.close()
+
+    def test_belowThreshold_skip(self):
+        db = self.__create_database({})
+        pageCount = self.__get_pragma(db, 'page_count')
+
+        vacuumInfo = self.databaseVacuum.DatabaseVacuum({'freePageThresholdInPercent': 100}).reclaim(db)
+
+        self.assertEqual(self.schemas.VacuumMode.NONE, vacuumInfo.mode)
+        self.assertEqual(0, vacuumInfo.reclaimed_pages)
+        self.assertEqual(pageCount, self.__get_pragma(db, 'page_count'))
+        db.close()
+
+    def test_existingDatabase_convertedByFirstVacuum(self):
+        db = self.__create_database({'mode': 'full'})
+        self.assertEqual(0, self.__get_pragma(db, 'auto_vacuum'))
+
+        vacuumInfo = self.databaseVacuum.DatabaseVacuum({}).reclaim(db)
+
+        self.assertEqual(self.schemas.VacuumMode.FULL, vacuumInfo.mode)
+        self.assertEqual(0, vacuumInfo.free_pages_after)
+        self.assertGreater(vacuumInfo.reclaimed_pages, 0)
+        self.assertEqual(self.databaseVacuum.AUTO_VACUUM_INCREMENTAL, self.__get_pragma(db, 'auto_vacuum'))
+        db.close()
+
+    def test_full(self):
+        db = self.__create_database({'mode': 'full'})
+
+        vacuumInfo = self.databaseVacuum.DatabaseVacuum({'mode': 'full'}).reclaim(db)
+
+        self.assertEqual(self.schemas.VacuumMode.FULL, vacuumInfo.mode)
+        self.assertEqual(0, vacuumInfo.free_pages_after)
+        self.assertEqual(0, self.__get_pragma(db, 'auto_vacuum'))
+        db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+SETTINGS = {
+    'database': {
+        'databasePath': 'storageLeaf.db',
+        'backup': {}
+    },
+    'api': {
+        'key': '123'
+    }
+}
+
+
+class TestDateTimeValidation(unittest.TestCase):
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS),
+                                                     'logic.BackupService': Mock()})
+        self._patcher.start()
+
+        from logic import Dependencies
+        from logic.database import Database, Models
+        from logic.routers import MeasurementRouter, SensorRouter
+        self.dependencies = Dependencies
+
+        self._directory = tempfile.mkdtemp()
+        databaseUrl = f'sqlite:///{os.path.join(self._directory, "storageLeaf.db")}'
+        self._engine = Database.create_database_engine(databaseUrl, {}, isReadOnly=False)
+        Models.Base.metadata.create_all(bind=self._engine)
+        sessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)
+
+        def get_test_database():
+            db = sessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app = FastAPI()
+        app.include_router(SensorRouter.router)
+        app.include_router(MeasurementRouter.router)
+        # other tests may leave an older import of the dependencies behind, the routers decide which one is used
+        app.dependency_overrides[MeasurementRouter.get_read_database] = get_test_database
+        app.dependency_overrides[SensorRouter.get_read_database] = get_test_database
+        self._client = TestClient(app)
+
+    def tearDown(self):
+        self._client.close()
+        self._engine.dispose()
+        shutil.rmtree(self._directory)
+        self._patcher.stop()
+
+    def test_validateDateTime_impossibleDate_raises(self):
+        with self.assertRaises(ValueError):
+            self.dependencies.validate_date_time('2021-02-30 12:00:00')
+
+    def test_validateDateTime_valid(self):
+        self.assertEqual('2021-02-28', self.dependencies.validate_date_time('2021-02-28'))
+        self.assertEqual('', self.dependencies.validate_date_time(''))
+
+    def test_dateRangeRoutes_impossibleDate_422(self):
+        urls = ['/measurement',
+                '/measurements/statistics',
+                '/measurements/export',
+                '/sensor/1/measurements',
+                '/sensor/1/measurements/aggregated',
+                '/sensor/1/measurements/downsampled']
+
+        for url in urls:
+            for parameterName in ['startDateTime', 'endDateTime']:
+                with self.subTest(url=url, parameterName=parameterName):
+                    response = self._client.get(url, params={parameterName: '2021-02-30 12:00:00'})
+                    self.assertEqual(422, response.status_code)
+
+    def test_dateRangeRoutes_invalidTime_422(self):
+        response = self._client.get('/measurement', params={'startDateTime': '2021-01-16 25:00:00'})
+        self.assertEqual(422, response.status_code)
+
+    def test_dateRangeRoutes_validDate_200(self):
+        response = self._client.get('/measurement', params={'startDateTime': '2021-02-28',
+                                                            'endDateTime': '2021-03-01 00:00:00'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([], response.json())
@@ -0,0 +1,42 @@
+import math
+import unittest
+
+from logic.database.Downsampling import largest_triangle_three_buckets
+
+
+class TestDownsampling(unittest.TestCase):
+    def test_lessValuesThanPoints_keepAll(self):
+        self.assertEqual([0, 1, 2], largest_triangle_three_buckets([1, 2, 3], [5.0, 6.0, 7.0], 10))
+
+    def test_empty(self):
+        self.assertEqual([], largest_triangle_three_buckets([], [], 10))
+
+    def test_numberOfPoints_firstAndLastKept(self):
+        timestamps = list(range(1000))
+        values = [math.sin(t / 50) for t in timestamps]
+
+        result = largest_triangle_three_buckets(timestamps, values, 100)
+
+        self.assertEqual(100, len(result))
+        self.assertEqual(0, result[0])
+        self.assertEqual(999, result[-1])
+        self.assertEqual(sorted(set(result)), result)
+
+    def test_peakIsKept(self):
+        timestamps = list(range(100))
+        values = [0.0] * 100
+        values[42] = 100.0
+        values[77] = -50.0
+
+        result = largest_triangle_three_buckets(timestamps, values, 10)
+
+        self.assertIn(42, result)
+        self.assertIn(77, result)
+
+    def test_onePointPerBucket(self):
+        timestamps = list(range(10))
+        values = [0.0, 1.0, 5.0, 1.0, 0.0, 2.0, 0.0, 9.0, 1.0, 0.0]
+
+        result = largest_triangle_three_buckets(timestamps, values, 6)
+
+        self.assertEqual([0, 2, 3, 6, 7, 9], result)
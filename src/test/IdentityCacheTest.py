@@ -0,0 +1,50 @@
+import unittest
+
+from logic.database.IdentityCache import IdentityCache
+
+
+class TestIdentityCache(unittest.TestCase):
+    def test_getSensorId_empty_miss(self):
+        cache = IdentityCache()
+
+        self.assertIsNone(cache.get_sensor_id('myDevice', 'mySensor'))
+        self.assertEqual(0, cache.get_statistics().hits)
+        self.assertEqual(1, cache.get_statistics().misses)
+
+    def test_putSensorIds_hit(self):
+        cache = IdentityCache()
+        cache.put_sensor_ids({('myDevice', 'mySensor'): 3}, cache.generation)
+
+        self.assertEqual(3, cache.get_sensor_id('myDevice', 'mySensor'))
+        self.assertTrue(cache.get_sensor_existence(3))
+        self.assertEqual(2, cache.get_statistics().hits)
+        self.assertEqual(0, cache.get_statistics().misses)
+
+    def test_putSensorExistence_notExisting(self):
+        cache = IdentityCache()
+        cache.put_sensor_existence(5, False, cache.generation)
+
+        self.assertFalse(cache.get_sensor_existence(5))
+
+    def test_invalidate_clearsEntries(self):
+        cache = IdentityCache()
+        cache.put_sensor_ids({('myDevice', 'mySensor'): 3}, cache.generation)
+        cache.put_sensor_existence(5, False, cache.generation)
+
+        cache.invalidate()
+
+        self.assertIsNone(cache.get_sensor_id('myDevice', 'mySensor'))
+        self.assertIsNone(cache.get_sensor_existence(3))
+        self.assertIsNone(cache.get_sensor_existence(5))
+        self.assertEqual(0, cache.get_statistics().size)
+
+    def test_put_afterInvalidation_ignored(self):
+        cache = IdentityCache()
+        generation = cache.generation
+
+        cache.invalidate()
+        cache.put_sensor_ids({('myDevice', 'mySensor'): 3}, generation)
+        cache.put_sensor_existence(5, True, generation)
+
+        self.assertIsNone(cache.get_sensor_id('myDevice', 'mySensor'))
+        self.assertIsNone(cache.get_sensor_existence(5))
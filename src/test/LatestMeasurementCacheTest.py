@@ -0,0 +1,122 @@
+import unittest
+
+from logic.database import Schemas
+from logic.database.LatestMeasurementCache import LatestMeasurementCache
+
+
+def create_measurement(measurementId: int, timestamp: str, value: str = '20.5') -> Schemas.Measurement:
+    return Schemas.Measurement(id=measurementId, sensor_id=1, timestamp=timestamp, value=value)
+
+
+class TestLatestMeasurementCache(unittest.TestCase):
+    def test_get_empty_miss(self):
+        cache = LatestMeasurementCache()
+
+        self.assertEqual((False, None), cache.get(1))
+        self.assertEqual(1, cache.get_statistics().misses)
+
+    def test_put_hit(self):
+        cache = LatestMeasurementCache()
+        measurement = create_measurement(1, '2021-01-16 18:15:22')
+        cache.put(1, measurement, cache.get_version(1))
+
+        self.assertEqual((True, measurement), cache.get(1))
+        self.assertEqual(1, cache.get_statistics().hits)
+
+    def test_put_noMeasurements_hit(self):
+        cache = LatestMeasurementCache()
+        cache.put(1, None, cache.get_version(1))
+
+        self.assertEqual((True, None), cache.get(1))
+
+    def test_put_writeDuringRead_notStored(self):
+        cache = LatestMeasurementCache()
+        version = cache.get_version(1)
+        cache.offer(create_measurement(2, '2021-01-16 18:20:22'))
+
+        cache.put(1, create_measurement(1, '2021-01-16 18:15:22'), version)
+
+        self.assertEqual((False, None), cache.get(1))
+
+    def test_put_invalidateDuringRead_notStored(self):
+        cache = LatestMeasurementCache()
+        version = cache.get_version(1)
+        cache.invalidate()
+
+        cache.put(1, create_measurement(1, '2021-01-16 18:15:22'), version)
+
+        self.assertEqual((False, None), cache.get(1))
+
+    def test_offer_newer_replaces(self):
+        cache = LatestMeasurementCache()
+        cache.put(1, create_measurement(1, '2021-01-16 18:15:22'), cache.get_version(1))
+        newer = create_measurement(2, '2021-01-16 18:20:22')
+
+        cache.offer(newer)
+
+        self.assertEqual((True, newer), cache.get(1))
+
+    def test_offer_older_keeps(self):
+        cache = LatestMeasurementCache()
+        latest = create_measurement(2, '2021-01-16 18:20:22')
+        cache.put(1, latest, cache.get_version(1))
+
+        cache.offer(create_measurement(3, '2021-01-16 18:15:22'))
+
+        self.assertEqual((True, latest), cache.get(1))
+
+    def test_offer_noMeasurements_replaces(self):
+        cache = LatestMeasurementCache()
+        cache.put(1, None, cache.get_version(1))
+        measurement = create_measurement(1, '2021-01-16 18:15:22')
+
+        cache.offer(measurement)
+
+        self.assertEqual((True, measurement), cache.get(1))
+
+    def test_offer_updatedValue_replaces(self):
+        cache = LatestMeasurementCache()
+        cache.put(1, create_measurement(1, '2021-01-16 18:15:22'), cache.get_version(1))
+        updated = create_measurement(1, '2021-01-16 18:15:22', '21')
+
+        cache.offer(updated)
+
+        self.assertEqual((True, updated), cache.get(1))
+
+    def test_offer_notCached_notStored(self):
+        cache = LatestMeasurementCache()
+        cache.offer(create_measurement(1, '2021-01-16 18:15:22'))
+
+        self.assertEqual((False, None), cache.get(1))
+
+    def test_removeMeasurement_latest_removesEntry(self):
+        cache = LatestMeasurementCache()
+        cache.put(1, create_measurement(1, '2021-01-16 18:15:22'), cache.get_version(1))
+
+        cache.remove_measurement(1, 1)
+
+        self.assertEqual((False, None), cache.get(1))
+
+    def test_removeMeasurement_other_keepsEntry(self):
+        cache = LatestMeasurementCache()
+        latest = create_measurement(2, '2021-01-16 18:20:22')
+        cache.put(1, latest, cache.get_version(1))
+
+        cache.remove_measurement(1, 1)
+
+        self.assertEqual((True, latest), cache.get(1))
+
+    def test_invalidateSensors(self):
+        cache = LatestMeasurementCache()
+        cache.put(1, create_measurement(1, '2021-01-16 18:15:22'), cache.get_version(1))
+        cache.put(2, None, cache.get_version(2))
+
+        cache.invalidate_sensors([1])
+
+        self.assertEqual((False, None), cache.get(1))
+        self.assertEqual((True, None), cache.get(2))
+        self.assertEqual(1, cache.get_statistics().size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+SETTINGS = {
+    'database': {
+        'databasePath': 'storageLeaf.db',
+        'backup': {}
+    },
+    'api': {
+        'key': '123'
+    }
+}
+
+HEADERS = {'apiKey': '123'}
+
+
+class TestMeasurementBatch(unittest.TestCase):
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS),
+                                                     'logic.BackupService': Mock()})
+        self._patcher.start()
+
+        from logic import WriteBehindQueue
+        from logic.database import Crud, Database, Models, MeasurementFormat
+        from logic.routers import MeasurementRouter
+        self.writeBehindQueue = WriteBehindQueue
+        self.models = Models
+        self.measurementFormat = MeasurementFormat
+        self.measurementRouter = MeasurementRouter
+
+        Crud.IDENTITY_CACHE.invalidate()
+        Crud.LATEST_MEASUREMENT_CACHE.invalidate()
+
+        self._directory = tempfile.mkdtemp()
+        databaseUrl = f'sqlite:///{os.path.join(self._directory, "storageLeaf.db")}'
+        self._engine = Database.create_database_engine(databaseUrl, {}, isReadOnly=False)
+        Models.Base.metadata.create_all(bind=self._engine)
+        sessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)
+        self._db = sessionLocal()
+
+        def get_test_database():
+            db = sessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app = FastAPI()
+        app.include_router(MeasurementRouter.router)
+        # other tests may leave an older import of the dependencies behind, the router decides which one is used
+        app.dependency_overrides[MeasurementRouter.get_database] = get_test_database
+        app.dependency_overrides[MeasurementRouter.get_read_database] = get_test_database
+        self._client = TestClient(app)
+
+    def tearDown(self):
+        self._client.close()
+        self._db.close()
+        self._engine.dispose()
+        shutil.rmtree(self._directory)
+        self._patcher.stop()
+
+    @staticmethod
+    def __create_batch(deviceName: str, sensorName: str, values):
+        return {'devices': [{'deviceName': deviceName,
+                             'sensors': [{'name': sensorName, 'type': 'temperature', 'values': values}]}]}
+
+    def __get_sensor_names(self):
+        self._db.rollback()
+        return sorted((sensor.device.name, sensor.name) for sensor in self._db.query(self.models.Sensor).all())
+
+    def __get_measurements(self):
+        self._db.rollback()
+        measurements = self._db.query(self.models.Measurement) \
+            .order_by(self.models.Measurement.sensor_id, self.models.Measurement.timestamp) \
+            .all()
+        return [(m.sensor.name, self.measurementFormat.to_date_time_string(m.timestamp), m.value)
+                for m in measurements]
+
+    def test_batch_unknownDevicesAndSensors_created(self):
+        batch = {'devices': [
+            {'deviceName': 'myDevice',
+             'sensors': [{'name': 'mySensor', 'type': 'temperature',
+                          'values': [{'value': '20.5', 'timestamp': '2021-01-16 18:15:22'},
+                                     {'value': '21', 'timestamp': '2021-01-16 18:20:22'}]},
+                         {'name': 'myOtherSensor', 'type': 'humidity',
+                          'values': [{'value': '55', 'timestamp': '2021-01-16 18:15:22'}]}]},
+            {'deviceName': 'myOtherDevice',
+             'sensors': [{'name': 'mySensor', 'type': 'temperature',
+                          'values': [{'value': '-3.5', 'timestamp': '2021-01-16 18:15:22'}]}]}
+        ]}
+
+        response = self._client.post('/measurements/batch', json=batch, headers=HEADERS)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('Added 4 measurements', response.json()['message'])
+        self.assertEqual([('myDevice', 'myOtherSensor'), ('myDevice', 'mySensor'), ('myOtherDevice', 'mySensor')],
+                         self.__get_sensor_names())
+        self.assertEqual([('mySensor', '2021-01-16 18:15:22', 20.5),
+                          ('mySensor', '2021-01-16 18:20:22', 21.0),
+                          ('myOtherSensor', '2021-01-16 18:15:22', 55.0),
+                          ('mySensor', '2021-01-16 18:15:22', -3.5)],
+                         self.__get_measurements())
+
+    def test_batch_existingDeviceAndSensor_reused(self):
+        firstBatch = self.__create_batch('myDevice', 'mySensor', [{'value': '1', 'timestamp': '2021-01-16 18:15:22'}])
+        secondBatch = self.__create_batch('myDevice', 'mySensor', [{'value': '2', 'timestamp': '2021-01-16 18:20:22'}])
+
+        self.assertEqual(200, self._client.post('/measurements/batch', json=firstBatch, headers=HEADERS).status_code)
+        self.assertEqual(200, self._client.post('/measurements/batch', json=secondBatch, headers=HEADERS).status_code)
+
+        self._db.rollback()
+        self.assertEqual(1, self._db.query(self.models.Device).count())
+        self.assertEqual([('myDevice', 'mySensor')], self.__get_sensor_names())
+        self.assertEqual([('mySensor', '2021-01-16 18:15:22', 1.0), ('mySensor', '2021-01-16 18:20:22', 2.0)],
+                         self.__get_measurements())
+
+    def test_batch_withoutTimestamp_storedWithCurrentTime(self):
+        batch = self.__create_batch('myDevice', 'mySensor', [{'value': '20.5'}])
+
+        response = self._client.post('/measurements/batch', json=batch, headers=HEADERS)
+
+        self.assertEqual(200, response.status_code)
+        self._db.rollback()
+        self.assertEqual(1, self._db.query(self.models.Measurement).count())
+        self.assertIsNotNone(self._db.query(self.models.Measurement).one().timestamp)
+
+    def test_batch_invalidValue_422(self):
+        for value in ['', 'abc', 'nan', 'inf']:
+            with self.subTest(value=value):
+                batch = self.__create_batch('myDevice', 'mySensor', [{'value': value}])
+
+                response = self._client.post('/measurements/batch', json=batch, headers=HEADERS)
+
+                self.assertEqual(422, response.status_code)
+
+        # nothing is created for rejected batches
+        self.assertEqual([], self.__get_sensor_names())
+
+    def test_batch_invalidTimestamp_422(self):
+        for timestamp in ['2021-02-30 12:00:00', '2021-01-16']:
+            with self.subTest(timestamp=timestamp):
+                batch = self.__create_batch('myDevice', 'mySensor', [{'value': '1', 'timestamp': timestamp}])
+
+                response = self._client.post('/measurements/batch', json=batch, headers=HEADERS)
+
+                self.assertEqual(422, response.status_code)
+
+        self.assertEqual([], self.__get_measurements())
+
+    def test_batch_missingApiKey_403(self):
+        batch = self.__create_batch('myDevice', 'mySensor', [{'value': '1'}])
+
+        response = self._client.post('/measurements/batch', json=batch, headers={'apiKey': 'wrong'})
+
+        self.assertEqual(403, response.status_code)
+        self.assertEqual([], self.__get_sensor_names())
+
+    def test_multipleMeasurements_unknownDeviceAndSensors_created(self):
+        measurements = {'deviceName': 'myDevice',
+                        'sensors': [{'name': 'mySensor', 'type': 'temperature', 'value': '20.5'},
+                                    {'name': 'myOtherSensor', 'type': 'humidity', 'value': '55'}]}
+
+        response = self._client.post('/measurements/', json=measurements, headers=HEADERS)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([('myDevice', 'myOtherSensor'), ('myDevice', 'mySensor')], self.__get_sensor_names())
+        self.assertEqual([20.5, 55.0], sorted(value for __, __, value in self.__get_measurements()))
+
+    def test_batch_writeBehindQueueFull_503(self):
+        queue = Mock(is_enabled=True,
+                     enqueue=AsyncMock(side_effect=self.writeBehindQueue.QueueFullError('Write-behind queue is full')))
+        batch = self.__create_batch('myDevice', 'mySensor', [{'value': '1', 'timestamp': '2021-01-16 18:15:22'}])
+
+        with patch.object(self.measurementRouter.WriteBehindQueue, 'WRITE_BEHIND_QUEUE', queue):
+            response = self._client.post('/measurements/batch', json=batch, headers=HEADERS)
+
+        self.assertEqual(503, response.status_code)
+        self.assertEqual('Write-behind queue is full', response.json()['detail'])
+        queue.enqueue.assert_awaited_once()
+        self.assertEqual([], self.__get_measurements())
+
+    def test_batch_writeBehindQueue_rowsEnqueued(self):
+        queue = Mock(is_enabled=True, enqueue=AsyncMock())
+        batch = self.__create_batch('myDevice', 'mySensor', [{'value': '1', 'timestamp': '2021-01-16 18:15:22'}])
+
+        with patch.object(self.measurementRouter.WriteBehindQueue, 'WRITE_BEHIND_QUEUE', queue):
+            response = self._client.post('/measurements/batch', json=batch, headers=HEADERS)
+
+        self.assertEqual(200, response.status_code)
+        # the sensors are created immediately, the measurements are written by the queue
+        self.assertEqual([('myDevice', 'mySensor')], self.__get_sensor_names())
+        rows = queue.enqueue.await_args.args[0]
+        self.assertEqual([(1.0, self.measurementFormat.to_epoch_seconds('2021-01-16 18:15:22'))],
+                         [(row['value'], row['timestamp']) for row in rows])
+        self.assertEqual([], self.__get_measurements())
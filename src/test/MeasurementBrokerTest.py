@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from unittest.mock import Mock, patch
+
+SETTINGS = {
+    'api': {}
+}
+
+
+def create_measurement(measurementId: int, sensorId: int):
+    from logic.database import Schemas
+    return Schemas.Measurement(id=measurementId, sensor_id=sensorId, timestamp='2021-01-16 18:15:22', value='20.5')
+
+
+class TestMeasurementBroker(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS)})
+        self._patcher.start()
+
+        from logic.MeasurementBroker import MeasurementBroker, TooManySubscribersError
+        self.broker = MeasurementBroker(maxSubscribers=2, bufferSize=2)
+        self.tooManySubscribersError = TooManySubscribersError
+
+    def tearDown(self):
+        self._patcher.stop()
+
+    async def __publish(self, measurements):
+        # published from another thread like the database executor does
+        await asyncio.to_thread(self.broker.publish, measurements)
+        await asyncio.sleep(0)
+
+    async def test_publish_allSubscribersReceive(self):
+        first = self.broker.subscribe(None)
+        second = self.broker.subscribe(None)
+
+        await self.__publish([create_measurement(1, 1)])
+
+        self.assertEqual(1, (await first.get()).id)
+        self.assertEqual(1, (await second.get()).id)
+
+    async def test_publish_filteredBySensorIds(self):
+        subscription = self.broker.subscribe([2])
+
+        await self.__publish([create_measurement(1, 1), create_measurement(2, 2)])
+
+        self.assertEqual(2, (await subscription.get()).id)
+        self.assertTrue(self.broker.has_subscribers([2]))
+        self.assertFalse(self.broker.has_subscribers([1]))
+
+    async def test_publish_slowConsumer_dropped(self):
+        slow = self.broker.subscribe(None)
+        fast = self.broker.subscribe(None)
+
+        await self.__publish([create_measurement(1, 1), create_measurement(2, 1)])
+        self.assertEqual(1, (await fast.get()).id)
+        self.assertEqual(2, (await fast.get()).id)
+
+        await self.__publish([create_measurement(3, 1)])
+
+        self.assertIsNone(await slow.get())
+        self.assertTrue(slow.is_dropped)
+        self.assertEqual(3, (await fast.get()).id)
+        self.assertFalse(fast.is_dropped)
+
+        self.broker.unsubscribe(slow)
+        self.assertEqual(1, self.broker.get_statistics().number_of_dropped_subscribers)
+
+    async def test_subscribe_tooManySubscribers_raise(self):
+        self.broker.subscribe(None)
+        self.broker.subscribe(None)
+
+        with self.assertRaises(self.tooManySubscribersError):
+            self.broker.subscribe(None)
+
+    async def test_unsubscribe_noDelivery(self):
+        subscription = self.broker.subscribe(None)
+        self.broker.unsubscribe(subscription)
+
+        await self.__publish([create_measurement(1, 1)])
+
+        self.assertFalse(self.broker.has_subscribers([1]))
+        self.assertEqual(0, self.broker.get_statistics().number_of_subscribers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import math
+import struct
+import unittest
+
+from logic import MeasurementColumns
+
+
+class TestMeasurementColumns(unittest.TestCase):
+    def test_encode_layout(self):
+        data = MeasurementColumns.encode([(1, 2, 1610820922, 20.5), (3, 2, 1610821222, 21.0)])
+
+        self.assertEqual(16 + 2 * 4 * 8, len(data))
+        self.assertEqual((b'SLMC', 1, 0, 2), struct.unpack_from('<4sHHQ', data))
+        self.assertEqual((1, 3, 2, 2, 1610820922, 1610821222), struct.unpack_from('<6q', data, 16))
+        self.assertEqual((20.5, 21.0), struct.unpack_from('<2d', data, 16 + 6 * 8))
+
+    def test_roundTrip(self):
+        rows = [(1, 2, 1610820922, 20.5), (3, 2, 1610821222, -1.25)]
+        self.assertEqual(rows, MeasurementColumns.decode(MeasurementColumns.encode(rows)))
+
+    def test_encode_empty(self):
+        data = MeasurementColumns.encode([])
+        self.assertEqual(16, len(data))
+        self.assertEqual([], MeasurementColumns.decode(data))
+
+    def test_encode_nonNumericValue_nan(self):
+        rows = MeasurementColumns.decode(MeasurementColumns.encode([(1, 2, 1610820922, 'on'),
+                                                                    (3, 2, 1610821222, 18.0)]))
+        self.assertTrue(math.isnan(rows[0][3]))
+        self.assertEqual(18.0, rows[1][3])
+
+    def test_decode_invalidMagic_raise(self):
+        with self.assertRaises(ValueError):
+            MeasurementColumns.decode(b'JSON' + bytes(12))
+
+    def test_isAccepted(self):
+        self.assertTrue(MeasurementColumns.is_accepted('application/x-storageleaf-columns'))
+        self.assertTrue(MeasurementColumns.is_accepted('application/json;q=0.5, application/x-storageleaf-columns'))
+        self.assertFalse(MeasurementColumns.is_accepted('application/json'))
+        self.assertFalse(MeasurementColumns.is_accepted('*/*'))
+        self.assertFalse(MeasurementColumns.is_accepted(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+SETTINGS = {
+    'database': {
+        'databasePath': 'storageLeaf.db',
+        'backup': {}
+    },
+    'api': {}
+}
+
+
+class TestMeasurementExport(unittest.TestCase):
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS),
+                                                     'logic.BackupService': Mock()})
+        self._patcher.start()
+
+        from logic import MeasurementExport
+        from logic.database import Crud, Database, Models, Schemas
+        from logic.routers import MeasurementRouter
+        self.measurementExport = MeasurementExport
+        self.crud = Crud
+        self.schemas = Schemas
+
+        Crud.IDENTITY_CACHE.invalidate()
+        Crud.LATEST_MEASUREMENT_CACHE.invalidate()
+
+        self._directory = tempfile.mkdtemp()
+        databaseUrl = f'sqlite:///{os.path.join(self._directory, "storageLeaf.db")}'
+        self._engine = Database.create_database_engine(databaseUrl, {}, isReadOnly=False)
+        Models.Base.metadata.create_all(bind=self._engine)
+        sessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)
+        self._db = sessionLocal()
+
+        # three sensors, equal timestamps are ordered by id
+        timestamps = ['2021-01-16 18:15:22', '2021-01-16 18:15:22', '2021-01-16 18:20:22', '2021-01-16 18:25:22']
+        batch = Schemas.MeasurementBatch(devices=[
+            Schemas.DeviceMeasurements(deviceName='myDevice', sensors=[
+                Schemas.SensorValues(name=f'mySensor{index}', type='temperature', values=[
+                    Schemas.TimestampedValue(value=str(value), timestamp=timestamp)
+                    for value, timestamp in enumerate(timestamps)
+                ]) for index in range(3)
+            ])
+        ])
+        Crud.create_measurement_batch(self._db, batch)
+
+        self._numberOfCreatedSessions = 0
+        self._numberOfOpenSessions = 0
+
+        def get_test_database():
+            db = sessionLocal()
+            self._numberOfCreatedSessions += 1
+            self._numberOfOpenSessions += 1
+            try:
+                yield db
+            finally:
+                db.close()
+                self._numberOfOpenSessions -= 1
+
+        self._app = FastAPI()
+        self._app.include_router(MeasurementRouter.router)
+        # other tests may leave an older import of the dependencies behind, the router decides which one is used
+        self._app.dependency_overrides[MeasurementRouter.get_read_database] = get_test_database
+        self._client = TestClient(self._app)
+
+        # small chunks to read the keys of a page with several seeks
+        self._chunkSizePatcher = patch.object(MeasurementExport, 'CHUNK_SIZE', 2)
+        self._chunkSizePatcher.start()
+
+    def tearDown(self):
+        self._chunkSizePatcher.stop()
+        self._client.close()
+        self._db.close()
+        self._engine.dispose()
+        shutil.rmtree(self._directory)
+        self._patcher.stop()
+
+    def __get_all_keys(self):
+        query = self.crud.get_measurements_for_export(self._db, '', '', None, None, None)
+        return [(row.sensor_id, row.timestamp, row.id) for row in query.all()]
+
+    def __export(self, **params):
+        response = self._client.get('/measurements/export', params=params)
+        self.assertEqual(200, response.status_code)
+        return [json.loads(line) for line in response.text.splitlines()], response.headers.get('X-Next-Cursor')
+
+    def test_getNextKey_keyOfLastRowOfPage(self):
+        keys = self.__get_all_keys()
+        self.assertEqual(12, len(keys))
+
+        for limit in range(1, len(keys) + 2):
+            with self.subTest(limit=limit):
+                query = self.crud.get_measurements_for_export(self._db, '', '', None, None, None)
+                expected = keys[limit - 1] if limit < len(keys) else None
+                self.assertEqual(expected, self.measurementExport.get_next_key(query, limit))
+
+    def test_getNextKey_afterCursor(self):
+        keys = self.__get_all_keys()
+
+        query = self.crud.get_measurements_for_export(self._db, '', '', None, None, keys[4])
+        self.assertEqual(keys[9], self.measurementExport.get_next_key(query, 5))
+
+    def test_export_pagesEqualFullExport(self):
+        expected, nextCursor = self.__export()
+        self.assertIsNone(nextCursor)
+
+        measurements = []
+        params = {'limit': 5}
+        while True:
+            page, nextCursor = self.__export(**params)
+            measurements.extend(page)
+            if nextCursor is None:
+                break
+            params['cursor'] = nextCursor
+
+        self.assertEqual(12, len(expected))
+        self.assertEqual(expected, measurements)
+
+    def test_export_insertBetweenNextKeyAndStream_noMeasurementLost(self):
+        getNextKey = self.measurementExport.get_next_key
+        firstSensorId = self.__get_all_keys()[0][0]
+        insertedIds = []
+
+        def get_next_key_and_insert(query, limit):
+            nextKey = getNextKey(query, limit)
+            if not insertedIds:
+                # sorts before the next key of the first page
+                measurement = self.schemas.MeasurementCreate(value='99', sensor_id=firstSensorId,
+                                                             timestamp='2021-01-16 18:00:00')
+                insertedIds.append(self.crud.create_measurement(self._db, measurement).id)
+            return nextKey
+
+        measurements = []
+        params = {'limit': 5}
+        with patch.object(self.measurementExport, 'get_next_key', get_next_key_and_insert):
+            while True:
+                page, nextCursor = self.__export(**params)
+                measurements.extend(page)
+                if nextCursor is None:
+                    break
+                params['cursor'] = nextCursor
+
+        expectedIds = sorted(key[2] for key in self.__get_all_keys())
+        self.assertEqual(13, len(expectedIds))
+        self.assertIn(insertedIds[0], expectedIds)
+        self.assertEqual(expectedIds, sorted(measurement['id'] for measurement in measurements))
+
+    def test_export_sessionClosedAfterStream(self):
+        measurements, __ = self.__export()
+
+        self.assertEqual(12, len(measurements))
+        self.assertEqual((1, 0), (self._numberOfCreatedSessions, self._numberOfOpenSessions))
+
+    def test_export_streamNeverStarted_sessionClosed(self):
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                 'scheme': 'http', 'path': '/measurements/export', 'raw_path': b'/measurements/export',
+                 'query_string': b'limit=5', 'root_path': '', 'headers': [],
+                 'client': ('testclient', 50000), 'server': ('testserver', 80)}
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            # the client is gone before the response is started
+            raise ConnectionResetError('Client disconnected')
+
+        with self.assertRaises(ConnectionResetError):
+            asyncio.run(self._app(scope, receive, send))
+
+        self.assertEqual((1, 0), (self._numberOfCreatedSessions, self._numberOfOpenSessions))
@@ -0,0 +1,58 @@
+import random
+import unittest
+from datetime import datetime
+
+from logic.database import MeasurementFormat
+
+
+class TestMeasurementFormat(unittest.TestCase):
+    def test_toEpochSeconds(self):
+        self.assertEqual(0, MeasurementFormat.to_epoch_seconds('1970-01-01 00:00:00'))
+        self.assertEqual(1610821322, MeasurementFormat.to_epoch_seconds('2021-01-16 18:22:02'))
+
+    def test_toEpochSeconds_invalidFormat_raise(self):
+        with self.assertRaises(ValueError):
+            MeasurementFormat.to_epoch_seconds('16.01.2021 18:22:02')
+
+    def test_toDateTimeString_roundTrip(self):
+        for dateTime in ['2021-01-16 18:22:02', '2021-03-28 02:30:00', '1999-12-31 23:59:59']:
+            epochSeconds = MeasurementFormat.to_epoch_seconds(dateTime)
+            self.assertEqual(dateTime, MeasurementFormat.to_date_time_string(epochSeconds))
+
+    def test_rangeBoundToEpochSeconds_withoutTime(self):
+        self.assertEqual(MeasurementFormat.to_epoch_seconds('2021-01-16 00:00:00'),
+                         MeasurementFormat.range_bound_to_epoch_seconds('2021-01-16'))
+
+    def test_toDatetime(self):
+        self.assertEqual(datetime(year=2021, month=1, day=16, hour=18, minute=22, second=2),
+                         MeasurementFormat.to_datetime(1610821322))
+
+    def test_parseValue(self):
+        self.assertEqual(20.5, MeasurementFormat.parse_value('20.5'))
+        self.assertEqual(-3.0, MeasurementFormat.parse_value('-3'))
+
+    def test_parseValue_notNumeric_raise(self):
+        for value in ['abc', '', 'nan', 'inf']:
+            with self.assertRaises(ValueError):
+                MeasurementFormat.parse_value(value)
+
+    def test_formatValue(self):
+        self.assertEqual('20.5', MeasurementFormat.format_value(20.5))
+        self.assertEqual('18', MeasurementFormat.format_value(18.0))
+        self.assertEqual('0.1', MeasurementFormat.format_value(0.1))
+        self.assertEqual('on', MeasurementFormat.format_value('on'))
+
+    def test_formatValue_sentValues(self):
+        # output contract: equal numbers are returned as the same string, regardless of the string that was sent
+        expected = {'20.5': '20.5', '20.50': '20.5', '20.0': '20', '20': '20', '-0.5': '-0.5', '1e3': '1000',
+                    '0.1': '0.1', '1.5e-7': '1.5e-07', '123456789012345': '123456789012345',
+                    '1e16': '1e+16', '-1e300': '-1e+300'}
+        for value, formattedValue in expected.items():
+            with self.subTest(value=value):
+                self.assertEqual(formattedValue, MeasurementFormat.format_value(MeasurementFormat.parse_value(value)))
+
+    def test_formatValue_roundTrip(self):
+        randomGenerator = random.Random(42)
+        for __ in range(1000):
+            value = randomGenerator.uniform(-1000, 1000) * 10 ** randomGenerator.randint(-10, 20)
+            self.assertEqual(value, MeasurementFormat.parse_value(MeasurementFormat.format_value(value)))
@@ -0,0 +1,212 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import Mock, patch
+
+from sqlalchemy.orm import sessionmaker
+
+SETTINGS = {
+    'database': {
+        'databasePath': 'storageLeaf.db',
+        'backup': {}
+    },
+    'api': {}
+}
+
+
+class TestPartitionManager(unittest.TestCase):
+    CURRENT_DATE = date(2021, 4, 15)
+
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS),
+                                                     'logic.BackupService': Mock()})
+        self._patcher.start()
+
+        from logic.database import Crud, Database, Models, Schemas
+        from logic.database.PartitionManager import PartitionManager
+        from logic.database.RetentionPolicy import RetentionPolicy
+        self.crud = Crud
+        self.models = Models
+        self.partitionManager = PartitionManager
+        self.retentionPolicy = RetentionPolicy
+        # every test uses a new database
+        Crud.IDENTITY_CACHE.invalidate()
+        Crud.LATEST_MEASUREMENT_CACHE.invalidate()
+
+        self._directory = tempfile.mkdtemp()
+        databaseUrl = f'sqlite:///{os.path.join(self._directory, "storageLeaf.db")}'
+        self._engine = Database.create_database_engine(databaseUrl, {}, isReadOnly=False)
+        self._readEngine = Database.create_database_engine(databaseUrl, {}, isReadOnly=True)
+        Models.Base.metadata.create_all(bind=self._engine)
+        self._db = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)()
+
+        # one measurement per hour from January to April for two sensors
+        for month in range(1, 5):
+            for sensorName in ['first', 'second']:
+                values = [Schemas.TimestampedValue(value=str(day * 100 + hour),
+                                                   timestamp=f'2021-{month:02d}-{day:02d} {hour:02d}:30:00')
+                          for day in range(1, 29) for hour in range(24)]
+                batch = Schemas.MeasurementBatch(devices=[
+                    Schemas.DeviceMeasurements(deviceName='myDevice', sensors=[
+                        Schemas.SensorValues(name=sensorName, type='temperature', values=values)
+                    ])
+                ])
+                Crud.create_measurement_batch(self._db, batch)
+
+        self._measurementsBefore = self.__read_measurements()
+        self._statisticsBefore = self.__read_statistics()
+
+    def tearDown(self):
+        self._db.close()
+        self._engine.dispose()
+        self._readEngine.dispose()
+        shutil.rmtree(self._directory)
+        self._patcher.stop()
+
+    def __create_manager(self, retentionInMonths: int = 0, policies=None):
+        return self.partitionManager({'enable': True, 'archiveAfterMonths': 1, 'retentionInMonths': retentionInMonths},
+                                     policies or [])
+
+    def __read_measurements(self):
+        with sessionmaker(bind=self._readEngine)() as readDb:
+            return [(m.id, m.timestamp, m.value, m.sensor_id)
+                    for m in self.crud.get_measurements_for_sensor(readDb, '', '', 1)]
+
+    def __read_statistics(self):
+        with sessionmaker(bind=self._readEngine)() as readDb:
+            return [(s.sensor_id, s.min, s.max, s.count)
+                    for s in self.crud.get_statistics_for_sensors(readDb, '', '', [1, 2])]
+
+    def __get_partition_names(self):
+        return [p.name for p in self._db.query(self.models.MeasurementPartition)
+                .order_by(self.models.MeasurementPartition.start_timestamp)]
+
+    def __count_measurements_in_table(self):
+        return self._db.query(self.models.Measurement).count()
+
+    def test_archive(self):
+        self.__create_manager().maintain(self._db, self.CURRENT_DATE)
+
+        # March is created in advance, but not archived yet
+        self.assertEqual(['measurement_p202101', 'measurement_p202102', 'measurement_p202103'],
+                         self.__get_partition_names())
+        self.assertEqual(2 * 2 * 28 * 24, self.__count_measurements_in_table())
+
+        self.assertEqual(self._measurementsBefore, self.__read_measurements())
+        self.assertEqual(4 * 2 * 28 * 24, self.crud.get_total_number_of_measurements(self._db))
+
+    def test_archive_repeated(self):
+        self.__create_manager().maintain(self._db, self.CURRENT_DATE)
+        self.__create_manager().maintain(self._db, date(2021, 5, 2))
+
+        self.assertEqual(4, len(self.__get_partition_names()))
+        self.assertEqual(self._measurementsBefore, self.__read_measurements())
+
+    def test_archive_keepsHighestId(self):
+        self.crud.create_measurement(self._db, self.crud.Schemas.MeasurementCreate(value='1', sensor_id=1,
+                                                                                   timestamp='2021-01-30 12:00:00'))
+        self.__create_manager().maintain(self._db, self.CURRENT_DATE)
+
+        self.assertEqual(2 * 2 * 28 * 24 + 1, self.__count_measurements_in_table())
+
+    def test_dropExpiredPartitions(self):
+        self.__create_manager(retentionInMonths=2).maintain(self._db, self.CURRENT_DATE)
+
+        self.assertEqual(['measurement_p202102', 'measurement_p202103'], self.__get_partition_names())
+        self.assertEqual(self._measurementsBefore[:3 * 28 * 24], self.__read_measurements())
+        # rollups keep the statistics of dropped partitions
+        self.assertEqual(self._statisticsBefore, self.__read_statistics())
+
+    def test_downsamplePartitions(self):
+        policies = [self.retentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=30),
+                    self.retentionPolicy(numberOfMeasurementsPerDay=2, ageInDays=60)]
+        self.__create_manager(policies=policies).maintain(self._db, self.CURRENT_DATE)
+
+        partitions = self._db.query(self.models.MeasurementPartition) \
+            .order_by(self.models.MeasurementPartition.start_timestamp).all()
+        self.assertEqual([2, 4, None], [p.measurements_per_day for p in partitions])
+
+        measurements = self.__read_measurements()
+        self.assertEqual(2 * 28 * 24 + 4 * 28 + 2 * 28, len(measurements))
+        self.assertEqual(self._statisticsBefore, self.__read_statistics())
+
+        with sessionmaker(bind=self._readEngine)() as readDb:
+            plan = readDb.connection().exec_driver_sql('EXPLAIN QUERY PLAN SELECT * FROM measurement '
+                                                       'WHERE sensor_id = 1 ORDER BY timestamp').fetchall()
+        self.assertIn('SEARCH main.measurement_p202101 USING COVERING INDEX '
+                      'ix_measurement_p202101_sensor_id_timestamp_id_value '
+                      '(sensor_id=? AND timestamp>? AND timestamp<?)', [row[-1] for row in plan])
+
+    def test_downsamplePartitions_replaceTableInOneTransaction(self):
+        self.__create_manager().maintain(self._db, self.CURRENT_DATE)
+        statements = []
+        self._db.connection().connection.driver_connection.set_trace_callback(statements.append)
+
+        policies = [self.retentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=30)]
+        self.__create_manager(policies=policies).maintain(self._db, self.CURRENT_DATE)
+
+        # statements of a script are traced with their separators
+        statements = [statement.strip().rstrip(';') for statement in statements]
+        dropIndex = statements.index('DROP TABLE "measurement_p202101"')
+        self.assertEqual('BEGIN IMMEDIATE', statements[dropIndex - 1])
+        self.assertEqual(['ALTER TABLE "measurement_p202101_new" RENAME TO "measurement_p202101"',
+                          'CREATE INDEX ix_measurement_p202101_sensor_id_timestamp_id_value '
+                          'ON measurement_p202101 (sensor_id, timestamp, id, value)',
+                          'CREATE INDEX ix_measurement_p202101_timestamp ON measurement_p202101 (timestamp)'],
+                         statements[dropIndex + 1:dropIndex + 4])
+        self.assertTrue(statements[dropIndex + 4].startswith('UPDATE measurement_partition'))
+        self.assertEqual('COMMIT', statements[dropIndex + 5])
+
+        partition = self._db.query(self.models.MeasurementPartition) \
+            .filter(self.models.MeasurementPartition.name == 'measurement_p202101').one()
+        self.assertEqual(4, partition.measurements_per_day)
+
+    def test_rebuildRollups_includesPartitions(self):
+        self.__create_manager().maintain(self._db, self.CURRENT_DATE)
+        self.crud.rebuild_rollups(self._db, 1)
+
+        self.assertEqual(self._statisticsBefore, self.__read_statistics())
+
+    def test_deleteLateMeasurement_rebuildsRollupsWithPartition(self):
+        self.__create_manager().maintain(self._db, self.CURRENT_DATE)
+        self.crud.create_measurement(self._db, self.crud.Schemas.MeasurementCreate(value='5000', sensor_id=1,
+                                                                                   timestamp='2021-01-01 00:00:00'))
+        self.crud.create_measurement(self._db, self.crud.Schemas.MeasurementCreate(value='1', sensor_id=1,
+                                                                                   timestamp='2021-04-28 00:00:00'))
+        lateMeasurement = self._db.query(self.models.Measurement).filter(self.models.Measurement.value == 5000).one()
+        self.crud.delete_measurement(self._db, lateMeasurement)
+
+        with sessionmaker(bind=self._readEngine)() as readDb:
+            buckets = self.crud.get_measurement_buckets_for_sensor(readDb, '2021-01-01', '2021-01-01 23:59:59', 1,
+                                                                   86400)
+        self.assertEqual([(24, 100, 123)], [(b.count, b.min, b.max) for b in buckets])
+
+    def __count_measurements_of_sensor(self, sensorId: int):
+        with sessionmaker(bind=self._readEngine)() as readDb:
+            return len(self.crud.get_measurements_for_sensor(readDb, '', '', sensorId))
+
+    def test_deleteSensor_deletesArchivedMeasurements(self):
+        self.__create_manager().maintain(self._db, self.CURRENT_DATE)
+        self.crud.delete_sensor(self._db, self.crud.get_sensor(self._db, 2))
+
+        self.assertEqual(0, self.__count_measurements_of_sensor(2))
+        self.assertEqual(4 * 28 * 24, self.crud.get_total_number_of_measurements(self._db))
+        self.assertEqual(0, self._db.query(self.models.MeasurementRollup)
+                         .filter(self.models.MeasurementRollup.sensor_id == 2).count())
+
+        # the id of the deleted sensor is not reused
+        newSensor = self.crud.create_sensor(self._db, self.crud.Schemas.SensorCreate(name='third', type='temperature',
+                                                                                    device_id=1))
+        self.assertEqual(3, newSensor.id)
+        self.assertEqual(0, self.__count_measurements_of_sensor(newSensor.id))
+        self.assertEqual(self._measurementsBefore, self.__read_measurements())
+
+    def test_deleteDevice_deletesArchivedMeasurements(self):
+        self.__create_manager(policies=[self.retentionPolicy(numberOfMeasurementsPerDay=4, ageInDays=30)]) \
+            .maintain(self._db, self.CURRENT_DATE)
+        self.crud.delete_device(self._db, self.crud.get_device(self._db, 1))
+
+        self.assertEqual(0, self.crud.get_total_number_of_measurements(self._db))
+        self.assertEqual(0, self._db.query(self.models.MeasurementRollup).count())
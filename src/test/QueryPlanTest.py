@@ -0,0 +1,266 @@
+import unittest
+from typing import List, Tuple
+from unittest.mock import Mock, patch
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+SETTINGS = {
+    'database': {
+        'databasePath': 'storageLeaf.db',
+        'backup': {}
+    },
+    'api': {}
+}
+
+
+class TestQueryPlan(unittest.TestCase):
+    # runs the statements of the hot crud queries with EXPLAIN QUERY PLAN
+    # and fails if sqlite falls back to a full table scan or a temporary b-tree for sorting
+
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS),
+                                                     'logic.BackupService': Mock()})
+        self._patcher.start()
+
+        from logic.database import Crud, Models, Schemas
+        self.crud = Crud
+        self.schemas = Schemas
+
+        # the sensor has to be created in this database
+        Crud.IDENTITY_CACHE.invalidate()
+        Crud.LATEST_MEASUREMENT_CACHE.invalidate()
+
+        self._engine = create_engine('sqlite://')
+        Models.Base.metadata.create_all(bind=self._engine)
+        self._db = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)()
+
+        batch = Schemas.MeasurementBatch(devices=[
+            Schemas.DeviceMeasurements(deviceName='myDevice', sensors=[
+                Schemas.SensorValues(name='mySensor', type='temperature', values=[
+                    Schemas.TimestampedValue(value='20.5', timestamp='2021-01-16 18:15:22'),
+                    Schemas.TimestampedValue(value='20.7', timestamp='2021-01-16 18:20:22')
+                ])
+            ])
+        ])
+        Crud.create_measurement_batch(self._db, batch)
+
+        self._statements = []
+        event.listen(self._engine, 'before_cursor_execute', self.__record_statement)
+
+    def tearDown(self):
+        event.remove(self._engine, 'before_cursor_execute', self.__record_statement)
+        self._db.close()
+        self._engine.dispose()
+        self._patcher.stop()
+
+    def __record_statement(self, connection, cursor, statement, parameters, context, executemany):
+        if not statement.startswith('EXPLAIN'):
+            self._statements.append((statement, parameters))
+
+    def __get_query_plans(self) -> List[Tuple[str, List[str]]]:
+        statements = list(self._statements)
+        self.assertTrue(statements, 'No statement recorded')
+
+        queryPlans = []
+        with self._engine.connect() as connection:
+            for statement, parameters in statements:
+                rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+                queryPlans.append((statement, [row[-1] for row in rows]))
+        return queryPlans
+
+    def __assert_no_scan_and_no_sort(self):
+        for statement, details in self.__get_query_plans():
+            for detail in details:
+                self.assertFalse(detail.startswith('SCAN'), f'Full scan "{detail}" for: {statement}')
+                self.assertNotIn('TEMP B-TREE', detail, f'Sorting "{detail}" for: {statement}')
+
+    def __assert_no_measurement_table_scan(self):
+        # used for aggregations, grouping by a computed bucket always needs a temporary b-tree
+        # the registry of partitions only contains one row per archived month
+        for statement, details in self.__get_query_plans():
+            for detail in details:
+                isMeasurementScan = detail.startswith('SCAN measurement') \
+                    and not detail.startswith('SCAN measurement_partition')
+                self.assertFalse(isMeasurementScan, f'Full scan "{detail}" for: {statement}')
+
+    def __assert_no_sort(self):
+        for statement, details in self.__get_query_plans():
+            for detail in details:
+                self.assertNotIn('TEMP B-TREE', detail, f'Sorting "{detail}" for: {statement}')
+
+    def __assert_rollups_only(self):
+        for statement, details in self.__get_query_plans():
+            for detail in details:
+                self.assertFalse(detail.startswith('SEARCH measurement '), f'Raw measurements read for: {statement}')
+
+    def __assert_covering_index(self):
+        for statement, details in self.__get_query_plans():
+            self.assertTrue(any('COVERING INDEX' in detail for detail in details),
+                            f'No covering index in {details} for: {statement}')
+
+    def test_getMeasurementsForSensor_dateRange(self):
+        self.crud.get_measurements_for_sensor(self._db, '2021-01-16 00:00:00', '2021-01-16 23:59:59', 1)
+        self.__assert_no_scan_and_no_sort()
+        self.__assert_covering_index()
+
+    def test_getMeasurementsForSensor_noDateRange(self):
+        self.crud.get_measurements_for_sensor(self._db, '', '', 1)
+        self.__assert_no_scan_and_no_sort()
+        self.__assert_covering_index()
+
+    def test_getLatestMeasurementForSensor(self):
+        self.crud.LATEST_MEASUREMENT_CACHE.invalidate()
+        self.crud.get_latest_measurement_for_sensor(self._db, 1)
+        self.__assert_no_scan_and_no_sort()
+        self.__assert_covering_index()
+
+    def test_getLatestMeasurements(self):
+        self.crud.LATEST_MEASUREMENT_CACHE.invalidate()
+        self.crud.get_latest_measurements(self._db, [1, 2], None)
+        self.__assert_no_measurement_table_scan()
+        self.__assert_no_sort()
+
+    def test_getFirstTimestampForSensor(self):
+        self.crud.get_first_timestamp_for_sensor(self._db, 1)
+        self.__assert_no_scan_and_no_sort()
+        self.__assert_covering_index()
+
+    def test_getMeasurementTimestampsForSensor(self):
+        list(self.crud.get_measurement_timestamps_for_sensor(self._db, '2021-01-16 00:00:00',
+                                                             '2021-01-16 23:59:59', 1))
+        self.__assert_no_scan_and_no_sort()
+        self.__assert_covering_index()
+
+    def test_getMeasurementValuesForSensor(self):
+        list(self.crud.get_measurement_values_for_sensor(self._db, '2021-01-16 00:00:00', '2021-01-16 23:59:59', 1))
+        self.__assert_no_scan_and_no_sort()
+        self.__assert_covering_index()
+
+    def test_getMeasurementBucketsForSensor(self):
+        # not aligned to the rollups
+        self.crud.get_measurement_buckets_for_sensor(self._db, '2021-01-16 00:00:01', '2021-01-16 23:59:59', 1, 3600)
+        self.__assert_no_measurement_table_scan()
+        self.__assert_covering_index()
+
+    def test_getMeasurementBucketsForSensor_rollups(self):
+        self.crud.get_measurement_buckets_for_sensor(self._db, '2021-01-16 00:00:00', '2021-01-16 23:59:59', 1, 3600)
+        self.__assert_no_measurement_table_scan()
+        self.__assert_rollups_only()
+
+    def test_getStatisticsForSensors(self):
+        self.crud.get_statistics_for_sensors(self._db, '2021-01-16 00:00:00', '2021-01-16 23:59:59', [1, 2])
+        self.__assert_no_measurement_table_scan()
+        self.__assert_no_sort()
+        self.__assert_rollups_only()
+
+    def test_getStatisticsForSensors_noDateRange(self):
+        self.crud.get_statistics_for_sensors(self._db, '', '', [1, 2])
+        self.__assert_no_measurement_table_scan()
+        self.__assert_no_sort()
+        self.__assert_rollups_only()
+
+    def test_getStatisticsForSensors_unalignedDateRange(self):
+        self.crud.get_statistics_for_sensors(self._db, '2021-01-16 18:10:00', '2021-01-17 01:30:00', [1, 2])
+        self.__assert_no_measurement_table_scan()
+        self.__assert_no_sort()
+
+    def test_createMeasurement_updatesRollups(self):
+        self.crud.create_measurement(self._db, self.schemas.MeasurementCreate(value='21.0', sensor_id=1,
+                                                                              timestamp='2021-01-16 18:25:22'))
+        self.__assert_no_measurement_table_scan()
+
+    def test_deleteMeasurement_rebuildsRollups(self):
+        self.crud.delete_measurement(self._db, self.crud.get_measurement(self._db, 1))
+        self.__assert_no_measurement_table_scan()
+
+    def test_rebuildRollups(self):
+        self.crud.rebuild_rollups(self._db, 1)
+        self.__assert_no_measurement_table_scan()
+
+    def test_getMeasurementsForExport(self):
+        self.crud.get_measurements_for_export(self._db, '2021-01-16 00:00:00', '2021-01-16 23:59:59',
+                                              [1, 2], None, None).all()
+        self.__assert_no_measurement_table_scan()
+        self.__assert_no_sort()
+        self.__assert_covering_index()
+
+    def test_getMeasurementsForExport_cursor(self):
+        self.crud.get_measurements_for_export(self._db, '', '', None, [1], (1, 1610820922, 2)).all()
+        self.__assert_no_measurement_table_scan()
+        self.__assert_no_sort()
+        self.__assert_covering_index()
+
+    def test_getNextKeyForExport(self):
+        from logic import MeasurementExport
+
+        query = self.crud.get_measurements_for_export(self._db, '', '', None, [1], None)
+        self.assertEqual((1, 1610820922, 1), MeasurementExport.get_next_key(query, 1))
+        self.__assert_no_measurement_table_scan()
+        self.__assert_no_sort()
+        self.__assert_covering_index()
+
+    def test_getMeasurements_dateRange(self):
+        self.crud.get_measurements(self._db, '2021-01-16 00:00:00', '2021-01-16 23:59:59')
+        self.__assert_no_scan_and_no_sort()
+
+    def test_getMeasurements_cursor(self):
+        self.crud.get_measurements(self._db, '', '', limit=100, afterKey=(1610820922, 1))
+        self.__assert_no_scan_and_no_sort()
+
+    def test_getMeasurementsForSensor_cursor(self):
+        self.crud.get_measurements_for_sensor(self._db, '2021-01-16 00:00:00', '2021-01-16 23:59:59', 1,
+                                              limit=100, beforeKey=(1610821222, 2))
+        self.__assert_no_scan_and_no_sort()
+        self.__assert_covering_index()
+
+    def test_getMeasurementRowsForSensor(self):
+        self.crud.get_measurement_rows_for_sensor(self._db, '2021-01-16 00:00:00', '2021-01-16 23:59:59', 1,
+                                                  limit=100, beforeKey=(1610821222, 2))
+        self.__assert_no_scan_and_no_sort()
+        self.__assert_covering_index()
+
+    def test_getDevices_cursor(self):
+        self.crud.get_devices(self._db, limit=100, afterId=1)
+        self.__assert_no_scan_and_no_sort()
+
+    def test_getSensors_cursor(self):
+        self.crud.get_sensors(self._db, limit=100, afterId=1)
+        self.__assert_no_scan_and_no_sort()
+
+    def test_getMeasurement(self):
+        self.crud.get_measurement(self._db, 1)
+        self.__assert_no_scan_and_no_sort()
+
+    def test_deleteMeasurementsInBatches(self):
+        self.crud.delete_measurements_in_batches(self._db, [1, 2])
+        self.__assert_no_scan_and_no_sort()
+
+    def test_getSensorByNameAndDeviceId(self):
+        self.crud.get_sensor_by_name_and_device_id(self._db, 'mySensor', 1)
+        self.__assert_no_scan_and_no_sort()
+
+    def test_sensorExists(self):
+        self.crud.IDENTITY_CACHE.invalidate()
+        self.crud.sensor_exists(self._db, 1)
+        self.__assert_no_scan_and_no_sort()
+
+    def test_getOrCreateSensorIds(self):
+        self.crud.IDENTITY_CACHE.invalidate()
+        batch = self.schemas.MeasurementBatch(devices=[
+            self.schemas.DeviceMeasurements(deviceName='myDevice', sensors=[
+                self.schemas.SensorValues(name='mySensor', type='temperature', values=[])
+            ])
+        ])
+        self.crud.get_or_create_sensor_ids(self._db, batch)
+        self.__assert_no_scan_and_no_sort()
+
+    def test_getRetentionProgress(self):
+        self.crud.get_retention_progress(self._db, 1, 24, 30)
+        self.__assert_no_scan_and_no_sort()
+
+    def test_hasMeasurementsInsertedAfter(self):
+        self.crud.has_measurements_inserted_after(self._db, 1, 1, '2021-01-16 23:59:59')
+        self.__assert_no_scan_and_no_sort()
+        for statement, details in self.__get_query_plans():
+            self.assertIn('USING INTEGER PRIMARY KEY', ' '.join(details), statement)
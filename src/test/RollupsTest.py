@@ -0,0 +1,308 @@
+import random
+import unittest
+from unittest.mock import Mock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from logic.database import MeasurementFormat, Rollups
+
+SETTINGS = {
+    'database': {
+        'databasePath': 'storageLeaf.db',
+        'backup': {}
+    },
+    'api': {}
+}
+
+START = MeasurementFormat.to_epoch_seconds('2021-01-16 00:00:00')
+HOUR = Rollups.SECONDS_PER_HOUR
+DAY = Rollups.SECONDS_PER_DAY
+
+
+class TestSplitRange(unittest.TestCase):
+    def test_aligned(self):
+        self.assertEqual([(DAY, START, START + 2 * DAY)], Rollups.split_range(START, START + 2 * DAY, [DAY, HOUR]))
+
+    def test_edges(self):
+        start = START - HOUR - 10
+        end = START + DAY + 2 * HOUR + 5
+        expected = [(None, start, START - HOUR),
+                    (HOUR, START - HOUR, START),
+                    (DAY, START, START + DAY),
+                    (HOUR, START + DAY, START + DAY + 2 * HOUR),
+                    (None, START + DAY + 2 * HOUR, end)]
+        self.assertEqual(expected, Rollups.split_range(start, end, [DAY, HOUR]))
+
+    def test_shorterThanResolution(self):
+        self.assertEqual([(None, START + 10, START + 20)], Rollups.split_range(START + 10, START + 20, [DAY, HOUR]))
+
+    def test_noResolutions(self):
+        self.assertEqual([(None, START, START + DAY)], Rollups.split_range(START, START + DAY, []))
+
+    def test_empty(self):
+        self.assertEqual([], Rollups.split_range(START, START, [DAY, HOUR]))
+
+
+class TestAggregateMeasurements(unittest.TestCase):
+    def test_oneRollupPerResolution(self):
+        rollups = Rollups.aggregate_measurements([{'sensor_id': 1, 'timestamp': START + 10, 'value': 2.0}])
+        self.assertEqual([(1, DAY, START), (1, HOUR, START)],
+                         [(rollup['sensor_id'], rollup['resolution'], rollup['bucket']) for rollup in rollups])
+
+    def test_merge(self):
+        rows = [{'sensor_id': 1, 'timestamp': START + 20, 'value': 2.0},
+                {'sensor_id': 1, 'timestamp': START + 10, 'value': 5.0},
+                {'sensor_id': 1, 'timestamp': START + 10, 'value': 1.0},
+                {'sensor_id': 1, 'timestamp': START + 20, 'value': 3.0}]
+        rollup = Rollups.aggregate_measurements(rows)[1]
+        self.assertEqual((1.0, 5.0, 11.0, 4), (rollup['min'], rollup['max'], rollup['sum'], rollup['count']))
+        # equal timestamps: the first inserted value is the first one and the last inserted value the last one
+        self.assertEqual((START + 10, 5.0), (rollup['first_timestamp'], rollup['first_value']))
+        self.assertEqual((START + 20, 3.0), (rollup['last_timestamp'], rollup['last_value']))
+
+
+class TestAggregate(unittest.TestCase):
+    def test_add(self):
+        aggregate = Rollups.Aggregate(1, 0)
+        aggregate.add(2.0, 4.0, 6.0, 2, 0, 2.0, 4.0)
+        aggregate.add(None, None, 0.0, 0, 3, None, None)
+        aggregate.add(1.0, 3.0, 4.0, 2, 1, 3.0, 1.0)
+        self.assertEqual((1.0, 4.0, 2.5, 4, 4), (aggregate.min, aggregate.max, aggregate.avg, aggregate.count,
+                                                 aggregate.number_of_non_numeric_values))
+        self.assertEqual((2.0, 1.0), (aggregate.first, aggregate.last))
+
+    def test_empty(self):
+        self.assertIsNone(Rollups.Aggregate(1, 0).avg)
+
+
+class TestCorrectRollup(unittest.TestCase):
+    ROLLUP = {'sensor_id': 1, 'resolution': HOUR, 'bucket': START, 'min': -5.0, 'max': 10.0, 'sum': 20.0,
+              'count': 10, 'number_of_non_numeric_values': 1, 'first_timestamp': START + 10, 'first_value': 1.0,
+              'last_timestamp': START + 50, 'last_value': 2.0}
+
+    def __create_recomputed(self, **values):
+        return {**self.ROLLUP, **values}
+
+    def test_complete_recomputed(self):
+        recomputed = self.__create_recomputed(max=8.0, sum=18.0)
+        self.assertIs(recomputed, Rollups.correct_rollup(self.ROLLUP, recomputed, START + 20, 10.0, 8.0))
+
+    def test_completeAfterDeletingLastValue_none(self):
+        rollup = self.__create_recomputed(count=1, number_of_non_numeric_values=0)
+        self.assertIsNone(Rollups.correct_rollup(rollup, None, START + 20, 10.0, None))
+
+    def test_thinnedOut_deleteValue_correctSumAndCount(self):
+        recomputed = self.__create_recomputed(min=0.0, max=3.0, sum=4.0, count=2)
+        corrected = Rollups.correct_rollup(self.ROLLUP, recomputed, START + 20, 1.0, None)
+        self.assertEqual((-5.0, 10.0, 19.0, 9, 1), (corrected['min'], corrected['max'], corrected['sum'],
+                                                    corrected['count'], corrected['number_of_non_numeric_values']))
+        self.assertEqual((START + 10, 1.0, START + 50, 2.0),
+                         (corrected['first_timestamp'], corrected['first_value'],
+                          corrected['last_timestamp'], corrected['last_value']))
+
+    def test_thinnedOut_updateMax_maxOfRemainingValues(self):
+        recomputed = self.__create_recomputed(min=0.0, max=3.0, sum=4.0, count=2)
+        corrected = Rollups.correct_rollup(self.ROLLUP, recomputed, START + 20, 10.0, -7.0)
+        self.assertEqual((-7.0, 3.0, 3.0, 10), (corrected['min'], corrected['max'], corrected['sum'],
+                                                corrected['count']))
+
+    def test_thinnedOut_updateFirst_firstOfRemainingValues(self):
+        recomputed = self.__create_recomputed(first_value=4.0, sum=4.0, count=2)
+        corrected = Rollups.correct_rollup(self.ROLLUP, recomputed, START + 10, 1.0, 4.0)
+        self.assertEqual((START + 10, 4.0, 23.0), (corrected['first_timestamp'], corrected['first_value'],
+                                                   corrected['sum']))
+
+    def test_thinnedOut_deleteNonNumericValue(self):
+        recomputed = self.__create_recomputed(count=2, number_of_non_numeric_values=0)
+        corrected = Rollups.correct_rollup(self.ROLLUP, recomputed, START + 20, 'abc', None)
+        self.assertEqual((20.0, 10, 0), (corrected['sum'], corrected['count'],
+                                         corrected['number_of_non_numeric_values']))
+
+    def test_thinnedOut_deleteLastNumericValue(self):
+        rollup = self.__create_recomputed(count=3)
+        corrected = Rollups.correct_rollup(rollup, None, START + 20, 1.0, None)
+        self.assertEqual(2, corrected['count'])
+
+        rollup = self.__create_recomputed(count=1, sum=1.0)
+        corrected = Rollups.correct_rollup(rollup, None, START + 20, 1.0, None)
+        self.assertEqual((None, None, 0, 1, None), (corrected['min'], corrected['max'], corrected['count'],
+                                                    corrected['number_of_non_numeric_values'],
+                                                    corrected['first_value']))
+
+
+class TestRollupQueries(unittest.TestCase):
+    # results using the rollups have to match the aggregation of the raw measurements
+
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS),
+                                                     'logic.BackupService': Mock()})
+        self._patcher.start()
+
+        from logic.database import Crud, Models, Schemas
+        self.crud = Crud
+        self.models = Models
+        self.schemas = Schemas
+
+        self._engine = create_engine('sqlite://')
+        Models.Base.metadata.create_all(bind=self._engine)
+        self._db = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)()
+
+        randomGenerator = random.Random(42)
+        timestamps = sorted(randomGenerator.randrange(START - DAY, START + 3 * DAY) for _ in range(2000))
+        values = [TestRollupQueries.__create_value(randomGenerator, timestamp) for timestamp in timestamps]
+        randomGenerator.shuffle(values)
+
+        # inserted out of order and in several batches
+        for index in range(0, len(values), 500):
+            self.crud.create_measurement_batch(self._db, self.__create_batch(values[index:index + 500]))
+        self.crud.create_measurement(self._db, self.schemas.MeasurementCreate(value='100', sensor_id=1,
+                                                                              timestamp='2021-01-16 12:00:00'))
+
+    def tearDown(self):
+        self._db.close()
+        self._engine.dispose()
+        self._patcher.stop()
+
+    @staticmethod
+    def __create_value(randomGenerator: random.Random, timestamp: int):
+        # few distinct timestamps to get equal timestamps within buckets
+        return MeasurementFormat.to_date_time_string(timestamp // 60 * 60), str(randomGenerator.randint(-50, 50))
+
+    def __create_batch(self, values):
+        return self.schemas.MeasurementBatch(devices=[
+            self.schemas.DeviceMeasurements(deviceName='myDevice', sensors=[
+                self.schemas.SensorValues(name='mySensor', type='temperature', values=[
+                    self.schemas.TimestampedValue(value=value, timestamp=timestamp) for timestamp, value in values
+                ])
+            ])
+        ])
+
+    def __get_raw_buckets(self, startTimestamp: int, endTimestamp: int, bucketWidthInSeconds: int):
+        measurements = self._db.query(self.models.Measurement) \
+            .filter(self.models.Measurement.timestamp >= startTimestamp) \
+            .filter(self.models.Measurement.timestamp <= endTimestamp) \
+            .order_by(self.models.Measurement.timestamp, self.models.Measurement.id) \
+            .all()
+
+        buckets = {}
+        for measurement in measurements:
+            buckets.setdefault((measurement.timestamp - startTimestamp) // bucketWidthInSeconds, []).append(
+                measurement.value)
+        return [(bucket, min(values), max(values), sum(values) / len(values), len(values), values[0], values[-1])
+                for bucket, values in sorted(buckets.items())]
+
+    def __assert_buckets(self, startTimestamp: int, endTimestamp: int, bucketWidthInSeconds: int):
+        aggregates = self.crud.get_measurement_buckets_for_sensor(
+            self._db, MeasurementFormat.to_date_time_string(startTimestamp),
+            MeasurementFormat.to_date_time_string(endTimestamp), 1, bucketWidthInSeconds)
+        expected = self.__get_raw_buckets(startTimestamp, endTimestamp, bucketWidthInSeconds)
+
+        self.assertEqual(len(expected), len(aggregates))
+        for expectedBucket, aggregate in zip(expected, aggregates):
+            self.assertEqual(expectedBucket[0], aggregate.bucket)
+            self.assertEqual(expectedBucket[1:3], (aggregate.min, aggregate.max))
+            self.assertAlmostEqual(expectedBucket[3], aggregate.avg)
+            self.assertEqual(expectedBucket[4:], (aggregate.count, aggregate.first, aggregate.last))
+
+    def test_buckets_hourly(self):
+        self.__assert_buckets(START, START + DAY - 1, HOUR)
+
+    def test_buckets_daily(self):
+        self.__assert_buckets(START - DAY, START + 3 * DAY - 1, DAY)
+
+    def test_buckets_unalignedEnd(self):
+        self.__assert_buckets(START, START + DAY + 5 * HOUR + 17, 3 * HOUR)
+
+    def test_buckets_unalignedStart(self):
+        self.__assert_buckets(START + 17, START + DAY, HOUR)
+
+    def test_statistics_unalignedRange(self):
+        startTimestamp = START - HOUR - 17
+        endTimestamp = START + 2 * DAY + 3 * HOUR + 17
+        statistics = self.crud.get_statistics_for_sensors(self._db,
+                                                          MeasurementFormat.to_date_time_string(startTimestamp),
+                                                          MeasurementFormat.to_date_time_string(endTimestamp), [1])
+        expected = self.__get_raw_buckets(startTimestamp, endTimestamp, endTimestamp - startTimestamp + 1)[0]
+
+        self.assertEqual(1, len(statistics))
+        self.assertEqual((expected[1], expected[2], expected[4]),
+                         (statistics[0].min, statistics[0].max, statistics[0].count))
+        self.assertAlmostEqual(expected[3], statistics[0].avg)
+
+    def test_statistics_noDateRange(self):
+        statistics = self.crud.get_statistics_for_sensors(self._db, '', '', [1, 2])
+        self.assertEqual([1], [entry.sensor_id for entry in statistics])
+        self.assertEqual(2001, statistics[0].count)
+        self.assertEqual(100, statistics[0].max)
+
+    def test_deleteMeasurement(self):
+        measurement = self._db.query(self.models.Measurement).filter(self.models.Measurement.value == 100).one()
+        self.crud.delete_measurement(self._db, measurement)
+        self.__assert_buckets(START, START + DAY - 1, HOUR)
+
+    def test_updateMeasurement(self):
+        measurement = self._db.query(self.models.Measurement).filter(self.models.Measurement.value == 100).one()
+        self.crud.update_measurement(self._db, measurement.id, self.schemas.MeasurementUpdate(value='-100'))
+        self.__assert_buckets(START - DAY, START + 3 * DAY - 1, DAY)
+
+    def test_rebuildRollups(self):
+        before = self._db.query(self.models.MeasurementRollup).order_by(self.models.MeasurementRollup.resolution,
+                                                                      self.models.MeasurementRollup.bucket).all()
+        before = [(rollup.resolution, rollup.bucket, rollup.min, rollup.max, rollup.count, rollup.first_value,
+                   rollup.last_value) for rollup in before]
+
+        self.crud.rebuild_rollups(self._db, 1)
+
+        after = self._db.query(self.models.MeasurementRollup).order_by(self.models.MeasurementRollup.resolution,
+                                                                     self.models.MeasurementRollup.bucket).all()
+        after = [(rollup.resolution, rollup.bucket, rollup.min, rollup.max, rollup.count, rollup.first_value,
+                  rollup.last_value) for rollup in after]
+        self.assertEqual(before, after)
+
+    def __get_day_aggregate(self):
+        return self.crud.get_measurement_buckets_for_sensor(self._db, MeasurementFormat.to_date_time_string(START),
+                                                            MeasurementFormat.to_date_time_string(START + DAY - 1),
+                                                            1, DAY)[0]
+
+    def test_cleanupThenEditMeasurements_keepsRollups(self):
+        measurement100 = self._db.query(self.models.Measurement).filter(self.models.Measurement.value == 100).one()
+        measurementIds = [measurementId for measurementId, in self._db.query(self.models.Measurement.id)
+                          .filter(self.models.Measurement.timestamp >= START)
+                          .filter(self.models.Measurement.timestamp < START + DAY)
+                          .order_by(self.models.Measurement.id)]
+
+        # thinned out by the database cleanup, every tenth measurement of the day is kept
+        keptIds = set(measurementIds[::10]) | {measurement100.id}
+        self.crud.delete_measurements_in_batches(self._db, [measurementId for measurementId in measurementIds
+                                                            if measurementId not in keptIds])
+        self._db.commit()
+        before = self.__get_day_aggregate()
+        self.assertEqual(len(measurementIds), before.count)
+
+        self.crud.update_measurement(self._db, measurement100.id, self.schemas.MeasurementUpdate(value='-100'))
+        after = self.__get_day_aggregate()
+        keptValues = [value for value, in self._db.query(self.models.Measurement.value)
+                      .filter(self.models.Measurement.id.in_(keptIds))]
+        self.assertEqual(before.count, after.count)
+        self.assertAlmostEqual(before.sum - 200, after.sum)
+        self.assertEqual((-100, max(keptValues)), (after.min, after.max))
+
+        other = self._db.query(self.models.Measurement) \
+            .filter(self.models.Measurement.id.in_(keptIds - {measurement100.id})) \
+            .filter(self.models.Measurement.value > after.min) \
+            .filter(self.models.Measurement.value < after.max) \
+            .first()
+        otherValue = other.value
+        self.crud.delete_measurement(self._db, other)
+        afterDelete = self.__get_day_aggregate()
+        self.assertEqual(before.count - 1, afterDelete.count)
+        self.assertAlmostEqual(after.sum - otherValue, afterDelete.sum)
+        self.assertEqual((after.min, after.max), (afterDelete.min, afterDelete.max))
+
+    def test_cleanupKeepsRollups(self):
+        measurementIds = [measurementId for measurementId, in self._db.query(self.models.Measurement.id)]
+        self.crud.delete_measurements_in_batches(self._db, measurementIds)
+
+        statistics = self.crud.get_statistics_for_sensors(self._db, '', '', [1])
+        self.assertEqual(2001, statistics[0].count)
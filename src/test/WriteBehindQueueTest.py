@@ -0,0 +1,206 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from typing import Callable, Dict, List
+from unittest.mock import Mock, patch
+
+from sqlalchemy.orm import sessionmaker
+
+SETTINGS = {
+    'database': {
+        'databasePath': 'storageLeaf.db',
+        'backup': {}
+    },
+    'api': {}
+}
+
+
+class BlockingExecutor:
+    # replaces the database executor, every write waits until it is released
+    def __init__(self):
+        self.isReleased = asyncio.Event()
+        self.numberOfCalls = 0
+
+    async def run(self, func: Callable, *args, **kwargs):
+        self.numberOfCalls += 1
+        await self.isReleased.wait()
+        return func(*args, **kwargs)
+
+
+class TestWriteBehindQueue(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._patcher = patch.dict('sys.modules', **{'Settings': Mock(SETTINGS=SETTINGS),
+                                                     'logic.BackupService': Mock()})
+        self._patcher.start()
+
+        from logic import Constants, WriteBehindQueue
+        from logic.database import Crud, Database, Models, Schemas
+        self.constants = Constants
+        self.writeBehindQueue = WriteBehindQueue
+        self.crud = Crud
+        self.models = Models
+
+        self.crud.IDENTITY_CACHE.invalidate()
+        self.crud.LATEST_MEASUREMENT_CACHE.invalidate()
+
+        self._directory = tempfile.mkdtemp()
+        databaseUrl = f'sqlite:///{os.path.join(self._directory, "storageLeaf.db")}'
+        self._engine = Database.create_database_engine(databaseUrl, {}, isReadOnly=False)
+        Models.Base.metadata.create_all(bind=self._engine)
+        sessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self._engine)
+        self._db = sessionLocal()
+
+        self._sessionPatcher = patch.object(WriteBehindQueue, 'SessionLocal', sessionLocal)
+        self._sessionPatcher.start()
+
+        batch = Schemas.MeasurementBatch(devices=[
+            Schemas.DeviceMeasurements(deviceName='myDevice', sensors=[
+                Schemas.SensorValues(name='mySensor', type='temperature', values=[])
+            ])
+        ])
+        self._sensorId = self.crud.get_or_create_sensor_ids(self._db, batch)[('myDevice', 'mySensor')]
+        self._queues = []
+
+    async def asyncTearDown(self):
+        for queue in self._queues:
+            await queue.stop()
+
+    def tearDown(self):
+        self._sessionPatcher.stop()
+        self._db.close()
+        self._engine.dispose()
+        shutil.rmtree(self._directory)
+        self._patcher.stop()
+
+    def __create_queue(self, **kwargs):
+        queue = self.writeBehindQueue.WriteBehindQueue(enable=True, **kwargs)
+        queue.start()
+        self._queues.append(queue)
+        return queue
+
+    def __create_rows(self, numberOfRows: int, firstTimestamp: int = 1610820922) -> List[Dict]:
+        return [{'sensor_id': self._sensorId, 'value': float(index), 'timestamp': firstTimestamp + index}
+                for index in range(numberOfRows)]
+
+    def __count_measurements(self) -> int:
+        self._db.rollback()
+        return self._db.query(self.models.Measurement).count()
+
+    @staticmethod
+    async def __wait_until(condition: Callable[[], bool]):
+        for __ in range(500):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError('Condition not reached')
+
+    def test_invalidDurability_raise(self):
+        with self.assertRaises(ValueError):
+            self.writeBehindQueue.WriteBehindQueue(enable=True, durability='eventually')
+
+    async def test_disabled_notStarted(self):
+        queue = self.writeBehindQueue.WriteBehindQueue(enable=False)
+        queue.start()
+
+        self.assertFalse(queue.is_enabled)
+        self.assertFalse(queue.get_statistics().enabled)
+
+    async def test_groupCommit_concurrentRequestsInOneTransaction(self):
+        queue = self.__create_queue(maxDelayInMilliseconds=100)
+
+        with patch.object(self.crud, 'create_measurements_from_rows',
+                          wraps=self.crud.create_measurements_from_rows) as createMeasurements:
+            await asyncio.gather(*[queue.enqueue(self.__create_rows(2, 1610820922 + 10 * index))
+                                   for index in range(3)])
+
+        createMeasurements.assert_called_once()
+        self.assertEqual(6, len(createMeasurements.call_args.args[1]))
+        self.assertEqual(6, self.__count_measurements())
+
+        statistics = queue.get_statistics()
+        self.assertEqual(1, statistics.number_of_group_commits)
+        self.assertEqual(6, statistics.number_of_written_measurements)
+
+    async def test_groupCommit_maxBatchSizeReached_writtenWithoutDelay(self):
+        queue = self.__create_queue(maxBatchSize=4, maxDelayInMilliseconds=10000)
+
+        await asyncio.wait_for(asyncio.gather(*[queue.enqueue(self.__create_rows(2, 1610820922 + 10 * index))
+                                                for index in range(4)]), 5)
+
+        self.assertEqual(8, self.__count_measurements())
+        self.assertEqual(2, queue.get_statistics().number_of_group_commits)
+
+    async def test_durabilityCommitted_returnsAfterCommit(self):
+        queue = self.__create_queue(durability='committed', maxDelayInMilliseconds=10)
+
+        await queue.enqueue(self.__create_rows(3))
+
+        self.assertEqual(3, self.__count_measurements())
+
+    async def test_durabilityCommitted_writeFails_raise(self):
+        queue = self.__create_queue(durability='committed', maxDelayInMilliseconds=10)
+
+        with patch.object(self.crud, 'create_measurements_from_rows', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError), self.assertLogs(self.constants.APP_NAME, level='ERROR'):
+                await queue.enqueue(self.__create_rows(3))
+
+        self.assertEqual(0, self.__count_measurements())
+        self.assertEqual(0, queue.get_statistics().number_of_group_commits)
+
+    async def test_durabilityQueued_returnsBeforeCommit(self):
+        executor = BlockingExecutor()
+        with patch.object(self.writeBehindQueue, 'DATABASE_EXECUTOR', executor):
+            queue = self.__create_queue(durability='queued', maxDelayInMilliseconds=10)
+
+            await asyncio.wait_for(queue.enqueue(self.__create_rows(3)), 5)
+            await self.__wait_until(lambda: executor.numberOfCalls == 1)
+            self.assertEqual(0, self.__count_measurements())
+
+            executor.isReleased.set()
+            await queue.stop()
+
+        self.assertEqual(3, self.__count_measurements())
+
+    async def test_queueFull_raise(self):
+        executor = BlockingExecutor()
+        with patch.object(self.writeBehindQueue, 'DATABASE_EXECUTOR', executor):
+            queue = self.__create_queue(durability='queued', maxQueueSize=1, maxDelayInMilliseconds=0,
+                                        enqueueTimeoutInSeconds=0.05)
+
+            # the first request is being written, the second one fills the queue
+            await queue.enqueue(self.__create_rows(1))
+            await self.__wait_until(lambda: executor.numberOfCalls == 1)
+            await queue.enqueue(self.__create_rows(1, 1610830000))
+
+            with self.assertRaises(self.writeBehindQueue.QueueFullError):
+                await queue.enqueue(self.__create_rows(1, 1610840000))
+
+            statistics = queue.get_statistics()
+            self.assertEqual(1, statistics.queue_size)
+            self.assertEqual(1, statistics.number_of_rejected_requests)
+
+            executor.isReleased.set()
+            await queue.stop()
+
+        self.assertEqual(2, self.__count_measurements())
+
+    async def test_stop_flushesPendingRequests(self):
+        queue = self.__create_queue(durability='queued', maxDelayInMilliseconds=1000)
+
+        for index in range(3):
+            await queue.enqueue(self.__create_rows(2, 1610820922 + 10 * index))
+        self.assertEqual(0, self.__count_measurements())
+
+        await queue.stop()
+
+        self.assertEqual(6, self.__count_measurements())
+        self.assertFalse(queue.is_enabled)
+
+    async def test_stop_rejectsNewRequests(self):
+        queue = self.__create_queue(durability='queued', maxDelayInMilliseconds=10)
+        await queue.stop()
+
+        with self.assertRaises(self.writeBehindQueue.QueueFullError):
+            await queue.enqueue(self.__create_rows(1))
@@ -0,0 +1,27 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Settings import SETTINGS
+from logic.database import DatabaseMigration, Models
+from logic.database.Database import engine
+
+# Usage (from the src directory): python tools/BackfillRollups.py
+# Recomputes the hourly and daily rollups of all sensors from the stored measurements.
+# The rollups are computed automatically on the first startup after the update, running it in advance avoids a long
+# startup time. Running it again is safe, but measurements already removed by the database cleanup are lost for the
+# rollups afterwards. StorageLeaf may keep running during the backfill.
+
+
+def main():
+    databasePath = SETTINGS['database']['databasePath']
+
+    Models.Base.metadata.create_all(bind=engine)
+    numberOfSensors = DatabaseMigration.backfill_rollups(engine)
+
+    print(f'Computed rollups for {numberOfSensors} sensors of database "{databasePath}"')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Settings import SETTINGS
+from logic.database import MeasurementFormat, Models
+from logic.database.Database import create_database_engine, get_engine_settings
+
+# Usage (from the src directory): python tools/DatabaseBenchmark.py [durationInSeconds]
+# Compares ingest and query throughput of the former engine configuration with the configured engine settings.
+
+NUMBER_OF_SENSORS = 10
+NUMBER_OF_PREFILLED_DAYS = 10
+PREFILL_INTERVAL_IN_MINUTES = 1
+NUMBER_OF_WRITERS = 4
+NUMBER_OF_READERS = 4
+
+LEGACY_ENGINE_SETTINGS = {
+    'journalMode': 'DELETE',
+    'synchronous': 'FULL',
+    'cacheSizeInKiB': 2000,
+    'mmapSizeInMB': 0,
+    'tempStore': 'DEFAULT',
+    'busyTimeoutInMilliseconds': 5000
+}
+
+
+class BenchmarkResult:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.numberOfInserts = 0
+        self.numberOfQueries = 0
+        self.numberOfErrors = 0
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+def prefill(sessionFactory, startTime: datetime):
+    db = sessionFactory()
+    try:
+        device = Models.Device(name='benchmarkDevice')
+        db.add(device)
+        db.flush()
+
+        for index in range(NUMBER_OF_SENSORS):
+            sensor = Models.Sensor(name=f'sensor{index}', type='temperature', device_id=device.id)
+            db.add(sensor)
+            db.flush()
+
+            numberOfRows = NUMBER_OF_PREFILLED_DAYS * 24 * 60 // PREFILL_INTERVAL_IN_MINUTES
+            rows = []
+            for i in range(numberOfRows):
+                timestamp = startTime + timedelta(minutes=PREFILL_INTERVAL_IN_MINUTES * i)
+                rows.append({'sensor_id': sensor.id,
+                             'value': round(random.uniform(15, 25), 2),
+                             'timestamp': MeasurementFormat.datetime_to_epoch_seconds(timestamp)})
+            db.execute(insert(Models.Measurement), rows)
+
+        db.commit()
+    finally:
+        db.close()
+
+
+def write_measurements(sessionFactory, result: BenchmarkResult, stopEvent: threading.Event):
+    # mirrors Crud.create_measurement: one commit per measurement
+    db = sessionFactory()
+    try:
+        while not stopEvent.is_set():
+            try:
+                db.add(Models.Measurement(sensor_id=random.randint(1, NUMBER_OF_SENSORS),
+                                          value=round(random.uniform(15, 25), 2),
+                                          timestamp=MeasurementFormat.datetime_to_epoch_seconds(datetime.now())))
+                db.commit()
+                result.count('numberOfInserts')
+            except Exception:
+                db.rollback()
+                result.count('numberOfErrors')
+    finally:
+        db.close()
+
+
+def read_measurements(sessionFactory, result: BenchmarkResult, stopEvent: threading.Event, startTime: datetime):
+    # mirrors Crud.get_measurements_for_sensor: all measurements of one day for a sensor
+    db = sessionFactory()
+    try:
+        while not stopEvent.is_set():
+            try:
+                dayStart = startTime + timedelta(days=random.randint(0, NUMBER_OF_PREFILLED_DAYS - 1))
+                startTimestamp = MeasurementFormat.datetime_to_epoch_seconds(dayStart)
+                db.query(Models.Measurement) \
+                    .filter(Models.Measurement.sensor_id == random.randint(1, NUMBER_OF_SENSORS)) \
+                    .filter(Models.Measurement.timestamp >= startTimestamp) \
+                    .filter(Models.Measurement.timestamp <= startTimestamp + MeasurementFormat.SECONDS_PER_DAY) \
+                    .order_by(Models.Measurement.timestamp.desc()) \
+                    .all()
+                db.rollback()
+                result.count('numberOfQueries')
+            except Exception:
+                db.rollback()
+                result.count('numberOfErrors')
+    finally:
+        db.close()
+
+
+def run_scenario(engineSettings: Dict, isReadWriteSplit: bool, durationInSeconds: float) -> BenchmarkResult:
+    directory = tempfile.mkdtemp()
+    try:
+        databaseUrl = f'sqlite:///{os.path.join(directory, "benchmark.db")}'
+        writeEngine = create_database_engine(databaseUrl, engineSettings, isReadOnly=False)
+        readEngine = create_database_engine(databaseUrl, engineSettings, isReadOnly=True) \
+            if isReadWriteSplit else writeEngine
+
+        Models.Base.metadata.create_all(bind=writeEngine)
+
+        writeSessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=writeEngine)
+        readSessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=readEngine)
+
+        startTime = datetime.now() - timedelta(days=NUMBER_OF_PREFILLED_DAYS)
+        prefill(writeSessionFactory, startTime)
+
+        result = BenchmarkResult()
+        stopEvent = threading.Event()
+        threads = [threading.Thread(target=write_measurements, args=(writeSessionFactory, result, stopEvent))
+                   for __ in range(NUMBER_OF_WRITERS)]
+        threads.extend([threading.Thread(target=read_measurements,
+                                         args=(readSessionFactory, result, stopEvent, startTime))
+                        for __ in range(NUMBER_OF_READERS)])
+
+        for thread in threads:
+            thread.start()
+        time.sleep(durationInSeconds)
+        stopEvent.set()
+        for thread in threads:
+            thread.join()
+
+        writeEngine.dispose()
+        readEngine.dispose()
+        return result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    durationInSeconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    scenarios = [
+        ('before (rollback journal, single engine)', LEGACY_ENGINE_SETTINGS, False),
+        ('after (configured settings, reader/writer engines)',
+         get_engine_settings(SETTINGS['database'].get('engine', {})), True)
+    ]
+
+    print(f'{NUMBER_OF_WRITERS} writers, {NUMBER_OF_READERS} readers, {durationInSeconds}s per scenario, '
+          f'{NUMBER_OF_SENSORS * NUMBER_OF_PREFILLED_DAYS * 24 * 60 // PREFILL_INTERVAL_IN_MINUTES} prefilled rows')
+    print(f'{"scenario":<55}{"inserts/s":>12}{"queries/s":>12}{"errors":>8}')
+    for name, engineSettings, isReadWriteSplit in scenarios:
+        result = run_scenario(engineSettings, isReadWriteSplit, durationInSeconds)
+        print(f'{name:<55}'
+              f'{result.numberOfInserts / durationInSeconds:>12.1f}'
+              f'{result.numberOfQueries / durationInSeconds:>12.1f}'
+              f'{result.numberOfErrors:>8}')
+
+
+if __name__ == '__main__':
+    main()
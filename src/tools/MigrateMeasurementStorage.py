@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Settings import SETTINGS
+from logic.database import DatabaseMigration
+from logic.database.Database import engine
+
+# Usage (from the src directory): python tools/MigrateMeasurementStorage.py
+# Converts the measurements of the configured database to the numeric storage (epoch second timestamps, REAL values).
+# The migration is also performed automatically on startup, running it in advance avoids a long startup time.
+# Stop StorageLeaf and create a backup of the database before running the migration.
+
+
+def get_size_in_mega_bytes(path: str) -> float:
+    return os.path.getsize(path) / 1024 / 1024
+
+
+def main():
+    databasePath = SETTINGS['database']['databasePath']
+
+    if not DatabaseMigration.is_measurement_storage_migration_required(engine):
+        print(f'Database "{databasePath}" already uses the numeric storage')
+        return
+
+    sizeBefore = get_size_in_mega_bytes(databasePath)
+    DatabaseMigration.migrate_measurement_storage(engine)
+    sizeAfter = get_size_in_mega_bytes(databasePath)
+
+    print(f'Migrated database "{databasePath}": {sizeBefore:.1f} MB -> {sizeAfter:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
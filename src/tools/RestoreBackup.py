@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic import BackupSnapshot
+
+# Usage (from the src directory): python tools/RestoreBackup.py <fullBackup> <targetDatabasePath>
+# Restores a downloaded backup (e.g. storageLeaf.db.gz) to the target path and applies the incremental backups found
+# next to it (storageLeaf.db.delta1.gz, storageLeaf.db.delta2.gz, ...) in order.
+# Incremental backups left over from an older full backup are detected and skipped.
+
+
+def main():
+    if len(sys.argv) != 3:
+        print('Usage: python tools/RestoreBackup.py <fullBackup> <targetDatabasePath>')
+        sys.exit(1)
+
+    fullBackupPath, targetPath = sys.argv[1], sys.argv[2]
+    if os.path.exists(targetPath):
+        print(f'Target "{targetPath}" already exists')
+        sys.exit(1)
+
+    BackupSnapshot.decompress(fullBackupPath, targetPath)
+    print(f'Restored full backup "{fullBackupPath}"')
+
+    basePath = fullBackupPath[:-len('.gz')] if fullBackupPath.endswith('.gz') else fullBackupPath
+    numberOfDeltas = 1
+    while os.path.exists(f'{basePath}.delta{numberOfDeltas}.gz'):
+        deltaPath = f'{basePath}.delta{numberOfDeltas}.gz'
+        try:
+            BackupSnapshot.apply_delta(deltaPath, targetPath)
+        except ValueError as e:
+            print(f'Stopped at "{deltaPath}": {e}')
+            break
+
+        print(f'Applied incremental backup "{deltaPath}"')
+        numberOfDeltas += 1
+
+    print(f'Restored database "{targetPath}"')
+
+
+if __name__ == '__main__':
+    main()